@@ -1,6 +1,6 @@
 from fastapi import FastAPI
 from tickets.router import router as tickets_router
-from draws.router import router as draws_router
+from draws.router import router as draws_router, close_draw
 from lottery_categories.router import router as categories_router
 from winners.router import router as winners_router
 from referrals.router import router as referrals_router # Import the referrals router
@@ -8,9 +8,22 @@ from users.router import router as users_router # Import the users router
 from auth.router import router as auth_router # Import the auth router
 from syndicates.router import router as syndicates_router # Import the syndicates router
 from gamification.router import router as gamification_router # Import the gamification router
+from metrics.router import router as metrics_router
+from exports.router import router as exports_router
+from metrics.instrumentation import install_instrumentation
+from auth.verification import signature_verifier
+from syndicates.db import ensure_syndicate_indexes, migrate_syndicate_memberships, migrate_syndicate_tickets
+from referrals.db import ensure_referral_indexes, migrate_referrer_stats
+from tickets.db import ensure_ticket_indexes, migrate_ticket_purchase_ids
+from draws.db import ensure_draw_indexes
+from gamification.db import ensure_gamification_indexes
+from draws.close_jobs import resume_close_jobs, shutdown_close_job_workers
+from gamification.backfill import resume_backfill_jobs, shutdown_backfill_workers
 from database import close_db_connection, connect_db, get_db
 
 app = FastAPI()
+# Per-request Mongo/XRPL/serialization timings (Server-Timing header + /api/_metrics)
+install_instrumentation(app)
 
 @app.on_event("startup")
 async def startup_db_client():
@@ -21,10 +34,46 @@ async def startup_db_client():
     except Exception as e:
         print(f"Failed to connect to MongoDB on startup: {e}")
 
+@app.on_event("startup")
+async def ensure_db_indexes():
+    # Each feature builds its own indexes, so one failing builder does not skip the rest
+    for ensure in (ensure_syndicate_indexes, ensure_referral_indexes, ensure_ticket_indexes, ensure_draw_indexes, ensure_gamification_indexes):
+        try:
+            ensure()
+        except Exception as e:
+            print(f"Failed to ensure MongoDB indexes ({ensure.__name__}) on startup: {e}")
+
+@app.on_event("startup")
+async def run_data_migrations():
+    # One-off backfills for data written before a feature existed; each runs once per database
+    for migrate in (migrate_syndicate_memberships, migrate_referrer_stats, migrate_ticket_purchase_ids, migrate_syndicate_tickets):
+        try:
+            migrate()
+        except Exception as e:
+            print(f"Failed to run data migration {migrate.__name__} on startup: {e}")
+
+@app.on_event("startup")
+async def resume_background_jobs():
+    try:
+        resumed = resume_backfill_jobs() # Achievement backfills interrupted by the last shutdown
+        if resumed:
+            print(f"Resumed {resumed} achievement backfill job(s).")
+    except Exception as e:
+        print(f"Failed to resume achievement backfill jobs on startup: {e}")
+    try:
+        resumed = resume_close_jobs(close_draw) # Draw closes whose worker died
+        if resumed:
+            print(f"Resumed {resumed} draw close job(s).")
+    except Exception as e:
+        print(f"Failed to resume draw close jobs on startup: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    shutdown_close_job_workers() # Let queued and running draw closes finish while the DB is still connected
+    shutdown_backfill_workers() # Backfills stop after their current partition and resume on next startup
     close_db_connection()
     print("MongoDB connection closed for FastAPI shutdown.")
+    signature_verifier.shutdown()
 
 
 app.include_router(tickets_router, prefix="/api/tickets", tags=["Tickets"])
@@ -36,3 +85,5 @@ app.include_router(users_router, prefix="/api/users", tags=["Users"]) # Add the
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"]) # Add the auth router
 app.include_router(syndicates_router, prefix="/api/syndicates", tags=["Syndicates"]) # Add the syndicates router
 app.include_router(gamification_router, prefix="/api/gamification", tags=["Gamification"]) # Add the gamification router
+app.include_router(metrics_router, prefix="/api/_metrics", tags=["Metrics"])
+app.include_router(exports_router, prefix="/api/exports", tags=["Exports"])
@@ -0,0 +1,134 @@
+import heapq
+from abc import ABC, abstractmethod
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from database import get_db
+from .models import auth_config
+
+logger = logging.getLogger(__name__)
+
+
+class ChallengeStore(ABC):
+    """
+    Interface for short-lived login challenges.
+    A challenge is stored once and consumed at most once; consuming removes it
+    so a signed challenge can never be replayed.
+    """
+
+    @abstractmethod
+    def put(self, challenge: str, wallet_address: str, expires_at: datetime) -> None:
+        ...
+
+    @abstractmethod
+    def pop(self, challenge: str) -> Optional[Dict]:
+        """
+        Atomically removes and returns {"wallet_address": str, "expires_at": datetime},
+        or None if the challenge is unknown or was already consumed.
+        Callers must still check expires_at, backends only purge lazily.
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class InMemoryChallengeStore(ChallengeStore):
+    """
+    Single-process store. Expired entries are swept from a min-heap ordered by
+    expiry, so each put/pop costs O(log n) amortized instead of a full scan.
+    Only suitable when running a single uvicorn worker.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Dict] = {}
+        self._expiry_heap: List[Tuple[datetime, str]] = []
+        self._lock = threading.Lock()
+
+    def _sweep_expired(self, now: datetime) -> None:
+        # Heap entries for challenges that were already consumed are simply dropped here.
+        while self._expiry_heap and self._expiry_heap[0][0] < now:
+            expires_at, challenge = heapq.heappop(self._expiry_heap)
+            entry = self._entries.get(challenge)
+            if entry is not None and entry["expires_at"] == expires_at:
+                del self._entries[challenge]
+                logger.debug(f"Expired challenge {challenge} removed from store.")
+
+    def put(self, challenge: str, wallet_address: str, expires_at: datetime) -> None:
+        with self._lock:
+            self._sweep_expired(datetime.now(timezone.utc))
+            self._entries[challenge] = {"wallet_address": wallet_address, "expires_at": expires_at}
+            heapq.heappush(self._expiry_heap, (expires_at, challenge))
+
+    def pop(self, challenge: str) -> Optional[Dict]:
+        with self._lock:
+            self._sweep_expired(datetime.now(timezone.utc))
+            return self._entries.pop(challenge, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MongoChallengeStore(ChallengeStore):
+    """
+    Store shared by all workers. A TTL index lets MongoDB purge expired challenges
+    in the background and find_one_and_delete consumes a challenge in one atomic
+    round trip, so a challenge issued by one worker can be redeemed on any other.
+    """
+
+    def __init__(self):
+        self.ensure_indexes()
+
+    def _collection(self) -> Collection:
+        return get_db().auth_challenges
+
+    def ensure_indexes(self) -> None:
+        try:
+            # expireAfterSeconds=0: each document expires at its own expires_at value.
+            self._collection().create_index("expires_at", expireAfterSeconds=0)
+        except PyMongoError as e:
+            logger.error(f"Failed to create TTL index for auth challenges: {e}")
+
+    def put(self, challenge: str, wallet_address: str, expires_at: datetime) -> None:
+        self._collection().insert_one({
+            "_id": challenge,
+            "wallet_address": wallet_address,
+            "expires_at": expires_at
+        })
+
+    def pop(self, challenge: str) -> Optional[Dict]:
+        doc = self._collection().find_one_and_delete({"_id": challenge})
+        if not doc:
+            return None
+        expires_at = doc["expires_at"]
+        if expires_at.tzinfo is None: # pymongo returns naive UTC datetimes by default
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return {"wallet_address": doc["wallet_address"], "expires_at": expires_at}
+
+    def __len__(self) -> int:
+        return self._collection().estimated_document_count()
+
+
+_challenge_store: Optional[ChallengeStore] = None
+_challenge_store_lock = threading.Lock()
+
+def get_challenge_store() -> ChallengeStore:
+    """Returns the configured challenge store, creating it on first use."""
+    global _challenge_store
+    if _challenge_store is None:
+        with _challenge_store_lock:
+            if _challenge_store is None:
+                backend = auth_config.CHALLENGE_STORE_BACKEND
+                if backend == "mongo":
+                    _challenge_store = MongoChallengeStore()
+                elif backend == "memory":
+                    _challenge_store = InMemoryChallengeStore()
+                else:
+                    raise ValueError(f"Unsupported CHALLENGE_STORE_BACKEND: {backend}")
+                logger.info(f"Using {type(_challenge_store).__name__} for login challenges.")
+    return _challenge_store
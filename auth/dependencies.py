@@ -3,7 +3,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import logging
 
 from . import utils as auth_utils
-from .models import TokenData # Assuming TokenData is what get_current_active_user returns
+from .models import TokenData, auth_config # Assuming TokenData is what get_current_active_user returns
 from jose import JWTError # Make sure JWTError is imported from jose
 
 logger = logging.getLogger(__name__)
@@ -42,3 +42,13 @@ async def get_current_user_from_token(
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+async def get_current_admin_user(token_data: TokenData = Depends(get_current_user_from_token)) -> TokenData:
+    """
+    FastAPI dependency for admin and operations endpoints: a valid token whose wallet is listed
+    in ADMIN_WALLET_ADDRESSES, otherwise 403.
+    """
+    if token_data.wallet_address not in auth_config.ADMIN_WALLET_ADDRESSES:
+        logger.info(f"Wallet {token_data.wallet_address} denied access to an admin endpoint.")
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return token_data
@@ -1,3 +1,5 @@
+import os
+from typing import List
 from pydantic import BaseModel, Field
 
 class ChallengeRequest(BaseModel):
@@ -18,6 +20,17 @@ class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
 
+class VerificationMetrics(BaseModel):
+    """Queue-depth and throughput counters of the login signature verification pool."""
+    executor: str
+    max_workers: int
+    max_pending: int
+    pending: int = Field(..., description="Verifications submitted but not finished (queue depth)")
+    pending_high_water: int
+    completed: int
+    rejected: int = Field(..., description="Logins refused with 503 because the queue was full")
+    avg_latency_ms: float = Field(..., description="Mean time per verification, queueing included; batched logins count one by one")
+
 class TokenData(BaseModel):
     """Data a JWT token will carry."""
     wallet_address: str | None = None
@@ -28,6 +41,14 @@ class AuthConfig(BaseModel):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     CHALLENGE_EXPIRE_MINUTES: int = 5
+    # "memory" keeps challenges in-process (single worker only); "mongo" shares them across workers.
+    CHALLENGE_STORE_BACKEND: str = os.environ.get('CHALLENGE_STORE_BACKEND', 'memory')
+    # Login signature verification runs off the event loop ("process" scales with cores, "thread" does not).
+    SIGNATURE_VERIFY_EXECUTOR: str = os.environ.get('SIGNATURE_VERIFY_EXECUTOR', 'process')
+    SIGNATURE_VERIFY_WORKERS: int = int(os.environ.get('SIGNATURE_VERIFY_WORKERS', os.cpu_count() or 1))
+    SIGNATURE_VERIFY_MAX_PENDING: int = int(os.environ.get('SIGNATURE_VERIFY_MAX_PENDING', 1024))
+    # Comma-separated wallets allowed to call admin and operations endpoints (none by default).
+    ADMIN_WALLET_ADDRESSES: List[str] = [w.strip() for w in os.environ.get('ADMIN_WALLET_ADDRESSES', '').split(',') if w.strip()]
 
 # Instantiate config - in a real app, load from environment variables
 auth_config = AuthConfig()
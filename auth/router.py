@@ -3,12 +3,15 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials # This lin
 import logging
 
 from . import utils as auth_utils
-from .models import ChallengeRequest, ChallengeResponse, TokenRequest, TokenResponse, TokenData, auth_config
+from .models import ChallengeRequest, ChallengeResponse, TokenRequest, TokenResponse, TokenData, VerificationMetrics, auth_config
+from .verification import signature_verifier, VerifierSaturatedError
+from .dependencies import get_current_admin_user
 # TokenData might not be needed here if get_current_user_from_token is the only consumer from this file
 from users.db import get_or_create_user # To ensure user exists upon successful login
+from metrics.instrumentation import TimedRoute
 # from .dependencies import get_current_user_from_token # No longer needed here
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 logger = logging.getLogger(__name__)
 
 # token_bearer_scheme moved to dependencies.py
@@ -64,19 +67,20 @@ async def login_for_access_token(request_data: TokenRequest):
         logger.warning(f"Challenge validation failed for {wallet_address}. Message: '{original_message}'")
         raise HTTPException(status_code=401, detail="Invalid, expired, or mismatched challenge.")
 
-    # 3. Check if the provided public key corresponds to the wallet address
-    #    This is a crucial step to ensure the public key isn't arbitrary.
-    if not auth_utils.check_public_key_matches_address(public_key_hex, wallet_address):
+    # 3 & 4. Check the public key corresponds to the wallet address and verify the signature.
+    #    Both are CPU-bound, so they run in the verification pool instead of on the event loop.
+    try:
+        key_matches_address, is_signature_valid = await signature_verifier.verify(
+            public_key_hex, wallet_address, original_message, signature_hex
+        )
+    except VerifierSaturatedError as e:
+        logger.warning(f"Signature verification pool saturated, rejecting login for {wallet_address}: {e}")
+        raise HTTPException(status_code=503, detail="Too many concurrent logins, please retry shortly.", headers={"Retry-After": "1"})
+
+    if not key_matches_address:
         logger.warning(f"Public key {public_key_hex} does not match address {wallet_address}.")
         raise HTTPException(status_code=401, detail="Public key does not correspond to the provided wallet address.")
 
-    # 4. Verify the signature
-    is_signature_valid = auth_utils.verify_xrpl_signature(
-        public_key_hex=public_key_hex,
-        message=original_message,
-        signature_hex=signature_hex
-    )
-
     if not is_signature_valid:
         logger.warning(f"Signature verification failed for {wallet_address}.")
         raise HTTPException(status_code=401, detail="Signature verification failed.")
@@ -94,6 +98,11 @@ async def login_for_access_token(request_data: TokenRequest):
     logger.info(f"Access token generated for {wallet_address}.")
     return TokenResponse(access_token=access_token)
 
+@router.get("/verification/metrics", response_model=VerificationMetrics, summary="Login signature verification pool metrics")
+async def get_verification_metrics(admin: TokenData = Depends(get_current_admin_user)):
+    """Reports queue depth and throughput of the off-loop signature verification pool. Admins only."""
+    return VerificationMetrics(**signature_verifier.metrics())
+
 # get_current_user_from_token moved to dependencies.py
 
 # Example of a protected route (can be in any other router)
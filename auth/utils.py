@@ -18,12 +18,11 @@ from xrpl.account import does_public_key_match_address
 from xrpl.cryptography import verify, get_public_key_from_address
 
 from .models import auth_config, TokenData
+from .challenge_store import get_challenge_store
 from users.db import get_or_create_user # To ensure user exists
 
-# --- Temporary In-Memory Challenge Store ---
-# IMPORTANT: Replace with Redis or a proper cache in production
-# Stores: {challenge_string: {"wallet_address": str, "expires_at": datetime}}
-challenge_store: Dict[str, Dict] = {}
+# Challenges live in a pluggable store (see challenge_store.py), selected by
+# auth_config.CHALLENGE_STORE_BACKEND. Use "mongo" when running several workers.
 logger = logging.getLogger(__name__)
 
 
@@ -39,11 +38,8 @@ def store_challenge(challenge: str, wallet_address: str) -> datetime:
     """Stores the challenge temporarily and returns its expiry time."""
     expires_delta = timedelta(minutes=auth_config.CHALLENGE_EXPIRE_MINUTES)
     expires_at = datetime.now(timezone.utc) + expires_delta
-    challenge_store[challenge] = {
-        "wallet_address": wallet_address,
-        "expires_at": expires_at
-    }
-    logger.debug(f"Stored challenge for {wallet_address}. Expires at {expires_at.isoformat()}. Current store size: {len(challenge_store)}")
+    get_challenge_store().put(challenge, wallet_address, expires_at)
+    logger.debug(f"Stored challenge for {wallet_address}. Expires at {expires_at.isoformat()}.")
     return expires_at
 
 def get_and_validate_challenge(challenge: str, wallet_address: str) -> bool:
@@ -51,19 +47,8 @@ def get_and_validate_challenge(challenge: str, wallet_address: str) -> bool:
     Retrieves the challenge, checks if it's for the given wallet_address,
     and if it hasn't expired. Invalidates the challenge after retrieval.
     """
-    # Clean up expired challenges first (simple in-memory cleanup)
-    # In Redis, this would be handled by TTL
-    now = datetime.now(timezone.utc)
-    expired_keys = [k for k, v in challenge_store.items() if v["expires_at"] < now]
-    for k in expired_keys:
-        try:
-            del challenge_store[k]
-            logger.debug(f"Expired challenge {k} removed from store.")
-        except KeyError:
-            pass # Possible race condition if removed by another request, ignore.
-
-
-    challenge_data = challenge_store.pop(challenge, None) # Invalidate by removing
+    # Expired challenges are purged by the store itself (heap sweep or Mongo TTL index).
+    challenge_data = get_challenge_store().pop(challenge) # Invalidate by removing
     if not challenge_data:
         logger.warning(f"Challenge not found or already used: {challenge}")
         return False
@@ -73,7 +58,7 @@ def get_and_validate_challenge(challenge: str, wallet_address: str) -> bool:
         # Re-store if popped by mistake for wrong user? No, challenge should be unique.
         return False
 
-    # Expiry check was implicitly done by cleanup, but double check for the popped item
+    # Stores purge lazily, so the popped item may still be past its expiry
     if challenge_data["expires_at"] < datetime.now(timezone.utc):
         logger.warning(f"Challenge expired for {wallet_address} at {challenge_data['expires_at']}")
         return False
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from . import utils as auth_utils
+from .models import auth_config
+
+logger = logging.getLogger(__name__)
+
+# (public_key_hex, wallet_address, message, signature_hex)
+LoginSignature = Tuple[str, str, str, str]
+
+
+class VerifierSaturatedError(Exception):
+    """Raised when the verification queue is full and the caller should retry later."""
+
+
+def verify_login_signature(public_key_hex: str, wallet_address: str, message: str, signature_hex: str) -> Tuple[bool, bool]:
+    """
+    Runs both CPU-bound checks for one login.
+    Returns (public_key_matches_address, signature_valid). The signature is not
+    checked when the key does not belong to the address.
+    """
+    if not auth_utils.check_public_key_matches_address(public_key_hex, wallet_address):
+        return False, False
+    return True, auth_utils.verify_xrpl_signature(public_key_hex=public_key_hex, message=message, signature_hex=signature_hex)
+
+def verify_login_signatures(items: Sequence[LoginSignature]) -> Tuple[List[Tuple[bool, bool]], List[float]]:
+    """
+    Batch form of verify_login_signature; one executor task verifies many logins.
+    Also returns, per item, the seconds from the task's start until that item was done.
+    """
+    results = []
+    finished_after = []
+    started = time.perf_counter()
+    for item in items:
+        results.append(verify_login_signature(*item))
+        finished_after.append(time.perf_counter() - started)
+    return results, finished_after
+
+
+class SignatureVerifier:
+    """
+    Bounded pool that keeps elliptic-curve verification off the event loop.
+    xrpl-py's key pairs are pure Python, so the default process pool is what lets
+    login throughput scale with cores; a thread pool only keeps the loop responsive.
+    """
+
+    def __init__(self, executor_kind: str, max_workers: int, max_pending: int):
+        if executor_kind not in ("process", "thread"):
+            raise ValueError(f"Unsupported SIGNATURE_VERIFY_EXECUTOR: {executor_kind}")
+        self.executor_kind = executor_kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        # Metrics (queue depth = verifications submitted but not finished)
+        self._pending = 0
+        self._pending_high_water = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_kind == "process":
+                        # spawn: forking a process that already holds a MongoClient is unsafe.
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.max_workers,
+                            mp_context=multiprocessing.get_context("spawn")
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sigverify")
+                    logger.info(f"Started {self.executor_kind} signature verification pool with {self.max_workers} workers.")
+        return self._executor
+
+    def _acquire(self, count: int) -> None:
+        with self._lock:
+            if self._pending + count > self.max_pending:
+                self._rejected += count
+                raise VerifierSaturatedError(f"Signature verification queue is full ({self._pending} pending).")
+            self._pending += count
+            self._pending_high_water = max(self._pending_high_water, self._pending)
+
+    def _release(self, count: int, latencies: Sequence[float] = ()) -> None:
+        # latencies are per verification, from submission until it finished, queueing included
+        with self._lock:
+            self._pending -= count
+            self._completed += len(latencies)
+            self._total_seconds += sum(latencies)
+
+    async def verify(self, public_key_hex: str, wallet_address: str, message: str, signature_hex: str) -> Tuple[bool, bool]:
+        """Verifies a single login without blocking the event loop."""
+        self._acquire(1)
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), verify_login_signature,
+                public_key_hex, wallet_address, message, signature_hex
+            )
+        finally:
+            self._release(1, [time.perf_counter() - started])
+
+    async def verify_batch(self, items: Sequence[LoginSignature]) -> List[Tuple[bool, bool]]:
+        """
+        Verifies many logins, split into one chunk per worker so the batch pays
+        a single executor round trip per worker instead of one per signature.
+        Each item is counted in the metrics with its own latency, as verify counts one login.
+        """
+        if not items:
+            return []
+        self._acquire(len(items))
+        latencies: List[float] = []
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            chunk_size = -(-len(items) // self.max_workers) # ceil division
+            chunks = [list(items[i:i + chunk_size]) for i in range(0, len(items), chunk_size)]
+            started = time.perf_counter()
+
+            async def run_chunk(chunk: List[LoginSignature]) -> List[Tuple[bool, bool]]:
+                results, finished_after = await loop.run_in_executor(executor, verify_login_signatures, chunk)
+                # The worker's clock is not ours (process pool), so the chunk's queueing is what its
+                # round trip took beyond the work; each item adds the work done up to its own result.
+                queued = max(time.perf_counter() - started - finished_after[-1], 0.0)
+                latencies.extend(queued + done for done in finished_after)
+                return results
+
+            results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+            return [result for chunk_results in results for result in chunk_results]
+        finally:
+            self._release(len(items), latencies)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.executor_kind,
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "pending_high_water": self._pending_high_water,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_latency_ms": round(self._total_seconds / self._completed * 1000, 3) if self._completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Global verifier instance (pool is started lazily on first login)
+signature_verifier = SignatureVerifier(
+    executor_kind=auth_config.SIGNATURE_VERIFY_EXECUTOR,
+    max_workers=auth_config.SIGNATURE_VERIFY_WORKERS,
+    max_pending=auth_config.SIGNATURE_VERIFY_MAX_PENDING
+)
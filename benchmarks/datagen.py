@@ -0,0 +1,471 @@
+"""
+Synthetic production-scale dataset for scale testing.
+
+    MONGODB_URI=mongodb://localhost:27017/ python -m benchmarks.datagen --drop --tickets 5000000 --draws 5000
+    MONGODB_DB_NAME=lottery_db_scale uvicorn app:app   # serve the generated data
+
+Loads categories, users, thousands of draws (completed with winners, plus one open draw per
+category), millions of tickets with Pick-N selections skewed toward popular numbers,
+syndicates with hundreds of members and referral chains. Tickets are generated and written
+per draw by a pool of worker processes, each doing unordered insert_many batches on its own
+connection. Every draw's data comes from an RNG derived from (--seed, draw index), so the
+output is identical for a given --seed and --as-of no matter how the work is scheduled.
+
+Derived data (syndicate memberships, referrer counters) is written with the same rebuild
+functions the app uses for repairs, and indexes are created after the load.
+"""
+import argparse
+import math
+import os
+import random
+import struct
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+import database
+from lottery_categories.db import create_category
+from lottery_categories.models import LotteryCategoryCreate, PrizeTierConfig
+from referrals import db as referrals_db
+from rng.utils import generate_winning_picks
+from syndicates import db as syndicate_db
+from syndicates.models import SyndicateMemberStatus
+from tickets import db as tickets_db
+from tickets.selections import encode_pick_values, match_counter
+
+from .seed import insert_chunked
+
+DEFAULT_DB_NAME = "lottery_db_scale"
+# Winners embedded per draw are capped so a popular low tier can't push a draw past the 16MB document limit.
+MAX_WINNERS_PER_DRAW = 1000
+REFERRAL_STATUSES = [("pending_first_purchase", 0.35), ("eligible_for_reward", 0.45), ("reward_credited", 0.15), ("reward_failed", 0.05)]
+SYNDICATE_STATUSES = [(SyndicateMemberStatus.ACTIVE, 0.8), (SyndicateMemberStatus.INVITED, 0.1), (SyndicateMemberStatus.LEFT, 0.07), (SyndicateMemberStatus.REMOVED, 0.03)]
+LUCKY_NUMBERS = {3, 7, 11}
+
+# (name, game_type, game_config, interval, [(tier_name, matches_required, % of pool)])
+CATEGORY_SPECS: List[Tuple[str, str, Dict[str, Any], str, List[Tuple[str, int, float]]]] = [
+    ("Scale Raffle Daily", "raffle", {}, "daily", [("First", 1, 50.0), ("Second", 2, 20.0), ("Third", 3, 10.0)]),
+    ("Scale Raffle Weekly", "raffle", {}, "weekly", [("Grand", 1, 70.0), ("Runner Up", 2, 10.0)]),
+    ("Scale Pick 3", "pick_n_digits", {"num_picks": 3, "min_digit": 0, "max_digit": 9, "allow_duplicates": True}, "daily", [("Match 3", 3, 60.0)]),
+    ("Scale Pick 4", "pick_n_digits", {"num_picks": 4, "min_digit": 0, "max_digit": 9, "allow_duplicates": False}, "daily", [("Match 4", 4, 50.0), ("Match 3", 3, 20.0)]),
+    ("Scale Pick 6 of 49", "pick_n_digits", {"num_picks": 6, "min_digit": 1, "max_digit": 49, "allow_duplicates": False}, "weekly", [("Jackpot", 6, 50.0), ("Match 5", 5, 20.0), ("Match 4", 4, 10.0)]),
+]
+INTERVALS = {"daily": timedelta(days=1), "weekly": timedelta(weeks=1)}
+
+
+def wallet_address(index: int) -> str:
+    return f"rScale{index:09d}"
+
+def _rng(seed: int, *labels: Any) -> random.Random:
+    """ Independent, reproducible stream for one part of the dataset. """
+    return random.Random(":".join(str(part) for part in (seed, *labels)))
+
+def _object_id(rng: random.Random, at: datetime) -> ObjectId:
+    """ Deterministic ObjectId whose timestamp part is `at`. """
+    return ObjectId(struct.pack(">I", int(at.timestamp())) + rng.getrandbits(64).to_bytes(8, "big"))
+
+def _weighted_choice(rng: random.Random, options: List[Tuple[Any, float]]) -> Any:
+    return rng.choices([value for value, _ in options], weights=[weight for _, weight in options])[0]
+
+def pick_weights(game_config: Dict[str, Any], skew: float) -> List[float]:
+    """
+    Relative popularity of each number in [min_digit, max_digit]: players favour birthday
+    numbers (1-31) and a few lucky numbers. skew=0 is uniform.
+    """
+    weights = []
+    for value in range(game_config["min_digit"], game_config["max_digit"] + 1):
+        weight = 1.0
+        if game_config["max_digit"] > 31 and 1 <= value <= 31:
+            weight *= 1.6
+        if value in LUCKY_NUMBERS:
+            weight *= 1.5
+        weights.append(weight ** skew)
+    return weights
+
+def skewed_picks(rng: random.Random, game_config: Dict[str, Any], log_weights: List[float]) -> List[int]:
+    """ One ticket's selection. Without duplicates this is weighted sampling without replacement (Gumbel top-k). """
+    low, num_picks = game_config["min_digit"], game_config["num_picks"]
+    if game_config.get("allow_duplicates"):
+        return [low + i for i in rng.choices(range(len(log_weights)), cum_weights=_cumulative(log_weights), k=num_picks)]
+    keys = [(lw - math.log(-math.log(rng.random() or 1e-300)), i) for i, lw in enumerate(log_weights)]
+    return [low + i for _, i in sorted(keys, reverse=True)[:num_picks]]
+
+_cum_cache: Dict[Tuple[float, ...], List[float]] = {}
+
+def _cumulative(log_weights: List[float]) -> List[float]:
+    key = tuple(log_weights)
+    if key not in _cum_cache:
+        total, cumulative = 0.0, []
+        for lw in log_weights:
+            total += math.exp(lw)
+            cumulative.append(total)
+        _cum_cache[key] = cumulative
+    return _cum_cache[key]
+
+def _wallet_index(rng: random.Random, wallet_count: int, activity_skew: float) -> int:
+    """ A few wallets buy most tickets: index density grows toward 0 as activity_skew rises. """
+    return min(wallet_count - 1, int(wallet_count * rng.random() ** activity_skew))
+
+
+# --- Worker side ---
+
+_worker_db = None
+
+def _init_worker(mongo_uri: str, db_name: str) -> None:
+    global _worker_db
+    _worker_db = MongoClient(mongo_uri)[db_name]
+    database.db = _worker_db # For the feature db functions used by workers (tickets_db.index_ticket_picks)
+
+def _target_db():
+    return _worker_db if _worker_db is not None else database.get_db()
+
+def _write_batch(db, task: Dict[str, Any], batch: List[Dict[str, Any]], index_picks: bool) -> None:
+    db.tickets.insert_many(batch, ordered=False)
+    if index_picks: # The open Pick-N draw gets the postings buy_tickets maintains, so closing it takes the indexed path
+        tickets_db.index_ticket_picks(task["draw_id"], [(t["ticket_seq"], t["selection_data"]["picks"]) for t in batch])
+
+def load_draw_tickets(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generates and inserts one draw's tickets, then (for completed draws) writes the draw's
+    participants, winning selection and winners. Runs in a worker process or thread.
+    """
+    db = _target_db()
+    rng = _rng(task["seed"], "draw", task["draw_index"])
+    game_config = task["game_config"]
+    pick_n = task["game_type"] == "pick_n_digits"
+    log_weights = [math.log(w) for w in pick_weights(game_config, task["pick_skew"])] if pick_n else []
+    num_tickets = task["num_tickets"]
+    opened_at, closed_at = task["opened_at"], task["closed_at"]
+    span_seconds = max(1.0, (min(closed_at, task["now"]) - opened_at).total_seconds())
+    completed = task["status"] == "completed"
+
+    winning_picks: Optional[List[int]] = None
+    if completed and pick_n:
+        winning_picks = generate_winning_picks(task["ledger_hash"], game_config)
+    count_matches = match_counter(winning_picks or [])
+    # Pick-N awards a ticket its best tier; raffle tiers are awarded in configured order.
+    tiers = sorted(task["tiers"], key=lambda t: t[1], reverse=True) if pick_n else task["tiers"]
+    raffle_positions = set(rng.sample(range(num_tickets), min(len(tiers), num_tickets))) if completed and not pick_n else set()
+    raffle_winners: List[Dict[str, Any]] = []
+    winners_by_tier: Dict[str, List[Dict[str, Any]]] = {name: [] for name, _, _ in tiers}
+    participants = set()
+
+    batch: List[Dict[str, Any]] = []
+    for position in range(num_tickets):
+        bought_at = opened_at + timedelta(seconds=rng.random() * span_seconds)
+        wallet = wallet_address(_wallet_index(rng, task["wallet_count"], task["activity_skew"]))
+        ticket = {
+            "_id": _object_id(rng, bought_at),
+            "wallet_address": wallet,
+            "draw_id": task["draw_id"],
+            "timestamp": bought_at,
+            "selection_data": None,
+        }
+        if pick_n:
+            picks = skewed_picks(rng, game_config, log_weights)
+            ticket["selection_data"] = {"picks": picks, **encode_pick_values(picks)}
+            ticket["ticket_seq"] = position
+            if completed:
+                matches = count_matches(ticket["selection_data"])
+                for tier_name, matches_required, _ in tiers:
+                    if matches >= matches_required:
+                        if len(winners_by_tier[tier_name]) < MAX_WINNERS_PER_DRAW:
+                            winners_by_tier[tier_name].append({"wallet_address": wallet, "ticket_id": str(ticket["_id"])})
+                        break
+        elif position in raffle_positions:
+            raffle_winners.append({"wallet_address": wallet, "ticket_id": str(ticket["_id"])})
+        participants.add(wallet)
+        batch.append(ticket)
+        if len(batch) >= task["batch_size"]:
+            _write_batch(db, task, batch, index_picks=pick_n and not completed)
+            batch = []
+    if batch:
+        _write_batch(db, task, batch, index_picks=pick_n and not completed)
+    if pick_n and not completed:
+        db.draws.update_one({"_id": ObjectId(task["draw_id"])}, {"$set": {"ticket_seq_next": num_tickets}})
+
+    if completed:
+        if not pick_n:
+            rng.shuffle(raffle_winners)
+            for (tier_name, _, _), winner in zip(tiers, raffle_winners):
+                winners_by_tier[tier_name].append(winner)
+        winners_payload = []
+        for tier_name, _, percentage in tiers:
+            tier_winners = winners_by_tier[tier_name]
+            if not tier_winners:
+                continue
+            prize = percentage / 100.0 * task["base_prize_pool"] / len(tier_winners)
+            fee = prize * task["winner_fee_percentage"] / 100.0
+            winners_payload.extend({
+                "tier_name": tier_name,
+                **winner,
+                "prize_amount_calculated": round(prize, 2),
+                "is_fixed_prize": False,
+                "fee_amount_charged": round(fee, 2),
+                "net_prize_payable": round(prize - fee, 2),
+            } for winner in tier_winners)
+        db.draws.update_one({"_id": ObjectId(task["draw_id"])}, {"$set": {
+            "participants": sorted(participants),
+            "winners_by_tier": winners_payload,
+            "winning_selection": {"picks": winning_picks} if pick_n else None,
+            "updated_at": closed_at,
+        }})
+    return {"tickets": num_tickets, "winners": sum(len(w) for w in winners_by_tier.values())}
+
+
+# --- Main process ---
+
+def connect(args) -> None:
+    database.close_db_connection()
+    if args.backend == "mongomock":
+        from mongomock import MongoClient as MockMongoClient
+        database.client = MockMongoClient()
+    else:
+        database.client = MongoClient(database.MONGO_URI, serverSelectionTimeoutMS=5000)
+        if args.drop:
+            database.client.drop_database(args.db_name)
+    database.db = database.client[args.db_name]
+    database._transactions_supported = None
+
+def create_categories(args) -> List[Dict[str, Any]]:
+    categories = []
+    for name, game_type, game_config, interval, tiers in CATEGORY_SPECS[:args.categories]:
+        category_id = create_category(LotteryCategoryCreate(
+            name=name,
+            game_type=game_type,
+            game_config=game_config,
+            draw_interval_type=interval,
+            draw_interval_value=1,
+            ticket_price=1.0 if game_type == "raffle" else 2.0,
+            base_prize_pool=10_000.0,
+            winner_fee_percentage=5.0,
+            prize_tiers=[
+                PrizeTierConfig(tier_name=tier_name, matches_required=matches, percentage_of_prize_pool=pct, is_jackpot_tier=(i == 0))
+                for i, (tier_name, matches, pct) in enumerate(tiers)
+            ],
+        ))
+        if not category_id:
+            raise RuntimeError(f"Failed to create category '{name}'.")
+        categories.append({"id": category_id, "name": name, "game_type": game_type, "game_config": game_config,
+                           "interval": INTERVALS[interval], "tiers": tiers})
+    return categories
+
+def create_users(args, now: datetime) -> None:
+    insert_chunked(database.db.users, ({
+        "wallet_address": wallet_address(i),
+        "nickname": f"player{i}" if i % 3 == 0 else None,
+        "created_at": now - timedelta(days=365),
+        "updated_at": now - timedelta(days=365),
+    } for i in range(args.wallets)))
+
+def plan_draws(args, categories: List[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+    """ Inserts the draw documents and returns one ticket-loading task per draw. """
+    rng = _rng(args.seed, "draws")
+    per_category = max(1, args.draws // len(categories))
+    draws, tasks = [], []
+    for category in categories:
+        interval = category["interval"]
+        for k in range(per_category):
+            # k == 0 is the currently open draw; the rest closed one interval apart going back in time.
+            closed_at = now + interval - k * interval
+            opened_at = closed_at - interval
+            status = "open" if k == 0 else "completed"
+            draw = {
+                "_id": _object_id(rng, opened_at),
+                "category_id": category["id"],
+                "status": status,
+                "scheduled_open_time": opened_at,
+                "scheduled_close_time": closed_at,
+                "actual_open_time": opened_at,
+                "actual_close_time": closed_at if status == "completed" else None,
+                "participants": [],
+                "ledger_hash": f"{rng.getrandbits(256):064X}" if status == "completed" else None,
+                "winning_selection": None,
+                "winners_by_tier": [],
+                "base_prize_pool": 10_000.0,
+                "created_at": opened_at,
+                "updated_at": opened_at,
+            }
+            draws.append(draw)
+            tasks.append({
+                "draw_index": len(tasks), "draw_id": str(draw["_id"]), "status": status,
+                "game_type": category["game_type"], "game_config": category["game_config"], "tiers": category["tiers"],
+                "opened_at": opened_at, "closed_at": closed_at, "now": now, "ledger_hash": draw["ledger_hash"],
+                "base_prize_pool": draw["base_prize_pool"], "winner_fee_percentage": 5.0,
+            })
+    insert_chunked(database.db.draws, iter(draws))
+
+    # Ticket volume per draw is heavy-tailed (rollover jackpots draw crowds).
+    weights = [rng.paretovariate(1.5) for _ in tasks]
+    total_weight = sum(weights)
+    remaining = args.tickets
+    for task, weight in zip(tasks, weights):
+        task["num_tickets"] = min(remaining, int(args.tickets * weight / total_weight))
+        remaining -= task["num_tickets"]
+    tasks[0]["num_tickets"] += remaining
+    for task in tasks:
+        task.update(seed=args.seed, wallet_count=args.wallets, activity_skew=args.activity_skew,
+                    pick_skew=args.pick_skew, batch_size=args.batch_size)
+    return tasks
+
+def load_tickets(args, tasks: List[Dict[str, Any]]) -> int:
+    executor: Executor
+    if args.backend == "mongomock":
+        executor = ThreadPoolExecutor(max_workers=args.workers) # In-memory client can only be shared by threads
+    else:
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(database.MONGO_URI, args.db_name))
+    loaded, started = 0, time.perf_counter()
+    # Biggest draws first so one huge draw doesn't run alone at the end.
+    ordered = sorted(tasks, key=lambda t: t["num_tickets"], reverse=True)
+    with executor:
+        for i, result in enumerate(executor.map(load_draw_tickets, ordered), 1):
+            loaded += result["tickets"]
+            if not args.quiet and (i % 100 == 0 or i == len(ordered)):
+                rate = loaded / max(1e-9, time.perf_counter() - started)
+                print(f"  draws {i}/{len(ordered)}  tickets {loaded:,}  ({rate:,.0f}/s)")
+    return loaded
+
+def create_syndicates(args, categories: List[Dict[str, Any]], now: datetime) -> None:
+    rng = _rng(args.seed, "syndicates")
+    syndicates = []
+    for i in range(args.syndicates):
+        member_count = min(args.wallets, rng.randint(args.min_syndicate_members, args.max_syndicate_members))
+        member_indexes = rng.sample(range(args.wallets), member_count)
+        members = [{
+            "wallet_address": wallet_address(index),
+            "nickname": None,
+            "join_date": now - timedelta(days=rng.randint(1, 300)),
+            "status": (SyndicateMemberStatus.ACTIVE if position == 0 else _weighted_choice(rng, SYNDICATE_STATUSES)).value,
+        } for position, index in enumerate(member_indexes)]
+        syndicates.append({
+            "_id": _object_id(rng, now),
+            "name": f"Scale Syndicate {i:05d}",
+            "description": None,
+            "creator_wallet_address": members[0]["wallet_address"],
+            "members": members,
+            "active_member_count": 0, # Set by rebuild_syndicate_memberships()
+            "default_lottery_category_id": rng.choice(categories)["id"],
+            "created_at": now - timedelta(days=300),
+            "updated_at": now,
+        })
+    insert_chunked(database.db.syndicates, iter(syndicates))
+    syndicate_db.rebuild_syndicate_memberships()
+
+def create_referrals(args, now: datetime) -> None:
+    """
+    Referral chains: wallets join in index order and a referred wallet's referrer is an earlier
+    wallet that owns a code, often one that was itself referred, so chains several levels deep form.
+    """
+    rng = _rng(args.seed, "referrals")
+    code_owners: List[int] = []
+    links, usage = [], Counter()
+    for index in range(args.wallets):
+        if code_owners and rng.random() < args.referral_share:
+            # Recent joiners refer most: bias toward the end of the owner list.
+            referrer = code_owners[min(len(code_owners) - 1, int(len(code_owners) * rng.random() ** 0.3))]
+            code = _referral_code(referrer)
+            usage[code] += 1
+            links.append({
+                "referrer_wallet_address": wallet_address(referrer),
+                "referee_wallet_address": wallet_address(index),
+                "referral_code_used": code,
+                "reward_status": _weighted_choice(rng, REFERRAL_STATUSES),
+                "created_at": now,
+                "updated_at": now,
+            })
+        if rng.random() < args.referral_share:
+            code_owners.append(index)
+    insert_chunked(database.db.referral_codes, ({
+        "code": _referral_code(index),
+        "wallet_address": wallet_address(index),
+        "usage_count": usage[_referral_code(index)],
+        "is_active": True,
+        "created_at": now,
+        "updated_at": now,
+    } for index in code_owners))
+    insert_chunked(database.db.referral_links, iter(links))
+    referrals_db.rebuild_referrer_stats()
+
+def _referral_code(index: int) -> str:
+    return f"SC{index:08X}"
+
+def create_indexes() -> None:
+    syndicate_db.ensure_syndicate_indexes()
+    referrals_db.ensure_referral_indexes()
+    tickets_db.ensure_ticket_indexes()
+    database.db.tickets.create_index([("draw_id", 1), ("wallet_address", 1)])
+    database.db.tickets.create_index([("wallet_address", 1)])
+    database.db.draws.create_index([("category_id", 1), ("status", 1), ("scheduled_close_time", -1)])
+    database.db.draws.create_index([("scheduled_close_time", -1)])
+    database.db.users.create_index("wallet_address", unique=True)
+
+def generate(args) -> Dict[str, Any]:
+    connect(args)
+    now = args.as_of
+    timings: Dict[str, float] = {}
+
+    def step(name, fn, *fn_args):
+        started = time.perf_counter()
+        result = fn(*fn_args)
+        timings[name] = round(time.perf_counter() - started, 2)
+        if not args.quiet:
+            print(f"{name}: {timings[name]}s")
+        return result
+
+    categories = step("categories", create_categories, args)
+    step("users", create_users, args, now)
+    tasks = step("draws", plan_draws, args, categories, now)
+    tickets = step("tickets", load_tickets, args, tasks)
+    step("syndicates", create_syndicates, args, categories, now)
+    step("referrals", create_referrals, args, now)
+    step("indexes", create_indexes)
+
+    counts = {name: database.db[name].estimated_document_count() for name in (
+        "lottery_categories", "users", "draws", "tickets", "syndicates", "syndicate_memberships",
+        "referral_codes", "referral_links", "referrer_stats")}
+    if not args.quiet:
+        print("Loaded " + ", ".join(f"{name}={count:,}" for name, count in counts.items()))
+        print(f"Tickets/s: {tickets / max(1e-9, timings['tickets']):,.0f}")
+    return {"counts": counts, "timings_s": timings}
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Bulk-load a reproducible production-scale dataset.")
+    parser.add_argument("--backend", choices=["mongo", "mongomock"], default="mongo",
+                        help="'mongo' uses MONGODB_URI; 'mongomock' is in-memory (small sizes, smoke tests).")
+    parser.add_argument("--db-name", default=DEFAULT_DB_NAME, help="Target database. Serve it with MONGODB_DB_NAME=<name>.")
+    parser.add_argument("--drop", action="store_true", help="Drop the target database first.")
+    parser.add_argument("--tickets", type=int, default=1_000_000)
+    parser.add_argument("--draws", type=int, default=2_000, help="Spread evenly over the categories; one per category stays open.")
+    parser.add_argument("--categories", type=int, default=len(CATEGORY_SPECS), choices=range(1, len(CATEGORY_SPECS) + 1))
+    parser.add_argument("--wallets", type=int, default=100_000)
+    parser.add_argument("--syndicates", type=int, default=200)
+    parser.add_argument("--min-syndicate-members", type=int, default=20)
+    parser.add_argument("--max-syndicate-members", type=int, default=400)
+    parser.add_argument("--referral-share", type=float, default=0.3, help="Share of wallets that own a code, and of wallets that were referred.")
+    parser.add_argument("--pick-skew", type=float, default=1.0, help="0 = uniform Pick-N numbers; higher favours popular numbers more.")
+    parser.add_argument("--activity-skew", type=float, default=2.0, help="1 = every wallet equally active; higher concentrates tickets on few wallets.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Documents per insert_many.")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--as-of", type=datetime.fromisoformat,
+                        help="Time the dataset is anchored at (ISO, UTC). Default: today 00:00 UTC. Same seed + as-of = same data.")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+    if args.as_of is None:
+        args.as_of = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if args.min_syndicate_members < 1 or args.max_syndicate_members < args.min_syndicate_members:
+        parser.error("Need 1 <= --min-syndicate-members <= --max-syndicate-members")
+    if args.draws < args.categories:
+        parser.error("--draws must be at least --categories")
+    return args
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    return generate(parse_args(argv))
+
+if __name__ == "__main__":
+    main()
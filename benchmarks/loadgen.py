@@ -0,0 +1,253 @@
+"""
+Load generator: concurrent virtual wallets logging in and buying tickets.
+
+    # In-process (ASGI, mongomock unless --backend mongo)
+    python -m benchmarks.loadgen --concurrency 10,50,100 --duration 20
+    # Against a running server
+    uvicorn app:app --workers 4 &
+    python -m benchmarks.loadgen --base-url http://127.0.0.1:8000 --concurrency 50,100,200,400
+
+Each virtual wallet has a locally generated XRPL key pair (as gen_testnet_wallets.py does,
+but without the faucet). A session is /api/auth/challenge + /api/auth/token followed by
+--actions-per-session requests drawn from the buy/history mix, then the wallet logs in again.
+Every concurrency level runs for --duration seconds and reports throughput and latency
+percentiles per endpoint; the level where throughput stops growing while p99 climbs is the
+saturation point.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import httpx
+from xrpl.core import keypairs
+
+from .run import BENCH_DB_NAME, percentile, use_fresh_database
+
+ENDPOINTS = ("auth_challenge", "auth_token", "tickets_buy", "draws_history")
+
+class VirtualWallet:
+    def __init__(self, rng: random.Random):
+        seed = keypairs.generate_seed(entropy=f"{rng.getrandbits(128):032x}")
+        self.public_key, self.private_key = keypairs.derive_keypair(seed)
+        self.address = keypairs.derive_classic_address(self.public_key)
+        self.access_token: Optional[str] = None
+
+    def sign(self, message: str) -> str:
+        return keypairs.sign(message.encode("utf-8"), self.private_key)
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+
+    def record(self, status: int, seconds: float) -> None:
+        self.statuses[status] += 1
+        self.latencies.append(seconds)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        errors = sum(n for status, n in self.statuses.items() if status >= 400 or status == 0)
+        return {
+            "requests": len(ordered),
+            "errors": errors,
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items())},
+            "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p90_ms": round(percentile(ordered, 90) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        }
+
+async def _timed(stats: Dict[str, EndpointStats], name: str, request) -> Optional[httpx.Response]:
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        stats[name].record(0, time.perf_counter() - started) # 0 = transport error / timeout
+        return None
+    stats[name].record(response.status_code, time.perf_counter() - started)
+    return response
+
+async def login(client: httpx.AsyncClient, wallet: VirtualWallet, stats: Dict[str, EndpointStats]) -> bool:
+    response = await _timed(stats, "auth_challenge", client.post("/api/auth/challenge", json={"wallet_address": wallet.address}))
+    if response is None or response.status_code != 200:
+        return False
+    message = response.json()["message_to_sign"]
+    response = await _timed(stats, "auth_token", client.post("/api/auth/token", json={
+        "wallet_address": wallet.address,
+        "public_key_hex": wallet.public_key,
+        "signature": wallet.sign(message),
+        "challenge_message": message,
+    }))
+    if response is None or response.status_code != 200:
+        return False
+    wallet.access_token = response.json()["access_token"]
+    return True
+
+def _buy_payload(wallet: VirtualWallet, category: Dict[str, Any], rng: random.Random, args) -> Dict[str, Any]:
+    payload = {
+        "wallet_address": wallet.address,
+        "category_id": category["id"],
+        "num_tickets": rng.randint(1, args.max_tickets_per_buy),
+    }
+    if category["game_type"] == "pick_n_digits":
+        config = category["game_config"]
+        digits = range(config["min_digit"], config["max_digit"] + 1)
+        if config.get("allow_duplicates"):
+            payload["selection"] = [rng.choice(digits) for _ in range(config["num_picks"])]
+        else:
+            payload["selection"] = rng.sample(list(digits), config["num_picks"])
+    return payload
+
+async def run_wallet(client, wallet, category, stats, args, rng: random.Random, deadline: float) -> None:
+    while time.perf_counter() < deadline:
+        if not await login(client, wallet, stats):
+            await asyncio.sleep(args.think_ms / 1000)
+            continue
+        headers = {"Authorization": f"Bearer {wallet.access_token}"}
+        for _ in range(args.actions_per_session):
+            if time.perf_counter() >= deadline:
+                return
+            if rng.random() < args.buy_ratio:
+                await _timed(stats, "tickets_buy", client.post("/api/tickets/buy", json=_buy_payload(wallet, category, rng, args), headers=headers))
+            else:
+                await _timed(stats, "draws_history", client.get("/api/draws/history", params={"limit": 20}, headers=headers))
+            if args.think_ms:
+                await asyncio.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+
+async def ensure_category(client: httpx.AsyncClient, args) -> Dict[str, Any]:
+    if args.category_id:
+        response = await client.get(f"/api/lottery_categories/{args.category_id}")
+        response.raise_for_status()
+        data = response.json()
+    else:
+        payload: Dict[str, Any] = {
+            "name": f"Loadgen {args.game}",
+            "draw_interval_type": "daily",
+            "draw_interval_value": 1,
+            "ticket_price": 1.0,
+            "is_active": True,
+            "prize_tiers": [{"tier_name": "Main", "matches_required": 1, "percentage_of_prize_pool": 50.0}],
+        }
+        if args.game == "pick_n":
+            payload["game_type"] = "pick_n_digits"
+            payload["game_config"] = {"num_picks": 4, "min_digit": 0, "max_digit": 9, "allow_duplicates": False}
+            payload["prize_tiers"][0]["matches_required"] = 4
+        else:
+            payload["game_type"] = "raffle"
+            payload["game_config"] = {}
+        response = await client.post("/api/lottery_categories/", json=payload)
+        response.raise_for_status()
+        data = response.json()
+    return {"id": data.get("id") or data["_id"], "game_type": data["game_type"], "game_config": data.get("game_config") or {}}
+
+async def run_stage(client, category, wallets: List[VirtualWallet], args, rng: random.Random) -> Dict[str, Any]:
+    stats = {name: EndpointStats() for name in ENDPOINTS}
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        run_wallet(client, wallet, category, stats, args, random.Random(rng.getrandbits(64)), deadline)
+        for wallet in wallets
+    ))
+    elapsed = time.perf_counter() - started
+    total = EndpointStats()
+    for endpoint_stats in stats.values():
+        total.latencies.extend(endpoint_stats.latencies)
+        total.statuses.update(endpoint_stats.statuses)
+    return {
+        "concurrency": len(wallets),
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": {name: s.summary(elapsed) for name, s in stats.items()},
+        "total": total.summary(elapsed),
+    }
+
+def print_stage(stage: Dict[str, Any]) -> None:
+    print(f"\nconcurrency={stage['concurrency']} elapsed={stage['elapsed_s']}s")
+    print(f"  {'endpoint':<16}{'req':>8}{'err':>6}{'rps':>10}{'p50ms':>10}{'p90ms':>10}{'p99ms':>10}{'maxms':>10}")
+    for name, s in list(stage["endpoints"].items()) + [("TOTAL", stage["total"])]:
+        print(f"  {name:<16}{s['requests']:>8}{s['errors']:>6}{s['throughput_rps']:>10}{s['p50_ms']:>10}{s['p90_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+
+async def run_load(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    wallets = [VirtualWallet(rng) for _ in range(max(args.concurrency))]
+    timeout = httpx.Timeout(args.timeout)
+
+    app = None
+    if args.base_url:
+        transport = None
+        base_url = args.base_url
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    else:
+        from app import app # Imported lazily: only the in-process mode needs the app module
+        use_fresh_database(args.backend)
+        await app.router.startup() # connect_db() keeps the client set above
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadgen"
+        limits = httpx.Limits()
+
+    stages = []
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=timeout, limits=limits) as client:
+            category = await ensure_category(client, args)
+            for concurrency in args.concurrency:
+                stage = await run_stage(client, category, wallets[:concurrency], args, rng)
+                print_stage(stage)
+                stages.append(stage)
+    finally:
+        if app is not None:
+            await app.router.shutdown()
+    return {
+        "meta": {
+            "target": args.base_url or f"in-process ({args.backend})",
+            "duration_s": args.duration,
+            "actions_per_session": args.actions_per_session,
+            "buy_ratio": args.buy_ratio,
+            "max_tickets_per_buy": args.max_tickets_per_buy,
+            "think_ms": args.think_ms,
+            "game": args.game,
+            "seed": args.seed,
+        },
+        "stages": stages,
+    }
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Drive the lottery API with concurrent virtual wallets.")
+    parser.add_argument("--base-url", help="Server to load (e.g. http://127.0.0.1:8000). Default: the app in-process over ASGI.")
+    parser.add_argument("--backend", choices=["mongomock", "mongo"], default="mongomock",
+                        help="In-process only. 'mongo' uses MONGODB_URI and drops/recreates the '%s' database." % BENCH_DB_NAME)
+    parser.add_argument("--concurrency", default="10,50", help="Comma-separated virtual wallet counts; one stage per value.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per stage.")
+    parser.add_argument("--actions-per-session", type=int, default=10, help="Requests per login before the wallet logs in again.")
+    parser.add_argument("--buy-ratio", type=float, default=0.75, help="Share of session requests that buy tickets (rest read draw history).")
+    parser.add_argument("--max-tickets-per-buy", type=int, default=5)
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between a wallet's requests.")
+    parser.add_argument("--game", choices=["raffle", "pick_n"], default="raffle", help="Game type of the category created for the run.")
+    parser.add_argument("--category-id", help="Use an existing category instead of creating one.")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="Write the report as JSON to this path.")
+    args = parser.parse_args(argv)
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c]
+    if not args.concurrency or min(args.concurrency) < 1:
+        parser.error("--concurrency needs at least one positive value")
+    return args
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    logging.disable(logging.INFO) # Auth and purchase paths log every request at INFO
+    report = asyncio.run(run_load(args))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
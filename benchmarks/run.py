@@ -0,0 +1,319 @@
+"""
+Benchmarks for the purchase, close, gamification, read and export hot paths.
+
+    python -m benchmarks.run --scales 1000,10000
+    MONGODB_URI=mongodb://localhost:27017/ python -m benchmarks.run --backend mongo --scales 1000,100000,10000000
+
+Each scale seeds a fresh database with that many tickets in the draw under test, then
+times the endpoint/service functions directly (no HTTP layer). Results (p50/p99 latency,
+throughput, peak RSS) are written as JSON so runs can be compared release to release;
+pass --baseline with an earlier results file to print the change.
+
+The default backend is an in-memory mongomock client. It's useful for spotting changes
+in call patterns but is much slower than a real server at 10^6+ tickets.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import database
+import draws.router as draws_router
+from draws import snapshots as draw_snapshots
+from draws.db import get_draw_history
+from exports.db import TICKET_EXPORT_COLUMNS, iter_ticket_rows
+from exports.streaming import ExportFormat, encode_export
+from gamification.db import ensure_gamification_indexes
+from gamification.leaderboard import loyalty_leaderboard
+from gamification.models import AchievementEventType
+from gamification.services import gamification_service
+from tickets.models import TicketPurchaseRequest
+from tickets.router import buy_tickets
+from winners.router import get_recent_winners
+
+from . import seed
+
+BENCH_DB_NAME = "lottery_db_bench"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+ACHIEVEMENT_DEFINITIONS = 20
+WALLETS_PER_SCALE_DIVISOR = 10 # ~10 tickets per wallet
+CLOSE_DUE_DRAWS = 20 # Due draws per close_due_batch iteration, one per category
+
+def use_fresh_database(backend: str) -> None:
+    """ Points the database module at an empty benchmark database. """
+    database.close_db_connection()
+    if backend == "mongomock":
+        from mongomock import MongoClient as MockMongoClient
+        client = MockMongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(database.MONGO_URI, serverSelectionTimeoutMS=5000)
+        client.drop_database(BENCH_DB_NAME)
+    database.client = client
+    database.db = client[BENCH_DB_NAME]
+    database._transactions_supported = None
+    ensure_gamification_indexes() # Repeat grants are rejected by its unique index, not a read
+    loyalty_leaderboard.invalidate()
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """ Nearest-rank percentile of an already sorted list. """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def summarize(name: str, scale: int, durations: List[float], items_per_op: int) -> Dict[str, Any]:
+    ordered = sorted(durations)
+    total = sum(ordered)
+    return {
+        "benchmark": name,
+        "scale": scale,
+        "iterations": len(ordered),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "mean_ms": round(total / len(ordered) * 1000, 3) if ordered else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        "ops_per_s": round(len(ordered) / total, 2) if total else None,
+        "items_per_s": round(len(ordered) * items_per_op / total, 2) if total else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def time_calls(fn: Callable[[int], Any], iterations: int, setup: Optional[Callable[[int], Any]] = None) -> List[float]:
+    """ Times fn(i) for each iteration; setup(i), if given, runs untimed before each call. """
+    durations = []
+    for i in range(iterations):
+        setup_result = setup(i) if setup else None
+        started = time.perf_counter()
+        fn(setup_result if setup else i)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def bench_buy_tickets(scale: int, args, rng: random.Random) -> Dict[str, Any]:
+    category_id = seed.seed_category("raffle", "Bench Raffle")
+    draw_id = seed.seed_open_draw(category_id)
+    seed.seed_tickets(draw_id, scale, max(1, scale // WALLETS_PER_SCALE_DIVISOR), rng)
+    seed.seed_achievement_definitions(ACHIEVEMENT_DEFINITIONS, category_id)
+
+    def buy(i):
+        buy_tickets(TicketPurchaseRequest(
+            wallet_address=f"rBuyer{i:07d}",
+            num_tickets=args.tickets_per_purchase,
+            category_id=category_id,
+        ))
+
+    return summarize("buy_tickets", scale, time_calls(buy, args.iterations), args.tickets_per_purchase)
+
+def _bench_close(name: str, game_type: str, scale: int, args, rng: random.Random) -> Dict[str, Any]:
+    category_id = seed.seed_category(game_type, f"Bench {game_type}")
+
+    def open_due_draw(_):
+        draw_id = seed.seed_open_draw(category_id, closes_in=timedelta(minutes=-1))
+        seed.seed_tickets(draw_id, scale, max(1, scale // WALLETS_PER_SCALE_DIVISOR), rng, pick_n=(game_type != "raffle"))
+        return draw_id
+
+    return summarize(name, scale, time_calls(draws_router.close_draw, args.close_iterations, setup=open_due_draw), scale)
+
+def bench_close_raffle(scale: int, args, rng: random.Random) -> Dict[str, Any]:
+    return _bench_close("close_draw_raffle", "raffle", scale, args, rng)
+
+def bench_close_pick_n(scale: int, args, rng: random.Random) -> Dict[str, Any]:
+    return _bench_close("close_draw_pick_n", "pick_n_digits", scale, args, rng)
+
+def bench_close_due(scale: int, args, rng: random.Random) -> Dict[str, Any]:
+    """ One /close_due batch over CLOSE_DUE_DRAWS due draws (alternating game types) sharing <scale> tickets. """
+    category_ids = [
+        seed.seed_category(game_type, f"Bench Due {i:02d}")
+        for i, game_type in enumerate(["raffle", "pick_n_digits"] * (CLOSE_DUE_DRAWS // 2))
+    ]
+    tickets_per_draw = max(1, scale // CLOSE_DUE_DRAWS)
+
+    def open_due_draws(_):
+        for i, category_id in enumerate(category_ids):
+            draw_id = seed.seed_open_draw(category_id, closes_in=timedelta(minutes=-1))
+            seed.seed_tickets(draw_id, tickets_per_draw, max(1, tickets_per_draw // WALLETS_PER_SCALE_DIVISOR), rng, pick_n=bool(i % 2))
+
+    close_due = lambda _: draws_router.close_due_draws_endpoint(limit=CLOSE_DUE_DRAWS)
+    return summarize("close_due_batch", scale, time_calls(close_due, args.close_iterations, setup=open_due_draws), tickets_per_draw * CLOSE_DUE_DRAWS)
+
+def bench_process_event(scale: int, args, rng: random.Random) -> Dict[str, Any]:
+    category_id = seed.seed_category("raffle", "Bench Gamification")
+    seed.seed_achievement_definitions(ACHIEVEMENT_DEFINITIONS, category_id)
+    num_wallets = max(1, scale // WALLETS_PER_SCALE_DIVISOR)
+
+    def process(i):
+        gamification_service.process_event(
+            f"rBench{rng.randrange(num_wallets):07d}",
+            AchievementEventType.TICKET_PURCHASE,
+            {"count": rng.randint(1, ACHIEVEMENT_DEFINITIONS), "category_id": category_id},
+        )
+
+    return summarize("gamification_process_event", scale, time_calls(process, args.iterations), 1)
+
+def bench_process_events_batch(scale: int, args, rng: random.Random) -> Dict[str, Any]:
+    """ One batch per iteration with an event per wallet, as a draw close sends for its winners. """
+    category_id = seed.seed_category("raffle", "Bench Gamification Batch")
+    seed.seed_achievement_definitions(ACHIEVEMENT_DEFINITIONS, category_id)
+    num_wallets = max(1, scale // WALLETS_PER_SCALE_DIVISOR)
+
+    def process(i):
+        gamification_service.process_events_batch([
+            (f"rBatch{i:03d}{w:07d}", AchievementEventType.TICKET_PURCHASE, {"count": rng.randint(1, ACHIEVEMENT_DEFINITIONS), "category_id": category_id})
+            for w in range(num_wallets)
+        ])
+
+    return summarize("gamification_events_batch", scale, time_calls(process, args.close_iterations), num_wallets)
+
+def _seed_history(scale: int, rng: random.Random) -> None:
+    category_id = seed.seed_category("raffle", "Bench History")
+    seed.seed_completed_draws(category_id, max(100, min(scale // 10, 100_000)), rng)
+
+def bench_draw_history(scale: int, args, rng: random.Random) -> Dict[str, Any]:
+    _seed_history(scale, rng)
+    return summarize("get_draw_history", scale, time_calls(lambda i: get_draw_history(limit=20), args.iterations), 20)
+
+def bench_recent_winners(scale: int, args, rng: random.Random) -> Dict[str, Any]:
+    _seed_history(scale, rng)
+    return summarize("get_recent_winners", scale, time_calls(lambda i: get_recent_winners(limit=10), args.iterations), 10)
+
+def bench_export_tickets(scale: int, args, rng: random.Random) -> Dict[str, Any]:
+    """ Streams a draw's <scale> tickets as gzipped CSV, as GET /api/exports/tickets does, discarding the bytes. """
+    category_id = seed.seed_category("pick_n_digits", "Bench Export")
+    draw_id = seed.seed_open_draw(category_id)
+    seed.seed_tickets(draw_id, scale, max(1, scale // WALLETS_PER_SCALE_DIVISOR), rng, pick_n=True)
+
+    def export(i):
+        for _ in encode_export(iter_ticket_rows(draw_id=draw_id), TICKET_EXPORT_COLUMNS, ExportFormat.CSV, gzip=True):
+            pass
+
+    return summarize("export_tickets_csv_gzip", scale, time_calls(export, args.close_iterations), scale)
+
+BENCHMARKS: Dict[str, Callable[[int, Any, random.Random], Dict[str, Any]]] = {
+    "buy_tickets": bench_buy_tickets,
+    "close_draw_raffle": bench_close_raffle,
+    "close_draw_pick_n": bench_close_pick_n,
+    "close_due_batch": bench_close_due,
+    "gamification_process_event": bench_process_event,
+    "gamification_events_batch": bench_process_events_batch,
+    "get_draw_history": bench_draw_history,
+    "get_recent_winners": bench_recent_winners,
+    "export_tickets_csv_gzip": bench_export_tickets,
+}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    original_ledger_hash = draws_router.get_latest_ledger_hash_sync
+    # Closing a draw would otherwise call the XRPL RPC; a seeded random hash keeps runs offline and repeatable.
+    draws_router.get_latest_ledger_hash_sync = lambda: f"{rng.getrandbits(256):064X}"
+    # Closes still write their ticket snapshots (that is part of the measured cost), just not into the repo
+    original_snapshot_dir = draw_snapshots.SNAPSHOT_DIR
+    snapshot_dir = tempfile.TemporaryDirectory(prefix="bench_draw_snapshots_")
+    draw_snapshots.SNAPSHOT_DIR = snapshot_dir.name
+    results = []
+    try:
+        for scale in args.scales:
+            for name in args.benchmarks:
+                use_fresh_database(args.backend)
+                result = BENCHMARKS[name](scale, args, rng)
+                results.append(result)
+                print(f"{name:<28} scale={scale:<9} p50={result['p50_ms']:>10.3f}ms p99={result['p99_ms']:>10.3f}ms "
+                      f"items/s={result['items_per_s']} rss={result['peak_rss_mb']}MB")
+    finally:
+        draws_router.get_latest_ledger_hash_sync = original_ledger_hash
+        draw_snapshots.SNAPSHOT_DIR = original_snapshot_dir
+        snapshot_dir.cleanup()
+        database.close_db_connection()
+    return {
+        "meta": {
+            "started_at": args.started_at,
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "scales": args.scales,
+            "iterations": args.iterations,
+            "close_iterations": args.close_iterations,
+            "tickets_per_purchase": args.tickets_per_purchase,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+def print_comparison(report: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["benchmark"], r["scale"]): r for r in baseline.get("results", [])}
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('meta', {}).get('git_commit')}):")
+    for result in report["results"]:
+        before = previous.get((result["benchmark"], result["scale"]))
+        if not before:
+            continue
+        changes = []
+        for key in ("p50_ms", "p99_ms"):
+            if before[key]:
+                changes.append(f"{key} {(result[key] - before[key]) / before[key] * 100:+.1f}%")
+        print(f"{result['benchmark']:<28} scale={result['scale']:<9} " + ", ".join(changes))
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the lottery backend hot paths.")
+    parser.add_argument("--backend", choices=["mongomock", "mongo"], default="mongomock",
+                        help="'mongo' uses MONGODB_URI and drops/recreates the '%s' database." % BENCH_DB_NAME)
+    parser.add_argument("--scales", default="1000,10000",
+                        help="Comma-separated ticket counts to seed, e.g. 1000,100000,10000000.")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS), help="Comma-separated subset of: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per benchmark (buy, gamification, reads).")
+    parser.add_argument("--close-iterations", type=int, default=3, help="Draws closed per close benchmark (each is seeded with <scale> tickets).")
+    parser.add_argument("--tickets-per-purchase", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/<timestamp>.json).")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against.")
+    args = parser.parse_args(argv)
+    args.scales = [int(s) for s in args.scales.split(",") if s]
+    args.benchmarks = [b for b in args.benchmarks.split(",") if b]
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    args.started_at = datetime.utcnow().isoformat()
+    return args
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    logging.disable(logging.INFO) # The services log every event at INFO
+    report = run_suite(args)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.started_at.replace(':', '').split('.')[0]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.baseline:
+        print_comparison(report, args.baseline)
+    return report
+
+if __name__ == "__main__":
+    main()
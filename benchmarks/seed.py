@@ -0,0 +1,174 @@
+"""
+Synthetic data for the benchmark suite.
+
+Documents are written with raw insert_many in chunks (not through the feature db
+functions) so seeding 10^6+ tickets doesn't dominate a run. Shapes match what the
+feature db modules write.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from database import get_db
+from draws.db import reserve_ticket_seqs
+from gamification.models import AchievementEventType
+from lottery_categories.db import create_category
+from lottery_categories.models import LotteryCategoryCreate, PrizeTierConfig
+from tickets.db import index_ticket_picks
+from tickets.selections import encode_pick_values
+
+INSERT_CHUNK_SIZE = 10_000
+
+PICK_N_GAME_CONFIG = {"num_picks": 4, "min_digit": 0, "max_digit": 9, "allow_duplicates": False}
+
+def insert_chunked(collection, docs_iter) -> None:
+    chunk: List[Dict[str, Any]] = []
+    for doc in docs_iter:
+        chunk.append(doc)
+        if len(chunk) >= INSERT_CHUNK_SIZE:
+            collection.insert_many(chunk, ordered=False)
+            chunk = []
+    if chunk:
+        collection.insert_many(chunk, ordered=False)
+
+def seed_category(game_type: str, name: str) -> str:
+    """ Creates a raffle or Pick-N category with three percentage tiers. Returns its ID. """
+    if game_type == "raffle":
+        tiers = [
+            PrizeTierConfig(tier_name="First", matches_required=1, percentage_of_prize_pool=50.0),
+            PrizeTierConfig(tier_name="Second", matches_required=2, percentage_of_prize_pool=20.0),
+            PrizeTierConfig(tier_name="Third", matches_required=3, percentage_of_prize_pool=10.0),
+        ]
+        game_config: Dict[str, Any] = {}
+    else:
+        tiers = [
+            PrizeTierConfig(tier_name="Match 4", matches_required=4, percentage_of_prize_pool=50.0, is_jackpot_tier=True),
+            PrizeTierConfig(tier_name="Match 3", matches_required=3, percentage_of_prize_pool=20.0),
+            PrizeTierConfig(tier_name="Match 2", matches_required=2, percentage_of_prize_pool=10.0),
+        ]
+        game_config = dict(PICK_N_GAME_CONFIG)
+    category_id = create_category(LotteryCategoryCreate(
+        name=name,
+        game_type=game_type,
+        game_config=game_config,
+        draw_interval_type="daily",
+        draw_interval_value=1,
+        ticket_price=1.0,
+        base_prize_pool=1000.0,
+        prize_tiers=tiers,
+    ))
+    if not category_id:
+        raise RuntimeError(f"Failed to seed category '{name}'.")
+    return category_id
+
+def seed_open_draw(category_id: str, closes_in: timedelta = timedelta(days=1)) -> str:
+    """ Inserts an open draw. A negative closes_in makes it due for closing. """
+    now = datetime.utcnow()
+    result = get_db().draws.insert_one({
+        "category_id": category_id,
+        "status": "open",
+        "scheduled_open_time": now - timedelta(days=1),
+        "scheduled_close_time": now + closes_in,
+        "actual_open_time": now - timedelta(days=1),
+        "participants": [],
+        "winners_by_tier": [],
+        "base_prize_pool": 1000.0,
+        "created_at": now,
+        "updated_at": now,
+    })
+    return str(result.inserted_id)
+
+def seed_tickets(draw_id: str, count: int, num_wallets: int, rng: random.Random, pick_n: bool = False) -> None:
+    """
+    Inserts count tickets spread over num_wallets wallets. Pick-N tickets get random distinct
+    picks, per-draw ticket_seqs and postings, as buy_tickets writes them.
+    """
+    now = datetime.utcnow()
+    digits = list(range(PICK_N_GAME_CONFIG["min_digit"], PICK_N_GAME_CONFIG["max_digit"] + 1))
+    first_seq = reserve_ticket_seqs(draw_id, count) if pick_n else None
+
+    def docs():
+        for i in range(count):
+            doc = {
+                "wallet_address": f"rBench{rng.randrange(num_wallets):07d}",
+                "draw_id": draw_id,
+                "timestamp": now,
+                "selection_data": None,
+            }
+            if pick_n:
+                picks = rng.sample(digits, PICK_N_GAME_CONFIG["num_picks"])
+                doc["selection_data"] = {"picks": picks, **encode_pick_values(picks)}
+                doc["ticket_seq"] = first_seq + i
+            yield doc
+
+    def indexed(docs_iter):
+        chunk = []
+        for doc in docs_iter:
+            chunk.append(doc)
+            if len(chunk) >= INSERT_CHUNK_SIZE:
+                index_ticket_picks(draw_id, [(d["ticket_seq"], d["selection_data"]["picks"]) for d in chunk])
+                yield from chunk
+                chunk = []
+        if chunk:
+            index_ticket_picks(draw_id, [(d["ticket_seq"], d["selection_data"]["picks"]) for d in chunk])
+            yield from chunk
+
+    insert_chunked(get_db().tickets, indexed(docs()) if pick_n else docs())
+
+def seed_completed_draws(category_id: str, count: int, rng: random.Random) -> None:
+    """ Inserts completed draws with one or two tier winners each, for history/winners reads. """
+    now = datetime.utcnow()
+
+    def docs():
+        for i in range(count):
+            closed_at = now - timedelta(hours=i + 1)
+            winners = [
+                {
+                    "tier_name": tier_name,
+                    "wallet_address": f"rBench{rng.randrange(10_000):07d}",
+                    "ticket_id": f"{rng.getrandbits(96):024x}",
+                    "prize_amount_calculated": amount,
+                    "is_fixed_prize": False,
+                    "fee_amount_charged": 0.0,
+                    "net_prize_payable": amount,
+                }
+                for tier_name, amount in (("First", 500.0), ("Second", 200.0))[:rng.randint(1, 2)]
+            ]
+            yield {
+                "category_id": category_id,
+                "status": "completed",
+                "scheduled_open_time": closed_at - timedelta(days=1),
+                "scheduled_close_time": closed_at,
+                "actual_open_time": closed_at - timedelta(days=1),
+                "actual_close_time": closed_at,
+                "participants": [w["wallet_address"] for w in winners],
+                "ledger_hash": f"{rng.getrandbits(256):064X}",
+                "winners_by_tier": winners,
+                "base_prize_pool": 1000.0,
+                "created_at": closed_at,
+                "updated_at": closed_at,
+            }
+
+    insert_chunked(get_db().draws, docs())
+
+def seed_achievement_definitions(count: int, category_id: Optional[str] = None) -> None:
+    """
+    Inserts active ticket-purchase achievements with rising count thresholds,
+    so process_event evaluates every definition and grants the low ones.
+    """
+    now = datetime.utcnow()
+    get_db().achievement_definitions.insert_many([
+        {
+            "name": f"Bench Buyer {i:03d}",
+            "description": f"Buy {i + 1} tickets in one purchase.",
+            "criteria": [{
+                "event_type": AchievementEventType.TICKET_PURCHASE.value,
+                "conditions": {"count": i + 1, "category_id": category_id if i % 2 else None},
+            }],
+            "points_reward": 10,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ])
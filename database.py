@@ -1,13 +1,20 @@
 import os
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Set, Tuple, TypeVar
 from pymongo import MongoClient
+from pymongo.client_session import ClientSession
+from pymongo.collection import Collection
 from pymongo.database import Database
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import ConnectionFailure, DuplicateKeyError
 
 MONGO_URI = os.environ.get('MONGODB_URI', 'mongodb://localhost:27017/')
-DB_NAME = "lottery_db"
+DB_NAME = os.environ.get('MONGODB_DB_NAME', 'lottery_db')
 
 client: MongoClient | None = None
 db: Database | None = None
+_transactions_supported: bool | None = None
+
+T = TypeVar("T")
 
 def connect_db():
     global client, db
@@ -39,12 +46,105 @@ def get_db() -> Database:
     return db
 
 def close_db_connection():
-    global client
+    global client, _transactions_supported
     if client:
         client.close()
         client = None
+        _transactions_supported = None
+        _completed_migrations.clear()
         print("MongoDB connection closed.")
 
+def transactions_supported() -> bool:
+    """
+    Multi-document transactions need a replica set or sharded cluster.
+    The answer is cached per connection.
+    """
+    global _transactions_supported
+    if _transactions_supported is None:
+        if client is None:
+            return False
+        try:
+            hello = client.admin.command('hello')
+            _transactions_supported = bool(hello.get('setName')) or hello.get('msg') == 'isdbgrid'
+        except Exception as e: # Also covers servers/mock clients that don't implement 'hello'
+            print(f"Could not determine MongoDB transaction support: {e}")
+            _transactions_supported = False
+    return _transactions_supported
+
+def run_in_transaction(callback: Callable[[Optional[ClientSession]], T]) -> T:
+    """
+    Runs callback(session) inside a transaction when the deployment supports it.
+    Otherwise runs callback(None): the writes are then not atomic and the
+    callback is responsible for compensating on failure.
+    """
+    if not transactions_supported():
+        return callback(None)
+    with client.start_session() as session:
+        return session.with_transaction(callback)
+
+# --- Unique indexes that writes rely on ---
+
+def create_unique_index(collection: Collection, keys: List[Tuple[str, int]], dedupe: Callable[[], int]) -> None:
+    """ Creates a unique index, first removing the duplicates that make the build fail. Raises if it still can't be built. """
+    try:
+        collection.create_index(keys, unique=True)
+    except DuplicateKeyError:
+        deleted = dedupe()
+        print(f"Removed {deleted} duplicate documents from {collection.name} to build its unique index.")
+        collection.create_index(keys, unique=True)
+
+def has_unique_index(collection: Collection, keys: List[Tuple[str, int]]) -> bool:
+    """ Whether the collection has a unique index on exactly these keys. """
+    return any(info.get("unique") and list(info["key"]) == keys for info in collection.index_information().values())
+
+# --- One-off data migrations ---
+# A migration is a marker document in 'schema_migrations' ({_id: name, status: "running"|"done"}).
+# The first process to insert the marker runs it; the others skip it (and code that depends on it
+# keeps its fallback) until the marker is done. A run that died is taken over after the timeout.
+
+MIGRATION_CLAIM_TIMEOUT = timedelta(minutes=30)
+_completed_migrations: Set[str] = set() # Per-process cache; a done migration never becomes undone
+
+def get_migrations_collection() -> Collection:
+    return get_db().schema_migrations
+
+def migration_done(name: str) -> bool:
+    if name in _completed_migrations:
+        return True
+    if get_migrations_collection().find_one({"_id": name, "status": "done"}, {"_id": 1}):
+        _completed_migrations.add(name)
+        return True
+    return False
+
+def run_migration(name: str, migrate: Callable[[], None]) -> bool:
+    """
+    Runs migrate() once per database, for data written before a feature existed.
+    Returns True once the migration is done (now or earlier), False if another process is
+    running it. An exception from migrate() releases the claim, so the next startup retries.
+    """
+    if migration_done(name):
+        return True
+    migrations = get_migrations_collection()
+    now = datetime.utcnow()
+    try:
+        migrations.insert_one({"_id": name, "status": "running", "started_at": now})
+    except DuplicateKeyError:
+        taken_over = migrations.find_one_and_update(
+            {"_id": name, "status": "running", "started_at": {"$lt": now - MIGRATION_CLAIM_TIMEOUT}},
+            {"$set": {"started_at": now}}
+        )
+        if not taken_over:
+            return migration_done(name)
+    try:
+        migrate()
+    except Exception:
+        migrations.delete_one({"_id": name, "status": "running", "started_at": now})
+        raise
+    migrations.update_one({"_id": name}, {"$set": {"status": "done", "finished_at": datetime.utcnow()}})
+    _completed_migrations.add(name)
+    print(f"Data migration '{name}' completed.")
+    return True
+
 # Connect on import - for FastAPI, dependency injection is better,
 # but for this structure, we'll connect and handle errors.
 # In a FastAPI app, you'd typically use startup/shutdown events.
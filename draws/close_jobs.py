@@ -0,0 +1,145 @@
+"""
+Bounded worker pool for background draw closes.
+
+POST /api/draws/close/{draw_id} queues a job and returns at once. A worker thread runs the close
+and records its phase and counters on the job document, which GET /api/draws/close_jobs/{id}
+returns. At most CLOSE_JOB_WORKERS closes run at a time per process; further jobs wait in the
+pool's queue, so a huge draw never holds an HTTP request worker.
+
+A running job first moves its draw to 'closing', so no tickets are bought after the close has
+read them. Each job holds a lease (draws.db.CLOSE_JOB_LEASE) that a heartbeat thread renews,
+together with the draw claims of the jobs it runs, every CLOSE_JOB_HEARTBEAT_SECONDS. A job
+whose process died stops being renewed and is taken over, with its draw claim, by the heartbeat
+of another process, by the next close request for the draw, or by resume_close_jobs on startup.
+"""
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from . import db as draws_db
+
+CLOSE_JOB_WORKERS = int(os.environ.get('CLOSE_JOB_WORKERS', '2'))
+CLOSE_JOB_HEARTBEAT_SECONDS = float(os.environ.get('CLOSE_JOB_HEARTBEAT_SECONDS', '30')) # Well under CLOSE_JOB_LEASE
+
+# Lease owner of the jobs this process runs
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{ObjectId()}"
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_heartbeat_stopping: Optional[threading.Event] = None
+_close_fn: Optional[Callable[..., Any]] = None # Runs jobs taken over by the heartbeat
+_held_jobs: Dict[str, Optional[str]] = {} # Job id -> draw claim token, for jobs queued or running here
+_held_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _heartbeat_stopping
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=CLOSE_JOB_WORKERS, thread_name_prefix="draw-close")
+            _heartbeat_stopping = threading.Event()
+            threading.Thread(target=_heartbeat_loop, args=(_heartbeat_stopping,), name="draw-close-heartbeat", daemon=True).start()
+        return _executor
+
+def _heartbeat_loop(stopping: threading.Event) -> None:
+    while not stopping.wait(CLOSE_JOB_HEARTBEAT_SECONDS):
+        try:
+            heartbeat()
+        except Exception:
+            logger.exception("Close job heartbeat failed")
+
+def heartbeat() -> int:
+    """
+    Renews the leases of this process's jobs and the claims on their draws, then takes over jobs
+    whose lease ran out. Returns the number of jobs taken over.
+    """
+    with _held_lock:
+        job_ids = list(_held_jobs)
+        close_claims = [claim for claim in _held_jobs.values() if claim]
+    if job_ids:
+        draws_db.renew_close_job_leases(job_ids, WORKER_ID)
+    if close_claims:
+        draws_db.renew_draw_claims(close_claims)
+    return resume_close_jobs() if _close_fn is not None else 0
+
+def shutdown_close_job_workers(wait: bool = True) -> None:
+    """
+    Called on app shutdown. Waits for queued and running closes unless wait=False; jobs left
+    unfinished are taken over once their lease runs out.
+    """
+    global _executor, _heartbeat_stopping
+    with _executor_lock:
+        executor, _executor = _executor, None
+        stopping, _heartbeat_stopping = _heartbeat_stopping, None
+    if executor is not None:
+        executor.shutdown(wait=wait) # The heartbeat keeps renewing while the pool drains
+    if stopping is not None:
+        stopping.set()
+
+def submit_close_job(job_id: str, draw_id: str, close_fn: Callable[..., Any]) -> None:
+    """ Queues close_fn(draw_id, claim=..., progress=...) on the worker pool under the given job. """
+    global _close_fn
+    _close_fn = close_fn
+    with _held_lock:
+        _held_jobs[job_id] = None
+    _get_executor().submit(run_close_job, job_id, draw_id, close_fn)
+
+def resume_close_jobs(close_fn: Optional[Callable[..., Any]] = None) -> int:
+    """
+    Takes over and queues the jobs whose worker died. Called on app startup (with close_fn) and
+    by the heartbeat. Returns the number of jobs queued.
+    """
+    global _close_fn
+    if close_fn is not None:
+        _close_fn = close_fn
+    jobs = draws_db.take_over_stale_close_jobs(WORKER_ID)
+    for job in jobs:
+        logger.warning(f"Taking over close job {job.id} for draw {job.draw_id} (attempt {job.attempts})")
+        submit_close_job(job.id, job.draw_id, _close_fn)
+    return len(jobs)
+
+def run_close_job(job_id: str, draw_id: str, close_fn: Callable[..., Any]) -> None:
+    try:
+        job = draws_db.get_close_job(job_id)
+        if job is None or job.status in ("completed", "failed") or job.lease_owner != WORKER_ID:
+            return # Finished, or taken over by another worker while it waited in the queue
+        # Hold the draw in 'closing' from here on, taking over the claim of a previous attempt
+        claim = draws_db.claim_draw_for_close(draw_id, datetime.utcnow(), stale_claim=job.close_claim)
+        if claim is not None:
+            with _held_lock:
+                _held_jobs[job_id] = claim
+        draws_db.update_close_job(job_id, {"status": "running", "phase": "starting", "started_at": datetime.utcnow(), "close_claim": claim})
+
+        def progress(phase: str, **counters: Any) -> None:
+            draws_db.update_close_job(job_id, {"phase": phase, **counters})
+
+        try:
+            # Without a claim, close_fn returns the draw if it is already closed, else fails with a 409
+            close_fn(draw_id, claim=claim, progress=progress)
+        except HTTPException as e:
+            logger.error(f"Close job {job_id} for draw {draw_id} failed: {e.detail}")
+            if claim is not None:
+                draws_db.release_draw_claim(draw_id, claim)
+            draws_db.update_close_job(job_id, {
+                "status": "failed", "error": str(e.detail), "error_status_code": e.status_code, "finished_at": datetime.utcnow()
+            }, finished=True)
+        except Exception as e:
+            logger.exception(f"Close job {job_id} for draw {draw_id} failed")
+            if claim is not None:
+                draws_db.release_draw_claim(draw_id, claim)
+            draws_db.update_close_job(job_id, {
+                "status": "failed", "error": str(e), "error_status_code": 500, "finished_at": datetime.utcnow()
+            }, finished=True)
+        else:
+            draws_db.update_close_job(job_id, {"status": "completed", "phase": "done", "finished_at": datetime.utcnow()}, finished=True)
+    finally:
+        with _held_lock:
+            _held_jobs.pop(job_id, None)
@@ -1,18 +1,44 @@
+from pymongo import ReturnDocument
 from pymongo.collection import Collection
 from pymongo.results import InsertOneResult, UpdateResult
-from pymongo.errors import PyMongoError
+from pymongo.errors import PyMongoError, DuplicateKeyError
 from bson import ObjectId
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta
 
 from database import get_db
-from .models import Draw, DrawCreate, DrawUpdate
+from .models import Draw, DrawCreate, DrawUpdate, DrawCloseJob
 
 def get_draws_collection() -> Collection:
     """Returns the 'draws' collection from MongoDB."""
     db = get_db()
     return db.draws
 
+# A batch close that died mid-way leaves its draws in 'closing'; after this long another batch may claim them.
+CLOSE_CLAIM_TIMEOUT = timedelta(minutes=10)
+# Close jobs hold a lease their worker renews (draws.close_jobs); once it runs out the job may be taken over.
+CLOSE_JOB_LEASE = timedelta(minutes=2)
+
+def get_close_jobs_collection() -> Collection:
+    """Returns the 'draw_close_jobs' collection from MongoDB."""
+    db = get_db()
+    return db.draw_close_jobs
+
+def ensure_draw_indexes() -> None:
+    """
+    Index for claim_due_draws, which looks up due draws by status and scheduled close time, and
+    the unique index that allows one unfinished close job per draw (active_for_draw is unset when a job finishes).
+    The multikey winner index serves per-wallet win lookups such as the achievement backfill, and
+    (status, actual_close_time) the winners export's completed-in-a-period scans.
+    """
+    try:
+        get_draws_collection().create_index([("status", 1), ("scheduled_close_time", 1)])
+        get_draws_collection().create_index([("status", 1), ("actual_close_time", 1)])
+        get_draws_collection().create_index("winners_by_tier.wallet_address")
+        get_close_jobs_collection().create_index("active_for_draw", unique=True, sparse=True)
+    except PyMongoError as e:
+        print(f"Error creating draw indexes: {e}")
+
 def create_draw(draw_data: DrawCreate) -> str | None:
     """
     Creates a new draw in the database.
@@ -52,7 +78,8 @@ def get_draw_by_id(draw_id: str) -> Draw | None:
             return None
         db_draw = collection.find_one({"_id": ObjectId(draw_id)})
         if db_draw:
-            return Draw(**db_draw) # Pydantic handles _id alias
+            db_draw['_id'] = str(db_draw['_id']) # Convert ObjectId to str for the model
+            return Draw(**db_draw)
         return None
     except PyMongoError as e:
         print(f"Error retrieving draw by ID '{draw_id}' from MongoDB: {e}")
@@ -81,6 +108,7 @@ def get_open_draws_for_category(category_id: str) -> List[Draw]:
         db_draws = collection.find(query).sort("scheduled_close_time", 1)
         for d_data in db_draws:
             try:
+                d_data['_id'] = str(d_data['_id']) # Convert ObjectId to str for the model
                 draws.append(Draw(**d_data))
             except Exception as e:
                 print(f"Error processing open draw data for _id '{d_data.get('_id')}': {e}")
@@ -107,6 +135,7 @@ def get_next_pending_draw(category_id: Optional[str] = None) -> Draw | None:
         # Find the one scheduled to open soonest
         db_draw = collection.find_one(query, sort=[("scheduled_open_time", 1)])
         if db_draw:
+            db_draw['_id'] = str(db_draw['_id']) # Convert ObjectId to str for the model
             return Draw(**db_draw)
         return None
     except PyMongoError as e:
@@ -117,12 +146,14 @@ def get_next_pending_draw(category_id: Optional[str] = None) -> Draw | None:
         return None
 
 
-def update_draw(draw_id: str, update_data: DrawUpdate) -> bool:
+def update_draw(draw_id: str, update_data: DrawUpdate, close_claim: Optional[str] = None) -> bool:
     """
     Updates a draw in the database.
     Args:
         draw_id: The ID of the draw to update.
         update_data: DrawUpdate model instance with fields to update.
+        close_claim: If given, the update only applies while the draw is 'closing' under this
+            claim token, and ends the claim. A close that lost its claim changes nothing.
     Returns:
         True if update was successful, False otherwise.
     """
@@ -137,10 +168,12 @@ def update_draw(draw_id: str, update_data: DrawUpdate) -> bool:
 
         update_dict["updated_at"] = datetime.utcnow()
 
-        result: UpdateResult = collection.update_one(
-            {"_id": ObjectId(draw_id)},
-            {"$set": update_dict}
-        )
+        query: Dict[str, Any] = {"_id": ObjectId(draw_id)}
+        update: Dict[str, Any] = {"$set": update_dict}
+        if close_claim is not None:
+            query.update({"status": "closing", "close_claim": close_claim})
+            update["$unset"] = {"close_claim": "", "close_claimed_at": "", "close_prior_status": ""}
+        result: UpdateResult = collection.update_one(query, update)
         return result.modified_count > 0
     except PyMongoError as e:
         print(f"Error updating draw ID '{draw_id}' in MongoDB: {e}")
@@ -162,6 +195,7 @@ def get_draw_history(category_id: Optional[str] = None, limit: int = 20, offset:
         db_draws = collection.find(query).sort("scheduled_close_time", -1).skip(offset).limit(limit)
         for d_data in db_draws:
             try:
+                d_data['_id'] = str(d_data['_id']) # Convert ObjectId to str for the model
                 draws.append(Draw(**d_data))
             except Exception as e:
                  print(f"Error processing draw history data for _id '{d_data.get('_id')}': {e}")
@@ -210,3 +244,263 @@ def add_participant_to_draw(draw_id: str, wallet_address: str) -> bool:
     except PyMongoError as e:
         print(f"Error adding participant to draw {draw_id} in MongoDB: {e}")
         return False
+
+def reserve_ticket_seqs(draw_id: str, count: int) -> int | None:
+    """
+    Reserves `count` consecutive per-draw ticket sequence numbers with a single $inc.
+    Returns the first one, or None on failure. Sequence numbers key the Pick-N postings index.
+    """
+    try:
+        if not ObjectId.is_valid(draw_id):
+            return None
+        updated = get_draws_collection().find_one_and_update(
+            {"_id": ObjectId(draw_id)},
+            {"$inc": {"ticket_seq_next": count}},
+            projection={"ticket_seq_next": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not updated:
+            return None
+        return updated["ticket_seq_next"] - count
+    except PyMongoError as e:
+        print(f"Error reserving {count} ticket sequence numbers for draw {draw_id}: {e}")
+        return None
+
+def claim_due_draws(now: datetime, limit: int) -> List[Draw]:
+    """
+    Claims up to `limit` draws that are due for closing (open, or 'closing' under an expired claim,
+    with scheduled_close_time <= now) by moving them to 'closing' under a new claim token.
+    Returns the claimed draws, soonest-due first. Concurrent callers never claim the same draw.
+    A draw claimed from 'open' records that in close_prior_status for release_draw_claim; a taken-over
+    claim keeps the prior status recorded by the claim it replaces.
+    """
+    try:
+        collection = get_draws_collection()
+        due = {
+            "scheduled_close_time": {"$lte": now},
+            "$or": [
+                {"status": "open"},
+                {"status": "closing", "close_claimed_at": {"$lt": now - CLOSE_CLAIM_TIMEOUT}},
+            ],
+        }
+        due_docs = list(collection.find(due, {"_id": 1, "status": 1}).sort("scheduled_close_time", 1).limit(limit))
+        if not due_docs:
+            return []
+        claim_token = str(ObjectId())
+        claim_fields = {"status": "closing", "close_claim": claim_token, "close_claimed_at": now, "updated_at": now}
+        open_ids = [d["_id"] for d in due_docs if d.get("status") == "open"]
+        stale_ids = [d["_id"] for d in due_docs if d.get("status") != "open"]
+        # Each update re-checks the due filter, so a draw claimed in between stays with the other caller
+        if open_ids:
+            collection.update_many(
+                {"_id": {"$in": open_ids}, **due, "status": "open"},
+                {"$set": {**claim_fields, "close_prior_status": "open"}}
+            )
+        if stale_ids:
+            collection.update_many({"_id": {"$in": stale_ids}, **due}, {"$set": claim_fields})
+        draws = []
+        for d_data in collection.find({"close_claim": claim_token}).sort("scheduled_close_time", 1):
+            d_data['_id'] = str(d_data['_id'])
+            draws.append(Draw(**d_data))
+        return draws
+    except PyMongoError as e:
+        print(f"Error claiming due draws: {e}")
+        return []
+
+def claim_draw_for_close(draw_id: str, now: datetime, stale_claim: Optional[str] = None) -> str | None:
+    """
+    Moves one draw to 'closing' under a new claim token, as claim_due_draws does for a batch:
+    an open draw, a pending draw past its scheduled close, or a 'closing' draw whose claim expired.
+    stale_claim is a claim known to be abandoned (that of a close job whose lease ran out), which
+    is taken over at once. Returns the token, or None if another close holds the draw or it is no
+    longer closable. The status the draw is claimed from is kept in close_prior_status, as in claim_due_draws.
+    """
+    try:
+        if not ObjectId.is_valid(draw_id):
+            return None
+        claim_token = str(ObjectId())
+        claim_fields = {"status": "closing", "close_claim": claim_token, "close_claimed_at": now, "updated_at": now}
+        takeovers: List[Dict[str, Any]] = [{"status": "closing", "close_claimed_at": {"$lt": now - CLOSE_CLAIM_TIMEOUT}}]
+        if stale_claim is not None:
+            takeovers.append({"status": "closing", "close_claim": stale_claim})
+        # One update per source status, so the claim knows which one it moved the draw from; open comes first
+        attempts = [
+            ({"status": "open"}, {**claim_fields, "close_prior_status": "open"}),
+            ({"status": "pending_open", "scheduled_close_time": {"$lte": now}}, {**claim_fields, "close_prior_status": "pending_open"}),
+            ({"$or": takeovers}, claim_fields),
+        ]
+        for claimable, fields in attempts:
+            result: UpdateResult = get_draws_collection().update_one({"_id": ObjectId(draw_id), **claimable}, {"$set": fields})
+            if result.modified_count > 0:
+                return claim_token
+        return None
+    except PyMongoError as e:
+        print(f"Error claiming draw {draw_id} for closing: {e}")
+        return None
+
+def renew_draw_claims(close_claims: List[str]) -> bool:
+    """ Restarts the expiry of the given claims, for closes that are still working on their draws. """
+    try:
+        now = datetime.utcnow()
+        get_draws_collection().update_many(
+            {"status": "closing", "close_claim": {"$in": close_claims}},
+            {"$set": {"close_claimed_at": now}}
+        )
+        return True
+    except PyMongoError as e:
+        print(f"Error renewing close claims: {e}")
+        return False
+
+def release_draw_claim(draw_id: str, close_claim: Optional[str] = None) -> bool:
+    """
+    Puts a claimed draw that could not be closed back to the status it was claimed from (close_prior_status,
+    'open' for claims from before it was recorded); with close_claim, only while that claim holds it.
+    """
+    try:
+        if not ObjectId.is_valid(draw_id):
+            return False
+        collection = get_draws_collection()
+        query: Dict[str, Any] = {"_id": ObjectId(draw_id), "status": "closing"}
+        if close_claim is not None:
+            query["close_claim"] = close_claim
+        claimed = collection.find_one(query, {"close_claim": 1, "close_prior_status": 1})
+        if not claimed:
+            return False
+        # Matched on the claim read above, so a takeover in between is left alone
+        query["close_claim"] = claimed.get("close_claim")
+        result: UpdateResult = collection.update_one(
+            query,
+            {
+                "$set": {"status": claimed.get("close_prior_status") or "open", "updated_at": datetime.utcnow()},
+                "$unset": {"close_claim": "", "close_claimed_at": "", "close_prior_status": ""},
+            }
+        )
+        return result.modified_count > 0
+    except PyMongoError as e:
+        print(f"Error releasing close claim on draw {draw_id}: {e}")
+        return False
+
+def _close_job_from_doc(job_doc: Dict[str, Any]) -> DrawCloseJob:
+    job_doc['_id'] = str(job_doc['_id'])
+    return DrawCloseJob(**job_doc)
+
+def _stale_close_job_filter(now: datetime) -> Dict[str, Any]:
+    """ Unfinished jobs whose lease ran out (or, for jobs from before leases, that stopped updating). """
+    return {
+        "active_for_draw": {"$exists": True},
+        "$or": [
+            {"lease_expires_at": {"$lt": now}},
+            {"lease_expires_at": {"$exists": False}, "updated_at": {"$lt": now - CLOSE_JOB_LEASE}},
+        ],
+    }
+
+def _take_over_close_job(query: Dict[str, Any], owner: str, now: datetime) -> DrawCloseJob | None:
+    """ Requeues one stale job matching query under owner's lease. Only one caller gets it. """
+    job_doc = get_close_jobs_collection().find_one_and_update(
+        {**query, **_stale_close_job_filter(now)},
+        {
+            "$set": {"status": "queued", "phase": "queued", "lease_owner": owner, "lease_expires_at": now + CLOSE_JOB_LEASE, "updated_at": now},
+            "$inc": {"attempts": 1},
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    return _close_job_from_doc(job_doc) if job_doc else None
+
+def create_close_job(draw_id: str, owner: str) -> Tuple[DrawCloseJob, bool] | None:
+    """
+    Creates a queued close job for the draw under owner's lease, unless the draw already has an
+    unfinished one, so repeated close requests don't close a draw twice. An unfinished job whose
+    lease ran out is taken over instead, so a dead worker doesn't block the draw.
+    Returns (job, created); created is True when the caller has to run the job. None on failure.
+    """
+    collection = get_close_jobs_collection()
+    now = datetime.utcnow()
+    try:
+        taken_over = _take_over_close_job({"active_for_draw": draw_id}, owner, now)
+        if taken_over is not None:
+            return taken_over, True
+    except PyMongoError as e:
+        print(f"Error taking over the close job for draw {draw_id}: {e}")
+        return None
+    insert_token = str(ObjectId())
+    for _ in range(2): # A concurrent insert for the same draw hits the unique index; the retry finds its job
+        try:
+            job_doc = collection.find_one_and_update(
+                {"active_for_draw": draw_id},
+                {"$setOnInsert": {
+                    "draw_id": draw_id, "status": "queued", "phase": "queued", "attempts": 1,
+                    "lease_owner": owner, "lease_expires_at": now + CLOSE_JOB_LEASE,
+                    "insert_token": insert_token, "created_at": now, "updated_at": now,
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return _close_job_from_doc(job_doc), job_doc.get("insert_token") == insert_token
+        except DuplicateKeyError:
+            continue
+        except PyMongoError as e:
+            print(f"Error creating close job for draw {draw_id}: {e}")
+            return None
+    return None
+
+def update_close_job(job_id: str, fields: Dict[str, Any], finished: bool = False) -> bool:
+    """ Sets fields on a close job. finished=True releases the draw for a new job. """
+    try:
+        if not ObjectId.is_valid(job_id):
+            return False
+        update: Dict[str, Any] = {"$set": {**fields, "updated_at": datetime.utcnow()}}
+        if finished:
+            update["$unset"] = {"active_for_draw": ""}
+        result: UpdateResult = get_close_jobs_collection().update_one({"_id": ObjectId(job_id)}, update)
+        return result.matched_count > 0
+    except PyMongoError as e:
+        print(f"Error updating close job {job_id}: {e}")
+        return False
+
+def take_over_stale_close_jobs(owner: str, limit: int = 100) -> List[DrawCloseJob]:
+    """ Takes over up to `limit` unfinished jobs whose lease ran out (their worker died), oldest first. """
+    jobs = []
+    try:
+        now = datetime.utcnow()
+        stale = get_close_jobs_collection().find(_stale_close_job_filter(now), {"_id": 1}).sort("created_at", 1).limit(limit)
+        for job_doc in list(stale):
+            job = _take_over_close_job({"_id": job_doc["_id"]}, owner, now)
+            if job is not None:
+                jobs.append(job)
+        return jobs
+    except PyMongoError as e:
+        print(f"Error taking over stale close jobs: {e}")
+        return jobs
+
+def renew_close_job_leases(job_ids: List[str], owner: str) -> bool:
+    """ Extends owner's leases on its unfinished jobs. A job another worker took over is left alone. """
+    try:
+        now = datetime.utcnow()
+        get_close_jobs_collection().update_many(
+            {"_id": {"$in": [ObjectId(job_id) for job_id in job_ids if ObjectId.is_valid(job_id)]},
+             "lease_owner": owner, "active_for_draw": {"$exists": True}},
+            {"$set": {"lease_expires_at": now + CLOSE_JOB_LEASE}}
+        )
+        return True
+    except PyMongoError as e:
+        print(f"Error renewing close job leases: {e}")
+        return False
+
+def get_active_close_job(draw_id: str) -> DrawCloseJob | None:
+    """ The draw's unfinished close job, if any. """
+    try:
+        job_doc = get_close_jobs_collection().find_one({"active_for_draw": draw_id})
+        return _close_job_from_doc(job_doc) if job_doc else None
+    except PyMongoError as e:
+        print(f"Error retrieving the close job of draw {draw_id}: {e}")
+        return None
+
+def get_close_job(job_id: str) -> DrawCloseJob | None:
+    try:
+        if not ObjectId.is_valid(job_id):
+            return None
+        job_doc = get_close_jobs_collection().find_one({"_id": ObjectId(job_id)})
+        return _close_job_from_doc(job_doc) if job_doc else None
+    except PyMongoError as e:
+        print(f"Error retrieving close job {job_id}: {e}")
+        return None
@@ -14,7 +14,10 @@ class Draw(BaseModel):
     actual_close_time: Optional[datetime] = Field(None, description="Actual time draw closed (if different from scheduled)")
 
     participants: List[str] = Field(default_factory=list, description="List of wallet addresses of participants")
-    ledger_hash: Optional[str] = None # Used for raffle winner selection, and as seed for PickN winning numbers
+    ledger_hash: Optional[str] = None # Validated XRPL ledger hash the close used
+    selection_seed: Optional[str] = Field(None, description="Per-draw seed for winner selection, HMAC(ledger_hash, draw id); draws closed before it existed used ledger_hash itself")
+    close_claim: Optional[str] = Field(None, exclude=True, description="Token of the close holding the draw in 'closing'")
+    close_prior_status: Optional[str] = Field(None, exclude=True, description="Status the draw was claimed from, restored if the close is released")
 
     # For Pick N games: stores the generated winning numbers/symbols
     winning_selection: Optional[Dict[str, Any]] = Field(None, description="Drawn winning numbers/symbols, e.g., {'picks': [1,2,3]}")
@@ -29,6 +32,12 @@ class Draw(BaseModel):
     # Prize pool for this specific draw instance
     base_prize_pool: float = Field(default=0.0, ge=0, description="The base prize pool amount for this specific draw instance (category base + category rollover at time of creation).")
 
+    # Frozen ticket snapshot written at close (see draws/snapshots.py)
+    ticket_snapshot_sha256: Optional[str] = Field(None, description="sha256 of the draw's ticket snapshot file, recorded at close")
+    ticket_snapshot_count: Optional[int] = Field(None, description="Number of tickets in the snapshot")
+    ticket_snapshot_host: Optional[str] = Field(None, description="Host that wrote the snapshot file (DRAW_SNAPSHOT_HOST)")
+    ticket_snapshot_path: Optional[str] = Field(None, description="Absolute path of the snapshot file on that host")
+
 
     class Config:
         populate_by_name = True
@@ -102,11 +111,52 @@ class DrawUpdate(BaseModel):
     actual_close_time: Optional[datetime] = None
     participants: Optional[List[str]] = None # Usually updated systemically
     ledger_hash: Optional[str] = None # Still set for raffles, and as seed for PickN
+    selection_seed: Optional[str] = None
     winning_selection: Optional[Dict[str, Any]] = None # For PickN games
     winners_by_tier: Optional[List['PrizeTierWinner']] = None # For all game types supporting tiers
+    ticket_snapshot_sha256: Optional[str] = None # Set at close when the ticket snapshot was written
+    ticket_snapshot_count: Optional[int] = None
+    ticket_snapshot_host: Optional[str] = None
+    ticket_snapshot_path: Optional[str] = None
     # category_id, scheduled times are generally not updated after creation.
     # updated_at will be set in DB layer
 
+# Background close of one draw (POST /api/draws/close/{draw_id}), polled via GET /api/draws/close_jobs/{id}
+class DrawCloseJob(BaseModel):
+    id: Optional[str] = Field(alias='_id', default=None)
+    draw_id: str
+    status: str = "queued" # "queued", "running", "completed", "failed"
+    phase: Optional[str] = Field(None, description="Current step, e.g. 'fetching_ledger', 'selecting_winners', 'gamification'")
+    tickets_scanned: Optional[int] = Field(None, description="Tickets read for winner selection, once known")
+    winners_found: Optional[int] = None
+    error: Optional[str] = None
+    error_status_code: Optional[int] = Field(None, description="HTTP status the synchronous close would have returned")
+    attempts: int = Field(1, description="Runs of the job, counting takeovers after a worker died")
+    lease_expires_at: Optional[datetime] = Field(None, description="While unfinished: when the job may be taken over unless its worker renews the lease")
+    lease_owner: Optional[str] = Field(None, exclude=True)
+    close_claim: Optional[str] = Field(None, exclude=True, description="Claim token the job holds its draw in 'closing' under")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        populate_by_name = True
+
+# Result of POST /api/draws/close_due
+class DrawBatchCloseResult(BaseModel):
+    ledger_hash: Optional[str] = Field(None, description="Validated ledger hash shared by every draw closed in the batch")
+    closed_draw_ids: List[str] = Field(default_factory=list)
+    failed: Dict[str, str] = Field(default_factory=dict, description="draw_id -> error; these draws were put back to 'open'")
+
+# Result of re-running a closed draw's winner selection from its ticket snapshot
+class DrawVerification(BaseModel):
+    draw_id: str
+    verified: bool = Field(..., description="True if the recomputed winners equal the stored winners_by_tier")
+    ticket_snapshot_sha256: str
+    ticket_snapshot_count: int
+    recomputed_winners: List[Dict[str, str]] = Field(default_factory=list, description="[{tier_name, ticket_id, wallet_address}] recomputed from the snapshot")
+    mismatched_ticket_ids: List[str] = Field(default_factory=list, description="Ticket IDs stored as winners but not recomputed, or the reverse")
+
 # Define PrizeTierWinner model here so Draw can reference it.
 class PrizeTierWinner(BaseModel):
     tier_name: str = Field(..., description="Name of the prize tier, matches PrizeTierConfig.tier_name from LotteryCategory")
@@ -121,6 +171,7 @@ class PrizeTierWinner(BaseModel):
     net_prize_payable: Optional[float] = Field(None, ge=0, description="The net prize amount payable to the winner after fees.")
 
     syndicate_win_details: Optional[Dict[str, Any]] = Field(None, description="Details if this win was by a syndicate (e.g., syndicate_id, name, members_count)")
+    selection_score: Optional[str] = Field(None, description="Hex HMAC(selection_seed, ticket_id) for winners of keyed_rank raffles; lower scores won higher tiers")
     # selection_matched: Optional[Any] = Field(None, description="What part of their selection matched, if applicable (e.g., for Pick N games)")
 
 
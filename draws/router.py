@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
-from .models import Draw, DrawCreate, DrawUpdate
+from typing import List, Optional, Dict, Any, Tuple, Callable, Iterable
+from .models import Draw, DrawCreate, DrawUpdate, DrawVerification, DrawBatchCloseResult, DrawCloseJob
 from tickets.db import get_tickets_collection as get_ticket_db_collection
-from rng.utils import calculate_winner_index
+from tickets import db as tickets_db
+from rng.utils import calculate_winner_index, derive_draw_seed, lowest_scoring_tickets, merge_lowest_scoring, RAFFLE_SELECTION_KEYED_RANK
+from tickets.selections import match_counter
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from xrpl.clients import JsonRpcClient
 # TODO: Find correct import for XRPLClientException for xrpl-py==2.4.0 and reinstate
 # from xrpl.clients import XRPLClientException # This was one attempt
@@ -14,7 +17,9 @@ import os
 import logging # Added logging
 
 from . import db as draws_db
-from lottery_categories.db import get_category_by_id as get_category_db_by_id, update_category_rollover # Import added
+from . import snapshots as draw_snapshots
+from . import close_jobs
+from lottery_categories.db import get_category_by_id as get_category_db_by_id, update_category_rollover, get_categories_by_ids # Import added
 from lottery_categories.models import LotteryCategory, PrizeTierConfig
 from .models import PrizeTierWinner
 from syndicates import db as syndicate_db
@@ -22,18 +27,22 @@ from syndicates.models import Syndicate, SyndicateMemberStatus, MemberShare
 from gamification.services import gamification_service # Import gamification service
 from gamification.models import AchievementEventType # Import event types
 from pymongo.errors import PyMongoError
+from metrics.instrumentation import TimedRoute, track_xrpl_call
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 logger = logging.getLogger(__name__) # Added logger
 
 XRPL_RPC_URL = os.environ.get('XRPL_RPC_URL', 'https://s.altnet.rippletest.net:51234/')
+CLOSE_BATCH_WORKERS = int(os.environ.get('CLOSE_BATCH_WORKERS', '4')) # Categories closed concurrently by /close_due
+RAFFLE_RANK_SHARDS = int(os.environ.get('RAFFLE_RANK_SHARDS', '4')) # Ticket ranges a keyed_rank raffle is ranked in concurrently
 
 # (get_latest_ledger_hash_sync remains the same, so not repeated for brevity)
 def get_latest_ledger_hash_sync():
     try:
         client = JsonRpcClient(XRPL_RPC_URL)
         ledger_request = Ledger(ledger_index="validated", transactions=False, expand=False)
-        response = client.request(ledger_request)
+        with track_xrpl_call():
+            response = client.request(ledger_request)
         result = response.result
         if not response.is_successful() or "ledger_hash" not in result:
             error_message = result.get("error_message") or result.get("error") or "Unknown XRPL error"
@@ -51,6 +60,238 @@ def get_latest_ledger_hash_sync():
         raise Exception(f"An unexpected error occurred while fetching ledger hash: {e}")
 
 
+def _pick_n_ticket_matches(draw_id: str, winning_picks: List[Any], min_matches: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Returns [{ticket_id, wallet_address, matches}] for the draw's tickets with at least
+    min_matches winning values, in purchase order.
+    Uses the draw's postings index when it covers every ticket: only the postings of the winning
+    values are merged and only qualifying tickets are read. Otherwise every ticket is scanned and
+    matched on its stored set encoding (see tickets.selections.match_counter).
+    """
+    if min_matches is None:
+        return [] # No match-based tiers, nothing to award
+    if min_matches > 0:
+        match_counts = tickets_db.get_pick_match_counts(draw_id, {int(pick) for pick in winning_picks})
+        if match_counts is not None:
+            qualifying = [seq for seq, matches in match_counts.items() if matches >= min_matches]
+            ticket_docs = tickets_db.get_ticket_docs_by_seqs(draw_id, qualifying)
+            if ticket_docs is not None:
+                return [
+                    {"ticket_id": str(doc["_id"]), "wallet_address": doc["wallet_address"], "matches": match_counts[doc["ticket_seq"]]}
+                    for doc in ticket_docs
+                ]
+        logger.info(f"Postings index unavailable for draw {draw_id}; scanning its tickets.")
+
+    count_matches = match_counter(winning_picks)
+    ticket_matches_info = []
+    for ticket_doc in get_ticket_db_collection().find(
+        {"draw_id": draw_id, "selection_data": {"$exists": True}},
+        {"wallet_address": 1, "selection_data": 1}
+    ):
+        selection_data = ticket_doc.get("selection_data")
+        if selection_data and selection_data.get("picks"):
+            matches = count_matches(selection_data)
+            if matches >= min_matches:
+                ticket_matches_info.append({
+                    "ticket_id": str(ticket_doc["_id"]),
+                    "wallet_address": ticket_doc["wallet_address"],
+                    "matches": matches
+                })
+    return ticket_matches_info
+
+def _snapshot_ticket_matches(snapshot: draw_snapshots.DrawSnapshot, winning_picks: List[Any], min_matches: Optional[int]) -> List[Dict[str, Any]]:
+    """ Same result as _pick_n_ticket_matches, read from the draw's ticket snapshot. """
+    if min_matches is None:
+        return []
+    return [
+        {**snapshot.ticket(row), "matches": matches}
+        for row, matches in snapshot.match_rows(winning_picks, min_matches)
+    ]
+
+def _snapshot_fields(snapshot: Optional[draw_snapshots.DrawSnapshot]) -> Dict[str, Any]:
+    """ The Draw fields recording a snapshot: its checksum, ticket count and where it was written. """
+    if snapshot is None:
+        return {}
+    return {
+        "ticket_snapshot_sha256": snapshot.sha256, "ticket_snapshot_count": len(snapshot),
+        "ticket_snapshot_host": draw_snapshots.SNAPSHOT_HOST, "ticket_snapshot_path": os.path.abspath(snapshot.path),
+    }
+
+def _assign_pick_n_tiers(ticket_matches_info: List[Dict[str, Any]], sorted_tiers: List[PrizeTierConfig]) -> Dict[str, List[Dict]]:
+    """ Places each ticket in the BEST tier it qualifies for. sorted_tiers is by matches_required, descending. """
+    tier_winners: Dict[str, List[Dict]] = {tier.tier_name: [] for tier in sorted_tiers}
+    for ticket_info in ticket_matches_info:
+        for tier_config in sorted_tiers:
+            if ticket_info["matches"] >= tier_config.matches_required:
+                tier_winners[tier_config.tier_name].append({
+                    "wallet_address": ticket_info["wallet_address"],
+                    "ticket_id": ticket_info["ticket_id"],
+                    # prize_amount and is_fixed_prize to be determined by the caller
+                })
+                break # Award only the best tier qualified for
+    return tier_winners
+
+class _TicketDocs:
+    """ Raffle tickets read from Mongo, with the row interface of DrawSnapshot. """
+
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def ticket(self, row: int) -> Dict[str, str]:
+        doc = self._docs[row]
+        return {"ticket_id": str(doc["_id"]), "wallet_address": doc["wallet_address"]}
+
+def _draw_raffle_winners(draw_id: str, seed: str, prize_tiers: List[PrizeTierConfig], tickets) -> List[Tuple[PrizeTierConfig, Dict[str, str]]]:
+    """
+    Draws one ticket per prize tier, in tier order, without replacement. tickets is a
+    DrawSnapshot or _TicketDocs; rows are in purchase order, so both give the same winners.
+    """
+    # Draw from the remaining row numbers, to ensure unique winners per tier
+    drawable_rows = list(range(len(tickets)))
+    picked_ticket_ids_for_draw = set()
+    winners: List[Tuple[PrizeTierConfig, Dict[str, str]]] = []
+
+    for tier_config in prize_tiers:
+        if not drawable_rows:
+            logger.info(f"No more drawable tickets for tier {tier_config.tier_name} in draw {draw_id}")
+            break
+
+        # Determine number of winners for THIS tier.
+        # For typical raffles, this is 1 winner per tier_config entry.
+        # If a tier_config could specify multiple winners for that single tier (e.g. 5 winners for "Tier 3"),
+        # this loop would need to run multiple times for this tier_config.
+        # For now, assume 1 winner per tier_config object.
+
+        # Vary seed per tier/pick to ensure different outcomes if multiple winners are picked from the same list
+        # Using tier_name and number of already picked winners to ensure unique seed component.
+        current_pick_seed_modifier = f"{tier_config.tier_name}_{len(picked_ticket_ids_for_draw)}"
+        winner_idx = calculate_winner_index(f"{seed}_{current_pick_seed_modifier}", len(drawable_rows))
+
+        selected_winner_ticket_info = tickets.ticket(drawable_rows.pop(winner_idx))
+
+        # The pop ensures this ticket won't be drawn again for subsequent tiers.
+        # picked_ticket_ids_for_draw ensures a ticket doesn't win twice if somehow drawable_rows wasn't managed perfectly (defensive).
+        if selected_winner_ticket_info["ticket_id"] in picked_ticket_ids_for_draw:
+            logger.warning(f"Ticket {selected_winner_ticket_info['ticket_id']} was already picked. This indicates an issue. Skipping for tier {tier_config.tier_name}.")
+            continue
+
+        picked_ticket_ids_for_draw.add(selected_winner_ticket_info["ticket_id"])
+        winners.append((tier_config, selected_winner_ticket_info))
+    return winners
+
+def _keyed_rank_shards(draw_id: str, snapshot: Optional[draw_snapshots.DrawSnapshot], shards: int) -> List[Iterable[Tuple[str, str]]]:
+    """
+    The draw's (ticket_id, wallet_address) pairs split into `shards` disjoint ranges of snapshot rows, or
+    of ticket_seq over the (draw_id, ticket_seq) index plus one range for tickets without a seq.
+    """
+    if snapshot is not None:
+        size = max(1, -(-len(snapshot) // shards)) # ceil division
+        return [snapshot.iter_tickets(start, start + size) for start in range(0, len(snapshot), size)]
+    collection = get_ticket_db_collection()
+    projection = {"_id": 1, "wallet_address": 1}
+    filters: List[Dict[str, Any]] = [{"draw_id": draw_id, "ticket_seq": None}] # Missing or null
+    last = collection.find_one({"draw_id": draw_id}, {"ticket_seq": 1}, sort=[("ticket_seq", -1)])
+    if last and last.get("ticket_seq") is not None:
+        size = max(1, -(-(last["ticket_seq"] + 1) // shards))
+        filters.extend({"draw_id": draw_id, "ticket_seq": {"$gte": low, "$lt": low + size}} for low in range(0, last["ticket_seq"] + 1, size))
+    return [((str(doc["_id"]), doc["wallet_address"]) for doc in collection.find(query, projection)) for query in filters]
+
+def _select_raffle_winners(draw_id: str, seed: str, category: LotteryCategory, snapshot: Optional[draw_snapshots.DrawSnapshot]) -> List[Tuple[PrizeTierConfig, Dict[str, str]]]:
+    """
+    Raffle winners per tier, from the draw's snapshot when there is one, else from the tickets collection.
+    With game_config selection_mode 'keyed_rank' the tickets with the lowest HMAC(seed, ticket_id)
+    win, lowest first; otherwise tickets are drawn per tier with calculate_winner_index.
+    """
+    if (category.game_config or {}).get("selection_mode") == RAFFLE_SELECTION_KEYED_RANK:
+        # Each ticket is scored on its own, so every range is streamed on a pool keeping only its
+        # best k, and the per-range results are merged into the overall k lowest
+        k = len(category.prize_tiers)
+        shards = _keyed_rank_shards(draw_id, snapshot, RAFFLE_RANK_SHARDS)
+        with ThreadPoolExecutor(max_workers=max(1, min(RAFFLE_RANK_SHARDS, len(shards)))) as pool:
+            ranked = merge_lowest_scoring(pool.map(lambda tickets: lowest_scoring_tickets(seed, tickets, k), shards), k)
+        return [
+            (tier_config, {"ticket_id": ticket_id, "wallet_address": wallet_address, "selection_score": score.hex()})
+            for tier_config, (score, ticket_id, wallet_address) in zip(category.prize_tiers, ranked)
+        ]
+
+    # Draw from all tickets of the draw, not just distinct participants, as tickets are unique entries.
+    if snapshot is not None:
+        raffle_tickets = snapshot
+    else:
+        raffle_tickets = _TicketDocs(list(get_ticket_db_collection().find(
+            {"draw_id": draw_id},
+            {"_id": 1, "wallet_address": 1} # Get ID and wallet address
+        )))
+    return _draw_raffle_winners(draw_id, seed, category.prize_tiers, raffle_tickets)
+
+def _sorted_match_tiers(prize_tiers: List[PrizeTierConfig]) -> List[PrizeTierConfig]:
+    # Sort tiers by matches_required descending (or by prize amount) to award best tier first
+    return sorted(
+        [tier for tier in prize_tiers if tier.matches_required is not None],
+        key=lambda t: t.matches_required,
+        reverse=True
+    )
+
+def _apply_syndicate_wins(draw_id: str, winners: List[Dict[str, Any]]) -> None:
+    """
+    Splits each syndicate-owned winning ticket's net prize among the syndicate's active
+    members, records the winnings and adds 'syndicate_win_details' to the winner dict.
+    Purchases and syndicates are fetched with one query each, however many winners there are.
+    """
+    if not winners:
+        return
+    purchases_by_ticket = syndicate_db.get_syndicate_purchases_for_tickets(
+        [w["ticket_id"] for w in winners], draw_id
+    )
+    if not purchases_by_ticket:
+        return
+    syndicates_by_id = syndicate_db.get_syndicates_by_ids(
+        [purchase.syndicate_id for purchase in purchases_by_ticket.values()]
+    )
+
+    for winner in winners:
+        syndicate_purchase = purchases_by_ticket.get(winner["ticket_id"])
+        if not syndicate_purchase:
+            continue
+        syndicate = syndicates_by_id.get(syndicate_purchase.syndicate_id)
+        if not syndicate:
+            continue
+        active_members = [m for m in syndicate.members if m.status == SyndicateMemberStatus.ACTIVE]
+        if not active_members:
+            continue
+
+        net_prize_for_distribution = winner["net_prize_payable"]
+        share_per_member = round(net_prize_for_distribution / len(active_members), 2)
+        member_shares: List[MemberShare] = [
+            MemberShare(wallet_address=member.wallet_address, nickname=member.nickname, share_of_winnings=share_per_member)
+            for member in active_members
+        ]
+        # Adjust last member's share for any rounding differences
+        total_distributed = sum(ms.share_of_winnings for ms in member_shares)
+        if abs(total_distributed - net_prize_for_distribution) > 0.001: # tolerance for float issues
+            member_shares[-1].share_of_winnings += (net_prize_for_distribution - total_distributed)
+            member_shares[-1].share_of_winnings = round(member_shares[-1].share_of_winnings, 2)
+
+        syndicate_db.record_syndicate_winnings(
+            syndicate_id=syndicate.id,
+            draw_id=draw_id,
+            winning_ticket_id=winner["ticket_id"],
+            total_gross=winner["prize_amount_calculated"],
+            fee_charged=winner["fee_amount_charged"],
+            total_net=net_prize_for_distribution,
+            member_distributions=member_shares
+        )
+        logger.info(f"Syndicate {syndicate.id} won with ticket {winner['ticket_id']}. Prize distributed among {len(active_members)} members.")
+        winner["syndicate_win_details"] = {
+            "syndicate_id": syndicate.id,
+            "syndicate_name": syndicate.name,
+            "distributed_to_members": len(active_members)
+        }
+
+
 # This endpoint is to manually trigger opening of due "pending_open" draws.
 # In a full system, a background scheduler would do this.
 @router.post("/process_pending_draws", summary="Manually trigger processing of pending draws to open them if due.")
@@ -129,8 +370,23 @@ def get_current_open_draws_for_category_endpoint(category_id: str):
         raise HTTPException(status_code=500, detail=f"An unexpected error: {str(e)}")
 
 
-@router.post('/close/{draw_id}', response_model=Draw, summary="Close an open draw and select a winner")
-def close_draw_endpoint(draw_id: str):
+def _no_progress(phase: str, **counters: Any) -> None:
+    pass
+
+def close_draw(draw_id: str, ledger_hash: Optional[str] = None, category: Optional[LotteryCategory] = None, claim: Optional[str] = None,
+               progress: Optional[Callable[..., None]] = None) -> Draw:
+    """
+    Closes a draw: selects its winners, records them and schedules the category's next draw.
+    The draw is first moved to 'closing' under a claim, so only one close does the work; the
+    result is only recorded while that claim holds. A batch close passes the ledger_hash and
+    category it prefetched for all of its draws, and the claim token it moved them to 'closing'
+    under. A close job passes progress(phase, **counters) to record each step.
+    Winners are selected with derive_draw_seed(ledger_hash, draw_id). Raises HTTPException on failure.
+    """
+    report = progress or _no_progress
+    snapshot: Optional[draw_snapshots.DrawSnapshot] = None
+    own_claim: Optional[str] = None
+    recorded = False
     try:
         draw = draws_db.get_draw_by_id(draw_id)
         if not draw:
@@ -139,10 +395,18 @@ def close_draw_endpoint(draw_id: str):
         now = datetime.utcnow()
         if draw.status == "completed" or draw.status == "closed": # Already processed
              return draw # Or raise error if trying to re-close
-        if draw.status != "open" and draw.scheduled_close_time > now : # Not yet open or past close time
+        if draw.status not in ("open", "closing") and draw.scheduled_close_time > now : # Not yet open or past close time
             raise HTTPException(status_code=400, detail=f"Draw {draw_id} is not yet ready to be closed or is not in 'open' state. Status: {draw.status}, Scheduled Close: {draw.scheduled_close_time}")
+        if claim is None:
+            own_claim = claim = draws_db.claim_draw_for_close(draw.id, now)
+            if claim is None:
+                current_state = draws_db.get_draw_by_id(draw.id)
+                if current_state and current_state.status in ("completed", "closed"):
+                    return current_state # Closed by a concurrent close
+                raise HTTPException(status_code=409, detail=f"Draw {draw_id} is being closed by another close.")
 
         # Fetch participants from the tickets collection for this draw_id
+        report("loading_participants")
         ticket_collection = get_ticket_db_collection()
         # Ensure draw.id is string, which it should be from Pydantic model
         participants = list(ticket_collection.distinct("wallet_address", {"draw_id": draw.id}))
@@ -158,14 +422,33 @@ def close_draw_endpoint(draw_id: str):
             )
         else:
             # Participants exist, proceed based on game type
-            category = get_category_db_by_id(draw.category_id)
+            if category is None or category.id != draw.category_id:
+                category = get_category_db_by_id(draw.category_id)
             if not category:
                 raise HTTPException(status_code=500, detail=f"Category {draw.category_id} for draw {draw.id} not found during closing.")
 
-            ledger_hash = get_latest_ledger_hash_sync() # Used for both raffle and as seed for PickN
+            if ledger_hash is None:
+                report("fetching_ledger")
+                ledger_hash = get_latest_ledger_hash_sync()
+            # One ledger hash can serve many draws (a /close_due batch), so each draw gets its own seed
+            seed = derive_draw_seed(ledger_hash, draw.id)
+
+            # Freeze the draw's tickets into a snapshot file, the audit artifact /verify re-reads.
+            # Raffles draw from it, as they need every ticket anyway; if it can't be written, they
+            # draw from Mongo as before. Pick-N winners come from the postings index without reading
+            # the other tickets, so their snapshot is only written once the result is recorded.
+            snapshot_fields: Dict[str, Any] = {}
+            if category.game_type == "raffle":
+                report("snapshotting_tickets")
+                snapshot = draw_snapshots.export_draw_snapshot(draw.id, category.game_type)
+                snapshot_fields = _snapshot_fields(snapshot)
+            if snapshot is not None:
+                report("selecting_winners", tickets_scanned=len(snapshot))
+            else:
+                report("selecting_winners")
 
             if category.game_type == "raffle":
-                winner_idx = calculate_winner_index(ledger_hash, len(participants))
+                winner_idx = calculate_winner_index(seed, len(participants))
                 # In a raffle, participants are wallet addresses. We need to find which ticket won.
                 # This is a simplification: a raffle usually picks one ticket ID, not one participant.
                 # For now, let's assume the participant IS the winner.
@@ -182,13 +465,9 @@ def close_draw_endpoint(draw_id: str):
                 # --- Updated Raffle Logic for Tiers ---
                 winners_for_final_payload: List[Dict[str, Any]] = []
 
-                # Fetch all tickets for the draw, not just distinct participants, as tickets are unique entries.
-                all_raffle_ticket_docs = list(ticket_collection.find(
-                    {"draw_id": draw.id},
-                    {"_id": 1, "wallet_address": 1} # Get ID and wallet address
-                ))
+                raffle_winners = _select_raffle_winners(draw.id, seed, category, snapshot)
 
-                if not all_raffle_ticket_docs:
+                if not raffle_winners:
                     # No tickets sold for the raffle, complete draw with no winners
                     # participants list would be empty, so this is covered by the initial check.
                     # However, if participants list is NOT empty but all_raffle_ticket_docs IS empty (data inconsistency),
@@ -196,44 +475,11 @@ def close_draw_endpoint(draw_id: str):
                     # The initial `if not participants:` check should handle this.
                     # For safety, we can ensure winners_by_tier is empty.
                     logger.info(f"No tickets found for raffle draw {draw.id}, though participants list was not empty. Setting no winners.")
-                    update_payload = DrawUpdate(status='completed', winners_by_tier=[], participants=participants, actual_close_time=now, ledger_hash=ledger_hash)
+                    update_payload = DrawUpdate(status='completed', winners_by_tier=[], participants=participants, actual_close_time=now, ledger_hash=ledger_hash, selection_seed=seed, **snapshot_fields)
 
                 else:
-                    # Use a copy of tickets to draw from, to ensure unique winners per tier
-                    drawable_tickets = [
-                        {"ticket_id": str(t["_id"]), "wallet_address": t["wallet_address"]}
-                        for t in all_raffle_ticket_docs
-                    ]
-
-                    picked_ticket_ids_for_draw = set()
-
                     # Assuming category.prize_tiers is already sorted in the desired order of awarding (e.g., highest prize first)
-                    for tier_config in category.prize_tiers:
-                        if not drawable_tickets:
-                            logger.info(f"No more drawable tickets for tier {tier_config.tier_name} in draw {draw.id}")
-                            break
-
-                        # Determine number of winners for THIS tier.
-                        # For typical raffles, this is 1 winner per tier_config entry.
-                        # If a tier_config could specify multiple winners for that single tier (e.g. 5 winners for "Tier 3"),
-                        # this loop would need to run multiple times for this tier_config.
-                        # For now, assume 1 winner per tier_config object.
-
-                        # Vary seed per tier/pick to ensure different outcomes if multiple winners are picked from the same list
-                        # Using tier_name and number of already picked winners to ensure unique seed component.
-                        current_pick_seed_modifier = f"{tier_config.tier_name}_{len(picked_ticket_ids_for_draw)}"
-                        winner_idx = calculate_winner_index(f"{ledger_hash}_{current_pick_seed_modifier}", len(drawable_tickets))
-
-                        selected_winner_ticket_info = drawable_tickets.pop(winner_idx)
-
-                        # The pop ensures this ticket won't be drawn again for subsequent tiers.
-                        # picked_ticket_ids_for_draw ensures a ticket doesn't win twice if somehow drawable_tickets wasn't managed perfectly (defensive).
-                        if selected_winner_ticket_info["ticket_id"] in picked_ticket_ids_for_draw:
-                             logger.warning(f"Ticket {selected_winner_ticket_info['ticket_id']} was already picked. This indicates an issue. Skipping for tier {tier_config.tier_name}.")
-                             continue
-
-                        picked_ticket_ids_for_draw.add(selected_winner_ticket_info["ticket_id"])
-
+                    for tier_config, selected_winner_ticket_info in raffle_winners:
                         prize_amount_for_tier_winner: float
                         is_fixed = False
                         if tier_config.fixed_prize_amount is not None:
@@ -249,65 +495,29 @@ def close_draw_endpoint(draw_id: str):
                             logger.error(f"Raffle Tier {tier_config.tier_name} in category {category.id} has neither fixed nor percentage prize. Skipping.")
                             continue
 
-                        winners_for_final_payload.append({
+                        winner_dict_for_payload = {
                             "tier_name": tier_config.tier_name,
                             "wallet_address": selected_winner_ticket_info["wallet_address"],
                             "ticket_id": selected_winner_ticket_info["ticket_id"],
                             "prize_amount_calculated": round(prize_amount_for_tier_winner, 2),
                             "is_fixed_prize": is_fixed,
                             "fee_amount_charged": round((prize_amount_for_tier_winner * category.winner_fee_percentage / 100.0), 2),
-                            "net_prize_payable": round(prize_amount_for_tier_winner * (1 - category.winner_fee_percentage / 100.0), 2)
+                            "net_prize_payable": round(prize_amount_for_tier_winner * (1 - category.winner_fee_percentage / 100.0), 2),
+                            "selection_score": selected_winner_ticket_info.get("selection_score")
                         }
 
-                        # --- Syndicate Winning Logic ---
-                        syndicate_purchase = syndicate_db.get_syndicate_purchase_for_ticket(
-                            ticket_id=selected_winner_ticket_info["ticket_id"],
-                            draw_id=draw.id
-                        )
-                        if syndicate_purchase:
-                            syndicate = syndicate_db.get_syndicate_by_id(syndicate_purchase.syndicate_id)
-                            if syndicate:
-                                active_members = [m for m in syndicate.members if m.status == SyndicateMemberStatus.ACTIVE]
-                                if active_members:
-                                    net_prize_for_distribution = winner_dict_for_payload["net_prize_payable"]
-                                    share_per_member = round(net_prize_for_distribution / len(active_members), 2)
-                                    member_shares: List[MemberShare] = []
-                                    for member_ac in active_members: # Renamed to avoid conflict
-                                        member_shares.append(MemberShare(
-                                            wallet_address=member_ac.wallet_address,
-                                            nickname=member_ac.nickname,
-                                            share_of_winnings=share_per_member
-                                        ))
-
-                                    total_distributed = sum(ms.share_of_winnings for ms in member_shares)
-                                    if member_shares and abs(total_distributed - net_prize_for_distribution) > 0.001:
-                                        member_shares[-1].share_of_winnings += (net_prize_for_distribution - total_distributed)
-                                        member_shares[-1].share_of_winnings = round(member_shares[-1].share_of_winnings, 2)
-
-                                    syndicate_db.record_syndicate_winnings(
-                                        syndicate_id=syndicate.id,
-                                        draw_id=draw.id,
-                                        winning_ticket_id=selected_winner_ticket_info["ticket_id"],
-                                        total_gross=winner_dict_for_payload["prize_amount_calculated"],
-                                        fee_charged=winner_dict_for_payload["fee_amount_charged"],
-                                        total_net=net_prize_for_distribution,
-                                        member_distributions=member_shares
-                                    )
-                                    logger.info(f"Syndicate {syndicate.id} won with ticket {selected_winner_ticket_info['ticket_id']}. Prize distributed among {len(active_members)} members.")
-                                    winner_dict_for_payload["syndicate_win_details"] = {
-                                        "syndicate_id": syndicate.id,
-                                        "syndicate_name": syndicate.name,
-                                        "distributed_to_members": len(active_members)
-                                    }
-                        # --- End Syndicate Winning Logic ---
                         winners_for_final_payload.append(winner_dict_for_payload)
 
+                    report("paying_syndicates", winners_found=len(winners_for_final_payload))
+                    _apply_syndicate_wins(draw.id, winners_for_final_payload)
                     update_payload = DrawUpdate(
                         status='completed',
                         ledger_hash=ledger_hash,
+                        selection_seed=seed,
                         winners_by_tier=winners_for_final_payload,
                         participants=participants,
-                        actual_close_time=now
+                        actual_close_time=now,
+                        **snapshot_fields
                     )
             elif category.game_type == "pick_n_digits":
                 # 1. Generate winning numbers using the proper RNG utility
@@ -318,63 +528,24 @@ def close_draw_endpoint(draw_id: str):
                 from rng.utils import generate_winning_picks # Moved import here for clarity
 
                 try:
-                    winning_numbers_list = generate_winning_picks(seed=ledger_hash, game_config=category.game_config)
+                    winning_numbers_list = generate_winning_picks(seed=seed, game_config=category.game_config)
                 except ValueError as e:
                     raise HTTPException(status_code=500, detail=f"Error generating winning numbers: {str(e)}")
 
                 current_winning_selection = {"picks": winning_numbers_list}
                 processed_winners_by_tier: List[PrizeTierWinner] = []
 
-                # Fetch all tickets for this draw that have selection_data
-                # And group them by number of matches for efficiency if possible, or iterate
-                # For now, iterate and check each tier.
-
-                all_draw_tickets_cursor = ticket_collection.find({"draw_id": draw.id, "selection_data": {"$exists": True}})
-
-                # Collect all tickets to allow multiple checks if a ticket wins in multiple (lower) tiers (if rules allow)
-                # Or, more commonly, a ticket wins in the highest possible tier it qualifies for.
-                # Let's assume a ticket wins in the BEST tier it qualifies for.
-
-                # Pre-calculate matches for each ticket
-                ticket_matches_info = []
-                for ticket_doc in all_draw_tickets_cursor:
-                    user_picks = ticket_doc.get("selection_data", {}).get("picks")
-                    if user_picks:
-                        # Count matches (order might matter or not based on game_config)
-                        # Assuming order doesn't matter and picks are unique in winning_numbers_list for simplicity here.
-                        # A more robust match count would depend on game_config (e.g., allow_duplicates in user_picks vs winning_numbers)
-                        matches = len(set(user_picks) & set(winning_numbers_list))
-                        ticket_matches_info.append({
-                            "ticket_id": str(ticket_doc["_id"]),
-                            "wallet_address": ticket_doc["wallet_address"],
-                            "matches": matches
-                        })
-
-                # Sort tiers by matches_required descending (or by prize amount) to award best tier first
-                sorted_tiers = sorted(
-                    [tier for tier in category.prize_tiers if tier.matches_required is not None],
-                    key=lambda t: t.matches_required,
-                    reverse=True
-                )
-
-                winners_for_final_payload: List[Dict[str, Any]] = [] # To build PrizeTierWinner later
-
-                # This list will store tuples of (tier_name, wallet_address, ticket_id, prize_amount, is_fixed)
-                # This is a temporary list to hold potential winners before splitting prize pool for percentage tiers
-                tier_winners_intermediate: Dict[str, List[Dict]] = {tier.tier_name: [] for tier in sorted_tiers}
+                sorted_tiers = _sorted_match_tiers(category.prize_tiers)
 
+                # A ticket wins in the BEST tier it qualifies for, so only tickets reaching the
+                # lowest tier's matches_required are needed.
+                min_matches = min((t.matches_required for t in sorted_tiers), default=None)
+                ticket_matches_info = _pick_n_ticket_matches(draw.id, winning_numbers_list, min_matches)
 
-                for ticket_info in ticket_matches_info:
-                    for tier_config in sorted_tiers:
-                        if ticket_info["matches"] >= tier_config.matches_required:
-                            # This ticket qualifies for this tier. Add to intermediate list for this tier.
-                            tier_winners_intermediate[tier_config.tier_name].append({
-                                "wallet_address": ticket_info["wallet_address"],
-                                "ticket_id": ticket_info["ticket_id"],
-                                # prize_amount and is_fixed_prize to be determined next
-                            })
-                            break # Award only the best tier qualified for
+                winners_for_final_payload: List[Dict[str, Any]] = [] # To build PrizeTierWinner later
 
+                # Potential winners per tier, before splitting the prize pool for percentage tiers
+                tier_winners_intermediate = _assign_pick_n_tiers(ticket_matches_info, sorted_tiers)
 
                 # Calculate prize amounts and populate processed_winners_by_tier
                 for tier_config in category.prize_tiers: # Iterate in original order or sorted by value
@@ -401,7 +572,7 @@ def close_draw_endpoint(draw_id: str):
                         continue
 
                     for winner_data in winners_in_this_tier:
-                        winners_for_final_payload.append({
+                        winner_dict_for_payload = {
                             "tier_name": tier_config.tier_name,
                             "wallet_address": winner_data["wallet_address"],
                             "ticket_id": winner_data["ticket_id"],
@@ -411,75 +582,46 @@ def close_draw_endpoint(draw_id: str):
                             "net_prize_payable": round(prize_amount_for_tier_winner * (1 - category.winner_fee_percentage / 100.0), 2)
                         }
 
-                        # --- Syndicate Winning Logic ---
-                        syndicate_purchase = syndicate_db.get_syndicate_purchase_for_ticket(
-                            ticket_id=winner_data["ticket_id"],
-                            draw_id=draw.id
-                        )
-                        if syndicate_purchase:
-                            syndicate = syndicate_db.get_syndicate_by_id(syndicate_purchase.syndicate_id)
-                            if syndicate:
-                                active_members = [m for m in syndicate.members if m.status == SyndicateMemberStatus.ACTIVE]
-                                if active_members:
-                                    net_prize_for_distribution = winner_dict_for_payload["net_prize_payable"]
-                                    share_per_member = round(net_prize_for_distribution / len(active_members), 2)
-                                    member_shares: List[MemberShare] = []
-                                    for member in active_members:
-                                        member_shares.append(MemberShare(
-                                            wallet_address=member.wallet_address,
-                                            nickname=member.nickname,
-                                            share_of_winnings=share_per_member
-                                        ))
-
-                                    # Adjust last member's share for any rounding differences
-                                    total_distributed = sum(ms.share_of_winnings for ms in member_shares)
-                                    if member_shares and abs(total_distributed - net_prize_for_distribution) > 0.001: # tolerance for float issues
-                                        member_shares[-1].share_of_winnings += (net_prize_for_distribution - total_distributed)
-                                        member_shares[-1].share_of_winnings = round(member_shares[-1].share_of_winnings, 2)
-
-                                    syndicate_db.record_syndicate_winnings(
-                                        syndicate_id=syndicate.id,
-                                        draw_id=draw.id,
-                                        winning_ticket_id=winner_data["ticket_id"],
-                                        total_gross=winner_dict_for_payload["prize_amount_calculated"],
-                                        fee_charged=winner_dict_for_payload["fee_amount_charged"],
-                                        total_net=net_prize_for_distribution,
-                                        member_distributions=member_shares
-                                    )
-                                    logger.info(f"Syndicate {syndicate.id} won with ticket {winner_data['ticket_id']}. Prize distributed among {len(active_members)} members.")
-                                    # Add a note to the main winner payload or handle as per display requirements
-                                    winner_dict_for_payload["syndicate_win_details"] = {
-                                        "syndicate_id": syndicate.id,
-                                        "syndicate_name": syndicate.name,
-                                        "distributed_to_members": len(active_members)
-                                    }
-                        # --- End Syndicate Winning Logic ---
                         winners_for_final_payload.append(winner_dict_for_payload)
 
+                report("paying_syndicates", winners_found=len(winners_for_final_payload))
+                _apply_syndicate_wins(draw.id, winners_for_final_payload)
                 update_payload = DrawUpdate(
                     status='completed',
                     ledger_hash=ledger_hash,
+                    selection_seed=seed,
                     winning_selection=current_winning_selection,
                     winners_by_tier=winners_for_final_payload, # This will be list of dicts, Pydantic handles conversion
                     participants=participants,
-                    actual_close_time=now
+                    actual_close_time=now,
+                    **snapshot_fields
                 )
             else:
                 raise HTTPException(status_code=500, detail=f"Unsupported game_type '{category.game_type}' for closing draw.")
 
-        success = draws_db.update_draw(draw.id, update_payload)
+        report("recording_results", winners_found=len(update_payload.winners_by_tier or []))
+        success = draws_db.update_draw(draw.id, update_payload, close_claim=claim)
+        recorded = success
         if not success:
-            # Check if already updated by a concurrent request
+            # Check if already updated by a concurrent close that took over an expired claim
             current_state = draws_db.get_draw_by_id(draw.id)
             if current_state and current_state.status == "completed":
                 return current_state
             raise HTTPException(status_code=500, detail="Failed to update draw status to completed.")
+        if participants and category.game_type == "pick_n_digits":
+            tickets_db.drop_pick_postings(draw.id) # The index only serves open draws
+            # The draw is completed, so no ticket can be added to it any more
+            report("snapshotting_tickets")
+            snapshot = draw_snapshots.export_draw_snapshot(draw.id, category.game_type)
+            if snapshot is not None:
+                draws_db.update_draw(draw.id, DrawUpdate(**_snapshot_fields(snapshot)))
 
         closed_draw = draws_db.get_draw_by_id(draw.id)
         if not closed_draw: # Should not happen
             raise HTTPException(status_code=500, detail="Failed to retrieve draw after closing.")
 
         # After closing, try to create the next draw for this category if rule applies
+        report("scheduling_next_draw")
         category = get_category_db_by_id(closed_draw.category_id)
         if category and category.is_active and category.draw_interval_type != "manual":
             # Schedule next draw starting after the current one closes
@@ -500,6 +642,7 @@ def close_draw_endpoint(draw_id: str):
                 print(f"Unexpected error creating next draw for category {category.name}: {e_next_draw}")
 
         # --- Progressive Jackpot Logic ---
+        report("updating_rollover")
         # This happens after the draw is successfully closed and winners (if any) are determined.
         # We need the 'category' object again, and the 'winners_for_final_payload' (or equivalent from 'closed_draw').
         if category: # Ensure category was fetched successfully earlier
@@ -557,24 +700,26 @@ def close_draw_endpoint(draw_id: str):
         # --- End Progressive Jackpot Logic ---
 
         # --- Gamification Event: Draw Win ---
+        report("gamification")
         if closed_draw and closed_draw.winners_by_tier:
-            for winner_info in closed_draw.winners_by_tier:
-                try:
-                    event_data_draw_win = {
-                        "prize_amount": winner_info.net_prize_payable or 0.0, # Use net payable
-                        "tier_name": winner_info.tier_name,
-                        "category_id": closed_draw.category_id,
-                        "draw_id": closed_draw.id
-                        # "is_syndicate_win": bool(winner_info.syndicate_win_details) # If needed
-                    }
-                    # Event is for the wallet address recorded as the winner of the tier
-                    gamification_service.process_event(
-                        user_wallet_address=winner_info.wallet_address,
-                        event_type=AchievementEventType.DRAW_WIN,
-                        event_data=event_data_draw_win
+            # One batch for all winners: a Pick-N draw can have tens of thousands
+            try:
+                gamification_service.process_events_batch([
+                    (
+                        winner_info.wallet_address, # Event is for the wallet address recorded as the winner of the tier
+                        AchievementEventType.DRAW_WIN,
+                        {
+                            "prize_amount": winner_info.net_prize_payable or 0.0, # Use net payable
+                            "tier_name": winner_info.tier_name,
+                            "category_id": closed_draw.category_id,
+                            "draw_id": closed_draw.id
+                            # "is_syndicate_win": bool(winner_info.syndicate_win_details) # If needed
+                        }
                     )
-                except Exception as e_gami_win:
-                    logger.error(f"Error processing gamification event for draw win for wallet {winner_info.wallet_address}: {e_gami_win}")
+                    for winner_info in closed_draw.winners_by_tier
+                ])
+            except Exception as e_gami_win:
+                logger.error(f"Error processing gamification events for the {len(closed_draw.winners_by_tier)} winners of draw {closed_draw.id}: {e_gami_win}")
         # --- End Gamification Event ---
 
         return closed_draw
@@ -588,6 +733,147 @@ def close_draw_endpoint(draw_id: str):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+    finally:
+        if own_claim is not None and not recorded:
+            draws_db.release_draw_claim(draw_id, own_claim)
+        if snapshot is not None:
+            snapshot.close()
+
+
+@router.post('/close/{draw_id}', response_model=DrawCloseJob, status_code=202, summary="Queue a background close of a draw")
+def close_draw_endpoint(draw_id: str):
+    """
+    Queues the close on the close-job worker pool and returns the job at once; poll
+    GET /api/draws/close_jobs/{job_id} for its phase and progress. A draw that already has an
+    unfinished close job gets that job back instead of a second one, or, if the job's worker
+    died, the job taken over and requeued here.
+    """
+    draw = draws_db.get_draw_by_id(draw_id)
+    if not draw:
+        raise HTTPException(status_code=404, detail=f"Draw with id {draw_id} not found.")
+    if draw.status == "closing" and draws_db.get_active_close_job(draw.id) is None:
+        raise HTTPException(status_code=409, detail=f"Draw {draw_id} is being closed by a batch close.")
+    queued = draws_db.create_close_job(draw.id, close_jobs.WORKER_ID)
+    if queued is None:
+        raise HTTPException(status_code=500, detail=f"Failed to queue a close job for draw {draw_id}.")
+    job, created = queued
+    if created:
+        close_jobs.submit_close_job(job.id, draw.id, close_draw)
+    return job
+
+
+@router.get('/close_jobs/{job_id}', response_model=DrawCloseJob, summary="Get the status and progress of a draw close job")
+def get_close_job_endpoint(job_id: str):
+    job = draws_db.get_close_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Close job {job_id} not found.")
+    return job
+
+
+@router.post('/close_due', response_model=DrawBatchCloseResult, summary="Close every draw that is due, with one ledger hash for the batch")
+def close_due_draws_endpoint(limit: int = Query(500, ge=1, le=5000, description="Maximum number of draws to close in this batch.")):
+    """
+    Claims every due draw, fetches one validated ledger hash and the draws' categories (one $in
+    query) for the whole batch, then closes the draws in a thread pool. Draws of the same category
+    close one after another in one task, as closing updates the category's rollover.
+    Draws that fail to close are put back to 'open' and listed in 'failed'.
+    """
+    claimed = draws_db.claim_due_draws(datetime.utcnow(), limit)
+    if not claimed:
+        return DrawBatchCloseResult()
+
+    try:
+        ledger_hash = get_latest_ledger_hash_sync()
+    except Exception as e:
+        for draw in claimed:
+            draws_db.release_draw_claim(draw.id, draw.close_claim)
+        raise HTTPException(status_code=502, detail=f"Could not fetch a validated ledger hash: {str(e)}")
+    categories = get_categories_by_ids([draw.category_id for draw in claimed])
+
+    draws_by_category: Dict[str, List[Draw]] = {}
+    for draw in claimed:
+        draws_by_category.setdefault(draw.category_id, []).append(draw)
+
+    def close_category_draws(draws: List[Draw]) -> List[Tuple[str, Optional[str]]]:
+        results = []
+        for draw in draws:
+            try:
+                close_draw(draw.id, ledger_hash=ledger_hash, category=categories.get(draw.category_id), claim=draw.close_claim)
+                results.append((draw.id, None))
+            except HTTPException as e:
+                logger.error(f"Batch close of draw {draw.id} failed: {e.detail}")
+                draws_db.release_draw_claim(draw.id, draw.close_claim)
+                results.append((draw.id, str(e.detail)))
+        return results
+
+    result = DrawBatchCloseResult(ledger_hash=ledger_hash)
+    with ThreadPoolExecutor(max_workers=max(1, min(CLOSE_BATCH_WORKERS, len(draws_by_category)))) as pool:
+        for results in pool.map(close_category_draws, draws_by_category.values()):
+            for draw_id, error in results:
+                if error is None:
+                    result.closed_draw_ids.append(draw_id)
+                else:
+                    result.failed[draw_id] = error
+    return result
+
+
+@router.get('/{draw_id}/verify', response_model=DrawVerification, summary="Recompute a closed draw's winners from its ticket snapshot")
+def verify_draw_endpoint(draw_id: str):
+    """
+    Re-runs winner selection for a completed draw from its frozen ticket snapshot and the
+    recorded ledger hash, and compares the result with the stored winners_by_tier.
+    Reads only the snapshot file (checked against its recorded sha256), not the tickets collection.
+    """
+    try:
+        draw = draws_db.get_draw_by_id(draw_id)
+        if not draw:
+            raise HTTPException(status_code=404, detail=f"Draw with id {draw_id} not found.")
+        if draw.status != "completed" or not draw.ticket_snapshot_sha256 or not draw.ledger_hash:
+            raise HTTPException(status_code=409, detail=f"Draw {draw_id} has no ticket snapshot to verify against.")
+        category = get_category_db_by_id(draw.category_id)
+        if not category:
+            raise HTTPException(status_code=404, detail=f"Category {draw.category_id} for draw {draw_id} not found.")
+
+        try:
+            snapshot = draw_snapshots.open_draw_snapshot(draw.id, draw.ticket_snapshot_sha256, draw.ticket_snapshot_path, draw.ticket_snapshot_host)
+        except draw_snapshots.SnapshotError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+        seed = draw.selection_seed or draw.ledger_hash
+        with snapshot:
+            recomputed: List[Dict[str, str]] = []
+            if category.game_type == "raffle":
+                for tier_config, ticket in _select_raffle_winners(draw.id, seed, category, snapshot):
+                    recomputed.append({"tier_name": tier_config.tier_name, "ticket_id": ticket["ticket_id"], "wallet_address": ticket["wallet_address"]})
+            elif category.game_type == "pick_n_digits":
+                from rng.utils import generate_winning_picks
+                winning_numbers_list = generate_winning_picks(seed=seed, game_config=category.game_config)
+                sorted_tiers = _sorted_match_tiers(category.prize_tiers)
+                ticket_matches_info = _snapshot_ticket_matches(
+                    snapshot, winning_numbers_list, min((t.matches_required for t in sorted_tiers), default=None)
+                )
+                for tier_name, tier_winners in _assign_pick_n_tiers(ticket_matches_info, sorted_tiers).items():
+                    recomputed.extend({"tier_name": tier_name, **winner} for winner in tier_winners)
+            else:
+                raise HTTPException(status_code=500, detail=f"Unsupported game_type '{category.game_type}' for verifying draw.")
+            ticket_count = len(snapshot)
+
+        stored = {(w.tier_name, w.ticket_id) for w in draw.winners_by_tier or []}
+        expected = {(w["tier_name"], w["ticket_id"]) for w in recomputed}
+        return DrawVerification(
+            draw_id=draw.id,
+            verified=stored == expected,
+            ticket_snapshot_sha256=draw.ticket_snapshot_sha256,
+            ticket_snapshot_count=ticket_count,
+            recomputed_winners=recomputed,
+            mismatched_ticket_ids=sorted({ticket_id for _, ticket_id in stored ^ expected}),
+        )
+    except PyMongoError as e:
+        raise HTTPException(status_code=500, detail=f"Database error verifying draw: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 
 @router.get('/history', response_model=List[Draw], summary="Get history of draws, optionally filtered by category")
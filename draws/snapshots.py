@@ -0,0 +1,303 @@
+"""
+Frozen ticket snapshots of closed draws.
+
+When a draw closes, its tickets are exported once into a columnar binary file that is read
+through a memory map. It is the draw's audit artifact: /api/draws/{id}/verify and offline
+audits re-read it instead of querying Mongo. Raffle closes export it first and draw from it.
+Pick-N closes take their winners from the postings index (tickets.db), which never reads the
+non-matching tickets, and export the snapshot only after the result is recorded. The file's
+sha256 is recorded on the Draw, so a snapshot that changed after the close is detected.
+
+Matching a snapshot (DrawSnapshot.match_rows) is a per-row Python loop over the memoryview
+columns, as numpy is not a dependency; it serves /verify, not the close.
+
+The file is local to the host that closed the draw, unless DRAW_SNAPSHOT_DIR is storage every
+host mounts. The Draw records the writing host (DRAW_SNAPSHOT_HOST) and the file's path, so a
+/verify elsewhere can say where the snapshot lives.
+
+Layout (little-endian; each section starts 8-byte aligned):
+    header          MAGIC, version, picks kind, ticket count N, wallet count W, picks width
+    ticket_seq      int64 x N       -1 for tickets without one (raffles)
+    wallet          uint32 x N      index into the wallet table
+    ticket_id       12 bytes x N    ObjectId
+    picks           width x N       PICKS_MASK64: uint64 bit mask; PICKS_MASK128: 16-byte mask;
+                                    PICKS_VALUES: sorted distinct int32, padded with VALUE_PAD
+    wallet offsets  uint32 x (W + 1)
+    wallet table    UTF-8 addresses, sorted
+Rows keep the order Mongo returned the draw's tickets in, which is the order raffle
+selection indexes into.
+"""
+import hashlib
+import mmap
+import os
+import socket
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+from tickets.db import get_tickets_collection
+from tickets.selections import decode_pick_values, MASK_128_VALUES
+
+SNAPSHOT_DIR = os.environ.get('DRAW_SNAPSHOT_DIR', os.path.join('data', 'draw_snapshots')) # Empty string disables snapshots
+SNAPSHOT_HOST = os.environ.get('DRAW_SNAPSHOT_HOST') or socket.gethostname() # Recorded on each draw with the file's path
+
+MAGIC = b"LTSNAP01"
+VERSION = 1
+_HEADER = struct.Struct("<8sHBxQII")
+_HEADER_SIZE = 32
+_TICKET_ID_SIZE = 12
+
+PICKS_NONE = 0
+PICKS_MASK64 = 1
+PICKS_MASK128 = 2
+PICKS_VALUES = 3
+VALUE_PAD = -(1 << 31)
+
+class SnapshotError(Exception):
+    """ Missing, malformed or tampered snapshot file. """
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def _require_little_endian() -> None:
+    if sys.byteorder != "little":
+        raise SnapshotError("Draw snapshots are only supported on little-endian hosts.")
+
+def snapshot_path(draw_id: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{draw_id}.snap")
+
+def _encode_picks(encoded: List[Any]) -> Tuple[int, int, bytes]:
+    """ Chooses the narrowest picks column for the draw. Returns (kind, width, column bytes). """
+    if all(isinstance(e, int) for e in encoded):
+        if all(e.bit_length() <= 64 for e in encoded):
+            return PICKS_MASK64, 8, array('Q', encoded).tobytes()
+        return PICKS_MASK128, 16, b"".join(e.to_bytes(16, 'little') for e in encoded)
+
+    value_lists = [
+        sorted(v for v in range(e.bit_length()) if e >> v & 1) if isinstance(e, int) else sorted(e)
+        for e in encoded
+    ]
+    count = max(1, max((len(values) for values in value_lists), default=1))
+    column = array('i')
+    for values in value_lists:
+        column.extend(values)
+        column.extend([VALUE_PAD] * (count - len(values)))
+    return PICKS_VALUES, 4 * count, column.tobytes()
+
+def write_snapshot(path: str, ticket_docs: Iterable[Dict[str, Any]], with_picks: bool) -> "DrawSnapshot":
+    """
+    Writes ticket documents ({_id, wallet_address, ticket_seq?, selection_data?}) to a
+    snapshot file at path (atomically, via a temporary file) and returns it opened.
+    """
+    _require_little_endian()
+    seqs = array('q')
+    wallet_rows = array('I')
+    ticket_ids = bytearray()
+    wallet_ids: Dict[str, int] = {}
+    encoded: List[Any] = [] # Per ticket: an int mask while values fit 0..127, else a set of values
+
+    for doc in ticket_docs:
+        seq = doc.get("ticket_seq")
+        seqs.append(seq if seq is not None else -1)
+        wallet_rows.append(wallet_ids.setdefault(doc["wallet_address"], len(wallet_ids)))
+        ticket_ids += ObjectId(doc["_id"]).binary
+        if with_picks:
+            selection_data = doc.get("selection_data") or {}
+            mask = selection_data.get("mask")
+            if mask is None:
+                values = decode_pick_values(selection_data)
+                in_range = all(0 <= v < MASK_128_VALUES for v in values)
+                mask = sum(1 << v for v in values) if in_range else values
+            encoded.append(mask)
+
+    picks_kind, picks_width, picks_column = _encode_picks(encoded) if with_picks else (PICKS_NONE, 0, b"")
+
+    wallets = sorted(wallet_ids)
+    remap = array('I', bytes(4 * len(wallets)))
+    for position, wallet in enumerate(wallets):
+        remap[wallet_ids[wallet]] = position
+    wallet_column = array('I', (remap[row] for row in wallet_rows))
+    wallet_blobs = [wallet.encode('utf-8') for wallet in wallets]
+    wallet_offsets = array('I', [0])
+    for blob in wallet_blobs:
+        wallet_offsets.append(wallet_offsets[-1] + len(blob))
+
+    header = _HEADER.pack(MAGIC, VERSION, picks_kind, len(seqs), len(wallets), picks_width)
+    sections = [header, seqs.tobytes(), wallet_column.tobytes(), bytes(ticket_ids), picks_column,
+                wallet_offsets.tobytes(), b"".join(wallet_blobs)]
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    digest = hashlib.sha256()
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        offset = 0
+        for section in sections:
+            padding = b"\0" * (_align(offset) - offset)
+            for chunk in (padding, section):
+                f.write(chunk)
+                digest.update(chunk)
+            offset = _align(offset) + len(section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return DrawSnapshot(path, sha256=digest.hexdigest())
+
+def export_draw_snapshot(draw_id: str, game_type: str) -> Optional["DrawSnapshot"]:
+    """
+    Exports the draw's tickets (one projected read) and returns the opened snapshot,
+    or None if snapshots are disabled or the export failed (callers then query Mongo).
+    """
+    if not SNAPSHOT_DIR:
+        return None
+    try:
+        cursor = get_tickets_collection().find(
+            {"draw_id": draw_id},
+            {"wallet_address": 1, "ticket_seq": 1, "selection_data": 1}
+        )
+        return write_snapshot(snapshot_path(draw_id), cursor, with_picks=(game_type == "pick_n_digits"))
+    except (PyMongoError, OSError, SnapshotError, ValueError) as e:
+        print(f"Error exporting ticket snapshot for draw {draw_id}: {e}")
+        return None
+
+def open_draw_snapshot(draw_id: str, expected_sha256: str, path: Optional[str] = None, host: Optional[str] = None) -> "DrawSnapshot":
+    """
+    Opens a closed draw's snapshot and checks it against the checksum recorded on the draw.
+    path and host are the location recorded at close; draws closed before it was recorded are
+    looked up in SNAPSHOT_DIR.
+    """
+    path = path or snapshot_path(draw_id)
+    if not os.path.exists(path):
+        if host and host != SNAPSHOT_HOST:
+            raise SnapshotError(f"Ticket snapshot for draw {draw_id} is at {path} on host {host}, which is not readable from {SNAPSHOT_HOST}.")
+        raise SnapshotError(f"No ticket snapshot for draw {draw_id}.")
+    snapshot = DrawSnapshot(path)
+    snapshot.sha256 = snapshot.compute_sha256()
+    if snapshot.sha256 != expected_sha256:
+        snapshot.close()
+        raise SnapshotError(f"Ticket snapshot for draw {draw_id} does not match its recorded checksum.")
+    return snapshot
+
+class DrawSnapshot:
+    """
+    Read-only view of a snapshot file. The columns are memoryviews over the mapping,
+    so reading a column doesn't copy it. Use as a context manager or call close().
+    """
+
+    def __init__(self, path: str, sha256: Optional[str] = None):
+        _require_little_endian()
+        self.path = path
+        self.sha256 = sha256
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views: List[memoryview] = []
+        try:
+            self._load()
+        except Exception:
+            self.close()
+            raise
+
+    def _view(self, start: int, length: int, fmt: Optional[str] = None) -> memoryview:
+        if start + length > len(self._mmap):
+            raise SnapshotError(f"Truncated ticket snapshot {self.path}.")
+        view = memoryview(self._mmap)[start:start + length]
+        self._views.append(view)
+        if fmt:
+            view = view.cast(fmt)
+            self._views.append(view)
+        return view
+
+    def _load(self) -> None:
+        if len(self._mmap) < _HEADER_SIZE:
+            raise SnapshotError(f"Truncated ticket snapshot {self.path}.")
+        magic, version, self.picks_kind, count, wallet_count, self.picks_width = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f"{self.path} is not a version {VERSION} ticket snapshot.")
+        self.ticket_count = count
+
+        offset = _align(_HEADER_SIZE)
+        self.ticket_seqs = self._view(offset, 8 * count, 'q')
+        offset = _align(offset + 8 * count)
+        self._wallet_rows = self._view(offset, 4 * count, 'I')
+        offset = _align(offset + 4 * count)
+        self._ticket_ids = self._view(offset, _TICKET_ID_SIZE * count)
+        offset = _align(offset + _TICKET_ID_SIZE * count)
+        self._picks = self._view(offset, self.picks_width * count, 'Q' if self.picks_kind == PICKS_MASK64 else None)
+        offset = _align(offset + self.picks_width * count)
+        wallet_offsets = self._view(offset, 4 * (wallet_count + 1), 'I')
+        offset = _align(offset + 4 * (wallet_count + 1))
+        blob = self._view(offset, wallet_offsets[-1])
+        self.wallets = [bytes(blob[wallet_offsets[i]:wallet_offsets[i + 1]]).decode('utf-8') for i in range(wallet_count)]
+
+    def __len__(self) -> int:
+        return self.ticket_count
+
+    def __enter__(self) -> "DrawSnapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if not self._mmap.closed:
+            self._mmap.close()
+
+    def compute_sha256(self) -> str:
+        return hashlib.sha256(self._mmap).hexdigest()
+
+    def ticket_id(self, row: int) -> str:
+        return self._ticket_ids[row * _TICKET_ID_SIZE:(row + 1) * _TICKET_ID_SIZE].hex()
+
+    def wallet_address(self, row: int) -> str:
+        return self.wallets[self._wallet_rows[row]]
+
+    def ticket(self, row: int) -> Dict[str, str]:
+        return {"ticket_id": self.ticket_id(row), "wallet_address": self.wallet_address(row)}
+
+    def iter_tickets(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """ (ticket_id, wallet_address) for rows start..stop, e.g. one shard of the draw. """
+        ticket_ids, wallet_rows, wallets = self._ticket_ids, self._wallet_rows, self.wallets
+        for row in range(start, self.ticket_count if stop is None else min(stop, self.ticket_count)):
+            yield ticket_ids[row * _TICKET_ID_SIZE:(row + 1) * _TICKET_ID_SIZE].hex(), wallets[wallet_rows[row]]
+
+    def pick_values(self, row: int) -> set:
+        if self.picks_kind == PICKS_MASK64:
+            mask = self._picks[row]
+        elif self.picks_kind == PICKS_MASK128:
+            mask = int.from_bytes(self._picks[row * 16:(row + 1) * 16], 'little')
+        elif self.picks_kind == PICKS_VALUES:
+            values = self._picks[row * self.picks_width:(row + 1) * self.picks_width].cast('i')
+            return {v for v in values if v != VALUE_PAD}
+        else:
+            raise SnapshotError(f"{self.path} has no picks column.")
+        return {v for v in range(mask.bit_length()) if mask >> v & 1}
+
+    def match_rows(self, winning_picks: List[Any], min_matches: int) -> List[Tuple[int, int]]:
+        """
+        [(row, matches)] for tickets with at least min_matches winning values, in row order.
+        One Python-level step per ticket, so /verify of a large draw is CPU-bound, not I/O-bound.
+        """
+        winning = {int(pick) for pick in winning_picks}
+        if self.picks_kind == PICKS_MASK64:
+            winning_mask = sum(1 << v for v in winning if 0 <= v < 64)
+            return [
+                (row, matches) for row, mask in enumerate(self._picks)
+                if (matches := (mask & winning_mask).bit_count()) >= min_matches
+            ]
+        if self.picks_kind == PICKS_MASK128:
+            winning_mask = sum(1 << v for v in winning if 0 <= v < MASK_128_VALUES)
+            picks = self._picks
+            return [
+                (row, matches) for row in range(self.ticket_count)
+                if (matches := (int.from_bytes(picks[row * 16:(row + 1) * 16], 'little') & winning_mask).bit_count()) >= min_matches
+            ]
+        return [
+            (row, matches) for row in range(self.ticket_count)
+            if (matches := len(self.pick_values(row) & winning)) >= min_matches
+        ]
@@ -0,0 +1,146 @@
+"""
+Cursor-backed row iterators for the bulk exports.
+
+Each iterator runs one find or aggregate with a bounded batch size and yields flat row dicts
+(keys in the order of the matching *_EXPORT_COLUMNS) one document at a time, so an export holds
+at most one batch in memory however many documents match. Unlike the rest of the db layer these
+let PyMongoError propagate: an export that stops part-way must fail, not look complete.
+"""
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from draws.db import get_draws_collection
+from tickets.db import get_tickets_collection
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '5000'))
+
+TICKET_EXPORT_COLUMNS = ("ticket_id", "draw_id", "wallet_address", "timestamp", "ticket_seq", "picks")
+DRAW_EXPORT_COLUMNS = (
+    "draw_id", "category_id", "status", "scheduled_open_time", "scheduled_close_time", "actual_open_time",
+    "actual_close_time", "base_prize_pool", "ticket_count", "participant_count", "winner_count", "winning_picks",
+    "ledger_hash",
+)
+WINNER_EXPORT_COLUMNS = (
+    "draw_id", "category_id", "actual_close_time", "tier_name", "wallet_address", "ticket_id",
+    "prize_amount_calculated", "fee_amount_charged", "net_prize_payable", "is_fixed_prize", "syndicate_id",
+)
+
+def _time_range(start: Optional[datetime], end: Optional[datetime]) -> Dict[str, datetime]:
+    """ Half-open [start, end) condition; empty when neither bound is given. """
+    condition = {}
+    if start is not None:
+        condition["$gte"] = start
+    if end is not None:
+        condition["$lt"] = end
+    return condition
+
+def iter_ticket_rows(draw_id: Optional[str] = None, wallet_address: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the tickets of a draw and/or wallet (every ticket, in storage order, if neither is given),
+    sorted along the index that serves the query: (draw_id, ticket_seq) when draw_id is given, else
+    (wallet_address, draw_id). Tickets without a ticket_seq (raffle purchases) sort first, in no set
+    order among themselves. Only the exported fields are fetched, so the packed selection
+    encodings never leave the server.
+    """
+    query: Dict[str, Any] = {}
+    sort = None
+    if wallet_address is not None:
+        query["wallet_address"] = wallet_address
+        sort = [("wallet_address", 1), ("draw_id", 1)]
+    if draw_id is not None:
+        query["draw_id"] = draw_id
+        sort = [("draw_id", 1), ("ticket_seq", 1)]
+    projection = {"draw_id": 1, "wallet_address": 1, "timestamp": 1, "ticket_seq": 1, "selection_data.picks": 1}
+    cursor = get_tickets_collection().find(query, projection).batch_size(EXPORT_BATCH_SIZE)
+    if sort:
+        cursor = cursor.sort(sort)
+    with cursor:
+        for doc in cursor:
+            yield {
+                "ticket_id": str(doc["_id"]),
+                "draw_id": doc.get("draw_id"),
+                "wallet_address": doc.get("wallet_address"),
+                "timestamp": doc.get("timestamp"),
+                "ticket_seq": doc.get("ticket_seq"),
+                "picks": (doc.get("selection_data") or {}).get("picks"),
+            }
+
+def iter_draw_rows(category_id: Optional[str] = None, status: Optional[str] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields draws by scheduled_close_time in [start, end), oldest first. Participant and winner
+    lists are reduced to counts on the server rather than shipped whole.
+    """
+    match: Dict[str, Any] = {}
+    if category_id is not None:
+        match["category_id"] = category_id
+    if status is not None:
+        match["status"] = status
+    close_range = _time_range(start, end)
+    if close_range:
+        match["scheduled_close_time"] = close_range
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": match},
+        {"$sort": {"scheduled_close_time": 1}},
+        {"$project": {
+            "category_id": 1, "status": 1, "scheduled_open_time": 1, "scheduled_close_time": 1,
+            "actual_open_time": 1, "actual_close_time": 1, "base_prize_pool": 1, "ledger_hash": 1,
+            "ticket_snapshot_count": 1,
+            "participant_count": {"$size": {"$ifNull": ["$participants", []]}},
+            "winner_count": {"$size": {"$ifNull": ["$winners_by_tier", []]}},
+            "winning_picks": "$winning_selection.picks",
+        }},
+    ]
+    with get_draws_collection().aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE) as cursor:
+        for doc in cursor:
+            closed = doc.get("status") == "completed"
+            yield {
+                "draw_id": str(doc["_id"]),
+                "category_id": doc.get("category_id"),
+                "status": doc.get("status"),
+                "scheduled_open_time": doc.get("scheduled_open_time"),
+                "scheduled_close_time": doc.get("scheduled_close_time"),
+                "actual_open_time": doc.get("actual_open_time"),
+                "actual_close_time": doc.get("actual_close_time"),
+                "base_prize_pool": doc.get("base_prize_pool"),
+                # Both are recorded at close, so they are empty for draws not closed yet. The exact
+                # ticket count comes from the close's ticket snapshot; participants are distinct wallets.
+                "ticket_count": doc.get("ticket_snapshot_count"),
+                "participant_count": doc.get("participant_count") if closed else None,
+                "winner_count": doc.get("winner_count"),
+                "winning_picks": doc.get("winning_picks"),
+                "ledger_hash": doc.get("ledger_hash"),
+            }
+
+def iter_winner_rows(category_id: Optional[str] = None, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """ Yields one row per prize won in completed draws closed in [start, end), oldest draw first. """
+    match: Dict[str, Any] = {"status": "completed", "winners_by_tier.0": {"$exists": True}}
+    if category_id is not None:
+        match["category_id"] = category_id
+    close_range = _time_range(start, end)
+    if close_range:
+        match["actual_close_time"] = close_range
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": match},
+        {"$sort": {"actual_close_time": 1}},
+        {"$project": {"category_id": 1, "actual_close_time": 1, "winners_by_tier": 1}},
+        {"$unwind": "$winners_by_tier"},
+    ]
+    with get_draws_collection().aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE) as cursor:
+        for doc in cursor:
+            winner = doc["winners_by_tier"]
+            yield {
+                "draw_id": str(doc["_id"]),
+                "category_id": doc.get("category_id"),
+                "actual_close_time": doc.get("actual_close_time"),
+                "tier_name": winner.get("tier_name"),
+                "wallet_address": winner.get("wallet_address"),
+                "ticket_id": winner.get("ticket_id"),
+                "prize_amount_calculated": winner.get("prize_amount_calculated"),
+                "fee_amount_charged": winner.get("fee_amount_charged"),
+                "net_prize_payable": winner.get("net_prize_payable"),
+                "is_fixed_prize": winner.get("is_fixed_prize"),
+                "syndicate_id": (winner.get("syndicate_win_details") or {}).get("syndicate_id"),
+            }
@@ -0,0 +1,84 @@
+import itertools
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pymongo.errors import PyMongoError
+
+from auth.dependencies import get_current_admin_user
+from draws.db import get_draw_by_id
+from metrics.instrumentation import TimedRoute
+from . import db as exports_db
+from .streaming import EXPORT_MEDIA_TYPES, GZIP_MEDIA_TYPE, ExportFormat, encode_export
+
+# Exports dump tickets and wallets in bulk, so they are for admins only
+router = APIRouter(route_class=TimedRoute, dependencies=[Depends(get_current_admin_user)])
+
+def _logged(chunks: Iterator[bytes], name: str) -> Iterator[bytes]:
+    try:
+        yield from chunks
+    except PyMongoError as e:
+        # Headers are already sent, so the only signal left is an aborted (incomplete) response
+        print(f"PyMongoError while streaming the {name} export: {e}")
+        raise
+
+def _export_response(name: str, rows: Iterable[Dict[str, Any]], columns: Sequence[str],
+                     export_format: ExportFormat, gzip: bool) -> StreamingResponse:
+    rows = iter(rows)
+    try:
+        # Runs the query before the response starts, so a database that is down is still a 500
+        first = next(rows, None)
+    except PyMongoError as e:
+        print(f"PyMongoError starting the {name} export: {e}")
+        raise HTTPException(status_code=500, detail=f"Database error while exporting {name}: {str(e)}")
+    if first is not None:
+        rows = itertools.chain([first], rows)
+
+    filename = f"{name}.{export_format.value}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        _logged(encode_export(rows, columns, export_format, gzip), name),
+        media_type=GZIP_MEDIA_TYPE if gzip else EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/tickets", summary="Stream tickets as NDJSON or CSV")
+def export_tickets(
+    draw_id: Optional[str] = Query(None, description="Only tickets in this draw"),
+    wallet_address: Optional[str] = Query(None, description="Only tickets bought by this wallet"),
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    gzip: bool = Query(False, description="Gzip the body (served as a .gz attachment)"),
+):
+    """
+    Streams every matching ticket, read from a cursor in batches, so memory use does not grow
+    with the size of the draw. With neither filter this dumps the whole collection.
+    """
+    if draw_id is not None and get_draw_by_id(draw_id) is None:
+        raise HTTPException(status_code=404, detail=f"Draw with ID '{draw_id}' not found.")
+    name = f"tickets-{draw_id}" if draw_id else "tickets"
+    rows = exports_db.iter_ticket_rows(draw_id=draw_id, wallet_address=wallet_address)
+    return _export_response(name, rows, exports_db.TICKET_EXPORT_COLUMNS, export_format, gzip)
+
+@router.get("/draws", summary="Stream draws as NDJSON or CSV")
+def export_draws(
+    category_id: Optional[str] = Query(None),
+    status: Optional[str] = Query(None, description="e.g. 'open', 'completed'"),
+    start: Optional[datetime] = Query(None, description="Scheduled to close at or after this time"),
+    end: Optional[datetime] = Query(None, description="Scheduled to close before this time"),
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    gzip: bool = Query(False, description="Gzip the body (served as a .gz attachment)"),
+):
+    rows = exports_db.iter_draw_rows(category_id=category_id, status=status, start=start, end=end)
+    return _export_response("draws", rows, exports_db.DRAW_EXPORT_COLUMNS, export_format, gzip)
+
+@router.get("/winners", summary="Stream prize winners as NDJSON or CSV")
+def export_winners(
+    category_id: Optional[str] = Query(None),
+    start: Optional[datetime] = Query(None, description="Draw closed at or after this time"),
+    end: Optional[datetime] = Query(None, description="Draw closed before this time"),
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    gzip: bool = Query(False, description="Gzip the body (served as a .gz attachment)"),
+):
+    """ One row per prize, e.g. all winners of a month with start=2026-09-01&end=2026-10-01. """
+    rows = exports_db.iter_winner_rows(category_id=category_id, start=start, end=end)
+    return _export_response("winners", rows, exports_db.WINNER_EXPORT_COLUMNS, export_format, gzip)
@@ -0,0 +1,268 @@
+"""
+Retroactive grants of an achievement definition to users who already meet it.
+
+Live grants only come from new events (GamificationService.process_event), so a definition added
+later never reaches users whose qualifying events are in the past. A backfill job rebuilds those
+events from the records they were emitted for (ticket purchases, grouped by purchase_id and
+without syndicate purchases, completed draws' winners and successful referral links) with one
+aggregation per wallet-address range, and bulk-inserts the grants with
+gamification.db.grant_achievements_bulk. Qualification follows process_event: one past event has
+to satisfy all of the definition's criteria, judged on the fields that event type carries live.
+
+Ranges split XRPL addresses on the BACKFILL_PREFIX_CHARS characters after the leading 'r', so no
+boundary query is needed. At most BACKFILL_WORKERS threads per process claim partitions one at a
+time, optionally pausing between them, to keep the load on the primary bounded. Progress is kept
+in Mongo, and resume_backfill_jobs (run at startup) picks up unfinished jobs after a restart.
+Grants are idempotent under the unique (wallet, definition) index, so a retried partition never
+grants twice.
+"""
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo.collection import Collection
+
+from database import migration_done
+from draws.db import get_draws_collection
+from referrals.db import get_referral_links_collection
+from referrals.models import SUCCESSFUL_REFERRAL_STATUSES
+from syndicates.db import SYNDICATE_TICKETS_MIGRATION
+from tickets.db import PURCHASE_IDS_MIGRATION, get_tickets_collection
+from . import db as gamification_db
+from .models import AchievementBackfillJob, AchievementDefinition, AchievementEventType
+
+XRPL_ADDRESS_ALPHABET = "rpshnaf39wBUDNEGHJKLM4PQRST7VWXYZ2bcdeCg65jkm8oFqi1tuvAxyz"
+
+BACKFILL_WORKERS = int(os.environ.get('BACKFILL_WORKERS', '2'))
+BACKFILL_PREFIX_CHARS = int(os.environ.get('BACKFILL_PREFIX_CHARS', '1')) # 1 -> 59 partitions, 2 -> 3,365
+BACKFILL_PARTITION_PAUSE_SECONDS = float(os.environ.get('BACKFILL_PARTITION_PAUSE_SECONDS', '0'))
+BACKFILL_IDLE_POLL_SECONDS = 5.0 # How often a worker with nothing to claim checks whether the job finished
+BACKFILL_GRANT_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+# (collection, wallet range condition -> pipeline listing the qualifying wallets as {"_id": wallet})
+BackfillPlan = Tuple[Collection, Callable[[Dict[str, Any]], List[Dict[str, Any]]]]
+
+class BackfillError(Exception):
+    pass
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_stopping = threading.Event() # Set by shutdown_backfill_workers for the current pool's workers
+_executor_lock = threading.Lock()
+
+def wallet_ranges(prefix_chars: int = BACKFILL_PREFIX_CHARS) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    [low, high) ranges covering every string; None is open-ended. The outer two ranges catch
+    anything that isn't a well-formed address.
+    """
+    boundaries = sorted("r" + "".join(chars) for chars in itertools.product(XRPL_ADDRESS_ALPHABET, repeat=prefix_chars))
+    bounds: List[Optional[str]] = [None, *boundaries, None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _wallet_range(low: Optional[str], high: Optional[str]) -> Dict[str, Any]:
+    condition: Dict[str, Any] = {"$type": "string"}
+    if low is not None:
+        condition["$gte"] = low
+    if high is not None:
+        condition["$lt"] = high
+    return condition
+
+def _merged_conditions(definition: AchievementDefinition) -> Optional[Tuple[AchievementEventType, Dict[str, Any]]]:
+    """
+    The event type and combined conditions one event must meet, or None if no single event can
+    (process_event never grants definitions whose criteria span event types).
+    """
+    event_types = {criterion.event_type for criterion in definition.criteria}
+    if len(event_types) != 1:
+        return None
+    merged: Dict[str, Any] = {"count": None, "min_amount": None, "category_id": None, "tier_name": None}
+    for criterion in definition.criteria:
+        for field, value in criterion.conditions.model_dump().items():
+            if value is None:
+                continue
+            if field in ("count", "min_amount"):
+                merged[field] = value if merged[field] is None else max(merged[field], value)
+            elif merged[field] is not None and merged[field] != value:
+                return None # Two different required values
+            else:
+                merged[field] = value
+    return event_types.pop(), merged
+
+def build_backfill_plan(definition: AchievementDefinition) -> Optional[BackfillPlan]:
+    """ Returns the aggregation for the definition's event type, or None if no past event can meet it. """
+    merged = _merged_conditions(definition)
+    if merged is None:
+        return None
+    event_type, conditions = merged
+    # process_event reads "amount" (0.0 when absent) and "count" (0 when absent); an event type
+    # that doesn't carry the field fails any positive threshold on it.
+    if conditions["min_amount"]:
+        return None # No event type carries "amount" today
+
+    if event_type == AchievementEventType.TICKET_PURCHASE: # {"count": tickets in the purchase, "category_id"}
+        if conditions["tier_name"] is not None:
+            return None
+        match: Dict[str, Any] = {}
+        if conditions["category_id"] is not None:
+            draw_ids = get_draws_collection().distinct("_id", {"category_id": conditions["category_id"]})
+            match["draw_id"] = {"$in": [str(draw_id) for draw_id in draw_ids]}
+        min_count = conditions["count"]
+
+        def ticket_purchase_pipeline(wallet_range: Dict[str, Any]) -> List[Dict[str, Any]]:
+            if not (migration_done(PURCHASE_IDS_MIGRATION) and migration_done(SYNDICATE_TICKETS_MIGRATION)):
+                raise BackfillError("Past tickets are not grouped into purchases yet; retry once the startup migrations have finished")
+            # Syndicate purchases emit no TICKET_PURCHASE event
+            stages: List[Dict[str, Any]] = [{"$match": {**match, "wallet_address": wallet_range, "syndicate_id": None}}]
+            if min_count:
+                # A purchase's tickets share its purchase_id; a ticket without one counts as a purchase of its own
+                stages += [
+                    {"$group": {"_id": {"wallet": "$wallet_address", "purchase_id": {"$ifNull": ["$purchase_id", "$_id"]}}, "count": {"$sum": 1}}},
+                    {"$match": {"count": {"$gte": min_count}}},
+                    {"$group": {"_id": "$_id.wallet"}},
+                ]
+            else:
+                stages.append({"$group": {"_id": "$wallet_address"}})
+            return stages
+
+        return get_tickets_collection(), ticket_purchase_pipeline
+
+    if event_type == AchievementEventType.DRAW_WIN: # {"prize_amount", "tier_name", "category_id", "draw_id"}
+        if conditions["count"]:
+            return None
+        match = {"status": "completed"}
+        if conditions["category_id"] is not None:
+            match["category_id"] = conditions["category_id"]
+        winner_match: Dict[str, Any] = {}
+        if conditions["tier_name"] is not None:
+            winner_match["winners_by_tier.tier_name"] = conditions["tier_name"]
+
+        def draw_win_pipeline(wallet_range: Dict[str, Any]) -> List[Dict[str, Any]]:
+            return [
+                {"$match": {**match, "winners_by_tier.wallet_address": wallet_range}},
+                {"$unwind": "$winners_by_tier"},
+                {"$match": {**winner_match, "winners_by_tier.wallet_address": wallet_range}},
+                {"$group": {"_id": "$winners_by_tier.wallet_address"}},
+            ]
+
+        return get_draws_collection(), draw_win_pipeline
+
+    if event_type == AchievementEventType.REFERRAL_SUCCESS: # {"count": 1} for the referrer
+        if (conditions["count"] or 0) > 1 or conditions["category_id"] is not None or conditions["tier_name"] is not None:
+            return None
+
+        def referral_success_pipeline(wallet_range: Dict[str, Any]) -> List[Dict[str, Any]]:
+            return [
+                {"$match": {"referrer_wallet_address": wallet_range, "reward_status": {"$in": list(SUCCESSFUL_REFERRAL_STATUSES)}}},
+                {"$group": {"_id": "$referrer_wallet_address"}},
+            ]
+
+        return get_referral_links_collection(), referral_success_pipeline
+
+    return None # Syndicate events aren't emitted by the app, so there is no history to replay
+
+def _grant_batch(definition: AchievementDefinition, wallets: List[str]) -> int:
+    definition_id = str(definition.id)
+    already_earned = gamification_db.get_earned_achievement_keys(wallets, [definition_id])
+    if already_earned is None:
+        raise BackfillError("Could not fetch earned achievements")
+    new_grants = [(wallet, definition) for wallet in wallets if (wallet, definition_id) not in already_earned]
+    return len(gamification_db.grant_achievements_bulk(new_grants))
+
+def backfill_partition(definition: AchievementDefinition, plan: BackfillPlan, low: Optional[str], high: Optional[str]) -> Tuple[int, int]:
+    """ Grants the definition to qualifying wallets in [low, high). Returns (users qualified, achievements granted). """
+    collection, pipeline = plan
+    users_qualified = achievements_granted = 0
+    batch: List[str] = []
+    for data in collection.aggregate(pipeline(_wallet_range(low, high)), allowDiskUse=True):
+        batch.append(data["_id"])
+        if len(batch) >= BACKFILL_GRANT_BATCH_SIZE:
+            achievements_granted += _grant_batch(definition, batch)
+            users_qualified += len(batch)
+            batch = []
+    if batch:
+        achievements_granted += _grant_batch(definition, batch)
+        users_qualified += len(batch)
+    return users_qualified, achievements_granted
+
+def run_backfill_job(job_id: str, stopping: Optional[threading.Event] = None) -> None:
+    """ Worker loop: claims and processes the job's partitions until the job finishes or `stopping` is set. """
+    stopping = stopping or threading.Event()
+    job = gamification_db.get_backfill_job(job_id)
+    if job is None or job.status not in ("queued", "running"):
+        return
+    definition = gamification_db.get_achievement_definition_by_id(job.definition_id)
+    plan = build_backfill_plan(definition) if definition else None
+    if plan is None:
+        gamification_db.update_backfill_job(job_id, {
+            "status": "failed", "error": "Achievement definition not found or no longer backfillable", "finished_at": datetime.utcnow()
+        })
+        return
+    gamification_db.mark_backfill_job_running(job_id)
+
+    while not stopping.is_set():
+        partition = gamification_db.claim_backfill_partition(job_id, datetime.utcnow())
+        if partition is None:
+            # The rest is claimed by other workers (or by a dead process, until its claims expire)
+            job = gamification_db.get_backfill_job(job_id)
+            if job is None or job.status not in ("queued", "running") or stopping.wait(BACKFILL_IDLE_POLL_SECONDS):
+                return
+            continue
+        try:
+            users_qualified, achievements_granted = backfill_partition(definition, plan, partition["low"], partition["high"])
+        except Exception as e:
+            logger.exception(f"Backfill job {job_id} partition {partition['index']} failed")
+            gamification_db.fail_backfill_partition(partition, str(e))
+        else:
+            gamification_db.complete_backfill_partition(partition, users_qualified, achievements_granted)
+        if BACKFILL_PARTITION_PAUSE_SECONDS:
+            stopping.wait(BACKFILL_PARTITION_PAUSE_SECONDS)
+
+def _get_executor() -> Tuple[ThreadPoolExecutor, threading.Event]:
+    global _executor, _executor_stopping
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BACKFILL_WORKERS, thread_name_prefix="achievement-backfill")
+            _executor_stopping = threading.Event()
+        return _executor, _executor_stopping
+
+def submit_backfill_job(job_id: str, partitions_total: int) -> None:
+    """ Queues up to BACKFILL_WORKERS workers for the job on the shared pool. """
+    executor, stopping = _get_executor()
+    for _ in range(max(1, min(BACKFILL_WORKERS, partitions_total))):
+        executor.submit(run_backfill_job, job_id, stopping)
+
+def start_backfill(definition: AchievementDefinition) -> AchievementBackfillJob | None:
+    """ Creates a backfill job for the definition and queues it. """
+    ranges = wallet_ranges() if build_backfill_plan(definition) is not None else []
+    job = gamification_db.create_backfill_job(str(definition.id), ranges)
+    if job is None:
+        return None
+    if not ranges:
+        gamification_db.update_backfill_job(job.id, {"status": "completed", "finished_at": datetime.utcnow()})
+        return gamification_db.get_backfill_job(job.id)
+    submit_backfill_job(job.id, job.partitions_total)
+    return job
+
+def resume_backfill_jobs() -> int:
+    """ Called on app startup. Requeues jobs left queued or running by a previous process. """
+    jobs = gamification_db.get_unfinished_backfill_jobs()
+    for job in jobs:
+        submit_backfill_job(job.id, job.partitions_total)
+    return len(jobs)
+
+def shutdown_backfill_workers(wait: bool = True) -> None:
+    """
+    Called on app shutdown. Workers stop after their current partition; the rest of each job
+    stays in Mongo for resume_backfill_jobs.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+        _executor_stopping.set()
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
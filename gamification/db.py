@@ -1,16 +1,34 @@
+from pymongo import ReturnDocument, UpdateOne
 from pymongo.collection import Collection
 from pymongo.results import InsertOneResult, UpdateResult, DeleteResult
-from pymongo.errors import PyMongoError, DuplicateKeyError
+from pymongo.errors import PyMongoError, DuplicateKeyError, BulkWriteError
 from bson import ObjectId
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from collections import Counter
+from typing import Iterable, List, Optional, Dict, Any, Set, Tuple
+from datetime import datetime, timedelta
 
-from database import get_db
+from database import create_unique_index, get_db, has_unique_index
+from .leaderboard import loyalty_leaderboard
 from .models import (
-    AchievementDefinition, UserAchievement, UserLoyalty,
+    AchievementDefinition, UserAchievement, UserLoyalty, LoyaltyLeaderboardEntry, LoyaltyRank, AchievementBackfillJob,
     AchievementDefinitionCreate, AchievementDefinitionUpdate # For type hinting if needed
 )
 
+# Caps the $in lists sent per query by the bulk helpers below
+BULK_QUERY_CHUNK_SIZE = 5000
+
+# A backfill partition claimed longer ago than this is assumed abandoned and handed to another worker
+BACKFILL_CLAIM_TIMEOUT = timedelta(minutes=15)
+BACKFILL_MAX_ATTEMPTS = 3
+
+# Leaderboard order; gamification.leaderboard breaks ties by wallet the same way
+LOYALTY_LEADERBOARD_SORT = [("current_points", -1), ("user_wallet_address", 1)]
+
+# Unique keys that make grants and point credits idempotent (see _grant_indexes_present)
+USER_ACHIEVEMENT_KEY = [("user_wallet_address", 1), ("achievement_definition_id", 1)]
+USER_LOYALTY_KEY = [("user_wallet_address", 1)]
+_grant_indexes_ready = False # Per-process cache, set once both unique indexes are known to exist
+
 # --- Collection Getters ---
 def get_achievement_definitions_collection() -> Collection:
     db = get_db()
@@ -20,16 +38,107 @@ def get_achievement_definitions_collection() -> Collection:
 
 def get_user_achievements_collection() -> Collection:
     db = get_db()
-    # Potential index: db.user_achievements.create_index([("user_wallet_address", 1), ("achievement_definition_id", 1)], unique=True)
     return db.user_achievements
 
 def get_user_loyalty_collection() -> Collection:
     db = get_db()
-    # Potential index: db.user_loyalty.create_index("user_wallet_address", unique=True)
     return db.user_loyalty
 
+def get_backfill_jobs_collection() -> Collection:
+    db = get_db()
+    return db.achievement_backfill_jobs
+
+def get_backfill_partitions_collection() -> Collection:
+    db = get_db()
+    return db.achievement_backfill_partitions
+
+def _dedupe_user_achievements() -> int:
+    """
+    Deletes repeat grants of an achievement to a user, keeping the earliest, as left by the
+    probe-then-insert grant path. Returns the number of documents deleted.
+    """
+    collection = get_user_achievements_collection()
+    deleted = 0
+    for group in collection.aggregate([
+        {"$sort": {"earned_at": 1, "_id": 1}},
+        {"$group": {"_id": {"wallet": "$user_wallet_address", "definition": "$achievement_definition_id"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True):
+        deleted += collection.delete_many({"_id": {"$in": group["ids"][1:]}}).deleted_count
+    return deleted
+
+def _dedupe_user_loyalty() -> int:
+    """
+    Merges a user's duplicate loyalty records (concurrent first-point upserts) into the oldest one,
+    summing their points. Returns the number of documents deleted.
+    """
+    collection = get_user_loyalty_collection()
+    deleted = 0
+    for group in collection.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": "$user_wallet_address", "ids": {"$push": "$_id"}, "points": {"$push": "$current_points"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True):
+        extra_points = sum(points or 0 for points in group["points"][1:])
+        collection.update_one({"_id": group["ids"][0]}, {"$inc": {"current_points": extra_points}, "$set": {"updated_at": datetime.utcnow()}})
+        deleted += collection.delete_many({"_id": {"$in": group["ids"][1:]}}).deleted_count
+    return deleted
+
+def ensure_gamification_indexes() -> None:
+    """
+    Creates the indexes the grant and loyalty writes rely on. Safe to call on every startup.
+    Raises if a unique index can't be built; grants are refused until it exists (see _grant_indexes_present).
+    """
+    global _grant_indexes_ready
+    try:
+        # grant_achievement_to_user inserts without probing; this index turns a repeat grant into a DuplicateKeyError.
+        # Its prefix also serves the per-user achievement lists.
+        create_unique_index(get_user_achievements_collection(), USER_ACHIEVEMENT_KEY, _dedupe_user_achievements)
+        # Loyalty points are applied with $inc upserts keyed on the wallet
+        loyalty = get_user_loyalty_collection()
+        create_unique_index(loyalty, USER_LOYALTY_KEY, _dedupe_user_loyalty)
+    except PyMongoError as e:
+        _grant_indexes_ready = False
+        print(f"Error creating the unique gamification indexes, achievements will not be granted until they exist: {e}")
+        raise
+    _grant_indexes_ready = True
+    try:
+        # Leaderboard reload order, and the count behind a single user's rank
+        loyalty.create_index(LOYALTY_LEADERBOARD_SORT)
+        # claim_backfill_partition takes a job's lowest unclaimed partition
+        get_backfill_partitions_collection().create_index([("job_id", 1), ("status", 1), ("index", 1)])
+        get_backfill_jobs_collection().create_index("status")
+        # Held by a job while it is queued or running, so a definition has one active backfill at a time
+        get_backfill_jobs_collection().create_index("active_definition_id", unique=True, sparse=True)
+    except PyMongoError as e:
+        print(f"Error creating gamification indexes: {e}")
+
+def _grant_indexes_present() -> bool:
+    """
+    Whether both unique indexes exist. Without them a repeated event would grant and credit points
+    again, so the grant functions refuse to write instead.
+    """
+    global _grant_indexes_ready
+    if _grant_indexes_ready:
+        return True
+    try:
+        _grant_indexes_ready = (
+            has_unique_index(get_user_achievements_collection(), USER_ACHIEVEMENT_KEY)
+            and has_unique_index(get_user_loyalty_collection(), USER_LOYALTY_KEY)
+        )
+    except PyMongoError as e:
+        print(f"Error checking the unique gamification indexes: {e}")
+        return False
+    if not _grant_indexes_ready:
+        print("Refusing to grant achievements: the unique user_achievements/user_loyalty indexes are missing (see ensure_gamification_indexes).")
+    return _grant_indexes_ready
+
 # --- AchievementDefinition CRUD ---
 
+def _with_str_id(data: Dict[str, Any]) -> Dict[str, Any]:
+    data['_id'] = str(data['_id']) # Convert ObjectId to str for the model
+    return data
+
 def create_achievement_definition(definition_data: AchievementDefinitionCreate) -> AchievementDefinition | None:
     try:
         collection = get_achievement_definitions_collection()
@@ -42,7 +151,7 @@ def create_achievement_definition(definition_data: AchievementDefinitionCreate)
 
         result: InsertOneResult = collection.insert_one(inserted_doc)
         created_def = collection.find_one({"_id": result.inserted_id})
-        return AchievementDefinition(**created_def) if created_def else None
+        return AchievementDefinition(**_with_str_id(created_def)) if created_def else None
     except PyMongoError as e: # Catch duplicate name if unique index exists
         print(f"Error creating achievement definition: {e}")
         return None
@@ -52,7 +161,7 @@ def get_achievement_definition_by_id(definition_id: str) -> AchievementDefinitio
         collection = get_achievement_definitions_collection()
         if not ObjectId.is_valid(definition_id): return None
         data = collection.find_one({"_id": ObjectId(definition_id)})
-        return AchievementDefinition(**data) if data else None
+        return AchievementDefinition(**_with_str_id(data)) if data else None
     except PyMongoError as e:
         print(f"Error getting achievement definition by ID {definition_id}: {e}")
         return None
@@ -66,7 +175,7 @@ def get_all_achievement_definitions(active_only: bool = False) -> List[Achieveme
             query["is_active"] = True
         results = collection.find(query).sort("name", 1)
         for data in results:
-            definitions.append(AchievementDefinition(**data))
+            definitions.append(AchievementDefinition(**_with_str_id(data)))
         return definitions
     except PyMongoError as e:
         print(f"Error fetching all achievement definitions: {e}")
@@ -109,44 +218,38 @@ def delete_achievement_definition(definition_id: str) -> bool:
 # --- UserAchievement Management ---
 
 def grant_achievement_to_user(user_wallet: str, definition: AchievementDefinition) -> UserAchievement | None:
+    """
+    Grants the achievement with a single insert and credits its points_reward with one $inc upsert.
+    Returns the new UserAchievement, or None if the user already had it (the unique
+    (user_wallet_address, achievement_definition_id) index rejects the insert), if that index
+    is missing, or on error.
+    """
+    if not _grant_indexes_present():
+        return None
+    user_ach = UserAchievement(
+        user_wallet_address=user_wallet,
+        achievement_definition_id=str(definition.id), # Ensure ID is string
+        name=definition.name,
+        description=definition.description,
+        icon_url=definition.icon_url
+        # earned_at has default_factory
+    )
+    inserted_doc = user_ach.model_dump(by_alias=True, exclude_none=True)
+    if "_id" in inserted_doc and inserted_doc["_id"] is None:
+        del inserted_doc["_id"]
     try:
-        collection = get_user_achievements_collection()
-        # Check if user already has this achievement
-        existing = collection.find_one({
-            "user_wallet_address": user_wallet,
-            "achievement_definition_id": str(definition.id) # Ensure definition.id is str
-        })
-        if existing:
-            print(f"User {user_wallet} already has achievement {definition.name} (ID: {definition.id}).")
-            return UserAchievement(**existing) # Return existing one
-
-        user_ach = UserAchievement(
-            user_wallet_address=user_wallet,
-            achievement_definition_id=str(definition.id), # Ensure ID is string
-            name=definition.name,
-            description=definition.description,
-            icon_url=definition.icon_url
-            # earned_at has default_factory
-        )
-        inserted_doc = user_ach.model_dump(by_alias=True, exclude_none=True)
-        if "_id" in inserted_doc and inserted_doc["_id"] is None:
-            del inserted_doc["_id"]
-
-        result: InsertOneResult = collection.insert_one(inserted_doc)
-        created_user_ach = collection.find_one({"_id": result.inserted_id})
-
-        # After granting achievement, update loyalty points if applicable
-        if definition.points_reward > 0:
-            update_user_loyalty_points(user_wallet, definition.points_reward)
-
-        return UserAchievement(**created_user_ach) if created_user_ach else None
-    except DuplicateKeyError: # If unique index on (user_wallet_address, achievement_definition_id) exists
-        print(f"DuplicateKeyError: User {user_wallet} likely already granted achievement ID {definition.id} (race condition?).")
-        existing = collection.find_one({"user_wallet_address": user_wallet, "achievement_definition_id": str(definition.id)})
-        return UserAchievement(**existing) if existing else None
+        result: InsertOneResult = get_user_achievements_collection().insert_one(inserted_doc)
+    except DuplicateKeyError: # Already granted, possibly by a concurrent event
+        return None
     except PyMongoError as e:
         print(f"Error granting achievement {definition.id} to user {user_wallet}: {e}")
         return None
+    user_ach.id = str(result.inserted_id)
+
+    # Points only follow a grant that was actually inserted
+    if definition.points_reward > 0:
+        _credit_loyalty_points(user_wallet, definition.points_reward)
+    return user_ach
 
 def get_user_achievements(user_wallet: str) -> List[UserAchievement]:
     achievements = []
@@ -154,7 +257,7 @@ def get_user_achievements(user_wallet: str) -> List[UserAchievement]:
         collection = get_user_achievements_collection()
         results = collection.find({"user_wallet_address": user_wallet}).sort("earned_at", -1)
         for data in results:
-            achievements.append(UserAchievement(**data))
+            achievements.append(UserAchievement(**_with_str_id(data)))
         return achievements
     except PyMongoError as e:
         print(f"Error fetching achievements for user {user_wallet}: {e}")
@@ -170,31 +273,121 @@ def check_if_user_has_achievement(user_wallet: str, definition_id: str) -> bool:
         print(f"Error checking achievement {definition_id} for user {user_wallet}: {e}")
         return False
 
+def get_earned_achievement_keys(user_wallets: Iterable[str], definition_ids: Iterable[str]) -> Set[Tuple[str, str]] | None:
+    """
+    Returns the (user_wallet_address, achievement_definition_id) pairs already earned among the
+    given wallets and definitions, or None on a database error.
+    """
+    wallets = list(user_wallets)
+    definition_ids = list(definition_ids)
+    earned: Set[Tuple[str, str]] = set()
+    try:
+        collection = get_user_achievements_collection()
+        for start in range(0, len(wallets), BULK_QUERY_CHUNK_SIZE):
+            results = collection.find(
+                {
+                    "user_wallet_address": {"$in": wallets[start:start + BULK_QUERY_CHUNK_SIZE]},
+                    "achievement_definition_id": {"$in": definition_ids},
+                },
+                {"_id": 0, "user_wallet_address": 1, "achievement_definition_id": 1}
+            )
+            earned.update((data["user_wallet_address"], data["achievement_definition_id"]) for data in results)
+        return earned
+    except PyMongoError as e:
+        print(f"Error fetching earned achievements for {len(wallets)} users: {e}")
+        return None
+
+def grant_achievements_bulk(grants: List[Tuple[str, AchievementDefinition]]) -> List[UserAchievement]:
+    """
+    Inserts a UserAchievement for each (user_wallet, definition) pair with one unordered insert_many,
+    then credits the points of the inserted grants with one $inc upsert per wallet. Callers filter
+    out achievements already earned (get_earned_achievement_keys); a pair that still fails to insert
+    is skipped and earns no points. Returns the inserted achievements.
+    """
+    if not grants or not _grant_indexes_present():
+        return []
+    docs = []
+    for user_wallet, definition in grants:
+        user_ach = UserAchievement(
+            user_wallet_address=user_wallet,
+            achievement_definition_id=str(definition.id),
+            name=definition.name,
+            description=definition.description,
+            icon_url=definition.icon_url
+        )
+        inserted_doc = user_ach.model_dump(by_alias=True, exclude_none=True)
+        if "_id" in inserted_doc and inserted_doc["_id"] is None:
+            del inserted_doc["_id"]
+        docs.append(inserted_doc)
+
+    failed_indexes: Set[int] = set()
+    try:
+        collection = get_user_achievements_collection()
+        collection.insert_many(docs, ordered=False) # Sets _id on each doc
+    except BulkWriteError as e: # e.g. a duplicate under a unique (wallet, definition) index
+        failed_indexes = {error["index"] for error in e.details.get("writeErrors", [])}
+        print(f"Bulk achievement grant: {len(failed_indexes)} of {len(docs)} inserts failed.")
+    except PyMongoError as e:
+        print(f"Error bulk granting {len(docs)} achievements: {e}")
+        return []
+
+    granted: List[UserAchievement] = []
+    points_by_wallet: Counter = Counter()
+    for index, (doc, (user_wallet, definition)) in enumerate(zip(docs, grants)):
+        if index in failed_indexes or "_id" not in doc:
+            continue
+        granted.append(UserAchievement(**_with_str_id(doc)))
+        if definition.points_reward > 0:
+            points_by_wallet[user_wallet] += definition.points_reward
+
+    if points_by_wallet:
+        now = datetime.utcnow()
+        try:
+            get_user_loyalty_collection().bulk_write([
+                UpdateOne(
+                    {"user_wallet_address": user_wallet},
+                    {"$inc": {"current_points": points}, "$set": {"updated_at": now}},
+                    upsert=True
+                )
+                for user_wallet, points in points_by_wallet.items()
+            ], ordered=False)
+        except PyMongoError as e:
+            print(f"Error crediting loyalty points for {len(points_by_wallet)} users: {e}")
+        _note_leaderboard_points(list(points_by_wallet))
+    return granted
+
 # --- UserLoyalty Management ---
 
+def _credit_loyalty_points(user_wallet: str, points_to_add: int) -> bool:
+    """ One $inc upsert; creates the loyalty record on a user's first points. """
+    try:
+        loyalty_data = get_user_loyalty_collection().find_one_and_update(
+            {"user_wallet_address": user_wallet},
+            {"$inc": {"current_points": points_to_add}, "$set": {"updated_at": datetime.utcnow()}},
+            projection={"_id": 0, "current_points": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except PyMongoError as e:
+        print(f"Error crediting {points_to_add} loyalty points to user {user_wallet}: {e}")
+        return False
+    loyalty_leaderboard.note_points(user_wallet, loyalty_data["current_points"])
+    return True
+
 def get_or_create_user_loyalty(user_wallet: str) -> UserLoyalty | None:
     try:
         collection = get_user_loyalty_collection()
-        loyalty_data = collection.find_one({"user_wallet_address": user_wallet})
-        if loyalty_data:
-            return UserLoyalty(**loyalty_data)
-
-        # Create new loyalty record
-        new_loyalty = UserLoyalty(user_wallet_address=user_wallet, current_points=0)
-        inserted_doc = new_loyalty.model_dump(by_alias=True, exclude_none=True)
-        # Ensure _id is not in the dict if it's None and aliased
-        if "_id" in inserted_doc and inserted_doc["_id"] is None:
-           del inserted_doc["_id"]
-
-        result: InsertOneResult = collection.insert_one(inserted_doc)
-        # Set _id for the Pydantic model based on what DB generated, or user_wallet_address if that's the _id strategy
-        # If _id is user_wallet_address, then find_one({"_id": user_wallet_address})
-        # Assuming default ObjectId for now.
-        created_loyalty = collection.find_one({"_id": result.inserted_id})
-        return UserLoyalty(**created_loyalty) if created_loyalty else None
-    except DuplicateKeyError: # If user_wallet_address is unique index and race condition
-        loyalty_data = collection.find_one({"user_wallet_address": user_wallet})
-        return UserLoyalty(**loyalty_data) if loyalty_data else None
+        # One round trip: returns the existing record or inserts an empty one
+        loyalty_data = collection.find_one_and_update(
+            {"user_wallet_address": user_wallet},
+            {"$setOnInsert": {"current_points": 0, "updated_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if not loyalty_data:
+            return None
+        loyalty_leaderboard.note_points(user_wallet, loyalty_data["current_points"]) # A new user may join a short leaderboard
+        return UserLoyalty(**_with_str_id(loyalty_data))
     except PyMongoError as e:
         print(f"Error getting/creating loyalty for user {user_wallet}: {e}")
         return None
@@ -204,28 +397,230 @@ def update_user_loyalty_points(user_wallet: str, points_to_add: int) -> UserLoya
         return get_or_create_user_loyalty(user_wallet)
     try:
         collection = get_user_loyalty_collection()
-        # Ensure loyalty record exists, then update
-        loyalty_record = get_or_create_user_loyalty(user_wallet)
-        if not loyalty_record:
-            # This implies get_or_create_user_loyalty failed, error already printed.
-            return None
-
-        result: UpdateResult = collection.update_one(
+        # Creates the record on first points; returns it after the increment
+        loyalty_data = collection.find_one_and_update(
             {"user_wallet_address": user_wallet},
             {
                 "$inc": {"current_points": points_to_add},
                 "$set": {"updated_at": datetime.utcnow()}
             },
-            upsert=False # Should not upsert here, get_or_create handles creation
+            upsert=True,
+            return_document=ReturnDocument.AFTER
         )
-        if result.modified_count > 0 or result.matched_count > 0 :
-            return get_or_create_user_loyalty(user_wallet) # Fetch updated record
+        if not loyalty_data:
+            return None
+        loyalty_leaderboard.note_points(user_wallet, loyalty_data["current_points"])
+        return UserLoyalty(**_with_str_id(loyalty_data))
+    except PyMongoError as e:
+        print(f"Error updating loyalty points for user {user_wallet}: {e}")
+        return None
 
-        # If no modification or match, something is off, as get_or_create should have made one.
-        # This path should ideally not be hit if get_or_create_user_loyalty is robust.
-        print(f"Loyalty points update for {user_wallet} did not modify/match. Current points: {loyalty_record.current_points if loyalty_record else 'N/A'}")
-        return loyalty_record # Return potentially stale record if update failed silently
+# --- Loyalty Leaderboard ---
 
+def _note_leaderboard_points(user_wallets: List[str]) -> None:
+    """
+    Reports new totals after a bulk $inc, which doesn't return them. Only users whose total can
+    place them on the cached leaderboard are read back (an indexed range query).
+    """
+    if not user_wallets or not loyalty_leaderboard.is_loaded(): # An unloaded board reads fresh totals anyway
+        return
+    query: Dict[str, Any] = {"user_wallet_address": {"$in": user_wallets}}
+    cutoff = loyalty_leaderboard.admission_cutoff()
+    if cutoff is not None:
+        query["current_points"] = {"$gte": cutoff} # Points only went up, so cached users match too
+    try:
+        for data in get_user_loyalty_collection().find(query, {"_id": 0, "user_wallet_address": 1, "current_points": 1}):
+            loyalty_leaderboard.note_points(data["user_wallet_address"], data["current_points"])
     except PyMongoError as e:
-        print(f"Error updating loyalty points for user {user_wallet}: {e}")
+        print(f"Error reading back loyalty points for the leaderboard: {e}")
+        loyalty_leaderboard.invalidate()
+
+def get_loyalty_leaderboard(offset: int = 0, limit: int = 20) -> List[LoyaltyLeaderboardEntry]:
+    """
+    Returns a page of the top loyalty_leaderboard.size users from the in-memory leaderboard,
+    reloading it with one sorted, limited query only when it is missing or too old.
+    """
+    rows = loyalty_leaderboard.page(offset, limit)
+    if rows is None:
+        try:
+            results = get_user_loyalty_collection().find(
+                {}, {"_id": 0, "user_wallet_address": 1, "current_points": 1}
+            ).sort(LOYALTY_LEADERBOARD_SORT).limit(loyalty_leaderboard.size)
+            loyalty_leaderboard.load([(data["user_wallet_address"], data["current_points"]) for data in results])
+        except PyMongoError as e:
+            print(f"Error loading the loyalty leaderboard: {e}")
+            return []
+        rows = loyalty_leaderboard.page(offset, limit) or []
+    return [
+        LoyaltyLeaderboardEntry(rank=rank, user_wallet_address=wallet, current_points=points)
+        for rank, wallet, points in rows
+    ]
+
+def get_user_loyalty_rank(user_wallet: str) -> LoyaltyRank | None:
+    """ 1 + the number of users with more points, counted on the current_points index. """
+    try:
+        collection = get_user_loyalty_collection()
+        loyalty_data = collection.find_one({"user_wallet_address": user_wallet}, {"_id": 0, "current_points": 1})
+        points = loyalty_data["current_points"] if loyalty_data else 0 # No record yet means no points
+        ahead = collection.count_documents({"current_points": {"$gt": points}})
+        return LoyaltyRank(user_wallet_address=user_wallet, current_points=points, rank=ahead + 1)
+    except PyMongoError as e:
+        print(f"Error getting loyalty rank for user {user_wallet}: {e}")
+        return None
+
+# --- Achievement Backfill Jobs ---
+
+def _backfill_job_from_doc(data: Dict[str, Any]) -> AchievementBackfillJob:
+    return AchievementBackfillJob(**_with_str_id(data))
+
+def create_backfill_job(definition_id: str, wallet_ranges: List[Tuple[Optional[str], Optional[str]]]) -> AchievementBackfillJob | None:
+    """
+    Creates a queued backfill job with one pending partition per (low, high) wallet-address range.
+    A None bound is open-ended. Returns None if a job for the definition is already queued or running.
+    """
+    try:
+        now = datetime.utcnow()
+        result: InsertOneResult = get_backfill_jobs_collection().insert_one({
+            "definition_id": definition_id, "active_definition_id": definition_id, "status": "queued",
+            "partitions_total": len(wallet_ranges), "partitions_done": 0, "partitions_failed": 0,
+            "users_qualified": 0, "achievements_granted": 0, "created_at": now, "updated_at": now,
+        })
+        job_id = str(result.inserted_id)
+        if wallet_ranges:
+            get_backfill_partitions_collection().insert_many([
+                {"job_id": job_id, "index": index, "low": low, "high": high, "status": "pending", "attempts": 0}
+                for index, (low, high) in enumerate(wallet_ranges)
+            ])
+        return get_backfill_job(job_id)
+    except DuplicateKeyError:
+        print(f"A backfill job for achievement {definition_id} is already queued or running.")
+        return None
+    except PyMongoError as e:
+        print(f"Error creating backfill job for achievement {definition_id}: {e}")
+        return None
+
+def get_backfill_job(job_id: str) -> AchievementBackfillJob | None:
+    try:
+        if not ObjectId.is_valid(job_id):
+            return None
+        data = get_backfill_jobs_collection().find_one({"_id": ObjectId(job_id)})
+        return _backfill_job_from_doc(data) if data else None
+    except PyMongoError as e:
+        print(f"Error retrieving backfill job {job_id}: {e}")
+        return None
+
+def get_active_backfill_job(definition_id: str) -> AchievementBackfillJob | None:
+    """ The definition's queued or running backfill job, if any. """
+    try:
+        data = get_backfill_jobs_collection().find_one({"active_definition_id": definition_id})
+        return _backfill_job_from_doc(data) if data else None
+    except PyMongoError as e:
+        print(f"Error retrieving the active backfill job for achievement {definition_id}: {e}")
+        return None
+
+def get_unfinished_backfill_jobs() -> List[AchievementBackfillJob]:
+    try:
+        results = get_backfill_jobs_collection().find({"status": {"$in": ["queued", "running"]}}).sort("created_at", 1)
+        return [_backfill_job_from_doc(data) for data in results]
+    except PyMongoError as e:
+        print(f"Error fetching unfinished backfill jobs: {e}")
+        return []
+
+def update_backfill_job(job_id: str, fields: Dict[str, Any]) -> bool:
+    try:
+        if not ObjectId.is_valid(job_id):
+            return False
+        update: Dict[str, Any] = {"$set": {**fields, "updated_at": datetime.utcnow()}}
+        if fields.get("status") in ("completed", "failed"):
+            update["$unset"] = {"active_definition_id": ""} # Frees the definition for another backfill
+        result: UpdateResult = get_backfill_jobs_collection().update_one({"_id": ObjectId(job_id)}, update)
+        return result.matched_count > 0
+    except PyMongoError as e:
+        print(f"Error updating backfill job {job_id}: {e}")
+        return False
+
+def mark_backfill_job_running(job_id: str) -> bool:
+    """ queued -> running; a job that is already running or finished is left as is. """
+    try:
+        now = datetime.utcnow()
+        result: UpdateResult = get_backfill_jobs_collection().update_one(
+            {"_id": ObjectId(job_id), "status": "queued"},
+            {"$set": {"status": "running", "started_at": now, "updated_at": now}}
+        )
+        return result.modified_count > 0
+    except PyMongoError as e:
+        print(f"Error starting backfill job {job_id}: {e}")
+        return False
+
+def claim_backfill_partition(job_id: str, now: datetime) -> Dict[str, Any] | None:
+    """
+    Claims the job's lowest pending partition, or one whose claim has expired (its worker died),
+    under a new claim token. Returns the partition document, or None when none is left to claim.
+    """
+    try:
+        return get_backfill_partitions_collection().find_one_and_update(
+            {"job_id": job_id, "$or": [
+                {"status": "pending"},
+                {"status": "claimed", "claimed_at": {"$lt": now - BACKFILL_CLAIM_TIMEOUT}},
+            ]},
+            {"$set": {"status": "claimed", "claim_token": str(ObjectId()), "claimed_at": now}},
+            sort=[("index", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+    except PyMongoError as e:
+        print(f"Error claiming a partition of backfill job {job_id}: {e}")
         return None
+
+def _settle_backfill_partition(partition: Dict[str, Any], fields: Dict[str, Any], job_inc: Dict[str, int]) -> bool:
+    """
+    Records a partition's outcome if the caller still holds its claim, then adds job_inc to the job's
+    counters and finishes the job once every partition is done or failed.
+    """
+    now = datetime.utcnow()
+    result: UpdateResult = get_backfill_partitions_collection().update_one(
+        {"_id": partition["_id"], "status": "claimed", "claim_token": partition["claim_token"]},
+        {"$set": {**fields, "finished_at": now}}
+    )
+    if result.matched_count == 0:
+        return False # The claim expired and the partition went to another worker
+    job = get_backfill_jobs_collection().find_one_and_update(
+        {"_id": ObjectId(partition["job_id"])},
+        {"$inc": job_inc, "$set": {"updated_at": now}},
+        return_document=ReturnDocument.AFTER
+    )
+    if job and job["partitions_done"] + job["partitions_failed"] >= job["partitions_total"]:
+        get_backfill_jobs_collection().update_one(
+            {"_id": job["_id"], "status": {"$in": ["queued", "running"]}},
+            {"$set": {"status": "failed" if job["partitions_failed"] else "completed", "finished_at": now, "updated_at": now},
+             "$unset": {"active_definition_id": ""}}
+        )
+    return True
+
+def complete_backfill_partition(partition: Dict[str, Any], users_qualified: int, achievements_granted: int) -> bool:
+    try:
+        return _settle_backfill_partition(
+            partition,
+            {"status": "done", "users_qualified": users_qualified, "achievements_granted": achievements_granted},
+            {"partitions_done": 1, "users_qualified": users_qualified, "achievements_granted": achievements_granted}
+        )
+    except PyMongoError as e:
+        print(f"Error completing partition {partition['index']} of backfill job {partition['job_id']}: {e}")
+        return False
+
+def fail_backfill_partition(partition: Dict[str, Any], error: str) -> bool:
+    """ Puts the partition back for another attempt, or fails it after BACKFILL_MAX_ATTEMPTS. """
+    try:
+        attempts = partition.get("attempts", 0) + 1
+        if attempts < BACKFILL_MAX_ATTEMPTS:
+            result: UpdateResult = get_backfill_partitions_collection().update_one(
+                {"_id": partition["_id"], "claim_token": partition["claim_token"]},
+                {"$set": {"status": "pending", "attempts": attempts, "error": error}, "$unset": {"claim_token": "", "claimed_at": ""}}
+            )
+            return result.matched_count > 0
+        if not _settle_backfill_partition(partition, {"status": "failed", "attempts": attempts, "error": error}, {"partitions_failed": 1}):
+            return False
+        update_backfill_job(partition["job_id"], {"error": f"Partition {partition['index']}: {error}"})
+        return True
+    except PyMongoError as e:
+        print(f"Error failing partition {partition['index']} of backfill job {partition['job_id']}: {e}")
+        return False
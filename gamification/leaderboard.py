@@ -0,0 +1,104 @@
+"""
+In-memory top-N loyalty leaderboard.
+
+The cache holds the LEADERBOARD_SIZE highest (current_points, wallet) pairs, ordered by points
+descending with ties broken by wallet address (the same order the reload query uses). It is
+loaded with one indexed, limited query and then kept current by gamification.db, which reports
+every score it changes. Each process has its own copy, so it is also reloaded after
+LEADERBOARD_MAX_AGE_SECONDS to pick up changes made by other workers.
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', '100'))
+LEADERBOARD_MAX_AGE_SECONDS = float(os.environ.get('LEADERBOARD_MAX_AGE_SECONDS', '60'))
+
+
+class LoyaltyLeaderboard:
+
+    def __init__(self, size: int = LEADERBOARD_SIZE, max_age_seconds: float = LEADERBOARD_MAX_AGE_SECONDS):
+        self.size = size
+        self.max_age_seconds = max_age_seconds
+        self._points: Dict[str, int] = {} # wallet -> points, for cached wallets
+        self._order: List[Tuple[int, str]] = [] # (-points, wallet), ascending = leaderboard order
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _key(self, wallet: str) -> Tuple[int, str]:
+        return (-self._points[wallet], wallet)
+
+    def _is_full(self) -> bool:
+        # Below size the cache holds every user, so any score belongs in it
+        return len(self._order) >= self.size
+
+    def load(self, rows: Iterable[Tuple[str, int]]) -> None:
+        """ Replaces the cache with (wallet, points) rows, the top `size` users from the database. """
+        with self._lock:
+            self._order = sorted((-points, wallet) for wallet, points in rows)[:self.size]
+            self._points = {wallet: -neg_points for neg_points, wallet in self._order}
+            self._loaded_at = time.monotonic()
+
+    def is_loaded(self) -> bool:
+        with self._lock:
+            return self._loaded_at is not None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def admission_cutoff(self) -> Optional[int]:
+        """
+        Lowest points a user outside the cache needs to get in, or None when any score would
+        (the cache is not loaded or not full).
+        """
+        with self._lock:
+            if self._loaded_at is None or not self._is_full():
+                return None
+            return -self._order[-1][0]
+
+    def note_points(self, wallet: str, points: int) -> None:
+        """ Records a user's new total. A drop that could let an uncached user overtake forces a reload. """
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            key = (-points, wallet)
+            if wallet in self._points:
+                old_key = self._key(wallet)
+                if key == old_key:
+                    return
+                was_full = self._is_full()
+                del self._order[bisect.bisect_left(self._order, old_key)]
+                if was_full and (not self._order or key > self._order[-1]):
+                    # Dropped to the bottom: an uncached user may now be ahead of it
+                    del self._points[wallet]
+                    self._loaded_at = None
+                    return
+            elif self._is_full():
+                if key >= self._order[-1]:
+                    return
+                _, evicted = self._order.pop()
+                del self._points[evicted]
+            bisect.insort(self._order, key)
+            self._points[wallet] = points
+
+    def page(self, offset: int, limit: int) -> Optional[List[Tuple[int, str, int]]]:
+        """
+        Returns (rank, wallet, points) rows, or None if the cache must be reloaded first.
+        Tied users share a rank (1, 2, 2, 4, ...), matching the count-based rank of a single user.
+        """
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.max_age_seconds:
+                return None
+            rows = []
+            for index in range(offset, min(offset + limit, len(self._order))):
+                neg_points, wallet = self._order[index]
+                # Everyone with more points is cached too, ahead of the first entry with these points
+                rank = bisect.bisect_left(self._order, (neg_points, "")) + 1
+                rows.append((rank, wallet, -neg_points))
+            return rows
+
+
+loyalty_leaderboard = LoyaltyLeaderboard()
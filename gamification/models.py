@@ -106,3 +106,31 @@ class UserLoyalty(BaseModel):
         populate_by_name = True
         json_encoders = {datetime: lambda dt: dt.isoformat()}
         model_config = {"from_attributes": True, "populate_by_name": True, "json_encoders": {datetime: lambda dt: dt.isoformat()}}
+
+class LoyaltyLeaderboardEntry(BaseModel):
+    rank: int = Field(..., ge=1, description="1-based; users with equal points share a rank")
+    user_wallet_address: str
+    current_points: int = Field(..., ge=0)
+
+class LoyaltyRank(BaseModel):
+    user_wallet_address: str
+    current_points: int = Field(default=0, ge=0)
+    rank: int = Field(..., ge=1, description="1 + the number of users with more points")
+
+# --- Retroactive grants for new definitions ---
+class AchievementBackfillJob(BaseModel):
+    id: Optional[str] = Field(default=None, alias='_id')
+    definition_id: str
+    status: str = "queued" # "queued", "running", "completed", "failed"
+    partitions_total: int = Field(default=0, description="Wallet-address ranges the job is split into")
+    partitions_done: int = 0
+    partitions_failed: int = Field(default=0, description="Ranges given up on after BACKFILL_MAX_ATTEMPTS")
+    users_qualified: int = Field(default=0, description="Users found to meet the definition, including ones who already had it")
+    achievements_granted: int = 0
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        populate_by_name = True
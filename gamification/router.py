@@ -1,16 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
 
+from . import backfill as achievement_backfill
 from . import db as gamification_db
+from .leaderboard import LEADERBOARD_SIZE
 from .models import (
-    AchievementDefinition, UserAchievement, UserAchievementResponse, UserLoyalty,
-    AchievementDefinitionCreate, AchievementDefinitionUpdate # For admin endpoints if added later
+    AchievementDefinition, UserAchievement, UserAchievementResponse, UserLoyalty, LoyaltyLeaderboardEntry, LoyaltyRank,
+    AchievementDefinitionCreate, AchievementDefinitionUpdate, # For admin endpoints if added later
+    AchievementBackfillJob
 )
-from auth.dependencies import get_current_user_from_token
+from auth.dependencies import get_current_admin_user, get_current_user_from_token
 from auth.models import TokenData
 import logging
+from metrics.instrumentation import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 logger = logging.getLogger(__name__)
 
 # --- Public/User-Facing Endpoints ---
@@ -65,22 +69,46 @@ async def get_my_loyalty_status(
         logger.exception(f"Error fetching loyalty status for user {user_wallet}.")
         raise HTTPException(status_code=500, detail="Could not retrieve user's loyalty status.")
 
+@router.get("/leaderboard", response_model=List[LoyaltyLeaderboardEntry], summary="Top users by loyalty points")
+async def get_loyalty_leaderboard(
+    limit: int = Query(20, ge=1, le=LEADERBOARD_SIZE),
+    offset: int = Query(0, ge=0, le=LEADERBOARD_SIZE)
+):
+    """
+    Pages through the top LEADERBOARD_SIZE users by loyalty points. Served from an in-memory
+    leaderboard that points changes keep current; use /leaderboard/my_rank beyond it.
+    """
+    return gamification_db.get_loyalty_leaderboard(offset=offset, limit=limit)
+
+@router.get("/leaderboard/my_rank", response_model=LoyaltyRank, summary="Get current user's leaderboard rank")
+async def get_my_loyalty_rank(
+    token_data: TokenData = Depends(get_current_user_from_token)
+):
+    user_wallet = token_data.wallet_address
+    if not user_wallet:
+         raise HTTPException(status_code=401, detail="Could not identify user from token.")
+    rank = gamification_db.get_user_loyalty_rank(user_wallet)
+    if rank is None:
+        raise HTTPException(status_code=500, detail="Could not retrieve user's leaderboard rank.")
+    return rank
+
 # --- Admin Endpoints (Example - Not fully part of current user-facing plan but good for completeness) ---
-# These would need admin-level authentication
+# Restricted to the wallets in ADMIN_WALLET_ADDRESSES (see auth.dependencies.get_current_admin_user)
 
 @router.post("/admin/achievements/definitions", response_model=AchievementDefinition, status_code=201, summary="ADMIN: Create new achievement definition", include_in_schema=False)
 async def admin_create_achievement_definition(
     definition_data: AchievementDefinitionCreate,
-    # TODO: Add admin authentication dependency here
-    # current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
-    # For now, accessible if uncommented and admin auth is added
-    # if not is_admin(current_admin):
-    #     raise HTTPException(status_code=403, detail="Not authorized")
     try:
         definition = gamification_db.create_achievement_definition(definition_data)
         if not definition:
             raise HTTPException(status_code=500, detail="Failed to create achievement definition.")
+        if definition.is_active:
+            # Users whose qualifying events are in the past get it from a background backfill
+            job = achievement_backfill.start_backfill(definition)
+            if job is None:
+                logger.error(f"Failed to start backfill for new achievement definition {definition.id}.")
         return definition
     except Exception as e:
         logger.exception("Admin error creating achievement definition.")
@@ -90,7 +118,7 @@ async def admin_create_achievement_definition(
 async def admin_update_achievement_definition(
     definition_id: str,
     update_data: AchievementDefinitionUpdate,
-    # TODO: Add admin authentication dependency here
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     try:
         updated_definition = gamification_db.update_achievement_definition(definition_id, update_data)
@@ -101,6 +129,41 @@ async def admin_update_achievement_definition(
         logger.exception(f"Admin error updating achievement definition {definition_id}.")
         raise HTTPException(status_code=500, detail=f"Failed to update achievement definition: {str(e)}")
 
+def _reject_active_backfill(definition_id: str) -> None:
+    active_job = gamification_db.get_active_backfill_job(definition_id)
+    if active_job:
+        raise HTTPException(status_code=409, detail=f"Backfill job {active_job.id} for this achievement is already {active_job.status}.")
+
+@router.post("/admin/achievements/definitions/{definition_id}/backfill", response_model=AchievementBackfillJob, status_code=202, summary="ADMIN: Grant an achievement to users who already meet it", include_in_schema=False)
+async def admin_backfill_achievement_definition(
+    definition_id: str,
+    current_admin: TokenData = Depends(get_current_admin_user)
+):
+    """
+    Queues a background job that grants the definition to every user whose past tickets, wins or
+    referrals meet it. Poll GET /admin/achievements/backfills/{job_id} for progress. At most one
+    job per definition is queued or running at a time; starting another is a 409.
+    """
+    definition = gamification_db.get_achievement_definition_by_id(definition_id)
+    if not definition:
+        raise HTTPException(status_code=404, detail="Achievement definition not found.")
+    _reject_active_backfill(definition_id)
+    job = achievement_backfill.start_backfill(definition)
+    if job is None:
+        _reject_active_backfill(definition_id) # Lost a race with another start
+        raise HTTPException(status_code=500, detail="Failed to start achievement backfill.")
+    return job
+
+@router.get("/admin/achievements/backfills/{job_id}", response_model=AchievementBackfillJob, summary="ADMIN: Get achievement backfill progress", include_in_schema=False)
+async def admin_get_achievement_backfill(
+    job_id: str,
+    current_admin: TokenData = Depends(get_current_admin_user)
+):
+    job = gamification_db.get_backfill_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Backfill job not found.")
+    return job
+
 # Add this router to app.py
 # from gamification.router import router as gamification_router
 # app.include_router(gamification_router, prefix="/api/gamification", tags=["Gamification"])
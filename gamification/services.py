@@ -1,4 +1,4 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
 from .models import AchievementEventType, AchievementDefinition, AchievementCriteria, UserAchievement
@@ -7,6 +7,10 @@ from users.db import get_user_by_wallet_address # To get user info if needed
 
 logger = logging.getLogger(__name__)
 
+# The event_data keys _check_criterion reads. Events that agree on these (and on the event type)
+# satisfy exactly the same definitions, so a batch evaluates the rules once per distinct shape.
+EVENT_SHAPE_KEYS = ("count", "amount", "category_id", "tier_name")
+
 class GamificationService:
     def __init__(self):
         # Cache definitions? For now, fetch each time or on startup if few.
@@ -45,6 +49,44 @@ class GamificationService:
         return True
 
 
+    def _definition_met_by_event(self, definition: AchievementDefinition, event_type: AchievementEventType, event_data: Dict[str, Any]) -> bool:
+        """Checks whether this single event satisfies the definition's criteria on its own."""
+        all_criteria_met_for_this_event = True
+        # This simple model assumes all criteria for an achievement must match the *same* event type
+        # and be satisfied by the *current* single event.
+
+        # Filter criteria relevant to the current event_type
+        relevant_criteria = [crit for crit in definition.criteria if crit.event_type == event_type]
+
+        if not relevant_criteria and definition.criteria:
+            # If definition has criteria, but none match current event type, it can't be earned by this event.
+            all_criteria_met_for_this_event = False
+        elif not definition.criteria: # Achievement with no criteria (auto-granted on some other condition perhaps?)
+            # This case should be handled by specific logic if needed, or ensure definitions always have criteria.
+            # For now, assume definitions always have criteria relevant to some event.
+            pass
+
+
+        for criterion in relevant_criteria: # Iterate through criteria that match the event type
+            if not self._check_criterion(event_data, criterion):
+                all_criteria_met_for_this_event = False
+                break # One criterion not met for this event, so this achievement isn't earned by this event
+
+        # Check if there are other criteria types in the definition that were NOT processed by this event.
+        # If so, this event alone cannot grant the achievement.
+        # This logic assumes an achievement requires ALL its defined criteria to be met simultaneously by one event
+        # if those criteria match the event type, or if other criteria types exist, they must be met by other means (not covered here).
+        # A more robust system would track progress for each criterion.
+
+        # Simplified: if all *relevant* criteria (those matching the event type) are met by this single event,
+        # AND there are no other types of criteria defined for this achievement, then grant.
+        # This means an achievement can only be triggered by one type of event.
+
+        other_criteria_types_exist = any(crit.event_type != event_type for crit in definition.criteria)
+        if other_criteria_types_exist and relevant_criteria : # If this event matched some, but others are pending
+             all_criteria_met_for_this_event = False # Cannot grant with this event alone
+        return all_criteria_met_for_this_event and bool(relevant_criteria) # Must have matched at least one relevant criterion
+
     def process_event(self, user_wallet_address: str, event_type: AchievementEventType, event_data: Optional[Dict[str, Any]] = None):
         """
         Processes an event for a user and checks if any achievements are unlocked.
@@ -66,53 +108,15 @@ class GamificationService:
             return
 
         for definition in active_definitions:
-            if gamification_db.check_if_user_has_achievement(user_wallet_address, str(definition.id)):
-                # logger.debug(f"User {user_wallet_address} already has achievement '{definition.name}'. Skipping.")
+            if not self._definition_met_by_event(definition, event_type, event_data):
                 continue
-
-            all_criteria_met_for_this_event = True
-            # This simple model assumes all criteria for an achievement must match the *same* event type
-            # and be satisfied by the *current* single event.
-
-            # Filter criteria relevant to the current event_type
-            relevant_criteria = [crit for crit in definition.criteria if crit.event_type == event_type]
-
-            if not relevant_criteria and definition.criteria:
-                # If definition has criteria, but none match current event type, it can't be earned by this event.
-                all_criteria_met_for_this_event = False
-            elif not definition.criteria: # Achievement with no criteria (auto-granted on some other condition perhaps?)
-                # This case should be handled by specific logic if needed, or ensure definitions always have criteria.
-                # For now, assume definitions always have criteria relevant to some event.
-                pass
-
-
-            for criterion in relevant_criteria: # Iterate through criteria that match the event type
-                if not self._check_criterion(event_data, criterion):
-                    all_criteria_met_for_this_event = False
-                    break # One criterion not met for this event, so this achievement isn't earned by this event
-
-            # Check if there are other criteria types in the definition that were NOT processed by this event.
-            # If so, this event alone cannot grant the achievement.
-            # This logic assumes an achievement requires ALL its defined criteria to be met simultaneously by one event
-            # if those criteria match the event type, or if other criteria types exist, they must be met by other means (not covered here).
-            # A more robust system would track progress for each criterion.
-
-            # Simplified: if all *relevant* criteria (those matching the event type) are met by this single event,
-            # AND there are no other types of criteria defined for this achievement, then grant.
-            # This means an achievement can only be triggered by one type of event.
-
-            other_criteria_types_exist = any(crit.event_type != event_type for crit in definition.criteria)
-            if other_criteria_types_exist and relevant_criteria : # If this event matched some, but others are pending
-                 all_criteria_met_for_this_event = False # Cannot grant with this event alone
-
-            if all_criteria_met_for_this_event and relevant_criteria: # Must have matched at least one relevant criterion
-                logger.info(f"User '{user_wallet_address}' meets criteria for achievement '{definition.name}' (ID: {definition.id}) with event '{event_type.value}'.")
-                granted_achievement = gamification_db.grant_achievement_to_user(user_wallet_address, definition)
-                if granted_achievement:
-                    logger.info(f"Achievement '{definition.name}' granted to user '{user_wallet_address}'. Points: {definition.points_reward}")
-                    # Potentially trigger other actions, like notifications (out of scope for this service)
-                else:
-                    logger.error(f"Failed to grant achievement '{definition.name}' to user '{user_wallet_address}' despite meeting criteria.")
+            # No has-it-already read: the unique (wallet, definition) index rejects a repeat grant
+            granted_achievement = gamification_db.grant_achievement_to_user(user_wallet_address, definition)
+            if granted_achievement:
+                logger.info(f"Achievement '{definition.name}' granted to user '{user_wallet_address}' for event '{event_type.value}'. Points: {definition.points_reward}")
+                # Potentially trigger other actions, like notifications (out of scope for this service)
+            else:
+                logger.debug(f"User '{user_wallet_address}' meets criteria for '{definition.name}' but already has it (or the grant failed).")
 
         # Direct loyalty points update based on event (optional, if not tied to achievements)
         # Example:
@@ -123,5 +127,55 @@ class GamificationService:
         #         logger.info(f"Awarded {points_for_purchase} loyalty points to {user_wallet_address} for ticket purchase.")
 
 
+    def process_events_batch(self, events: List[Tuple[str, AchievementEventType, Optional[Dict[str, Any]]]]) -> List[UserAchievement]:
+        """
+        Batch form of process_event for many (user_wallet_address, event_type, event_data) events,
+        e.g. every winner of a draw. Definitions are loaded once and evaluated once per distinct
+        event shape (see EVENT_SHAPE_KEYS); achievements already earned are fetched in bulk and
+        the new grants inserted in bulk. A wallet earns each achievement at most once per batch.
+        Returns the newly granted achievements.
+        """
+        if not events:
+            return []
+
+        active_definitions: List[AchievementDefinition] = gamification_db.get_all_achievement_definitions(active_only=True)
+        if not active_definitions:
+            logger.debug("No active achievement definitions found.")
+            return []
+
+        definitions_by_shape: Dict[Tuple[Any, ...], List[AchievementDefinition]] = {}
+        candidates: Dict[Tuple[str, str], AchievementDefinition] = {} # (wallet, definition_id) -> definition, in event order
+        for user_wallet_address, event_type, event_data in events:
+            event_data = event_data or {}
+            shape = (event_type,) + tuple(event_data.get(key) for key in EVENT_SHAPE_KEYS)
+            met_definitions = definitions_by_shape.get(shape)
+            if met_definitions is None:
+                met_definitions = definitions_by_shape[shape] = [
+                    definition for definition in active_definitions
+                    if self._definition_met_by_event(definition, event_type, event_data)
+                ]
+            for definition in met_definitions:
+                candidates.setdefault((user_wallet_address, str(definition.id)), definition)
+
+        logger.info(f"Processed {len(events)} events in {len(definitions_by_shape)} distinct shapes; {len(candidates)} candidate grants.")
+        if not candidates:
+            return []
+
+        already_earned = gamification_db.get_earned_achievement_keys(
+            {wallet for wallet, _ in candidates}, {definition_id for _, definition_id in candidates}
+        )
+        if already_earned is None:
+            logger.error(f"Could not fetch earned achievements; skipping {len(candidates)} candidate grants.")
+            return []
+
+        new_grants = [(key[0], definition) for key, definition in candidates.items() if key not in already_earned]
+        granted = gamification_db.grant_achievements_bulk(new_grants)
+        if len(granted) != len(new_grants):
+            logger.warning(f"Granted {len(granted)} of {len(new_grants)} achievements; the rest were already earned or failed to insert.")
+        else:
+            logger.info(f"Granted {len(granted)} achievements.")
+        return granted
+
+
 # Global service instance (or use FastAPI dependency injection)
 gamification_service = GamificationService()
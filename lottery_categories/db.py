@@ -41,7 +41,8 @@ def get_category_by_id(category_id: str) -> LotteryCategory | None:
             return None
         db_category = collection.find_one({"_id": ObjectId(category_id)})
         if db_category:
-            return LotteryCategory(**db_category) # Pydantic will handle _id alias
+            db_category['_id'] = str(db_category['_id']) # Convert ObjectId to str for the model
+            return LotteryCategory(**db_category)
         return None
     except PyMongoError as e:
         print(f"Error retrieving lottery category by ID '{category_id}' from MongoDB: {e}")
@@ -51,6 +52,25 @@ def get_category_by_id(category_id: str) -> LotteryCategory | None:
         return None
 
 
+def get_categories_by_ids(category_ids: List[str]) -> Dict[str, LotteryCategory]:
+    """ Fetches many categories with one $in query. Returns {category_id: category}. """
+    try:
+        object_ids = [ObjectId(cid) for cid in set(category_ids) if ObjectId.is_valid(cid)]
+        if not object_ids:
+            return {}
+        categories = {}
+        for db_category in get_categories_collection().find({"_id": {"$in": object_ids}}):
+            db_category['_id'] = str(db_category['_id'])
+            try:
+                categories[db_category['_id']] = LotteryCategory(**db_category)
+            except Exception as e:
+                print(f"Error processing data for category ID '{db_category['_id']}': {e}")
+        return categories
+    except PyMongoError as e:
+        print(f"Error fetching lottery categories by IDs: {e}")
+        return {}
+
+
 def get_all_categories(active_only: bool = False) -> list[LotteryCategory]:
     """
     Retrieves all lottery categories, optionally filtering for active ones.
@@ -65,6 +85,7 @@ def get_all_categories(active_only: bool = False) -> list[LotteryCategory]:
         db_categories = collection.find(query).sort("name", 1) # Sort by name
         for cat_data in db_categories:
             try:
+                cat_data['_id'] = str(cat_data['_id']) # Convert ObjectId to str for the model
                 categories.append(LotteryCategory(**cat_data))
             except Exception as e: # Pydantic validation error for a specific doc
                 print(f"Error processing category data for _id '{cat_data.get('_id')}': {e}")
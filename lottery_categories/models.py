@@ -2,6 +2,16 @@ from pydantic import BaseModel, Field, validator
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
+from rng.utils import RAFFLE_SELECTION_SEQUENTIAL, RAFFLE_SELECTION_KEYED_RANK
+
+RAFFLE_SELECTION_MODES = (RAFFLE_SELECTION_SEQUENTIAL, RAFFLE_SELECTION_KEYED_RANK)
+
+def _check_selection_mode(game_config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # A mistyped mode would silently fall back to sequential selection, so it is rejected up front
+    if game_config and "selection_mode" in game_config and game_config["selection_mode"] not in RAFFLE_SELECTION_MODES:
+        raise ValueError(f"game_config selection_mode must be one of {', '.join(RAFFLE_SELECTION_MODES)}.")
+    return game_config
+
 class PrizeTierConfig(BaseModel):
     tier_name: str = Field(..., description="Name of the prize tier (e.g., 'Jackpot', 'Match 4', 'Second Prize')")
     description: Optional[str] = Field(None, max_length=100, description="Brief description of what this tier rewards")
@@ -60,7 +70,10 @@ class LotteryCategoryBase(BaseModel):
         return tiers
 
 class LotteryCategoryCreate(LotteryCategoryBase):
-    pass
+
+    @validator('game_config')
+    def validate_selection_mode(cls, game_config: Dict[str, Any]):
+        return _check_selection_mode(game_config)
 
 class LotteryCategoryUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=3, max_length=50)
@@ -76,12 +89,23 @@ class LotteryCategoryUpdate(BaseModel):
     is_active: Optional[bool] = None
     current_rollover_amount: Optional[float] = Field(None, ge=0) # Typically updated by system, but allow manual override
 
+    @validator('game_config')
+    def validate_selection_mode(cls, game_config: Optional[Dict[str, Any]]):
+        return _check_selection_mode(game_config)
+
 
 class LotteryCategory(LotteryCategoryBase):
     id: str = Field(alias='_id', description="MongoDB document ID")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+    def uses_ticket_seqs(self) -> bool:
+        """
+        Whether purchases reserve per-draw ticket sequence numbers: Pick-N tickets key the postings
+        index by them, and keyed_rank raffles are ranked in ticket_seq ranges.
+        """
+        return self.game_type == "pick_n_digits" or (self.game_config or {}).get("selection_mode") == RAFFLE_SELECTION_KEYED_RANK
+
     class Config:
         populate_by_name = True
         json_encoders = {
@@ -4,8 +4,9 @@ from typing import List, Optional
 from . import db as categories_db
 from .models import LotteryCategory, LotteryCategoryCreate, LotteryCategoryUpdate
 from pymongo.errors import PyMongoError
+from metrics.instrumentation import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.post("/", response_model=LotteryCategory, status_code=201)
 def create_new_category(category_in: LotteryCategoryCreate):
@@ -0,0 +1,277 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+
+# Histogram bucket upper bounds in milliseconds (last bucket is +inf)
+DURATION_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+# Histogram bucket upper bounds for Mongo commands per request (spots N+1 patterns)
+COMMAND_COUNT_BUCKETS = [0, 1, 2, 5, 10, 25, 50, 100, 250, 1000]
+
+
+class RequestMetrics:
+    """Timings collected while serving a single request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.mongo_by_collection: Dict[str, List[float]] = {} # collection -> [count, seconds]
+        self.xrpl_seconds = 0.0
+        self.xrpl_calls = 0
+        self.serialize_seconds = 0.0
+        self.endpoint_returned_at: Optional[float] = None # Set by TimedRoute
+
+    def add_mongo(self, collection: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.mongo_by_collection.setdefault(collection, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    @property
+    def mongo_commands(self) -> int:
+        return sum(int(count) for count, _ in self.mongo_by_collection.values())
+
+    @property
+    def mongo_seconds(self) -> float:
+        return sum(seconds for _, seconds in self.mongo_by_collection.values())
+
+
+_current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request_metrics", default=None)
+
+
+def current_request_metrics() -> Optional[RequestMetrics]:
+    return _current_request.get()
+
+
+@contextmanager
+def track_xrpl_call():
+    """Attributes the wrapped block's wall time to XRPL RPC for the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics = _current_request.get()
+        if request_metrics is not None:
+            request_metrics.xrpl_seconds += time.perf_counter() - started
+            request_metrics.xrpl_calls += 1
+
+
+class _Histogram:
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"le_{b}" for b in self.bounds] + ["le_inf"]
+        return {"buckets": dict(zip(labels, self.counts)), "sum": round(self.total, 3), "max": round(self.max, 3)}
+
+
+class _RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.duration_ms = _Histogram(DURATION_BUCKETS_MS)
+        self.mongo_ms = _Histogram(DURATION_BUCKETS_MS)
+        self.mongo_commands = _Histogram(COMMAND_COUNT_BUCKETS)
+        self.xrpl_ms = _Histogram(DURATION_BUCKETS_MS)
+        self.serialize_ms = _Histogram(DURATION_BUCKETS_MS)
+        self.mongo_by_collection: Dict[str, List[float]] = {} # collection -> [count, ms]
+
+
+class MetricsRegistry:
+    """Process-wide per-route aggregates, exposed by /api/_metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, _RouteStats] = {}
+
+    def record(self, route: str, duration_seconds: float, request_metrics: RequestMetrics) -> None:
+        with self._lock:
+            stats = self._routes.setdefault(route, _RouteStats())
+            stats.requests += 1
+            stats.duration_ms.observe(duration_seconds * 1000)
+            stats.mongo_ms.observe(request_metrics.mongo_seconds * 1000)
+            stats.mongo_commands.observe(request_metrics.mongo_commands)
+            if request_metrics.xrpl_calls:
+                stats.xrpl_ms.observe(request_metrics.xrpl_seconds * 1000)
+            stats.serialize_ms.observe(request_metrics.serialize_seconds * 1000)
+            for collection, (count, seconds) in request_metrics.mongo_by_collection.items():
+                entry = stats.mongo_by_collection.setdefault(collection, [0, 0.0])
+                entry[0] += count
+                entry[1] += seconds * 1000
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                route: {
+                    "requests": stats.requests,
+                    "duration_ms": stats.duration_ms.snapshot(),
+                    "mongo_ms": stats.mongo_ms.snapshot(),
+                    "mongo_commands_per_request": stats.mongo_commands.snapshot(),
+                    "xrpl_ms": stats.xrpl_ms.snapshot(),
+                    "serialize_ms": stats.serialize_ms.snapshot(),
+                    "mongo_by_collection": {
+                        collection: {"commands": int(count), "total_ms": round(ms, 3)}
+                        for collection, (count, ms) in sorted(stats.mongo_by_collection.items())
+                    },
+                }
+                for route, stats in sorted(self._routes.items())
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+metrics_registry = MetricsRegistry()
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    Attributes every Mongo command to the request that issued it.
+    pymongo calls listeners synchronously on the issuing thread, and Starlette copies the
+    request context into its threadpool, so the contextvar is visible for sync endpoints too.
+    """
+
+    def __init__(self):
+        self._collections: Dict[Tuple[Any, int], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if _current_request.get() is None:
+            return
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        collection = target if isinstance(target, str) else event.command_name
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _finished(self, event) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), None)
+        request_metrics = _current_request.get()
+        if collection is not None and request_metrics is not None:
+            request_metrics.add_mongo(collection, event.duration_micros / 1_000_000)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finished(event)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware that opens a RequestMetrics scope per HTTP request, adds a
+    Server-Timing header to the response and records the request in metrics_registry.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_metrics = RequestMetrics()
+        token = _current_request.set(request_metrics)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(request_metrics, elapsed).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_request.reset(token)
+            route = scope.get("route")
+            route_label = f"{scope['method']} {route.path}" if route is not None else "unmatched"
+            metrics_registry.record(route_label, time.perf_counter() - started, request_metrics)
+
+
+def _server_timing(request_metrics: RequestMetrics, elapsed_seconds: float) -> str:
+    return ", ".join([
+        f'mongo;dur={request_metrics.mongo_seconds * 1000:.2f};desc="{request_metrics.mongo_commands} cmds"',
+        f'xrpl;dur={request_metrics.xrpl_seconds * 1000:.2f}',
+        f'serialize;dur={request_metrics.serialize_seconds * 1000:.2f}',
+        f'app;dur={elapsed_seconds * 1000:.2f}',
+    ])
+
+
+def _mark_endpoint_return(call: Callable) -> Callable:
+    """ Wraps an endpoint to note when it returns, keeping it sync or async as FastAPI dispatches on that. """
+    def mark():
+        request_metrics = _current_request.get()
+        if request_metrics is not None:
+            request_metrics.endpoint_returned_at = time.perf_counter()
+
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def async_endpoint(*args, **kwargs):
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                mark()
+        return async_endpoint
+
+    @functools.wraps(call)
+    def endpoint(*args, **kwargs): # Runs in the threadpool, which copies the request's context
+        try:
+            return call(*args, **kwargs)
+        finally:
+            mark()
+    return endpoint
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that records response serialization time: from the endpoint returning to the
+    route handler having its Response (response_model validation, jsonable_encoder, rendering).
+    Routers opt in with APIRouter(route_class=TimedRoute).
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Any]:
+        self.dependant.call = _mark_endpoint_return(self.dependant.call)
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            response = await handler(request)
+            request_metrics = _current_request.get()
+            if request_metrics is not None and request_metrics.endpoint_returned_at is not None:
+                request_metrics.serialize_seconds += time.perf_counter() - request_metrics.endpoint_returned_at
+                request_metrics.endpoint_returned_at = None
+            return response
+
+        return timed_handler
+
+
+_listener_registered = False
+
+def install_instrumentation(app) -> None:
+    """
+    Registers the Mongo command listener and the request middleware. Serialization time
+    is only recorded for routes of routers built with route_class=TimedRoute.
+    Must run before the MongoClient is created (listeners are bound at client construction).
+    """
+    global _listener_registered
+    if not _listener_registered: # pymongo listeners are process-wide
+        monitoring.register(MongoCommandTimer())
+        _listener_registered = True
+    app.add_middleware(RequestMetricsMiddleware)
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query
+
+from auth.dependencies import get_current_admin_user
+from .instrumentation import TimedRoute, metrics_registry
+
+# Route timings and traffic are operational data: admins only
+router = APIRouter(route_class=TimedRoute, dependencies=[Depends(get_current_admin_user)])
+
+@router.get("", summary="Per-route request timing histograms")
+async def get_request_metrics(reset: bool = Query(False, description="Clear the aggregates after returning them.")):
+    """
+    Request duration, Mongo time and command counts (overall and per collection),
+    XRPL RPC time and response serialization time, aggregated per route since
+    startup or the last reset.
+    """
+    snapshot = metrics_registry.snapshot()
+    if reset:
+        metrics_registry.reset()
+    return {"routes": snapshot}
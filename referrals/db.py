@@ -1,26 +1,28 @@
 import string
 import random
+from pymongo import ReturnDocument
 from pymongo.collection import Collection
 from pymongo.results import InsertOneResult, UpdateResult, DeleteResult
 from pymongo.errors import PyMongoError, DuplicateKeyError
 from bson import ObjectId
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
-from database import get_db
+from database import create_unique_index, get_db, has_unique_index, migration_done, run_migration
 from .models import ReferralCode, ReferralCodeCreate, ReferralCodeUpdate, \
                     ReferralLink, ReferralLinkCreate, ReferralLinkUpdate
 
 REFERRAL_CODE_LENGTH = 8 # Length of the generated referral code
 
+# Unique keys create_referral_code relies on instead of probing (see _code_indexes_present)
+REFERRAL_CODE_KEY = [("code", 1)]
+REFERRAL_CODE_WALLET_KEY = [("wallet_address", 1)] # A user has one code
+_code_indexes_ready = False # Per-process cache, set once both unique indexes are known to exist
+
 def get_referral_codes_collection() -> Collection:
     """Returns the 'referral_codes' collection from MongoDB."""
     db = get_db()
-    # Ensure indexes - this should ideally be done once at app startup or offline
-    # For simplicity, doing it here, but it's not efficient to call repeatedly.
-    # In a production app, manage indexes separately.
-    # db.referral_codes.create_index("code", unique=True)
-    # db.referral_codes.create_index("wallet_address", unique=True) # A user has one code
+    # Unique indexes on code and wallet_address are created by ensure_referral_indexes()
     return db.referral_codes
 
 def get_referral_links_collection() -> Collection:
@@ -30,57 +32,148 @@ def get_referral_links_collection() -> Collection:
     # db.referral_links.create_index("referrer_wallet_address")
     return db.referral_links
 
+def _with_str_id(data: dict) -> dict:
+    data['_id'] = str(data['_id']) # Convert ObjectId to str for the model
+    return data
+
+def get_referrer_stats_collection() -> Collection:
+    """
+    Returns the 'referrer_stats' collection: one document per referrer wallet (_id) holding
+    link counts per reward_status, so referral stats are a single _id lookup.
+    """
+    db = get_db()
+    return db.referrer_stats
+
+def _dedupe_wallet_codes() -> int:
+    """
+    Deletes a wallet's extra referral codes, as left by the probe-then-insert code path, keeping its
+    earliest code and adding the extra codes' usage counts to it. Returns the number of documents deleted.
+    """
+    collection = get_referral_codes_collection()
+    deleted = 0
+    for group in collection.aggregate([
+        {"$sort": {"created_at": 1, "_id": 1}},
+        {"$group": {"_id": "$wallet_address", "ids": {"$push": "$_id"}, "usage": {"$push": "$usage_count"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True):
+        extra_usage = sum(usage or 0 for usage in group["usage"][1:])
+        collection.update_one({"_id": group["ids"][0]}, {"$inc": {"usage_count": extra_usage}, "$set": {"updated_at": datetime.utcnow()}})
+        deleted += collection.delete_many({"_id": {"$in": group["ids"][1:]}}).deleted_count
+    return deleted
+
+def _dedupe_codes() -> int:
+    """
+    Gives every wallet but the earliest holder of a repeated code string a fresh code, so links made
+    with that code keep pointing at one wallet. Returns the number of documents recoded.
+    """
+    collection = get_referral_codes_collection()
+    recoded = 0
+    for group in collection.aggregate([
+        {"$sort": {"created_at": 1, "_id": 1}},
+        {"$group": {"_id": "$code", "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True):
+        for code_id in group["ids"][1:]:
+            while True:
+                code = generate_unique_referral_code_str()
+                if not collection.find_one({"code": code}, {"_id": 1}):
+                    break
+            collection.update_one({"_id": code_id}, {"$set": {"code": code, "updated_at": datetime.utcnow()}})
+            recoded += 1
+    return recoded
+
+def ensure_referral_indexes() -> None:
+    """
+    Creates the indexes the referral queries rely on. Safe to call on every startup. Duplicates that
+    stop a unique index from building are resolved first; while one is still missing,
+    create_referral_code probes with reads instead (see _code_indexes_present).
+    """
+    global _code_indexes_ready
+    codes = get_referral_codes_collection()
+    try:
+        # create_referral_code relies on both unique indexes instead of probing with reads.
+        create_unique_index(codes, REFERRAL_CODE_KEY, _dedupe_codes)
+        create_unique_index(codes, REFERRAL_CODE_WALLET_KEY, _dedupe_wallet_codes)
+        _code_indexes_ready = True
+    except PyMongoError as e:
+        _code_indexes_ready = False
+        print(f"Error creating the unique referral code indexes, codes are allocated by probing until they exist: {e}")
+    try:
+        # Also serves plain referrer_wallet_address lookups (index prefix).
+        get_referral_links_collection().create_index([("referrer_wallet_address", 1), ("reward_status", 1)])
+    except PyMongoError as e:
+        print(f"Error creating referral indexes: {e}")
+
+def _code_indexes_present() -> bool:
+    """
+    Whether both unique referral code indexes exist. Without them an insert can neither detect a
+    code collision nor a wallet's existing code, so create_referral_code probes first.
+    """
+    global _code_indexes_ready
+    if _code_indexes_ready:
+        return True
+    try:
+        codes = get_referral_codes_collection()
+        _code_indexes_ready = has_unique_index(codes, REFERRAL_CODE_KEY) and has_unique_index(codes, REFERRAL_CODE_WALLET_KEY)
+    except PyMongoError as e:
+        print(f"Error checking the unique referral code indexes: {e}")
+        return False
+    return _code_indexes_ready
+
 def generate_unique_referral_code_str(length: int = REFERRAL_CODE_LENGTH) -> str:
     """Generates a random alphanumeric string for a referral code."""
-    # Not guaranteed unique globally by itself, uniqueness is enforced by DB insert attempt.
-    # For higher volume, might need a more robust unique ID generator or retry loop.
+    # Not guaranteed unique by itself, uniqueness is enforced by the unique index on insert.
     chars = string.ascii_uppercase + string.digits
     return ''.join(random.choice(chars) for _ in range(length))
 
+MAX_CODE_ALLOCATION_ATTEMPTS = 5
+
+def _duplicate_key_field(error: DuplicateKeyError) -> Optional[str]:
+    """Returns the indexed field a DuplicateKeyError was raised for, if the server reported it."""
+    key_pattern = (error.details or {}).get("keyPattern") or {}
+    return next(iter(key_pattern), None)
+
 def create_referral_code(wallet_address: str) -> ReferralCode | None:
     """
     Creates a new referral code for a wallet if one doesn't exist, or returns the existing one.
     A wallet can only have one referral code.
+    Relies on the unique indexes on code and wallet_address: the common case is a single
+    insert, a code collision is retried with a fresh code, and a concurrent request that
+    already created the wallet's code wins. While those indexes are missing, the wallet's code
+    and each candidate code are probed with reads before inserting.
     """
     collection = get_referral_codes_collection()
     try:
-        existing_code = collection.find_one({"wallet_address": wallet_address})
-        if existing_code:
-            return ReferralCode(**existing_code)
-
-        # Try to generate a unique code. Retry a few times if collision (unlikely with reasonable length).
-        unique_code_str = ""
-        max_retries = 5
-        for _ in range(max_retries):
-            code_str_candidate = generate_unique_referral_code_str()
-            if not collection.find_one({"code": code_str_candidate}):
-                unique_code_str = code_str_candidate
-                break
-
-        if not unique_code_str:
-            print(f"Failed to generate a unique referral code string after {max_retries} retries.")
-            return None # Could not generate a unique code
-
-        code_data = ReferralCodeCreate(
-            code=unique_code_str,
-            wallet_address=wallet_address
-            # usage_count and is_active default in ReferralCodeBase/Create
-            # created_at, updated_at default in ReferralCodeCreate
-        )
-        # Pydantic model_dump for v2, .dict() for v1
-        data_to_insert = code_data.model_dump()
+        probe = not _code_indexes_present()
+        if probe:
+            existing_code = collection.find_one({"wallet_address": wallet_address})
+            if existing_code:
+                return ReferralCode(**_with_str_id(existing_code))
+        for _ in range(MAX_CODE_ALLOCATION_ATTEMPTS):
+            code_data = ReferralCodeCreate(
+                code=generate_unique_referral_code_str(),
+                wallet_address=wallet_address
+                # usage_count and is_active default in ReferralCodeBase/Create
+                # created_at, updated_at default in ReferralCodeCreate
+            )
+            data_to_insert = code_data.model_dump()
+            if probe and collection.find_one({"code": code_data.code}, {"_id": 1}):
+                continue # Code collision, draw another one
+            try:
+                result: InsertOneResult = collection.insert_one(data_to_insert)
+            except DuplicateKeyError as e:
+                if _duplicate_key_field(e) == "code":
+                    continue # Code collision, draw another one
+                # The wallet already has a code (or the server didn't say which key clashed).
+                existing_code = collection.find_one({"wallet_address": wallet_address})
+                if existing_code:
+                    return ReferralCode(**_with_str_id(existing_code))
+                continue
+            data_to_insert["_id"] = result.inserted_id
+            return ReferralCode(**_with_str_id(data_to_insert))
 
-        result: InsertOneResult = collection.insert_one(data_to_insert)
-        created_doc = collection.find_one({"_id": result.inserted_id})
-        if created_doc:
-            return ReferralCode(**created_doc)
+        print(f"Failed to allocate a unique referral code for wallet {wallet_address} after {MAX_CODE_ALLOCATION_ATTEMPTS} attempts.")
         return None
-    except DuplicateKeyError: # Should be caught by the find_one for wallet_address
-        print(f"DuplicateKeyError: Referral code likely already exists for wallet {wallet_address} or code collision.")
-        existing_code = collection.find_one({"wallet_address": wallet_address})
-        if existing_code:
-            return ReferralCode(**existing_code)
-        return None # Should not happen if wallet_address index is unique
     except PyMongoError as e:
         print(f"Error creating referral code for wallet {wallet_address}: {e}")
         return None
@@ -92,7 +185,7 @@ def get_referral_code_by_code(code: str) -> ReferralCode | None:
         collection = get_referral_codes_collection()
         db_code = collection.find_one({"code": code})
         if db_code:
-            return ReferralCode(**db_code)
+            return ReferralCode(**_with_str_id(db_code))
         return None
     except PyMongoError as e:
         print(f"Error retrieving referral code by code '{code}': {e}")
@@ -104,7 +197,7 @@ def get_referral_code_by_wallet(wallet_address: str) -> ReferralCode | None:
         collection = get_referral_codes_collection()
         db_code = collection.find_one({"wallet_address": wallet_address})
         if db_code:
-            return ReferralCode(**db_code)
+            return ReferralCode(**_with_str_id(db_code))
         return None
     except PyMongoError as e:
         print(f"Error retrieving referral code by wallet '{wallet_address}': {e}")
@@ -152,9 +245,10 @@ def create_referral_link(referrer_wallet: str, referee_wallet: str, referral_cod
         data_to_insert = link_data.model_dump()
 
         result: InsertOneResult = collection.insert_one(data_to_insert)
+        _adjust_referrer_stats(referrer_wallet, {link_data.reward_status: 1})
         created_doc = collection.find_one({"_id": result.inserted_id})
         if created_doc:
-            return ReferralLink(**created_doc)
+            return ReferralLink(**_with_str_id(created_doc))
         return None
     except DuplicateKeyError: # This would happen if referee_wallet_address has a unique index
         print(f"DuplicateKeyError: Referral link for referee {referee_wallet} likely already exists.")
@@ -169,7 +263,7 @@ def get_referral_link_by_referee(referee_wallet: str) -> ReferralLink | None:
         collection = get_referral_links_collection()
         db_link = collection.find_one({"referee_wallet_address": referee_wallet})
         if db_link:
-            return ReferralLink(**db_link)
+            return ReferralLink(**_with_str_id(db_link))
         return None
     except PyMongoError as e:
         print(f"Error retrieving referral link by referee '{referee_wallet}': {e}")
@@ -182,14 +276,14 @@ def get_referral_links_by_referrer(referrer_wallet: str, limit: int = 50, offset
         collection = get_referral_links_collection()
         db_links = collection.find({"referrer_wallet_address": referrer_wallet}).sort("created_at", -1).skip(offset).limit(limit)
         for link_data in db_links:
-            links.append(ReferralLink(**link_data))
+            links.append(ReferralLink(**_with_str_id(link_data)))
         return links
     except PyMongoError as e:
         print(f"Error retrieving referral links by referrer '{referrer_wallet}': {e}")
         return []
 
 def update_referral_link_status(link_id_str: str, new_status: str) -> bool:
-    """Updates the reward_status of a referral link."""
+    """Updates the reward_status of a referral link and moves it between the referrer's status counters."""
     try:
         collection = get_referral_links_collection()
         if not ObjectId.is_valid(link_id_str):
@@ -198,37 +292,143 @@ def update_referral_link_status(link_id_str: str, new_status: str) -> bool:
         link_id = ObjectId(link_id_str)
         update_data = ReferralLinkUpdate(reward_status=new_status, updated_at=datetime.utcnow())
 
-        result: UpdateResult = collection.update_one(
-            {"_id": link_id},
-            {"$set": update_data.model_dump(exclude_unset=True)}
+        # The previous status comes back with the update itself, so the counters can be
+        # adjusted without a separate read. Unchanged statuses don't match and aren't counted.
+        previous = collection.find_one_and_update(
+            {"_id": link_id, "reward_status": {"$ne": new_status}},
+            {"$set": update_data.model_dump(exclude_unset=True)},
+            projection={"referrer_wallet_address": 1, "reward_status": 1},
+            return_document=ReturnDocument.BEFORE
         )
-        return result.modified_count > 0
+        if not previous:
+            return False
+        _adjust_referrer_stats(previous["referrer_wallet_address"], {previous["reward_status"]: -1, new_status: 1})
+        return True
     except PyMongoError as e:
         print(f"Error updating status for referral link ID '{link_id_str}': {e}")
         return False
 
+# --- Referrer stats ---
+# Counters are updated after the link write they describe. Links created before the counters
+# existed are counted in by migrate_referrer_stats() at startup; until it has finished, stats
+# are counted from referral_links. rebuild_referrer_stats() recomputes them to repair drift
+# after a failed counter write, which is also how a negative counter is handled on read.
+
+REFERRER_STATS_MIGRATION = "referrer_stats_v1"
+
+def _adjust_referrer_stats(referrer_wallet: str, deltas: Dict[str, int]) -> None:
+    try:
+        inc = {f"status_counts.{status}": delta for status, delta in deltas.items()}
+        total_delta = sum(deltas.values())
+        if total_delta:
+            inc["total"] = total_delta
+        inc["version"] = 1 # Lets the migration detect a write that raced it
+        get_referrer_stats_collection().update_one(
+            {"_id": referrer_wallet},
+            {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+    except PyMongoError as e:
+        print(f"Error updating referrer stats for '{referrer_wallet}': {e}")
+
+def _count_links_by_status(referrer_wallet: str) -> Dict[str, int]:
+    pipeline = [
+        {"$match": {"referrer_wallet_address": referrer_wallet}},
+        {"$group": {"_id": "$reward_status", "count": {"$sum": 1}}}
+    ]
+    return {row["_id"]: row["count"] for row in get_referral_links_collection().aggregate(pipeline)}
+
+def count_referral_links_by_status(referrer_wallet: str) -> Dict[str, int]:
+    """Counts a referrer's links per reward_status with a $group over the (referrer, reward_status) index."""
+    try:
+        return _count_links_by_status(referrer_wallet)
+    except PyMongoError as e:
+        print(f"Error counting referral links for referrer '{referrer_wallet}': {e}")
+        return {}
+
+def get_referrer_status_counts(referrer_wallet: str) -> Dict[str, int]:
+    """
+    Returns {reward_status: count} for a referrer's links from the counters document.
+    Counts the links instead while the counters are not trusted: before the stats migration has
+    finished, when the referrer has no counters yet, or when one has gone negative (drift, which
+    is repaired by rebuilding that referrer's counters).
+    """
+    try:
+        if not migration_done(REFERRER_STATS_MIGRATION):
+            return count_referral_links_by_status(referrer_wallet)
+        stats = get_referrer_stats_collection().find_one({"_id": referrer_wallet}, {"status_counts": 1})
+        if not stats:
+            return count_referral_links_by_status(referrer_wallet)
+        status_counts = stats.get("status_counts", {})
+        if any(count < 0 for count in status_counts.values()):
+            print(f"Negative referral counters for '{referrer_wallet}', rebuilding them: {status_counts}")
+            rebuild_referrer_stats(referrer_wallet)
+            return count_referral_links_by_status(referrer_wallet)
+        return {status: count for status, count in status_counts.items() if count}
+    except PyMongoError as e:
+        print(f"Error retrieving referrer stats for '{referrer_wallet}': {e}")
+        return {}
+
+def _counters_fields(status_counts: Dict[str, int]) -> dict:
+    return {"status_counts": status_counts, "total": sum(status_counts.values()), "updated_at": datetime.utcnow()}
+
+def rebuild_referrer_stats(referrer_wallet: Optional[str] = None) -> int:
+    """
+    Recomputes counters from referral_links for one referrer or (referrer_wallet=None) all of them.
+    Returns the number of referrers written.
+    """
+    try:
+        match = {"referrer_wallet_address": referrer_wallet} if referrer_wallet else {}
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": {"referrer": "$referrer_wallet_address", "status": "$reward_status"}, "count": {"$sum": 1}}}
+        ]
+        counts_by_referrer: Dict[str, Dict[str, int]] = {}
+        for row in get_referral_links_collection().aggregate(pipeline):
+            counts_by_referrer.setdefault(row["_id"]["referrer"], {})[row["_id"]["status"]] = row["count"]
+
+        stats_collection = get_referrer_stats_collection()
+        for wallet, status_counts in counts_by_referrer.items():
+            stats_collection.update_one({"_id": wallet}, {"$set": _counters_fields(status_counts), "$inc": {"version": 1}}, upsert=True)
+        return len(counts_by_referrer)
+    except PyMongoError as e:
+        print(f"Error rebuilding referrer stats: {e}")
+        return 0
+
+def _seed_referrer_stats(referrer_wallet: str) -> None:
+    """
+    Replaces one referrer's counters with counts of their links, unless a counter write lands
+    in between (its version changes, or it creates the document first); then counts again.
+    """
+    stats_collection = get_referrer_stats_collection()
+    while True:
+        current = stats_collection.find_one({"_id": referrer_wallet}, {"version": 1})
+        status_counts = _count_links_by_status(referrer_wallet)
+        if current is None:
+            try:
+                stats_collection.insert_one({"_id": referrer_wallet, "version": 0, **_counters_fields(status_counts)})
+                return
+            except DuplicateKeyError:
+                continue
+        result = stats_collection.replace_one(
+            {"_id": referrer_wallet, "version": current.get("version")},
+            {"version": current.get("version", 0) + 1, **_counters_fields(status_counts)}
+        )
+        if result.matched_count:
+            return
+
+def _backfill_referrer_stats() -> None:
+    referrers = get_referral_links_collection().aggregate([{"$group": {"_id": "$referrer_wallet_address"}}])
+    for row in referrers:
+        _seed_referrer_stats(row["_id"])
+
+def migrate_referrer_stats() -> bool:
+    """ Startup step: counts links created before the counters existed, once per database. Returns True once it is done. """
+    return run_migration(REFERRER_STATS_MIGRATION, _backfill_referrer_stats)
+
 # Note on Indexes:
-# For 'referral_codes':
-# - Create unique index on 'code'
-# - Create unique index on 'wallet_address' (if one user gets one code)
-# For 'referral_links':
-# - Create unique index on 'referee_wallet_address'
-# - Create index on 'referrer_wallet_address'
-# These should be created once, e.g., via an admin script or on app startup using PyMongo's `create_indexes`.
-# Example (do this in database.py or a setup script):
-# def setup_referral_indexes(db_client):
-#     codes_collection = db_client[DB_NAME].referral_codes
-#     codes_collection.create_index("code", unique=True)
-#     codes_collection.create_index("wallet_address", unique=True)
-#
-#     links_collection = db_client[DB_NAME].referral_links
-#     links_collection.create_index("referee_wallet_address", unique=True)
-#     links_collection.create_index("referrer_wallet_address")
-# This is commented out here as db.py is for functions, not index setup directly.
-# The index hints in models.py `Field(..., index=True)` are for documentation/ORM use,
-# Pydantic itself doesn't create DB indexes.
-# `unique=True` in `Field` is also for documentation for basic Pydantic,
-# actual DB unique constraint is via `create_index`.
-# For `referee_wallet_address`, the `DuplicateKeyError` handling relies on this unique index.
-# For `code` and `wallet_address` in `referral_codes`, the `create_referral_code` has a find-first logic
-# to handle "get or create" and a retry for code string generation, but unique indexes are still best practice.
+# ensure_referral_indexes() (called on app startup) creates:
+# - 'referral_codes': unique 'code', unique 'wallet_address'
+# - 'referral_links': (referrer_wallet_address, reward_status)
+# A unique index on 'referral_links.referee_wallet_address' is still recommended;
+# create_referral_link handles the DuplicateKeyError it would raise.
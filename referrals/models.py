@@ -32,6 +32,9 @@ class ReferralCode(ReferralCodeBase):
             "arbitrary_types_allowed": True
         }
 
+# reward_status values that count as a successful referral
+SUCCESSFUL_REFERRAL_STATUSES = ("eligible_for_reward", "reward_credited")
+
 class ReferralLinkBase(BaseModel):
     referrer_wallet_address: str = Field(..., description="Wallet address of the user who referred.", index=True)
     referee_wallet_address: str = Field(..., description="Wallet address of the user who was referred.", unique=True, index=True) # Mark as unique and for indexing
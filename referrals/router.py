@@ -3,10 +3,11 @@ from typing import List, Optional
 from pydantic import BaseModel # Added import for BaseModel
 
 from . import db as referrals_db
-from .models import ReferralCode, ReferralLink, UserReferralStats, MyReferralCodeResponse
+from .models import ReferralCode, ReferralLink, UserReferralStats, MyReferralCodeResponse, SUCCESSFUL_REFERRAL_STATUSES
 from pymongo.errors import PyMongoError
+from metrics.instrumentation import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 class WalletAddressBody(BaseModel): # Pydantic model for request body
     wallet_address: str
@@ -49,20 +50,10 @@ async def get_referral_stats_for_wallet(
     try:
         user_code: Optional[ReferralCode] = referrals_db.get_referral_code_by_wallet(wallet_address)
 
-        # Count successful referrals (e.g., those who completed a purchase or a specific action)
-        # This requires defining what a "successful" referral means in terms of ReferralLink.reward_status
-        # For now, let's count links where reward_status is 'eligible_for_reward' or 'reward_credited'
-        successful_referral_links = []
-        if user_code: # Only count if they have a code to refer with
-            links_by_user_code = await get_links_for_code(user_code.code) # Helper needed or direct query
-
-            # This part needs a db function like get_referral_links_by_code_and_status
-            # For simplicity now, let's assume we get all links by referrer and filter
-            # This is inefficient for many links.
-            all_referrer_links = referrals_db.get_referral_links_by_referrer(wallet_address)
-            for link in all_referrer_links:
-                if link.reward_status in ["eligible_for_reward", "reward_credited"]:
-                    successful_referral_links.append(link)
+        # Successful referrals are links whose reward_status is in SUCCESSFUL_REFERRAL_STATUSES.
+        # Counts come from the referrer's counters document, so they are exact for any number of links.
+        status_counts = referrals_db.get_referrer_status_counts(wallet_address)
+        successful_referrals_count = sum(status_counts.get(status, 0) for status in SUCCESSFUL_REFERRAL_STATUSES)
 
         # Check if this user was referred by someone
         link_as_referee = referrals_db.get_referral_link_by_referee(wallet_address)
@@ -72,7 +63,7 @@ async def get_referral_stats_for_wallet(
             wallet_address=wallet_address,
             referral_code=user_code.code if user_code else None,
             referral_code_usage_count=user_code.usage_count if user_code else 0,
-            successful_referrals_count=len(successful_referral_links),
+            successful_referrals_count=successful_referrals_count,
             referred_by=referred_by_wallet
         )
 
@@ -82,23 +73,3 @@ async def get_referral_stats_for_wallet(
     except Exception as e:
         print(f"Unexpected error in /stats/{wallet_address} endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
-
-
-# Helper function (could be in db.py or here if specific to router logic)
-# This is an example, the actual query might be more complex or better placed in db.py
-async def get_links_for_code(referral_code: str) -> List[ReferralLink]:
-    # This is a placeholder. A proper db function would be:
-    # referrals_db.get_referral_links_by_code(referral_code)
-    # For now, this won't work as intended without that db function.
-    # The current get_referral_links_by_referrer is what's used above.
-    # This function is not directly used by the current stats endpoint logic above.
-    # It's here to illustrate a potential need.
-    print(f"Placeholder: Would fetch links for code {referral_code}")
-    return []
-
-# TODO for /stats endpoint:
-# The current way of calculating successful_referrals_count by fetching all links by referrer
-# and then filtering is not optimal.
-# Ideally, add a DB function:
-# `count_successful_referrals_for_referrer(referrer_wallet: str, success_statuses: List[str]) -> int`
-# For now, the current implementation will work for small numbers but should be optimized.
@@ -1,6 +1,15 @@
 import hashlib
+import heapq
 import hmac # For HMAC-based PRNG for PickN
-from typing import List, Dict, Any
+import itertools
+from operator import itemgetter
+from typing import List, Dict, Any, Iterable, Tuple
+
+# Raffle selection modes (LotteryCategory.game_config["selection_mode"])
+RAFFLE_SELECTION_SEQUENTIAL = "sequential" # Default: calculate_winner_index per tier over the ticket list
+RAFFLE_SELECTION_KEYED_RANK = "keyed_rank" # The k tickets with the lowest raffle_ticket_score win
+
+_SCORE_KEY = itemgetter(0, 1) # (score, ticket_id); ticket ids are unique, so payloads are never compared
 
 def calculate_winner_index(seed: str, num_participants: int) -> int:
     """
@@ -22,6 +31,42 @@ def calculate_winner_index(seed: str, num_participants: int) -> int:
     winner_index = val % num_participants
     return winner_index
 
+def derive_draw_seed(ledger_hash: str, draw_id: str) -> str:
+    """
+    Per-draw selection seed: hex HMAC-SHA256 of the draw ID keyed by the ledger hash. Draws closed
+    with the same ledger hash (e.g. one /close_due batch) still get independent outcomes.
+    """
+    return hmac.new(ledger_hash.encode('utf-8'), draw_id.encode('utf-8'), hashlib.sha256).hexdigest()
+
+def raffle_ticket_score(seed: str, ticket_id: str) -> bytes:
+    """
+    HMAC-SHA256 of the ticket ID keyed by the seed (e.g., ledger hash). Scores are independent
+    per ticket, so anyone holding the seed can check a winner's score from its ticket ID alone.
+    """
+    return hmac.new(seed.encode('utf-8'), ticket_id.encode('utf-8'), hashlib.sha256).digest()
+
+def lowest_scoring_tickets(seed: str, tickets: Iterable[Tuple[str, Any]], k: int) -> List[Tuple[bytes, str, Any]]:
+    """
+    Returns the k (score, ticket_id, payload) entries with the lowest raffle_ticket_score, lowest first,
+    from (ticket_id, payload) pairs. One pass with a heap of k entries, so tickets can be a cursor.
+    Run it per shard of the tickets and combine the shard results with merge_lowest_scoring.
+    """
+    if k <= 0:
+        return []
+    keyed = hmac.new(seed.encode('utf-8'), digestmod=hashlib.sha256)
+
+    def scored():
+        for ticket_id, payload in tickets:
+            h = keyed.copy()
+            h.update(ticket_id.encode('utf-8'))
+            yield h.digest(), ticket_id, payload
+
+    return heapq.nsmallest(k, scored(), key=_SCORE_KEY)
+
+def merge_lowest_scoring(shard_results: Iterable[List[Tuple[bytes, str, Any]]], k: int) -> List[Tuple[bytes, str, Any]]:
+    """ Combines per-shard lowest_scoring_tickets results into the overall k lowest. """
+    return list(itertools.islice(heapq.merge(*shard_results, key=_SCORE_KEY), k))
+
 def generate_winning_picks(seed: str, game_config: Dict[str, Any]) -> List[Any]:
     """
     Generates a list of winning picks for "Pick N" style games based on a seed
@@ -1,3 +1,4 @@
+from pymongo import ReturnDocument, UpdateOne
 from pymongo.collection import Collection
 from pymongo.results import InsertOneResult, UpdateResult, DeleteResult
 from pymongo.errors import PyMongoError
@@ -5,12 +6,14 @@ from bson import ObjectId
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from database import get_db
+from database import get_db, migration_done, run_in_transaction, run_migration
 from .models import (
-    Syndicate, SyndicateMember, SyndicateMemberStatus,
+    Syndicate, SyndicateMember, SyndicateMemberStatus, SyndicateMemberRole,
     SyndicateTicketPurchase, SyndicateWinningsDistribution, MemberShare
 )
 from users.db import get_user_by_wallet_address # To fetch nickname
+from tickets.db import get_tickets_collection
+from tickets.models import TicketCreate
 
 def get_syndicates_collection() -> Collection:
     db = get_db()
@@ -19,6 +22,11 @@ def get_syndicates_collection() -> Collection:
     # db.syndicates.create_index("members.wallet_address") # For finding syndicates a user is in
     return db.syndicates
 
+def get_syndicate_memberships_collection() -> Collection:
+    db = get_db()
+    # Indexes are created by ensure_syndicate_indexes()
+    return db.syndicate_memberships
+
 def get_syndicate_ticket_purchases_collection() -> Collection:
     db = get_db()
     # Potential indexes:
@@ -35,6 +43,112 @@ def get_syndicate_winnings_collection() -> Collection:
     # db.syndicate_winnings.create_index("winning_ticket_id")
     return db.syndicate_winnings
 
+def _with_str_id(data: Dict[str, Any]) -> Dict[str, Any]:
+    data['_id'] = str(data['_id']) # Convert ObjectId to str for the model
+    return data
+
+def ensure_syndicate_indexes() -> None:
+    """ Creates the indexes the syndicate queries rely on. Safe to call on every startup. """
+    try:
+        memberships = get_syndicate_memberships_collection()
+        memberships.create_index([("wallet_address", 1), ("status", 1)])
+        memberships.create_index([("syndicate_id", 1), ("wallet_address", 1)], unique=True)
+    except PyMongoError as e:
+        print(f"Error creating syndicate indexes: {e}")
+
+# --- Membership index (syndicate_memberships) ---
+# The embedded members array stays the source of truth. Every member mutation
+# updates the syndicate first and then upserts the matching membership row; if
+# that second write fails, rebuild_syndicate_memberships() resyncs from the array.
+# Syndicates created before the index existed get their rows and active_member_count
+# from migrate_syndicate_memberships() at startup; until it has finished, lookups
+# fall back to the members array.
+
+MEMBERSHIPS_MIGRATION = "syndicate_memberships_v1"
+
+def _upsert_membership(syndicate_id: str, wallet_address: str, status: SyndicateMemberStatus, role: SyndicateMemberRole = SyndicateMemberRole.MEMBER) -> None:
+    try:
+        get_syndicate_memberships_collection().update_one(
+            {"syndicate_id": syndicate_id, "wallet_address": wallet_address},
+            {"$set": {"status": status.value, "updated_at": datetime.utcnow()}, "$setOnInsert": {"role": role.value}},
+            upsert=True
+        )
+    except PyMongoError as e:
+        print(f"Error syncing membership of {wallet_address} in syndicate {syndicate_id}: {e}")
+
+def _member_role(member: Dict[str, Any], syndicate_data: Dict[str, Any]) -> str:
+    return (SyndicateMemberRole.ADMIN if member["wallet_address"] == syndicate_data["creator_wallet_address"] else SyndicateMemberRole.MEMBER).value
+
+def _active_member_count(members: List[Dict[str, Any]]) -> int:
+    return sum(1 for m in members if m["status"] == SyndicateMemberStatus.ACTIVE.value)
+
+def rebuild_syndicate_memberships(syndicate_id: Optional[str] = None) -> int:
+    """
+    Rewrites membership rows and active_member_count from the embedded members arrays,
+    for one syndicate or (syndicate_id=None) all of them, to repair drift.
+    Returns the number of syndicates processed.
+    """
+    processed = 0
+    try:
+        syndicates = get_syndicates_collection()
+        memberships = get_syndicate_memberships_collection()
+        query = {}
+        if syndicate_id is not None:
+            if not ObjectId.is_valid(syndicate_id): return 0
+            query = {"_id": ObjectId(syndicate_id)}
+        for data in syndicates.find(query, {"members": 1, "creator_wallet_address": 1}):
+            sid = str(data["_id"])
+            members = data.get("members", [])
+            memberships.delete_many({"syndicate_id": sid})
+            if members:
+                now = datetime.utcnow()
+                memberships.insert_many([{
+                    "syndicate_id": sid,
+                    "wallet_address": m["wallet_address"],
+                    "status": m["status"],
+                    "role": _member_role(m, data),
+                    "updated_at": now
+                } for m in members])
+            syndicates.update_one({"_id": data["_id"]}, {"$set": {"active_member_count": _active_member_count(members)}})
+            processed += 1
+        return processed
+    except PyMongoError as e:
+        print(f"Error rebuilding syndicate memberships: {e}")
+        return processed
+
+def _backfill_syndicate_memberships() -> None:
+    """
+    Adds the membership rows missing for existing syndicates and sets active_member_count from
+    the members array. Safe alongside live member mutations: rows are only inserted, never
+    overwritten (an existing row was written by a mutation and is newer), and the count is set
+    only if the array is unchanged since it was read, otherwise the syndicate is read again.
+    """
+    syndicates = get_syndicates_collection()
+    memberships = get_syndicate_memberships_collection()
+    for data in syndicates.find({}, {"members": 1, "creator_wallet_address": 1}):
+        sid = str(data["_id"])
+        while True:
+            members = data.get("members", [])
+            if members:
+                memberships.bulk_write([UpdateOne(
+                    {"syndicate_id": sid, "wallet_address": m["wallet_address"]},
+                    {"$setOnInsert": {"status": m["status"], "role": _member_role(m, data), "updated_at": datetime.utcnow()}},
+                    upsert=True
+                ) for m in members], ordered=False)
+            result = syndicates.update_one(
+                {"_id": data["_id"], "members": data.get("members", [])},
+                {"$set": {"active_member_count": _active_member_count(members)}}
+            )
+            if result.matched_count:
+                break
+            data = syndicates.find_one({"_id": data["_id"]}, {"members": 1, "creator_wallet_address": 1})
+            if data is None: # Deleted meanwhile
+                break
+
+def migrate_syndicate_memberships() -> bool:
+    """ Startup step: backfills the membership index once per database. Returns True once it is done. """
+    return run_migration(MEMBERSHIPS_MIGRATION, _backfill_syndicate_memberships)
+
 # --- Syndicate CRUD ---
 
 def create_syndicate(name: str, description: Optional[str], creator_wallet_address: str, default_category_id: Optional[str]) -> Syndicate | None:
@@ -54,6 +168,7 @@ def create_syndicate(name: str, description: Optional[str], creator_wallet_addre
             description=description,
             creator_wallet_address=creator_wallet_address,
             members=[initial_member],
+            active_member_count=1,
             default_lottery_category_id=default_category_id,
             # created_at, updated_at have default_factory
         )
@@ -64,8 +179,9 @@ def create_syndicate(name: str, description: Optional[str], creator_wallet_addre
             del inserted_doc["_id"]
 
         result: InsertOneResult = collection.insert_one(inserted_doc)
+        _upsert_membership(str(result.inserted_id), creator_wallet_address, SyndicateMemberStatus.ACTIVE, SyndicateMemberRole.ADMIN)
         created_syndicate = collection.find_one({"_id": result.inserted_id})
-        return Syndicate(**created_syndicate) if created_syndicate else None
+        return Syndicate(**_with_str_id(created_syndicate)) if created_syndicate else None
     except PyMongoError as e:
         print(f"Error creating syndicate: {e}")
         return None
@@ -75,7 +191,7 @@ def get_syndicate_by_id(syndicate_id: str) -> Syndicate | None:
         collection = get_syndicates_collection()
         if not ObjectId.is_valid(syndicate_id): return None
         data = collection.find_one({"_id": ObjectId(syndicate_id)})
-        return Syndicate(**data) if data else None
+        return Syndicate(**_with_str_id(data)) if data else None
     except PyMongoError as e:
         print(f"Error getting syndicate by ID {syndicate_id}: {e}")
         return None
@@ -112,27 +228,48 @@ def delete_syndicate_by_id(syndicate_id: str) -> bool:
         # Consider implications: what if syndicate has active participations or pending winnings?
         # For now, direct delete. Add checks or soft delete if needed.
         result: DeleteResult = collection.delete_one({"_id": ObjectId(syndicate_id)})
+        if result.deleted_count > 0:
+            get_syndicate_memberships_collection().delete_many({"syndicate_id": syndicate_id})
         return result.deleted_count > 0
     except PyMongoError as e:
         print(f"Error deleting syndicate {syndicate_id}: {e}")
         return False
 
-def get_syndicates_for_member(wallet_address: str) -> List[Syndicate]:
+def get_syndicates_for_member(wallet_address: str, include_members: bool = True) -> List[Syndicate]:
+    """
+    Syndicates where the wallet is active or invited, found through the indexed
+    syndicate_memberships collection. With include_members=False the (potentially
+    large) members array is not fetched; use active_member_count instead.
+    Before the membership migration has finished, scans the members arrays instead.
+    """
     syndicates = []
     try:
-        collection = get_syndicates_collection()
-        # Find syndicates where the members array contains an element matching the wallet_address and status is active or invited
-        query = {"members": {"$elemMatch": {"wallet_address": wallet_address, "status": {"$in": [SyndicateMemberStatus.ACTIVE, SyndicateMemberStatus.INVITED]}}}}
-        # Also include syndicates created by the user
-        # query = {"$or": [
-        #     {"creator_wallet_address": wallet_address},
-        #     {"members": {"$elemMatch": {"wallet_address": wallet_address, "status": {"$in": [SyndicateMemberStatus.ACTIVE, SyndicateMemberStatus.INVITED]}}}}
-        # ]}
-        # Simpler: just based on membership for "my_syndicates" for now
-
-        results = collection.find(query)
+        listed_statuses = [SyndicateMemberStatus.ACTIVE.value, SyndicateMemberStatus.INVITED.value]
+        if not migration_done(MEMBERSHIPS_MIGRATION):
+            results = get_syndicates_collection().find(
+                {"members": {"$elemMatch": {"wallet_address": wallet_address, "status": {"$in": listed_statuses}}}}
+            )
+            for data in results:
+                data["active_member_count"] = _active_member_count(data.get("members", [])) # Not set on legacy documents
+                if not include_members:
+                    data["members"] = []
+                syndicates.append(Syndicate(**_with_str_id(data)))
+            return syndicates
+
+        memberships = get_syndicate_memberships_collection()
+        # Covered by the (wallet_address, status) index
+        rows = memberships.find(
+            {"wallet_address": wallet_address, "status": {"$in": listed_statuses}},
+            {"syndicate_id": 1, "_id": 0}
+        )
+        syndicate_ids = [ObjectId(row["syndicate_id"]) for row in rows if ObjectId.is_valid(row["syndicate_id"])]
+        if not syndicate_ids:
+            return []
+
+        projection = None if include_members else {"members": 0}
+        results = get_syndicates_collection().find({"_id": {"$in": syndicate_ids}}, projection)
         for data in results:
-            syndicates.append(Syndicate(**data))
+            syndicates.append(Syndicate(**_with_str_id(data)))
         return syndicates
     except PyMongoError as e:
         print(f"Error fetching syndicates for member {wallet_address}: {e}")
@@ -140,72 +277,120 @@ def get_syndicates_for_member(wallet_address: str) -> List[Syndicate]:
 
 # --- Syndicate Member Management ---
 
-def add_or_update_syndicate_member(syndicate_id: str, member_wallet: str, status: SyndicateMemberStatus, invited_by_wallet: Optional[str] = None) -> Syndicate | None:
+# Member mutations are single find_one_and_update round trips: the filter carries the
+# precondition (member present with the expected status) and arrayFilters target the
+# member element, so there is no read-modify-write race on array positions.
+
+def invite_syndicate_member(syndicate_id: str, member_wallet: str, nickname: Optional[str] = None) -> Syndicate | None:
+    """
+    Adds member_wallet as INVITED, or re-invites them if they previously left or were removed.
+    Returns the updated syndicate, or None if the syndicate doesn't exist or the user is already
+    active/invited.
+    """
     try:
         collection = get_syndicates_collection()
         if not ObjectId.is_valid(syndicate_id): return None
+        now = datetime.utcnow()
+
+        # New member: push guarded by $ne so concurrent invites can't add the wallet twice.
+        new_member = SyndicateMember(wallet_address=member_wallet, nickname=nickname, status=SyndicateMemberStatus.INVITED)
+        data = collection.find_one_and_update(
+            {"_id": ObjectId(syndicate_id), "members.wallet_address": {"$ne": member_wallet}},
+            {"$push": {"members": new_member.model_dump()}, "$set": {"updated_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if data:
+            _upsert_membership(syndicate_id, member_wallet, SyndicateMemberStatus.INVITED)
+            return Syndicate(**_with_str_id(data))
+
+        # Former member (left/removed): flip the existing element back to invited.
+        inactive_statuses = [SyndicateMemberStatus.LEFT.value, SyndicateMemberStatus.REMOVED.value]
+        update_fields = {"members.$[m].status": SyndicateMemberStatus.INVITED.value, "updated_at": now}
+        if nickname is not None:
+            update_fields["members.$[m].nickname"] = nickname
+        data = collection.find_one_and_update(
+            {"_id": ObjectId(syndicate_id), "members": {"$elemMatch": {"wallet_address": member_wallet, "status": {"$in": inactive_statuses}}}},
+            {"$set": update_fields},
+            array_filters=[{"m.wallet_address": member_wallet}],
+            return_document=ReturnDocument.AFTER
+        )
+        if not data:
+            return None
+        _upsert_membership(syndicate_id, member_wallet, SyndicateMemberStatus.INVITED)
+        return Syndicate(**_with_str_id(data))
+    except PyMongoError as e:
+        print(f"Error inviting member {member_wallet} to syndicate {syndicate_id}: {e}")
+        return None
 
-        syndicate = get_syndicate_by_id(syndicate_id)
-        if not syndicate: return None
-
-        member_idx = -1
-        for i, mem in enumerate(syndicate.members):
-            if mem.wallet_address == member_wallet:
-                member_idx = i
-                break
-
-        user_profile = get_user_by_wallet_address(member_wallet)
-        nickname = user_profile.nickname if user_profile else None
-
-        if member_idx != -1: # Update existing member
-            update_query = {f"members.{member_idx}.status": status.value, "updated_at": datetime.utcnow()}
-            if status == SyndicateMemberStatus.ACTIVE and syndicate.members[member_idx].status == SyndicateMemberStatus.INVITED:
-                update_query[f"members.{member_idx}.join_date"] = datetime.utcnow()
-            if nickname is not None: # Update nickname if fetched
-                 update_query[f"members.{member_idx}.nickname"] = nickname
-
-            collection.update_one({"_id": ObjectId(syndicate_id)}, {"$set": update_query})
-        else: # Add new member (typically for invite)
-            if status != SyndicateMemberStatus.INVITED: # Only allow adding new members as 'invited' initially by this function path
-                 print(f"Cannot add new member {member_wallet} to syndicate {syndicate_id} with status {status}. Must be invited first.")
-                 return None # Or raise error
-
-            new_member = SyndicateMember(wallet_address=member_wallet, nickname=nickname, status=SyndicateMemberStatus.INVITED)
-            collection.update_one(
-                {"_id": ObjectId(syndicate_id)},
-                {"$push": {"members": new_member.model_dump()}, "$set": {"updated_at": datetime.utcnow()}}
-            )
-        return get_syndicate_by_id(syndicate_id)
+def accept_syndicate_invite(syndicate_id: str, member_wallet: str, nickname: Optional[str] = None) -> Syndicate | None:
+    """ Moves an INVITED member to ACTIVE. Returns None if there is no pending invite. """
+    try:
+        collection = get_syndicates_collection()
+        if not ObjectId.is_valid(syndicate_id): return None
+        now = datetime.utcnow()
+
+        update_fields = {
+            "members.$[m].status": SyndicateMemberStatus.ACTIVE.value,
+            "members.$[m].join_date": now,
+            "updated_at": now
+        }
+        if nickname is not None:
+            update_fields["members.$[m].nickname"] = nickname
+        data = collection.find_one_and_update(
+            {"_id": ObjectId(syndicate_id), "members": {"$elemMatch": {"wallet_address": member_wallet, "status": SyndicateMemberStatus.INVITED.value}}},
+            {"$set": update_fields, "$inc": {"active_member_count": 1}},
+            array_filters=[{"m.wallet_address": member_wallet, "m.status": SyndicateMemberStatus.INVITED.value}],
+            return_document=ReturnDocument.AFTER
+        )
+        if not data:
+            return None
+        _upsert_membership(syndicate_id, member_wallet, SyndicateMemberStatus.ACTIVE)
+        return Syndicate(**_with_str_id(data))
     except PyMongoError as e:
-        print(f"Error adding/updating member {member_wallet} in syndicate {syndicate_id}: {e}")
+        print(f"Error accepting invite for {member_wallet} in syndicate {syndicate_id}: {e}")
         return None
 
-def remove_syndicate_member(syndicate_id: str, member_wallet: str, new_status: SyndicateMemberStatus = SyndicateMemberStatus.REMOVED) -> Syndicate | None:
-    """ Can be used for 'leave' (status=LEFT) or 'remove' (status=REMOVED) """
+def remove_syndicate_member(
+    syndicate_id: str,
+    member_wallet: str,
+    new_status: SyndicateMemberStatus = SyndicateMemberStatus.REMOVED,
+    from_statuses: Optional[List[SyndicateMemberStatus]] = None
+) -> Syndicate | None:
+    """
+    Can be used for 'leave' (status=LEFT) or 'remove' (status=REMOVED).
+    Members keep their array element (with the new status) so history is preserved.
+    Only members currently in from_statuses (default: active or invited) are changed;
+    returns None if no such member exists.
+    """
     try:
         collection = get_syndicates_collection()
         if not ObjectId.is_valid(syndicate_id): return None
 
-        syndicate = get_syndicate_by_id(syndicate_id)
-        if not syndicate or not any(m.wallet_address == member_wallet for m in syndicate.members):
-            return None # Syndicate or member not found
-
-        # Instead of $pull, update status to LEFT or REMOVED to keep history if desired.
-        # Or, if true removal:
-        # result = collection.update_one(
-        #     {"_id": ObjectId(syndicate_id)},
-        #     {"$pull": {"members": {"wallet_address": member_wallet}}, "$set": {"updated_at": datetime.utcnow()}}
-        # )
-        # For now, update status:
-        res = collection.update_one(
-            {"_id": ObjectId(syndicate_id), "members.wallet_address": member_wallet},
-            {"$set": {"members.$.status": new_status.value, "updated_at": datetime.utcnow()}}
+        from_values = [status.value for status in (from_statuses or [SyndicateMemberStatus.ACTIVE, SyndicateMemberStatus.INVITED])]
+        is_member = {"$eq": ["$$m.wallet_address", member_wallet]}
+        changes: Dict[str, Any] = {
+            "members": {"$map": {"input": "$members", "as": "m", "in": {"$cond": [
+                {"$and": [is_member, {"$in": ["$$m.status", from_values]}]},
+                {"$mergeObjects": ["$$m", {"status": new_status.value}]},
+                "$$m"
+            ]}}},
+            "updated_at": datetime.utcnow(),
+        }
+        if SyndicateMemberStatus.ACTIVE.value in from_values:
+            # Expressions in a $set stage see the document before it, so this counts the member only if it was active
+            was_active = {"$filter": {"input": "$members", "as": "m", "cond": {"$and": [is_member, {"$eq": ["$$m.status", SyndicateMemberStatus.ACTIVE.value]}]}}}
+            changes["active_member_count"] = {"$subtract": ["$active_member_count", {"$size": was_active}]}
+        # One pipeline update whatever the member's status; array filters can't be combined with a pipeline
+        data = collection.find_one_and_update(
+            {"_id": ObjectId(syndicate_id), "members": {"$elemMatch": {"wallet_address": member_wallet, "status": {"$in": from_values}}}},
+            [{"$set": changes}],
+            return_document=ReturnDocument.AFTER
         )
-        if res.modified_count == 0 and res.matched_count == 0: # Defensive check
-            print(f"Member {member_wallet} not found or status not changed in syndicate {syndicate_id}")
+        if not data:
+            print(f"Member {member_wallet} not found or not in a removable state in syndicate {syndicate_id}")
             return None
-
-        return get_syndicate_by_id(syndicate_id)
+        _upsert_membership(syndicate_id, member_wallet, new_status)
+        return Syndicate(**_with_str_id(data))
     except PyMongoError as e:
         print(f"Error removing member {member_wallet} from syndicate {syndicate_id}: {e}")
         return None
@@ -227,22 +412,114 @@ def record_syndicate_ticket_purchase(syndicate_id: str, draw_id: str, purchased_
             del inserted_doc["_id"]
 
         result: InsertOneResult = collection.insert_one(inserted_doc)
+        _tag_syndicate_tickets(result.inserted_id, syndicate_id, ticket_ids)
         created_purchase = collection.find_one({"_id": result.inserted_id})
-        return SyndicateTicketPurchase(**created_purchase) if created_purchase else None
+        return SyndicateTicketPurchase(**_with_str_id(created_purchase)) if created_purchase else None
     except PyMongoError as e:
         print(f"Error recording syndicate ticket purchase for syndicate {syndicate_id}, draw {draw_id}: {e}")
         return None
 
+def record_syndicate_bulk_purchase(syndicate_id: str, draw_id: str, purchased_by_wallet: str, tickets: List[TicketCreate]) -> SyndicateTicketPurchase | None:
+    """
+    Writes all tickets with one insert_many and the SyndicateTicketPurchase record that
+    references them, in a single transaction when the deployment supports it.
+    Without transactions, tickets already inserted are deleted again if a later write fails,
+    so a failed purchase never leaves tickets that aren't logged for the syndicate.
+    """
+    # The tickets carry the id of the purchase record, and syndicate_id marks them as syndicate tickets
+    purchase_id = ObjectId()
+    ticket_docs = [{**ticket.model_dump(), "purchase_id": str(purchase_id), "syndicate_id": syndicate_id} for ticket in tickets]
+
+    def _write(session):
+        try:
+            result = get_tickets_collection().insert_many(ticket_docs, ordered=True, session=session)
+            purchase_data = SyndicateTicketPurchase(
+                syndicate_id=syndicate_id,
+                draw_id=draw_id,
+                purchased_by_wallet_address=purchased_by_wallet,
+                ticket_ids=[str(ticket_id) for ticket_id in result.inserted_ids]
+            )
+            purchase_doc = purchase_data.model_dump(by_alias=True, exclude_none=True)
+            purchase_doc["_id"] = purchase_id
+            get_syndicate_ticket_purchases_collection().insert_one(purchase_doc, session=session)
+            return SyndicateTicketPurchase(**_with_str_id(purchase_doc))
+        except PyMongoError:
+            if session is None:
+                # insert_many assigns _id to each document client-side, so partial inserts can be undone.
+                inserted_ids = [doc["_id"] for doc in ticket_docs if "_id" in doc]
+                get_tickets_collection().delete_many({"_id": {"$in": inserted_ids}})
+            raise
+
+    try:
+        return run_in_transaction(_write)
+    except PyMongoError as e:
+        print(f"Error recording bulk syndicate purchase of {len(tickets)} tickets for syndicate {syndicate_id}, draw {draw_id}: {e}")
+        return None
+
 def get_syndicate_purchase_for_ticket(ticket_id: str, draw_id: str) -> SyndicateTicketPurchase | None:
     try:
         collection = get_syndicate_ticket_purchases_collection()
         # Find a purchase record that includes this ticket_id for the given draw_id
         data = collection.find_one({"draw_id": draw_id, "ticket_ids": ticket_id})
-        return SyndicateTicketPurchase(**data) if data else None
+        return SyndicateTicketPurchase(**_with_str_id(data)) if data else None
     except PyMongoError as e:
         print(f"Error finding syndicate purchase for ticket {ticket_id}, draw {draw_id}: {e}")
         return None
 
+def get_syndicate_purchases_for_tickets(ticket_ids: List[str], draw_id: str) -> Dict[str, SyndicateTicketPurchase]:
+    """
+    Batch form of get_syndicate_purchase_for_ticket: one query for many tickets.
+    Returns {ticket_id: purchase} for the tickets that were bought by a syndicate.
+    """
+    purchases_by_ticket: Dict[str, SyndicateTicketPurchase] = {}
+    if not ticket_ids:
+        return purchases_by_ticket
+    try:
+        collection = get_syndicate_ticket_purchases_collection()
+        wanted = set(ticket_ids)
+        for data in collection.find({"draw_id": draw_id, "ticket_ids": {"$in": list(wanted)}}):
+            purchase = SyndicateTicketPurchase(**_with_str_id(data))
+            for ticket_id in wanted.intersection(purchase.ticket_ids):
+                purchases_by_ticket[ticket_id] = purchase
+        return purchases_by_ticket
+    except PyMongoError as e:
+        print(f"Error finding syndicate purchases for {len(ticket_ids)} tickets, draw {draw_id}: {e}")
+        return {}
+
+# Syndicate tickets carry syndicate_id and the id of their purchase record as purchase_id.
+# Tickets bought before that get both from migrate_syndicate_tickets() at startup.
+
+SYNDICATE_TICKETS_MIGRATION = "syndicate_ticket_ids_v1"
+
+def _tag_syndicate_tickets(purchase_id: ObjectId, syndicate_id: str, ticket_ids: List[str]) -> None:
+    object_ids = [ObjectId(ticket_id) for ticket_id in ticket_ids if ObjectId.is_valid(ticket_id)]
+    if object_ids:
+        get_tickets_collection().update_many(
+            {"_id": {"$in": object_ids}},
+            {"$set": {"purchase_id": str(purchase_id), "syndicate_id": syndicate_id}}
+        )
+
+def _backfill_syndicate_tickets() -> None:
+    purchases = get_syndicate_ticket_purchases_collection().find({}, {"syndicate_id": 1, "ticket_ids": 1})
+    for purchase in purchases:
+        _tag_syndicate_tickets(purchase["_id"], purchase["syndicate_id"], purchase.get("ticket_ids", []))
+
+def migrate_syndicate_tickets() -> bool:
+    """ Startup step: tags tickets bought by syndicates before they carried syndicate_id, once per database. Returns True once it is done. """
+    return run_migration(SYNDICATE_TICKETS_MIGRATION, _backfill_syndicate_tickets)
+
+def get_syndicates_by_ids(syndicate_ids: List[str]) -> Dict[str, Syndicate]:
+    """ Fetches many syndicates with one $in query. Returns {syndicate_id: syndicate}. """
+    try:
+        object_ids = [ObjectId(sid) for sid in set(syndicate_ids) if ObjectId.is_valid(sid)]
+        if not object_ids:
+            return {}
+        results = get_syndicates_collection().find({"_id": {"$in": object_ids}})
+        return {str(data["_id"]): Syndicate(**_with_str_id(data)) for data in results}
+    except PyMongoError as e:
+        print(f"Error fetching syndicates by IDs: {e}")
+        return {}
+
 def record_syndicate_winnings(
     syndicate_id: str,
     draw_id: str,
@@ -270,7 +547,7 @@ def record_syndicate_winnings(
 
         result: InsertOneResult = collection.insert_one(inserted_doc)
         created_winnings = collection.find_one({"_id": result.inserted_id})
-        return SyndicateWinningsDistribution(**created_winnings) if created_winnings else None
+        return SyndicateWinningsDistribution(**_with_str_id(created_winnings)) if created_winnings else None
     except PyMongoError as e:
         print(f"Error recording syndicate winnings for syndicate {syndicate_id}, draw {draw_id}: {e}")
         return None
@@ -281,7 +558,7 @@ def get_syndicate_winnings_for_draw(syndicate_id: str, draw_id: str) -> List[Syn
         collection = get_syndicate_winnings_collection()
         results = collection.find({"syndicate_id": syndicate_id, "draw_id": draw_id})
         for data in results:
-            winnings_list.append(SyndicateWinningsDistribution(**data))
+            winnings_list.append(SyndicateWinningsDistribution(**_with_str_id(data)))
         return winnings_list
     except PyMongoError as e:
         print(f"Error fetching syndicate winnings for syndicate {syndicate_id}, draw {draw_id}: {e}")
@@ -9,6 +9,10 @@ class SyndicateMemberStatus(str, Enum):
     LEFT = "left"
     REMOVED = "removed"
 
+class SyndicateMemberRole(str, Enum):
+    ADMIN = "admin"
+    MEMBER = "member"
+
 class SyndicateMember(BaseModel):
     wallet_address: str = Field(..., description="Wallet address of the member")
     nickname: Optional[str] = Field(None, description="Nickname of the member, fetched from User profile if available") # Denormalized for convenience
@@ -23,6 +27,7 @@ class Syndicate(BaseModel):
     creator_wallet_address: str = Field(..., description="Wallet address of the user who created the syndicate (admin)")
 
     members: List[SyndicateMember] = Field(default_factory=list, description="List of members in the syndicate")
+    active_member_count: int = Field(default=0, ge=0, description="Cached number of ACTIVE members, kept in sync by the member mutations")
 
     # Conceptual: Even if free-to-play, this defines how shares are split if not explicitly defined per member.
     # For now, assume equal share among active members.
@@ -92,13 +97,14 @@ class SyndicateResponse(Syndicate): # Inherits all fields from Syndicate
 class InviteMemberRequest(BaseModel):
     member_wallet_address: str = Field(..., description="Wallet address of the user to invite")
 
+MAX_SYNDICATE_TICKETS_PER_PURCHASE = 10000
+
 class SyndicateParticipateRequest(BaseModel):
-    num_tickets: int = Field(..., gt=0, description="Number of tickets the syndicate wants to 'purchase' for the draw")
-    # Selections might be needed if the syndicate plays a "Pick N" game
-    # For now, assume raffle or admin picks numbers manually if needed for PickN, then enters them via normal ticket purchase.
-    # This endpoint would just log the intent and associate tickets.
-    # A simpler model: admin buys tickets normally, then assigns them to syndicate for a draw.
-    # For this plan: this endpoint will create new ticket entries attributed to the syndicate admin.
+    num_tickets: int = Field(..., gt=0, le=MAX_SYNDICATE_TICKETS_PER_PURCHASE, description="Number of tickets the syndicate wants to 'purchase' for the draw")
+    # For "Pick N" games each ticket needs a selection: either one list per ticket, or quick_pick to have them generated.
+    # Tickets are created attributed to the syndicate admin and logged under a SyndicateTicketPurchase.
+    selections: Optional[List[List[Any]]] = Field(None, description="One selection per ticket for 'Pick N' games. Length must equal num_tickets.")
+    quick_pick: bool = Field(False, description="Generate random selections for 'Pick N' games instead of providing them.")
 
 # Response for listing syndicates (could be a simplified version)
 class SyndicateSummaryResponse(BaseModel):
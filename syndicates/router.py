@@ -8,14 +8,18 @@ from .models import (
     SyndicateTicketPurchase, SyndicateSummaryResponse
 )
 from users.db import get_user_by_wallet_address # For checking if invited user exists, getting nickname
-from tickets.router import buy_tickets # To "buy" tickets for the syndicate
-from tickets.models import TicketPurchaseRequest # For the above
-from draws.db import get_draw_by_id # To validate draw for participation
+from tickets.models import TicketCreate, PickNSelectionData
+from tickets.db import index_ticket_picks
+from tickets.selections import validate_pick_n_selections, generate_quick_picks, pick_n_selection_data
+from draws.db import get_draw_by_id, reserve_ticket_seqs # To validate draw for participation
+from lottery_categories.db import get_category_by_id
+from datetime import datetime
 from auth.dependencies import get_current_user_from_token
 from auth.models import TokenData
 import logging
+from metrics.instrumentation import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 logger = logging.getLogger(__name__)
 
 # --- Syndicate Management ---
@@ -39,8 +43,9 @@ async def create_new_syndicate(
 @router.get("/my_syndicates", response_model=List[SyndicateSummaryResponse], summary="List syndicates for the current user")
 async def list_my_syndicates(token_data: TokenData = Depends(get_current_user_from_token)):
     user_wallet = token_data.wallet_address
-    syndicates = syndicate_db.get_syndicates_for_member(user_wallet)
-    # Convert full Syndicate objects to SyndicateSummaryResponse
+    # Members arrays aren't needed for the summary; the cached active_member_count is used instead.
+    syndicates = syndicate_db.get_syndicates_for_member(user_wallet, include_members=False)
+    # Convert Syndicate objects to SyndicateSummaryResponse
     summaries = []
     for synd in syndicates:
         if synd.id: # Ensure id is present
@@ -48,7 +53,7 @@ async def list_my_syndicates(token_data: TokenData = Depends(get_current_user_fr
                 id=synd.id,
                 name=synd.name,
                 creator_wallet_address=synd.creator_wallet_address,
-                member_count=len([m for m in synd.members if m.status == SyndicateMemberStatus.ACTIVE]),
+                member_count=synd.active_member_count,
                 created_at=synd.created_at
             ))
     return summaries
@@ -133,17 +138,14 @@ async def invite_syndicate_member(
         raise HTTPException(status_code=403, detail="Only syndicate creator can invite members.")
 
     invited_wallet = request_data.member_wallet_address
-    if not get_user_by_wallet_address(invited_wallet): # Check if invited user exists in our system
+    invited_user = get_user_by_wallet_address(invited_wallet) # Check if invited user exists in our system
+    if not invited_user:
         raise HTTPException(status_code=404, detail=f"User with wallet {invited_wallet} not found in the system.")
 
-    if any(member.wallet_address == invited_wallet for member in syndicate.members if member.status != SyndicateMemberStatus.LEFT and member.status != SyndicateMemberStatus.REMOVED):
-        raise HTTPException(status_code=400, detail=f"User {invited_wallet} is already a member or has a pending invite.")
-
-    updated_syndicate = syndicate_db.add_or_update_syndicate_member(
-        syndicate_id, invited_wallet, SyndicateMemberStatus.INVITED, invited_by_wallet=current_user_wallet
-    )
+    # The db update only matches if the user isn't already active/invited, so concurrent invites can't race.
+    updated_syndicate = syndicate_db.invite_syndicate_member(syndicate_id, invited_wallet, nickname=invited_user.nickname)
     if not updated_syndicate:
-        raise HTTPException(status_code=500, detail="Failed to invite member.")
+        raise HTTPException(status_code=400, detail=f"User {invited_wallet} is already a member or has a pending invite.")
     return updated_syndicate
 
 @router.post("/{syndicate_id}/members/accept_invite", response_model=SyndicateResponse, summary="Accept an invitation to join a syndicate")
@@ -152,19 +154,14 @@ async def accept_syndicate_invite(
     token_data: TokenData = Depends(get_current_user_from_token)
 ):
     current_user_wallet = token_data.wallet_address
-    syndicate = syndicate_db.get_syndicate_by_id(syndicate_id)
-    if not syndicate:
-        raise HTTPException(status_code=404, detail="Syndicate not found.")
-
-    member_to_activate = next((m for m in syndicate.members if m.wallet_address == current_user_wallet and m.status == SyndicateMemberStatus.INVITED), None)
-    if not member_to_activate:
-        raise HTTPException(status_code=400, detail="No pending invitation found for this user in this syndicate, or user already active.")
-
-    updated_syndicate = syndicate_db.add_or_update_syndicate_member(
-        syndicate_id, current_user_wallet, SyndicateMemberStatus.ACTIVE
+    user_profile = get_user_by_wallet_address(current_user_wallet)
+    updated_syndicate = syndicate_db.accept_syndicate_invite(
+        syndicate_id, current_user_wallet, nickname=user_profile.nickname if user_profile else None
     )
     if not updated_syndicate:
-        raise HTTPException(status_code=500, detail="Failed to accept invitation.")
+        if not syndicate_db.get_syndicate_by_id(syndicate_id):
+            raise HTTPException(status_code=404, detail="Syndicate not found.")
+        raise HTTPException(status_code=400, detail="No pending invitation found for this user in this syndicate, or user already active.")
     return updated_syndicate
 
 @router.post("/{syndicate_id}/members/leave", response_model=SyndicateResponse, summary="Leave a syndicate")
@@ -181,9 +178,11 @@ async def leave_syndicate(
     if syndicate.creator_wallet_address == current_user_wallet and len([m for m in syndicate.members if m.status == SyndicateMemberStatus.ACTIVE]) > 1:
         raise HTTPException(status_code=400, detail="Creator cannot leave the syndicate if other active members exist. Transfer ownership or remove members first.")
 
-    updated_syndicate = syndicate_db.remove_syndicate_member(syndicate_id, current_user_wallet, new_status=SyndicateMemberStatus.LEFT)
+    updated_syndicate = syndicate_db.remove_syndicate_member(
+        syndicate_id, current_user_wallet, new_status=SyndicateMemberStatus.LEFT, from_statuses=[SyndicateMemberStatus.ACTIVE]
+    )
     if not updated_syndicate:
-        raise HTTPException(status_code=500, detail="Failed to leave syndicate.")
+        raise HTTPException(status_code=400, detail="User is not an active member of this syndicate.")
     # If creator leaves and is the last member, the syndicate could be auto-deleted or marked inactive.
     # For now, just marks as LEFT. If creator leaves as last member, they can then delete it.
     return updated_syndicate
@@ -203,13 +202,10 @@ async def remove_member_from_syndicate(
     if member_wallet_address == current_user_wallet:
         raise HTTPException(status_code=400, detail="Creator cannot remove themselves using this endpoint. Use 'leave' or 'delete syndicate'.")
 
-    member_exists = any(m.wallet_address == member_wallet_address and (m.status == SyndicateMemberStatus.ACTIVE or m.status == SyndicateMemberStatus.INVITED) for m in syndicate.members)
-    if not member_exists:
-        raise HTTPException(status_code=404, detail=f"Member {member_wallet_address} not found or not in a removable state in this syndicate.")
-
+    # Only active or invited members match the update; anything else is reported as not found.
     updated_syndicate = syndicate_db.remove_syndicate_member(syndicate_id, member_wallet_address, new_status=SyndicateMemberStatus.REMOVED)
     if not updated_syndicate:
-        raise HTTPException(status_code=500, detail=f"Failed to remove member {member_wallet_address}.")
+        raise HTTPException(status_code=404, detail=f"Member {member_wallet_address} not found or not in a removable state in this syndicate.")
     return updated_syndicate
 
 # --- Syndicate Draw Participation ---
@@ -233,65 +229,58 @@ async def syndicate_participate_in_draw(
     if draw.status != "open":
         raise HTTPException(status_code=400, detail=f"Draw {draw_id} is not open for ticket purchase. Status: {draw.status}")
 
-    # For "Pick N" games, selection data would be needed.
-    # This endpoint simplifies by assuming the admin (current_user_wallet) "buys" tickets.
-    # These tickets are regular tickets but their IDs are logged under SyndicateTicketPurchase.
-    # The actual "cost" is conceptual in a free-to-play model.
-
-    # Get category for selection validation if needed
-    # from lottery_categories.db import get_category_by_id as get_lottery_category
-    # category = get_lottery_category(draw.category_id)
-    # if not category:
-    #     raise HTTPException(status_code=500, detail="Failed to load category for draw.")
-    # if category.game_type == "pick_n_digits" and not request_data.selections:
-    #     raise HTTPException(status_code=400, detail="Selections are required for Pick N Digit games.")
-    # TODO: Handle selections if game_type is pick_n_digits. For now, assume raffle or admin handles selection via other means.
-
-    purchased_ticket_ids: List[str] = []
-    try:
-        # The buy_tickets function from tickets.router is a FastAPI endpoint function.
-        # It's not ideal to call it directly. We should use the underlying DB operations or a service layer.
-        # For now, let's simulate what it does: create ticket entries.
-        # This part needs careful refactoring if buy_tickets has complex logic we need to replicate.
-        # A better way: Ticket creation logic should be in a service/DB function callable from both routers.
-
-        # Simplified direct ticket creation (attributes to syndicate admin for now)
-        from tickets.db import create_ticket as create_ticket_db
-        from tickets.models import TicketCreate #, PickNSelectionData
-
-        for i in range(request_data.num_tickets):
-            # If PickN, would need selection data here.
-            # selection_data_for_ticket = PickNSelectionData(picks=request_data.selections[i]) if request_data.selections else None
-            ticket_to_create = TicketCreate(
-                wallet_address=current_user_wallet, # Ticket is "owned" by syndicate admin
-                draw_id=draw_id,
-                # selection_data=selection_data_for_ticket
-            )
-            ticket_id = create_ticket_db(ticket_to_create)
-            if not ticket_id:
-                raise HTTPException(status_code=500, detail=f"Failed to create one or more tickets for syndicate (ticket {i+1}).")
-            purchased_ticket_ids.append(ticket_id)
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error creating tickets for syndicate participation: {e}")
-        raise HTTPException(status_code=500, detail="Error processing syndicate ticket purchase.")
-
-    if not purchased_ticket_ids:
-        raise HTTPException(status_code=500, detail="No tickets were purchased for the syndicate.")
-
-    syndicate_purchase_record = syndicate_db.record_syndicate_ticket_purchase(
+    # These tickets are regular tickets "owned" by the syndicate admin; their IDs are logged under
+    # a SyndicateTicketPurchase. The actual "cost" is conceptual in a free-to-play model.
+    category = get_category_by_id(draw.category_id)
+    if not category:
+        raise HTTPException(status_code=500, detail="Failed to load category for draw.")
+
+    ticket_selections: List[Optional[PickNSelectionData]]
+    if category.game_type == "pick_n_digits":
+        if request_data.selections is not None:
+            if request_data.quick_pick:
+                raise HTTPException(status_code=400, detail="Provide either selections or quick_pick, not both.")
+            if len(request_data.selections) != request_data.num_tickets:
+                raise HTTPException(status_code=400, detail=f"Expected {request_data.num_tickets} selections, got {len(request_data.selections)}.")
+            ticket_selections = validate_pick_n_selections(request_data.selections, category.game_config)
+        elif request_data.quick_pick:
+            quick_picks = generate_quick_picks(category.game_config, request_data.num_tickets)
+            ticket_selections = [pick_n_selection_data(picks) for picks in quick_picks]
+        else:
+            raise HTTPException(status_code=400, detail="Selections or quick_pick are required for Pick N Digit games.")
+    else:
+        if request_data.selections is not None or request_data.quick_pick:
+            raise HTTPException(status_code=400, detail=f"Selection data is not applicable for game type '{category.game_type}'.")
+        ticket_selections = [None] * request_data.num_tickets
+
+    # Pick-N and keyed_rank raffle tickets get per-draw sequence numbers (see tickets.router.buy_tickets).
+    first_seq: Optional[int] = None
+    if category.uses_ticket_seqs():
+        first_seq = reserve_ticket_seqs(draw_id, request_data.num_tickets)
+        if first_seq is None:
+            raise HTTPException(status_code=500, detail="Failed to allocate ticket numbers for the draw.")
+
+    now = datetime.utcnow()
+    tickets_to_create = [
+        TicketCreate(
+            wallet_address=current_user_wallet, draw_id=draw_id, timestamp=now, selection_data=selection,
+            ticket_seq=first_seq + i if first_seq is not None else None
+        )
+        for i, selection in enumerate(ticket_selections)
+    ]
+
+    # Tickets and the purchase log are written together (one insert_many plus one insert, transactional when supported).
+    syndicate_purchase_record = syndicate_db.record_syndicate_bulk_purchase(
         syndicate_id=syndicate_id,
         draw_id=draw_id,
         purchased_by_wallet=current_user_wallet,
-        ticket_ids=purchased_ticket_ids
+        tickets=tickets_to_create
     )
     if not syndicate_purchase_record:
-        # This is problematic: tickets were created but not logged for syndicate.
-        # Ideally, ticket creation and logging should be atomic or have rollback.
-        logger.error(f"Tickets {purchased_ticket_ids} created for syndicate {syndicate_id} but failed to record syndicate purchase log.")
-        raise HTTPException(status_code=500, detail="Failed to log syndicate ticket purchase after tickets were created.")
+        raise HTTPException(status_code=500, detail="Failed to record syndicate ticket purchase. No tickets were purchased.")
+    if category.game_type == "pick_n_digits":
+        # If indexing fails, close falls back to scanning the draw's tickets.
+        index_ticket_picks(draw_id, [(t.ticket_seq, t.selection_data.picks) for t in tickets_to_create])
 
     return syndicate_purchase_record
 
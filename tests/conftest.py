@@ -1,18 +1,29 @@
+import threading
+import time
+from collections import Counter
+
 import pytest
 from fastapi.testclient import TestClient
 from mongomock import MongoClient as MockMongoClient
+from mongomock.collection import Collection as MockCollection
 # from unittest.mock import patch # monkeypatch is generally preferred with pytest
 
 # Import your FastAPI application
 from app import app
+import app as app_module # app.py imports connect_db by name, so it is patched there too
 import database # Import your database module to patch it
+from draws import snapshots as draw_snapshots
+from gamification.leaderboard import loyalty_leaderboard
 
 @pytest.fixture(scope="function")
-def test_client(monkeypatch):
+def test_client(monkeypatch, tmp_path):
     """
     Test client fixture that directly patches database.connect_db
-    to use mongomock.
+    to use mongomock. Draw ticket snapshots are written under tmp_path.
     """
+    monkeypatch.setattr(draw_snapshots, "SNAPSHOT_DIR", str(tmp_path / "draw_snapshots"))
+    loyalty_leaderboard.invalidate() # Cached from an earlier test's database
+
     # Create a single MockMongoClient instance for the test function
     mock_mongo_client_instance = MockMongoClient()
 
@@ -22,8 +33,7 @@ def test_client(monkeypatch):
         try:
             # Set the global client and db in the 'database' module directly
             database.client = mock_mongo_client_instance
-            # Ensure server is available (mongomock is always "available")
-            database.client.admin.command('ismaster') # A lightweight command
+            # mongomock is always "available" (and doesn't implement the ismaster command)
             database.db = database.client[database.DB_NAME + "_test"] # Use a distinct test DB name
             # print(f"Mock DB '{database.db.name}' set up with {type(database.client)}")
         except Exception as e:
@@ -35,6 +45,7 @@ def test_client(monkeypatch):
 
     # Before each test, patch database.connect_db
     monkeypatch.setattr(database, 'connect_db', mock_connect_db_logic)
+    monkeypatch.setattr(app_module, 'connect_db', mock_connect_db_logic)
 
     # Also, ensure that if get_db() was called before and failed, it can retry.
     # Resetting these ensures get_db will call our patched connect_db.
@@ -57,3 +68,114 @@ def test_client(monkeypatch):
     database.client = None
     database.db = None
     # monkeypatch automatically undoes the setattr for 'connect_db'
+
+
+@pytest.fixture(scope="function")
+def close_draw_and_wait(test_client):
+    """
+    Closes a draw through the close job API: POST /api/draws/close/{draw_id} (202), then polls
+    GET /api/draws/close_jobs/{job_id} until the job finishes. Asserts it completed and returns
+    the closed draw as JSON.
+    """
+    def close(draw_id: str, timeout: float = 30.0):
+        response = test_client.post(f"/api/draws/close/{draw_id}")
+        assert response.status_code == 202, response.text
+        job_id = response.json()["_id"]
+        deadline = time.monotonic() + timeout
+        while True:
+            job = test_client.get(f"/api/draws/close_jobs/{job_id}").json()
+            if job["status"] in ("completed", "failed"):
+                break
+            assert time.monotonic() < deadline, f"Close job {job_id} still {job['status']} ({job['phase']})"
+            time.sleep(0.01)
+        assert job["status"] == "completed", job
+        response = test_client.get(f"/api/draws/{draw_id}")
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return close
+
+
+# Collection methods that each correspond to one round trip against a real server.
+COUNTED_COLLECTION_METHODS = (
+    "find", "find_one", "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "bulk_write", "aggregate", "count_documents",
+    "estimated_document_count", "distinct",
+)
+
+class MongoOpCounter:
+    """
+    Counts Mongo operations per (collection, method) while enabled.
+    Nested calls (mongomock implements find_one on top of find, etc.) count once.
+    calls keeps each counted operation as (collection, method, args, kwargs), in order.
+    """
+
+    def __init__(self):
+        self.ops = Counter()
+        self.calls = []
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def reset(self):
+        with self._lock:
+            self.ops.clear()
+            self.calls.clear()
+
+    def count(self, collection: str | None = None, methods=None) -> int:
+        with self._lock:
+            return sum(
+                n for (coll, method), n in self.ops.items()
+                if (collection is None or coll == collection) and (methods is None or method in methods)
+            )
+
+    def track(self):
+        """ Context manager: reset, count everything inside the block, stop counting on exit. """
+        counter = self
+
+        class _Tracking:
+            def __enter__(self):
+                counter.reset()
+                counter.enabled = True
+                return counter
+
+            def __exit__(self, *exc):
+                counter.enabled = False
+                return False
+
+        return _Tracking()
+
+    def _wrap(self, method_name, original):
+        counter = self
+
+        def wrapper(collection_self, *args, **kwargs):
+            depth = getattr(counter._local, "depth", 0)
+            if counter.enabled and depth == 0:
+                with counter._lock:
+                    counter.ops[(collection_self.name, method_name)] += 1
+                    counter.calls.append((collection_self.name, method_name, args, kwargs))
+            counter._local.depth = depth + 1
+            try:
+                return original(collection_self, *args, **kwargs)
+            finally:
+                counter._local.depth = depth
+
+        return wrapper
+
+
+@pytest.fixture(scope="function")
+def mongo_ops(monkeypatch):
+    """
+    Counts the Mongo round trips made by app code against the mongomock client.
+    Usage:
+        with mongo_ops.track():
+            test_client.post(...)
+        assert mongo_ops.count("tickets") <= K
+    """
+    counter = MongoOpCounter()
+    for method_name in COUNTED_COLLECTION_METHODS:
+        original = getattr(MockCollection, method_name, None)
+        if original is not None:
+            monkeypatch.setattr(MockCollection, method_name, counter._wrap(method_name, original))
+    return counter
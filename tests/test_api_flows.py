@@ -2,6 +2,9 @@ import pytest
 from fastapi.testclient import TestClient
 from typing import Dict, Any, List
 
+import draws.router as draws_router
+import rng.utils
+
 # client fixture is from tests/conftest.py
 
 # Helper to reduce boilerplate if needed, or just call client.post directly
@@ -32,6 +35,7 @@ class TestAPIFlows:
             "prize_info": {"main_prize": "75% of pool"},
             "is_active": True,
             "game_type": "raffle",
+            "prize_tiers": [{"tier_name": "Raffle Winner", "percentage_of_prize_pool": 75.0}],
             # game_config can be empty for raffle or omitted if model has default
             "game_config": {}
         }
@@ -40,9 +44,9 @@ class TestAPIFlows:
         raffle_cat_data = raffle_cat_response.json()
         assert raffle_cat_data["name"] == raffle_payload["name"]
         assert raffle_cat_data["game_type"] == "raffle"
-        assert "id" in raffle_cat_data
-        TestAPIFlows.created_category_ids.append(raffle_cat_data["id"])
-        raffle_cat_id = raffle_cat_data["id"]
+        assert "_id" in raffle_cat_data
+        TestAPIFlows.created_category_ids.append(raffle_cat_data["_id"])
+        raffle_cat_id = raffle_cat_data["_id"]
 
         # 2. Create a "pick_n_digits" category
         pickn_payload = {
@@ -54,6 +58,7 @@ class TestAPIFlows:
             "prize_info": {"match_4": "Jackpot $1000"},
             "is_active": True,
             "game_type": "pick_n_digits",
+            "prize_tiers": [{"tier_name": "Match 4", "matches_required": 4, "is_jackpot_tier": True, "percentage_of_prize_pool": 60.0}],
             "game_config": {
                 "num_picks": 4,
                 "min_digit": 0,
@@ -67,9 +72,9 @@ class TestAPIFlows:
         assert pickn_cat_data["name"] == pickn_payload["name"]
         assert pickn_cat_data["game_type"] == "pick_n_digits"
         assert pickn_cat_data["game_config"]["num_picks"] == 4
-        assert "id" in pickn_cat_data
-        TestAPIFlows.created_category_ids.append(pickn_cat_data["id"])
-        pickn_cat_id = pickn_cat_data["id"]
+        assert "_id" in pickn_cat_data
+        TestAPIFlows.created_category_ids.append(pickn_cat_data["_id"])
+        pickn_cat_id = pickn_cat_data["_id"]
 
         # 3. List all categories
         list_response = client.get("/api/lottery_categories/")
@@ -78,8 +83,8 @@ class TestAPIFlows:
         assert isinstance(list_data, list)
         assert len(list_data) >= 2 # Assuming clean DB or only these two
 
-        found_raffle = any(cat["id"] == raffle_cat_id for cat in list_data)
-        found_pickn = any(cat["id"] == pickn_cat_id for cat in list_data)
+        found_raffle = any(cat["_id"] == raffle_cat_id for cat in list_data)
+        found_pickn = any(cat["_id"] == pickn_cat_id for cat in list_data)
         assert found_raffle
         assert found_pickn
 
@@ -87,14 +92,14 @@ class TestAPIFlows:
         get_raffle_response = client.get(f"/api/lottery_categories/{raffle_cat_id}")
         assert get_raffle_response.status_code == 200
         get_raffle_data = get_raffle_response.json()
-        assert get_raffle_data["id"] == raffle_cat_id
+        assert get_raffle_data["_id"] == raffle_cat_id
         assert get_raffle_data["name"] == raffle_payload["name"]
 
         # 5. Get pick_n_digits category by ID
         get_pickn_response = client.get(f"/api/lottery_categories/{pickn_cat_id}")
         assert get_pickn_response.status_code == 200
         get_pickn_data = get_pickn_response.json()
-        assert get_pickn_data["id"] == pickn_cat_id
+        assert get_pickn_data["_id"] == pickn_cat_id
         assert get_pickn_data["game_config"]["num_picks"] == 4
 
         # 6. Update a category (e.g., deactivate raffle category)
@@ -114,8 +119,8 @@ class TestAPIFlows:
         list_active_response = client.get("/api/lottery_categories/?active_only=true")
         assert list_active_response.status_code == 200
         active_list_data = list_active_response.json()
-        assert not any(cat["id"] == raffle_cat_id for cat in active_list_data) # Deactivated raffle should not be here
-        assert any(cat["id"] == pickn_cat_id for cat in active_list_data)    # Active pickn should be here
+        assert not any(cat["_id"] == raffle_cat_id for cat in active_list_data) # Deactivated raffle should not be here
+        assert any(cat["_id"] == pickn_cat_id for cat in active_list_data)    # Active pickn should be here
 
         # 8. Delete a category (e.g. the deactivated raffle)
         delete_response = client.delete(f"/api/lottery_categories/{raffle_cat_id}")
@@ -158,7 +163,7 @@ class TestAPIFlows:
     #     pass
 
 
-    def test_raffle_game_end_to_end_flow(self, test_client: TestClient):
+    def test_raffle_game_end_to_end_flow(self, test_client: TestClient, close_draw_and_wait, monkeypatch):
         """
         Tests a full raffle game flow:
         1. Create a raffle category.
@@ -170,6 +175,7 @@ class TestAPIFlows:
         7. Verify next draw auto-creation.
         """
         client = test_client
+        monkeypatch.setattr(draws_router, "get_latest_ledger_hash_sync", lambda: "E2" * 32) # No XRPL access in tests
 
         # 1. Create Raffle Category
         from datetime import datetime, timedelta # Moved import here
@@ -179,11 +185,12 @@ class TestAPIFlows:
             "draw_interval_value": 1,
             "ticket_price": 1.0,
             "game_type": "raffle",
-            "is_active": True
+            "is_active": True,
+            "prize_tiers": [{"tier_name": "Raffle Winner", "matches_required": 1, "percentage_of_prize_pool": 50.0}]
         }
         cat_response = client.post("/api/lottery_categories/", json=raffle_payload)
         assert cat_response.status_code == 201, cat_response.text
-        raffle_cat_id = cat_response.json()["id"]
+        raffle_cat_id = cat_response.json()["_id"] # Responses are serialized by alias
 
         # 2. Manually Create a Draw (pending_open)
         open_time_dt = datetime.utcnow() - timedelta(minutes=1) # Ensure it's openable now
@@ -193,11 +200,12 @@ class TestAPIFlows:
             "category_id": raffle_cat_id,
             "scheduled_open_time": open_time_dt.isoformat(),
             "scheduled_close_time": close_time_dt.isoformat(),
+            "base_prize_pool": 0.0,
         }
         draw_response = client.post("/api/draws/", json=draw_payload)
         assert draw_response.status_code == 201, draw_response.text
         draw_data = draw_response.json()
-        draw_id = draw_data["id"]
+        draw_id = draw_data["_id"]
         assert draw_data["status"] == "pending_open"
 
         # 3. Process Pending Draws to Open it
@@ -228,20 +236,16 @@ class TestAPIFlows:
         # For this test, we assume manual closure of an "open" draw is fine.
         # If a test needs to wait for scheduled_close_time, mocking time (e.g. with freezegun) is needed.
 
-        close_response = client.post(f"/api/draws/close/{draw_id}")
-        assert close_response.status_code == 200, close_response.text
-        closed_draw_data = close_response.json()
+        closed_draw_data = close_draw_and_wait(draw_id) # Queues a close job and waits for it
         assert closed_draw_data["status"] == "completed"
         assert closed_draw_data.get("ledger_hash") is not None
         assert "winners_by_tier" in closed_draw_data
 
-        if closed_draw_data["participants"]:
-             assert len(closed_draw_data["winners_by_tier"]) == 1
-             winner_info = closed_draw_data["winners_by_tier"][0]
-             assert winner_info["prize_tier_name"] == "Raffle Winner"
-             assert winner_info["wallet_address"] in ["walletRaffle1", "walletRaffle2"]
-        else:
-            assert len(closed_draw_data["winners_by_tier"]) == 0
+        assert closed_draw_data["participants"] # Both wallets bought tickets above
+        assert len(closed_draw_data["winners_by_tier"]) == 1
+        winner_info = closed_draw_data["winners_by_tier"][0]
+        assert winner_info["tier_name"] == "Raffle Winner"
+        assert winner_info["wallet_address"] in ["walletRaffle1", "walletRaffle2"]
 
 
         # 6. Check Winner Announcement
@@ -270,7 +274,7 @@ class TestAPIFlows:
 
         next_pending_draw = None
         for d_item in all_draws_for_cat: # Renamed d to d_item to avoid conflict
-            if d_item["id"] != draw_id and d_item["status"] == "pending_open":
+            if d_item["_id"] != draw_id and d_item["status"] == "pending_open":
                 # Check if its scheduled_open_time matches the closed_draw_data's scheduled_close_time
                 # Need to parse string dates to datetime for proper comparison if not already objects
                 # For this test, assuming string comparison is okay if format is identical
@@ -283,7 +287,7 @@ class TestAPIFlows:
         assert next_pending_draw["scheduled_open_time"] == closed_draw_data["scheduled_close_time"]
 
 
-    def test_pick_n_game_end_to_end_flow(self, test_client: TestClient):
+    def test_pick_n_game_end_to_end_flow(self, test_client: TestClient, close_draw_and_wait, monkeypatch):
         """
         Tests a full "Pick N Digits" game flow:
         1. Create a pick_n_digits category.
@@ -295,6 +299,8 @@ class TestAPIFlows:
         7. Verify next draw auto-creation.
         """
         client = test_client
+        monkeypatch.setattr(draws_router, "get_latest_ledger_hash_sync", lambda: "E3" * 32) # No XRPL access in tests
+        monkeypatch.setattr(rng.utils, "generate_winning_picks", lambda seed, game_config: [1, 2, 3]) # walletPickN1 wins
         from datetime import datetime, timedelta
 
         # 1. Create Pick N Category
@@ -306,11 +312,12 @@ class TestAPIFlows:
             "game_type": "pick_n_digits",
             "game_config": {"num_picks": 3, "min_digit": 0, "max_digit": 9, "allow_duplicates": False},
             "is_active": True,
-            "prize_info": {"match_3": "Jackpot"}
+            "prize_info": {"match_3": "Jackpot"},
+            "prize_tiers": [{"tier_name": "Jackpot - Match 3", "matches_required": 3, "is_jackpot_tier": True, "percentage_of_prize_pool": 60.0}]
         }
         cat_response = client.post("/api/lottery_categories/", json=pickn_payload)
         assert cat_response.status_code == 201, cat_response.text
-        pickn_cat_id = cat_response.json()["id"]
+        pickn_cat_id = cat_response.json()["_id"]
         pickn_cat_game_config = pickn_payload["game_config"]
 
 
@@ -321,10 +328,11 @@ class TestAPIFlows:
             "category_id": pickn_cat_id,
             "scheduled_open_time": open_time_dt.isoformat(),
             "scheduled_close_time": close_time_dt.isoformat(),
+            "base_prize_pool": 0.0,
         }
         draw_response = client.post("/api/draws/", json=draw_payload)
         assert draw_response.status_code == 201, draw_response.text
-        draw_id = draw_response.json()["id"]
+        draw_id = draw_response.json()["_id"]
 
         # 3. Open the Draw
         process_response = client.post(f"/api/draws/process_pending_draws?category_id={pickn_cat_id}")
@@ -359,9 +367,7 @@ class TestAPIFlows:
 
 
         # 5. Close the Draw
-        close_response = client.post(f"/api/draws/close/{draw_id}")
-        assert close_response.status_code == 200, close_response.text
-        closed_draw_data = close_response.json()
+        closed_draw_data = close_draw_and_wait(draw_id) # Queues a close job and waits for it
 
         assert closed_draw_data["status"] == "completed"
         assert closed_draw_data.get("ledger_hash") is not None
@@ -383,11 +389,12 @@ class TestAPIFlows:
         elif winning_picks == [7, 8, 9]: # Wallet P4's pick
             expected_winner_wallet = "walletPickN2"
 
+        assert expected_winner_wallet == "walletPickN1" # Winning picks are pinned above
         if expected_winner_wallet:
             assert len(winners_by_tier) == 1, f"Expected 1 winner, got {len(winners_by_tier)}. Winning picks: {winning_picks}"
             winner_info = winners_by_tier[0]
             assert winner_info["wallet_address"] == expected_winner_wallet
-            assert winner_info["prize_tier_name"] == f"Jackpot - Match {pickn_cat_game_config['num_picks']}"
+            assert winner_info["tier_name"] == f"Jackpot - Match {pickn_cat_game_config['num_picks']}"
             assert winner_info["ticket_id"] == (ticket_w3_id if expected_winner_wallet == "walletPickN1" else buy_response_w4.json()["tickets"][0])
         else:
             assert len(winners_by_tier) == 0, f"Expected 0 winners if picks {winning_picks} didn't match [1,2,3] or [7,8,9]. Winners: {winners_by_tier}"
@@ -400,7 +407,7 @@ class TestAPIFlows:
 
         next_pending_draw = None
         for d_item in all_draws_for_cat:
-            if d_item["id"] != draw_id and d_item["status"] == "pending_open":
+            if d_item["_id"] != draw_id and d_item["status"] == "pending_open":
                 if d_item["scheduled_open_time"] == closed_draw_data["scheduled_close_time"]:
                     next_pending_draw = d_item
                     break
@@ -423,22 +430,24 @@ class TestAPIFlows:
         # --- Setup: Create a category and an open draw for ticket purchase ---
         ref_category_payload = {
             "name": "Referral Test Cat", "draw_interval_type": "manual",
-            "ticket_price": 1.0, "game_type": "raffle", "is_active": True
+            "ticket_price": 1.0, "game_type": "raffle", "is_active": True,
+            "prize_tiers": [{"tier_name": "Raffle Winner", "percentage_of_prize_pool": 50.0}]
         }
         cat_resp = client.post("/api/lottery_categories/", json=ref_category_payload)
         assert cat_resp.status_code == 201, cat_resp.text
-        ref_cat_id = cat_resp.json()["id"]
+        ref_cat_id = cat_resp.json()["_id"]
 
         open_time = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
         close_time = (datetime.utcnow() + timedelta(hours=1)).isoformat()
         draw_payload = {
             "category_id": ref_cat_id,
             "scheduled_open_time": open_time,
-            "scheduled_close_time": close_time
+            "scheduled_close_time": close_time,
+            "base_prize_pool": 0.0
         }
         draw_resp = client.post("/api/draws/", json=draw_payload)
         assert draw_resp.status_code == 201, draw_resp.text
-        # draw_id = draw_resp.json()["id"] # No, this is the draw_id of the just created draw
+        # draw_id = draw_resp.json()["_id"] # No, this is the draw_id of the just created draw
 
         # We need to get the ID of the *open* draw that the ticket will be bought for
         # The ticket purchase logic handles finding/creating an open draw.
@@ -525,21 +534,23 @@ class TestAPIFlows:
         # Setup a valid category and draw for some tests
         category_payload = {
             "name": "Error Test Cat", "draw_interval_type": "manual",
-            "ticket_price": 1.0, "game_type": "raffle", "is_active": True
+            "ticket_price": 1.0, "game_type": "raffle", "is_active": True,
+            "prize_tiers": [{"tier_name": "Raffle Winner", "percentage_of_prize_pool": 50.0}]
         }
         cat_resp = client.post("/api/lottery_categories/", json=category_payload)
         assert cat_resp.status_code == 201
-        error_test_cat_id = cat_resp.json()["id"]
+        error_test_cat_id = cat_resp.json()["_id"]
 
         pickn_category_payload = {
             "name": "Error PickN Cat", "draw_interval_type": "manual", "ticket_price": 1.0,
             "game_type": "pick_n_digits",
             "game_config": {"num_picks": 3, "min_digit": 0, "max_digit": 9, "allow_duplicates": False},
-            "is_active": True
+            "is_active": True,
+            "prize_tiers": [{"tier_name": "Match 3", "matches_required": 3, "percentage_of_prize_pool": 50.0}]
         }
         pickn_cat_resp = client.post("/api/lottery_categories/", json=pickn_category_payload)
         assert pickn_cat_resp.status_code == 201
-        error_test_pickn_cat_id = pickn_cat_resp.json()["id"]
+        error_test_pickn_cat_id = pickn_cat_resp.json()["_id"]
 
 
         # Test 5.1: Ticket purchase with invalid category_id
@@ -613,7 +624,8 @@ class TestAPIFlows:
         client.post("/api/draws/", json={
             "category_id": error_test_cat_id,
             "scheduled_open_time": open_time,
-            "scheduled_close_time": close_time
+            "scheduled_close_time": close_time,
+            "base_prize_pool": 0.0
         }) # Create draw
         client.post(f"/api/draws/process_pending_draws?category_id={error_test_cat_id}") # Open it
 
@@ -0,0 +1,147 @@
+import pytest
+from fastapi.testclient import TestClient
+from typing import Any, Dict, List
+
+import draws.router as draws_router
+import rng.utils
+from draws import db as draws_db
+from syndicates import db as syndicate_db
+from tickets.models import TicketCreate
+
+# test_client and mongo_ops fixtures are from tests/conftest.py
+
+READ_METHODS = {"find", "find_one", "aggregate", "count_documents", "distinct"}
+
+# Upper bounds on Mongo round trips. They don't depend on ticket/winner counts;
+# raise them only with a reason, an N+1 regression shows up as a linear blow-up.
+BUY_TICKETS_BUDGET = 20
+CLOSE_DRAW_SYNDICATE_READS_BUDGET = 2
+
+def raffle_category_payload(num_tiers: int) -> Dict[str, Any]:
+    return {
+        "name": f"Budget Raffle {num_tiers}",
+        "draw_interval_type": "daily",
+        "draw_interval_value": 1,
+        "ticket_price": 1.0,
+        "is_active": True,
+        "game_type": "raffle",
+        "game_config": {},
+        "prize_tiers": [
+            {"tier_name": f"Tier {i + 1}", "matches_required": i + 1, "percentage_of_prize_pool": 10.0}
+            for i in range(num_tiers)
+        ],
+    }
+
+PICK_N_CATEGORY = {
+    "name": "Budget Pick 4",
+    "draw_interval_type": "daily",
+    "draw_interval_value": 1,
+    "ticket_price": 1.0,
+    "is_active": True,
+    "game_type": "pick_n_digits",
+    "game_config": {"num_picks": 4, "min_digit": 0, "max_digit": 39, "allow_duplicates": False},
+    "prize_tiers": [
+        {"tier_name": "Match 4", "matches_required": 4, "percentage_of_prize_pool": 50.0},
+        {"tier_name": "Match 3", "matches_required": 3, "percentage_of_prize_pool": 20.0},
+    ],
+}
+
+def buy(client: TestClient, category_id: str, wallet: str, num_tickets: int, selection: List[int] | None = None) -> List[str]:
+    response = client.post("/api/tickets/buy", json={
+        "wallet_address": wallet,
+        "category_id": category_id,
+        "num_tickets": num_tickets,
+        "selection": selection,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["tickets"]
+
+class TestQueryBudgets:
+
+    @pytest.fixture(autouse=True)
+    def fixed_ledger_hash(self, monkeypatch):
+        monkeypatch.setattr(draws_router, "get_latest_ledger_hash_sync", lambda: "A1" * 32)
+
+    def _create_category(self, client: TestClient, num_tiers: int = 1) -> str:
+        response = client.post("/api/lottery_categories/", json=raffle_category_payload(num_tiers))
+        assert response.status_code == 201, response.text
+        return response.json()["_id"] # Responses are serialized by alias
+
+    def test_buy_tickets_round_trips_do_not_grow_with_ticket_count(self, test_client, mongo_ops):
+        category_id = self._create_category(test_client)
+        buy(test_client, category_id, "rWarmup", 1) # Opens the draw, so both measured calls take the same path
+
+        with mongo_ops.track():
+            buy(test_client, category_id, "rSingle", 1)
+        single_ticket_ops = mongo_ops.count()
+
+        with mongo_ops.track():
+            ticket_ids = buy(test_client, category_id, "rBulk", 100)
+        hundred_ticket_ops = mongo_ops.count()
+
+        assert len(ticket_ids) == 100
+        assert mongo_ops.count("tickets", {"insert_one", "insert_many"}) == 1
+        assert hundred_ticket_ops <= BUY_TICKETS_BUDGET
+        assert hundred_ticket_ops == single_ticket_ops
+
+    def _close_with_syndicate_winners(self, client: TestClient, mongo_ops, close_draw_and_wait, num_winners: int) -> Dict[str, Any]:
+        category_id = self._create_category(client, num_tiers=num_winners)
+        buy(client, category_id, "rSolo", 1)
+        draw_id = draws_db.get_open_draws_for_category(category_id)[0].id
+
+        # Every other ticket in the draw belongs to a syndicate, so all tier winners are syndicate wins.
+        for i in range(num_winners):
+            syndicate = syndicate_db.create_syndicate(f"Budget Syndicate {i}", None, f"rCreator{i}", category_id)
+            tickets = [TicketCreate(wallet_address=f"rCreator{i}", draw_id=draw_id) for _ in range(3)]
+            assert syndicate_db.record_syndicate_bulk_purchase(syndicate.id, draw_id, f"rCreator{i}", tickets)
+
+        with mongo_ops.track():
+            return close_draw_and_wait(draw_id)
+
+    @pytest.mark.parametrize("num_winners", [1, 6])
+    def test_close_draw_syndicate_lookups_are_constant(self, test_client, mongo_ops, close_draw_and_wait, num_winners):
+        closed = self._close_with_syndicate_winners(test_client, mongo_ops, close_draw_and_wait, num_winners)
+
+        assert len(closed["winners_by_tier"]) == num_winners
+        syndicate_reads = (
+            mongo_ops.count("syndicate_ticket_purchases", READ_METHODS)
+            + mongo_ops.count("syndicates", READ_METHODS)
+        )
+        assert syndicate_reads <= CLOSE_DRAW_SYNDICATE_READS_BUDGET
+        # Winnings records are one write per syndicate win, which is expected.
+        syndicate_wins = [w for w in closed["winners_by_tier"] if w.get("syndicate_win_details")]
+        assert mongo_ops.count("syndicate_winnings", {"insert_one"}) == len(syndicate_wins)
+
+    def test_pick_n_close_reads_only_the_matching_tickets(self, test_client, mongo_ops, close_draw_and_wait, monkeypatch):
+        monkeypatch.setattr(rng.utils, "generate_winning_picks", lambda seed, game_config: [1, 2, 3, 4])
+        response = test_client.post("/api/lottery_categories/", json=PICK_N_CATEGORY)
+        assert response.status_code == 201, response.text
+        category_id = response.json()["_id"]
+        buy(test_client, category_id, "rMiss", 300, selection=[20, 21, 22, 23]) # Seqs 0..299
+        buy(test_client, category_id, "rHit", 2, selection=[1, 2, 3, 9]) # Seqs 300, 301
+        draw_id = draws_db.get_open_draws_for_category(category_id)[0].id
+
+        with mongo_ops.track():
+            closed = close_draw_and_wait(draw_id)
+        assert sorted(w["wallet_address"] for w in closed["winners_by_tier"]) == ["rHit", "rHit"]
+
+        def query_filter(args, kwargs):
+            return (args[0] if args else kwargs.get("filter")) or {}
+        # The result is recorded by the claim-guarded update of the draw
+        recorded_at = next(
+            i for i, (collection, method, args, kwargs) in enumerate(mongo_ops.calls)
+            if collection == "draws" and method == "update_one" and "close_claim" in query_filter(args, kwargs)
+        )
+        reads = [
+            (i, query_filter(args, kwargs)) for i, (collection, method, args, kwargs) in enumerate(mongo_ops.calls)
+            if collection == "tickets" and method in {"find", "find_one", "aggregate"}
+        ]
+        selection_reads = [read for i, read in reads if i < recorded_at]
+        assert selection_reads
+        for read in selection_reads:
+            seqs = read["ticket_seq"]
+            read_seqs = set(seqs["$in"]) if "$in" in seqs else set(range(seqs["$gte"], seqs["$lte"] + 1))
+            assert read_seqs <= {300, 301}
+        # The snapshot still holds every ticket, written after the result
+        assert closed["ticket_snapshot_count"] == 302
+        assert any(i > recorded_at and read == {"draw_id": draw_id} for i, read in reads)
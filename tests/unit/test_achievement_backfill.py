@@ -0,0 +1,265 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import draws.router as draws_router
+from app import app
+from auth.dependencies import get_current_user_from_token
+from auth.models import TokenData, auth_config
+from database import get_db
+from draws import db as draws_db
+from gamification import backfill as achievement_backfill
+from gamification import db as gamification_db
+from gamification.models import AchievementDefinitionCreate, AchievementEventType
+from syndicates import db as syndicate_db
+from tickets import db as tickets_db
+from tickets.models import TicketCreate
+
+# test_client and close_draw_and_wait fixtures are from tests/conftest.py
+
+RAFFLE_CATEGORY = {
+    "name": "Backfill Raffle",
+    "draw_interval_type": "daily",
+    "draw_interval_value": 1,
+    "ticket_price": 1.0,
+    "is_active": True,
+    "game_type": "raffle",
+    "game_config": {},
+    "prize_tiers": [{"tier_name": "First", "matches_required": 1, "percentage_of_prize_pool": 50.0}],
+}
+
+def _definition(name, event_type, points_reward=10, **conditions):
+    return gamification_db.create_achievement_definition(AchievementDefinitionCreate(
+        name=name, description=f"{name}.", points_reward=points_reward,
+        criteria=[{"event_type": event_type, "conditions": conditions}],
+    ))
+
+def _holders(definition):
+    return sorted(a["user_wallet_address"] for a in get_db().user_achievements.find({"achievement_definition_id": definition.id}))
+
+class TestAchievementBackfill:
+
+    @pytest.fixture(autouse=True)
+    def inline_jobs(self, monkeypatch):
+        """ Runs queued jobs when run_queued() is called instead of on the worker pool. """
+        self.queued = []
+        monkeypatch.setattr(achievement_backfill, "submit_backfill_job", lambda job_id, partitions_total: self.queued.append(job_id))
+        monkeypatch.setattr(draws_router, "get_latest_ledger_hash_sync", lambda: "B7" * 32)
+
+    def run_queued(self):
+        while self.queued:
+            achievement_backfill.run_backfill_job(self.queued.pop(0))
+
+    def _category(self, test_client, name):
+        response = test_client.post("/api/lottery_categories/", json={**RAFFLE_CATEGORY, "name": name})
+        assert response.status_code == 201, response.text
+        return response.json()["_id"]
+
+    def _buy(self, test_client, category_id, wallet, num_tickets):
+        response = test_client.post("/api/tickets/buy", json={"wallet_address": wallet, "category_id": category_id, "num_tickets": num_tickets})
+        assert response.status_code == 200, response.text
+
+    def _backfill(self, definition):
+        job = achievement_backfill.start_backfill(definition)
+        self.run_queued()
+        return gamification_db.get_backfill_job(job.id)
+
+    def test_ticket_purchases_are_replayed_per_purchase(self, test_client):
+        main, other = self._category(test_client, "Backfill Main"), self._category(test_client, "Backfill Other")
+        self._buy(test_client, main, "rBackA", 5)
+        self._buy(test_client, main, "rBackB", 2)
+        self._buy(test_client, main, "rBackB", 2) # Two purchases of 2 are not one of 3
+        self._buy(test_client, other, "rBackC", 4)
+        self._buy(test_client, other, "ZNotAnAddress", 3) # Outside the address alphabet, still covered
+
+        bulk = _definition("Bulk Buyer", AchievementEventType.TICKET_PURCHASE, count=3)
+        job = self._backfill(bulk)
+        assert _holders(bulk) == ["ZNotAnAddress", "rBackA", "rBackC"]
+        assert job.status == "completed"
+        assert job.partitions_done == job.partitions_total == len(achievement_backfill.wallet_ranges())
+        assert (job.users_qualified, job.achievements_granted) == (3, 3)
+        assert gamification_db.get_or_create_user_loyalty("rBackA").current_points == 10
+
+        loyal = _definition("Main Player", AchievementEventType.TICKET_PURCHASE, category_id=main)
+        self._backfill(loyal)
+        assert _holders(loyal) == ["rBackA", "rBackB"]
+
+        # Re-running grants nothing twice and credits no more points
+        again = self._backfill(bulk)
+        assert (again.users_qualified, again.achievements_granted) == (3, 0)
+        assert gamification_db.get_or_create_user_loyalty("rBackA").current_points == 20
+
+    def test_legacy_tickets_are_grouped_into_purchases(self, test_client, monkeypatch):
+        category_id = self._category(test_client, "Backfill Legacy")
+        self._buy(test_client, category_id, "rLegNew", 1)
+        draw_id = draws_db.get_open_draws_for_category(category_id)[0].id
+
+        # Written before purchase ids: one utcnow() per ticket, and syndicate tickets untagged
+        start = datetime.utcnow() - timedelta(days=30)
+        def legacy(wallet, *offsets):
+            result = get_db().tickets.insert_many([{"wallet_address": wallet, "draw_id": draw_id, "timestamp": start + offset} for offset in offsets])
+            return [str(ticket_id) for ticket_id in result.inserted_ids]
+        legacy("rLegA", timedelta(0), timedelta(milliseconds=3), timedelta(milliseconds=7))
+        legacy("rLegB", timedelta(0), timedelta(milliseconds=2), timedelta(minutes=10), timedelta(minutes=10, milliseconds=4))
+        get_db().syndicate_ticket_purchases.insert_one({
+            "syndicate_id": "0123456789abcdef01234567", "draw_id": draw_id, "purchased_by_wallet_address": "rLegSyn",
+            "ticket_ids": legacy("rLegSyn", *(timedelta(milliseconds=i) for i in range(4))),
+        })
+        syndicate_db.record_syndicate_bulk_purchase("0123456789abcdef01234568", draw_id, "rLegSyn2", [TicketCreate(wallet_address="rLegSyn2", draw_id=draw_id)] * 3)
+
+        bulk = _definition("Legacy Bulk Buyer", AchievementEventType.TICKET_PURCHASE, count=3)
+        get_db().schema_migrations.delete_many({})
+        monkeypatch.setattr(database, "_completed_migrations", set())
+        job = self._backfill(bulk)
+        assert job.status == "failed" and "migrations" in job.error
+
+        assert tickets_db.migrate_ticket_purchase_ids() and syndicate_db.migrate_syndicate_tickets()
+        assert len(get_db().tickets.distinct("purchase_id", {"wallet_address": "rLegB"})) == 2
+        assert get_db().tickets.count_documents({"syndicate_id": {"$ne": None}}) == 7
+        assert self._backfill(bulk).status == "completed"
+        assert _holders(bulk) == ["rLegA"]
+
+    def test_draw_wins_and_referrals(self, test_client, close_draw_and_wait):
+        category_id = self._category(test_client, "Backfill Wins")
+        for wallet in ("rWinA", "rWinB"):
+            self._buy(test_client, category_id, wallet, 3)
+        closed = close_draw_and_wait(draws_db.get_open_draws_for_category(category_id)[0].id)
+        winner = closed["winners_by_tier"][0]["wallet_address"]
+
+        first = _definition("First Prize", AchievementEventType.DRAW_WIN, tier_name="First")
+        other_tier = _definition("Other Prize", AchievementEventType.DRAW_WIN, tier_name="Jackpot")
+        self._backfill(first)
+        assert self._backfill(other_tier).partitions_done > 0
+        assert _holders(first) == [winner]
+        assert _holders(other_tier) == []
+
+        get_db().referral_links.insert_many([
+            {"referrer_wallet_address": "rRefA", "referee_wallet_address": "rNew1", "reward_status": "eligible_for_reward"},
+            {"referrer_wallet_address": "rRefB", "referee_wallet_address": "rNew2", "reward_status": "pending_first_purchase"},
+            {"referrer_wallet_address": "rRefC", "referee_wallet_address": "rNew3", "reward_status": "reward_credited"},
+        ])
+        referrer = _definition("Referrer", AchievementEventType.REFERRAL_SUCCESS, count=1)
+        self._backfill(referrer)
+        assert _holders(referrer) == ["rRefA", "rRefC"]
+
+    def test_definitions_no_single_event_meets_finish_at_once(self, test_client):
+        unreachable = gamification_db.create_achievement_definition(AchievementDefinitionCreate(
+            name="Buy And Refer", description="Both.", criteria=[
+                {"event_type": AchievementEventType.TICKET_PURCHASE, "conditions": {}},
+                {"event_type": AchievementEventType.REFERRAL_SUCCESS, "conditions": {}},
+            ],
+        ))
+        job = achievement_backfill.start_backfill(unreachable)
+        assert job.status == "completed" and job.partitions_total == 0
+        assert self.queued == []
+
+    def test_interrupted_job_resumes_from_its_partitions(self, test_client, monkeypatch):
+        category_id = self._category(test_client, "Backfill Resume")
+        for wallet in ("rResA", "rResB", "rResZ"):
+            self._buy(test_client, category_id, wallet, 1)
+        definition = _definition("Any Ticket", AchievementEventType.TICKET_PURCHASE)
+        job = achievement_backfill.start_backfill(definition)
+        self.queued.clear()
+
+        # A worker that died holding a partition, and one that failed a partition once
+        dead = gamification_db.claim_backfill_partition(job.id, datetime.utcnow())
+        flaky = gamification_db.claim_backfill_partition(job.id, datetime.utcnow())
+        assert gamification_db.fail_backfill_partition(flaky, "boom")
+
+        assert achievement_backfill.resume_backfill_jobs() == 1
+        monkeypatch.setattr(gamification_db, "BACKFILL_CLAIM_TIMEOUT", timedelta(0)) # The dead worker's claim has expired
+        self.run_queued()
+
+        finished = gamification_db.get_backfill_job(job.id)
+        assert finished.status == "completed"
+        assert finished.partitions_done == finished.partitions_total
+        assert _holders(definition) == ["rResA", "rResB", "rResZ"]
+        # The dead worker's late result is ignored
+        assert not gamification_db.complete_backfill_partition(dead, 1, 1)
+        assert gamification_db.get_backfill_job(job.id).partitions_done == finished.partitions_total
+
+    def test_failing_partition_fails_the_job(self, test_client, monkeypatch):
+        definition = _definition("Any Ticket", AchievementEventType.TICKET_PURCHASE)
+        monkeypatch.setattr(achievement_backfill, "wallet_ranges", lambda: [(None, "rM"), ("rM", None)])
+        original = achievement_backfill.backfill_partition
+        def backfill_partition(definition, plan, low, high):
+            if low == "rM":
+                raise achievement_backfill.BackfillError("unavailable")
+            return original(definition, plan, low, high)
+        monkeypatch.setattr(achievement_backfill, "backfill_partition", backfill_partition)
+
+        job = self._backfill(definition)
+        assert job.status == "failed"
+        assert (job.partitions_done, job.partitions_failed) == (1, 1)
+        assert "unavailable" in job.error
+
+class TestBackfillEndpoints:
+
+    @pytest.fixture(autouse=True)
+    def as_admin(self, monkeypatch):
+        monkeypatch.setattr(auth_config, "ADMIN_WALLET_ADDRESSES", ["rAdmin"])
+        app.dependency_overrides[get_current_user_from_token] = lambda: TokenData(wallet_address="rAdmin")
+        yield
+        app.dependency_overrides.pop(get_current_user_from_token, None)
+
+    def _wait(self, test_client, job_id, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = test_client.get(f"/api/gamification/admin/achievements/backfills/{job_id}").json()
+            if job["status"] in ("completed", "failed"):
+                return job
+            time.sleep(0.02)
+        raise AssertionError(f"Backfill job {job_id} did not finish")
+
+    def test_creating_a_definition_backfills_it(self, test_client, monkeypatch):
+        monkeypatch.setattr(achievement_backfill, "BACKFILL_WORKERS", 1)
+        response = test_client.post("/api/lottery_categories/", json=RAFFLE_CATEGORY)
+        category_id = response.json()["_id"]
+        assert test_client.post("/api/tickets/buy", json={"wallet_address": "rAdmin", "category_id": category_id, "num_tickets": 2}).status_code == 200
+
+        response = test_client.post("/api/gamification/admin/achievements/definitions", json={
+            "name": "Early Bird", "description": "Bought before this existed.", "points_reward": 5,
+            "criteria": [{"event_type": "ticket_purchase", "conditions": {"count": 2}}],
+        })
+        assert response.status_code == 201, response.text
+        definition_id = response.json()["_id"]
+        job_id = str(get_db().achievement_backfill_jobs.find_one({"definition_id": definition_id})["_id"])
+        job = self._wait(test_client, job_id)
+        assert job["status"] == "completed"
+        assert job["achievements_granted"] == 1
+
+        response = test_client.post(f"/api/gamification/admin/achievements/definitions/{definition_id}/backfill")
+        assert response.status_code == 202
+        assert self._wait(test_client, response.json()["_id"])["achievements_granted"] == 0
+
+        assert test_client.post("/api/gamification/admin/achievements/definitions/0123456789abcdef01234567/backfill").status_code == 404
+        assert test_client.get("/api/gamification/admin/achievements/backfills/0123456789abcdef01234567").status_code == 404
+
+    def test_admins_only(self, test_client):
+        definition = _definition("Locked", AchievementEventType.TICKET_PURCHASE)
+        backfill_url = f"/api/gamification/admin/achievements/definitions/{definition.id}/backfill"
+        app.dependency_overrides[get_current_user_from_token] = lambda: TokenData(wallet_address="rUser")
+        assert test_client.post(backfill_url).status_code == 403
+        app.dependency_overrides.pop(get_current_user_from_token)
+        assert test_client.post(backfill_url).status_code in (401, 403)
+        assert test_client.get("/api/gamification/admin/achievements/backfills/0123456789abcdef01234567").status_code in (401, 403)
+        assert get_db().achievement_backfill_jobs.count_documents({}) == 0
+
+    def test_one_active_backfill_per_definition(self, test_client, monkeypatch):
+        monkeypatch.setattr(achievement_backfill, "submit_backfill_job", lambda job_id, partitions_total: None) # Stays queued
+        definition = _definition("Once At A Time", AchievementEventType.TICKET_PURCHASE)
+        backfill_url = f"/api/gamification/admin/achievements/definitions/{definition.id}/backfill"
+        response = test_client.post(backfill_url)
+        assert response.status_code == 202
+        job_id = response.json()["_id"]
+
+        response = test_client.post(backfill_url)
+        assert response.status_code == 409
+        assert job_id in response.json()["detail"]
+        # Also when the check passes but the insert loses the race
+        assert gamification_db.create_backfill_job(definition.id, [(None, None)]) is None
+
+        assert gamification_db.update_backfill_job(job_id, {"status": "failed", "finished_at": datetime.utcnow()})
+        assert test_client.post(backfill_url).status_code == 202
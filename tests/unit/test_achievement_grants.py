@@ -0,0 +1,93 @@
+from datetime import datetime
+
+import pytest
+from mongomock import MongoClient as MockMongoClient
+
+from gamification import db as gamification_db
+from gamification.models import AchievementDefinition, AchievementEventType
+from gamification.services import GamificationService
+
+class TestAchievementGrants:
+
+    @pytest.fixture(autouse=True)
+    def mock_db(self, monkeypatch):
+        mock_db = MockMongoClient()["achievement_grants_test"]
+        monkeypatch.setattr(gamification_db, "get_db", lambda: mock_db)
+        gamification_db.ensure_gamification_indexes()
+        return mock_db
+
+    @pytest.fixture
+    def definition(self, mock_db):
+        result = mock_db.achievement_definitions.insert_one({
+            "name": "First Purchase", "description": "Buy a ticket.", "points_reward": 15, "is_active": True,
+            "criteria": [{"event_type": AchievementEventType.TICKET_PURCHASE.value, "conditions": {"count": 1}}],
+        })
+        return AchievementDefinition(**gamification_db._with_str_id(mock_db.achievement_definitions.find_one({"_id": result.inserted_id})))
+
+    def test_unlock_is_two_writes_and_no_reads(self, definition, mongo_ops):
+        with mongo_ops.track():
+            granted = gamification_db.grant_achievement_to_user("rGrant", definition)
+        assert granted.id and granted.name == "First Purchase"
+        assert mongo_ops.count() == 2
+        assert mongo_ops.count("user_achievements", {"insert_one"}) == 1
+        assert mongo_ops.count("user_loyalty", {"find_one_and_update"}) == 1
+        assert gamification_db.get_or_create_user_loyalty("rGrant").current_points == 15
+
+    def test_repeat_grant_is_rejected_without_points(self, definition, mock_db, mongo_ops):
+        assert gamification_db.grant_achievement_to_user("rGrant", definition)
+        with mongo_ops.track():
+            assert gamification_db.grant_achievement_to_user("rGrant", definition) is None
+        assert mongo_ops.count() == 1 # The rejected insert only
+        assert mock_db.user_achievements.count_documents({}) == 1
+        assert gamification_db.get_or_create_user_loyalty("rGrant").current_points == 15
+
+    def test_repeated_events_grant_once(self, definition, mock_db, mongo_ops):
+        service = GamificationService()
+        for _ in range(3):
+            service.process_event("rEvent", AchievementEventType.TICKET_PURCHASE, {"count": 2})
+        assert [a.name for a in gamification_db.get_user_achievements("rEvent")] == ["First Purchase"]
+        assert gamification_db.get_or_create_user_loyalty("rEvent").current_points == 15
+
+        with mongo_ops.track():
+            service.process_event("rEvent", AchievementEventType.TICKET_PURCHASE, {"count": 2})
+        assert mongo_ops.count("user_achievements", {"find", "find_one", "count_documents"}) == 0
+
+    def test_loyalty_records_are_upserted(self, mock_db):
+        assert gamification_db.get_or_create_user_loyalty("rLoyal").current_points == 0
+        assert gamification_db.update_user_loyalty_points("rLoyal", 7).current_points == 7
+        assert gamification_db.update_user_loyalty_points("rNew", 3).current_points == 3
+        assert gamification_db.get_or_create_user_loyalty("rLoyal").current_points == 7
+        assert mock_db.user_loyalty.count_documents({}) == 2
+
+    def test_legacy_duplicates_are_removed_before_the_unique_indexes(self, definition, monkeypatch):
+        legacy_db = MockMongoClient()["achievement_grants_legacy_test"]
+        monkeypatch.setattr(gamification_db, "get_db", lambda: legacy_db)
+        monkeypatch.setattr(gamification_db, "_grant_indexes_ready", False)
+        earned = [datetime(2026, 1, day) for day in (3, 1, 2)]
+        legacy_db.user_achievements.insert_many([
+            {"user_wallet_address": "rDup", "achievement_definition_id": definition.id, "name": definition.name, "description": definition.description, "earned_at": at}
+            for at in earned
+        ] + [{"user_wallet_address": "rOnce", "achievement_definition_id": definition.id, "name": definition.name, "description": definition.description, "earned_at": earned[0]}])
+        legacy_db.user_loyalty.insert_many([
+            {"user_wallet_address": "rDup", "current_points": 15}, {"user_wallet_address": "rDup", "current_points": 15},
+        ])
+
+        gamification_db.ensure_gamification_indexes()
+        assert [a.earned_at for a in gamification_db.get_user_achievements("rDup")] == [datetime(2026, 1, 1)]
+        assert legacy_db.user_achievements.count_documents({}) == 2
+        assert legacy_db.user_loyalty.count_documents({}) == 1
+        assert gamification_db.get_or_create_user_loyalty("rDup").current_points == 30
+        assert gamification_db.grant_achievement_to_user("rDup", definition) is None
+
+    def test_grants_are_refused_without_the_unique_indexes(self, definition, monkeypatch):
+        unindexed_db = MockMongoClient()["achievement_grants_unindexed_test"]
+        monkeypatch.setattr(gamification_db, "get_db", lambda: unindexed_db)
+        monkeypatch.setattr(gamification_db, "_grant_indexes_ready", False)
+
+        assert gamification_db.grant_achievement_to_user("rNoIndex", definition) is None
+        assert gamification_db.grant_achievements_bulk([("rNoIndex", definition)]) == []
+        assert unindexed_db.user_achievements.count_documents({}) == 0
+        assert unindexed_db.user_loyalty.count_documents({}) == 0
+
+        gamification_db.ensure_gamification_indexes()
+        assert gamification_db.grant_achievement_to_user("rNoIndex", definition)
@@ -0,0 +1,35 @@
+import json
+
+from benchmarks import run as bench_run
+
+class TestBenchmarkSuite:
+
+    def test_percentile_nearest_rank(self):
+        values = [float(v) for v in range(1, 101)]
+        assert bench_run.percentile(values, 50) == 50.0
+        assert bench_run.percentile(values, 99) == 99.0
+        assert bench_run.percentile([7.0], 99) == 7.0
+
+    def test_small_run_writes_every_benchmark(self, tmp_path):
+        output = tmp_path / "results.json"
+        bench_run.main([
+            "--scales", "200", "--iterations", "3", "--close-iterations", "1",
+            "--output", str(output),
+        ])
+
+        report = json.loads(output.read_text())
+        assert report["meta"]["backend"] == "mongomock"
+        assert {r["benchmark"] for r in report["results"]} == set(bench_run.BENCHMARKS)
+        for result in report["results"]:
+            assert result["scale"] == 200
+            assert 0 < result["p50_ms"] <= result["p99_ms"]
+            assert result["peak_rss_mb"] > 0
+
+    def test_baseline_comparison(self, tmp_path, capsys):
+        baseline = tmp_path / "baseline.json"
+        bench_run.main(["--scales", "100", "--benchmarks", "get_draw_history", "--iterations", "3", "--output", str(baseline)])
+        bench_run.main([
+            "--scales", "100", "--benchmarks", "get_draw_history", "--iterations", "3",
+            "--output", str(tmp_path / "current.json"), "--baseline", str(baseline),
+        ])
+        assert "get_draw_history" in capsys.readouterr().out.split("Compared with")[1]
@@ -0,0 +1,59 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from mongomock import MongoClient as MockMongoClient
+
+from auth import challenge_store as challenge_store_module
+from auth.challenge_store import InMemoryChallengeStore, MongoChallengeStore
+
+class TestInMemoryChallengeStore:
+
+    def test_pop_returns_entry_once(self):
+        store = InMemoryChallengeStore()
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+        store.put("challenge1", "rWallet1", expires_at)
+        assert store.pop("challenge1") == {"wallet_address": "rWallet1", "expires_at": expires_at}
+        assert store.pop("challenge1") is None
+
+    def test_expired_entries_are_swept(self):
+        store = InMemoryChallengeStore()
+        past = datetime.now(timezone.utc) - timedelta(seconds=1)
+        future = datetime.now(timezone.utc) + timedelta(minutes=5)
+        for i in range(100):
+            store.put(f"old{i}", "rWallet1", past)
+        store.put("fresh", "rWallet2", future)
+        # The sweep on the next put removes all expired challenges without touching fresh ones.
+        store.put("fresh2", "rWallet2", future)
+        assert len(store) == 2
+        assert store.pop("old5") is None
+        assert store.pop("fresh")["wallet_address"] == "rWallet2"
+
+    def test_consumed_entries_do_not_break_sweep(self):
+        store = InMemoryChallengeStore()
+        soon = datetime.now(timezone.utc) - timedelta(seconds=1)
+        store.put("consumed", "rWallet1", soon)
+        store._entries.pop("consumed") # Consumed before its heap entry was swept
+        store.put("other", "rWallet1", datetime.now(timezone.utc) + timedelta(minutes=1))
+        assert len(store._expiry_heap) == 1
+        assert len(store) == 1
+
+
+class TestMongoChallengeStore:
+
+    @pytest.fixture
+    def mongo_store(self, monkeypatch):
+        mock_db = MockMongoClient()["challenge_store_test"]
+        monkeypatch.setattr(challenge_store_module, "get_db", lambda: mock_db)
+        return MongoChallengeStore()
+
+    def test_pop_is_single_use_and_tz_aware(self, mongo_store):
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+        mongo_store.put("challenge1", "rWallet1", expires_at)
+        entry = mongo_store.pop("challenge1")
+        assert entry["wallet_address"] == "rWallet1"
+        assert entry["expires_at"].tzinfo is not None
+        assert abs(entry["expires_at"] - expires_at) < timedelta(milliseconds=1)
+        assert mongo_store.pop("challenge1") is None
+
+    def test_ttl_index_created(self, mongo_store):
+        indexes = mongo_store._collection().index_information()
+        assert any(info.get("expireAfterSeconds") == 0 for info in indexes.values())
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import draws.router as draws_router
+from database import get_db
+from draws import db as draws_db
+from rng.utils import derive_draw_seed
+
+# test_client fixture is from tests/conftest.py
+
+def _category(name, game_type):
+    category = {
+        "name": name,
+        "draw_interval_type": "daily",
+        "draw_interval_value": 1,
+        "ticket_price": 1.0,
+        "is_active": True,
+        "game_type": game_type,
+        "game_config": {},
+        "prize_tiers": [{"tier_name": "First", "matches_required": 1, "percentage_of_prize_pool": 50.0}],
+    }
+    if game_type == "pick_n_digits":
+        category["game_config"] = {"num_picks": 2, "min_digit": 0, "max_digit": 3, "allow_duplicates": False}
+    return category
+
+class TestCloseDueDraws:
+
+    @pytest.fixture(autouse=True)
+    def ledger_fetches(self, monkeypatch):
+        fetches = []
+        monkeypatch.setattr(draws_router, "get_latest_ledger_hash_sync", lambda: fetches.append(1) or "D4" * 32)
+        return fetches
+
+    def _open_draw(self, test_client, name, game_type, due=True):
+        response = test_client.post("/api/lottery_categories/", json=_category(name, game_type))
+        assert response.status_code == 201, response.text
+        category_id = response.json()["_id"]
+        payload = {"wallet_address": "rDueA", "category_id": category_id, "num_tickets": 5}
+        if game_type == "pick_n_digits":
+            payload["quick_pick"] = True
+        assert test_client.post("/api/tickets/buy", json=payload).status_code == 200
+        draw_id = draws_db.get_open_draws_for_category(category_id)[0].id
+        if due:
+            get_db().draws.update_one({"_id": ObjectId(draw_id)}, {"$set": {"scheduled_close_time": datetime.utcnow() - timedelta(minutes=1)}})
+        return draw_id
+
+    def test_closes_due_draws_with_one_ledger_fetch(self, test_client, monkeypatch, ledger_fetches):
+        category_fetches = []
+        original = draws_router.get_categories_by_ids
+        monkeypatch.setattr(draws_router, "get_categories_by_ids", lambda ids: category_fetches.append(ids) or original(ids))
+        due = [self._open_draw(test_client, f"Due Raffle {i}", "raffle") for i in range(3)]
+        due.append(self._open_draw(test_client, "Due Pick 2", "pick_n_digits"))
+        not_due = self._open_draw(test_client, "Not Due Raffle", "raffle", due=False)
+
+        response = test_client.post("/api/draws/close_due")
+        assert response.status_code == 200, response.text
+        result = response.json()
+        assert sorted(result["closed_draw_ids"]) == sorted(due)
+        assert result["failed"] == {}
+        assert result["ledger_hash"] == "D4" * 32
+        assert len(ledger_fetches) == 1
+        assert len(category_fetches) == 1
+
+        for draw_id in due:
+            draw = draws_db.get_draw_by_id(draw_id)
+            assert draw.status == "completed" and draw.ledger_hash == "D4" * 32
+            assert draw.selection_seed == derive_draw_seed("D4" * 32, draw_id) # One ledger hash, a seed per draw
+            assert draw.winners_by_tier or draw.winning_selection
+        assert draws_db.get_draw_by_id(not_due).status == "open"
+        assert test_client.post("/api/draws/close_due").json() == {"ledger_hash": None, "closed_draw_ids": [], "failed": {}}
+
+    def test_failed_draw_is_released(self, test_client):
+        draw_id = self._open_draw(test_client, "Orphan Raffle", "raffle")
+        get_db().lottery_categories.delete_many({})
+
+        result = test_client.post("/api/draws/close_due").json()
+        assert result["closed_draw_ids"] == []
+        assert draw_id in result["failed"]
+        assert draws_db.get_draw_by_id(draw_id).status == "open"
+
+    def test_claimed_draw_is_left_to_its_batch(self, test_client):
+        draw_id = self._open_draw(test_client, "Claimed Raffle", "raffle")
+        assert [d.id for d in draws_db.claim_due_draws(datetime.utcnow(), 10)] == [draw_id]
+
+        assert draws_db.claim_due_draws(datetime.utcnow(), 10) == []
+        assert test_client.post(f"/api/draws/close/{draw_id}").status_code == 409
+        # A claim left behind by a batch that died expires
+        later = datetime.utcnow() + draws_db.CLOSE_CLAIM_TIMEOUT + timedelta(seconds=1)
+        assert [d.id for d in draws_db.claim_due_draws(later, 10)] == [draw_id]
+
+    def test_close_that_lost_its_claim_records_nothing(self, test_client):
+        draw_id = self._open_draw(test_client, "Contended Raffle", "raffle")
+        [batch_draw] = draws_db.claim_due_draws(datetime.utcnow(), 10)
+        # The batch stalls past its claim, and a direct close takes the draw over
+        later = datetime.utcnow() + draws_db.CLOSE_CLAIM_TIMEOUT + timedelta(seconds=1)
+        takeover = draws_db.claim_draw_for_close(draw_id, later)
+        assert takeover and takeover != batch_draw.close_claim
+        assert draws_db.claim_draw_for_close(draw_id, later) is None
+
+        with pytest.raises(draws_router.HTTPException):
+            draws_router.close_draw(draw_id, ledger_hash="D4" * 32, claim=batch_draw.close_claim)
+        stored = get_db().draws.find_one({"_id": ObjectId(draw_id)})
+        assert stored["status"] == "closing" and stored["close_claim"] == takeover
+        assert not stored.get("winners_by_tier")
+        assert get_db().draws.count_documents({"category_id": batch_draw.category_id}) == 1 # No next draw scheduled
+
+        closed = draws_router.close_draw(draw_id, ledger_hash="D4" * 32, claim=takeover)
+        assert closed.status == "completed" and closed.winners_by_tier
+        stored = get_db().draws.find_one({"_id": ObjectId(draw_id)})
+        assert "close_claim" not in stored and "close_prior_status" not in stored
+
+    def test_direct_close_claims_the_draw(self, test_client):
+        draw_id = self._open_draw(test_client, "Direct Raffle", "raffle")
+        closed = draws_router.close_draw(draw_id)
+        assert closed.status == "completed"
+        assert draws_router.close_draw(draw_id).id == draw_id # Already closed: returned as is
+
+        other_id = self._open_draw(test_client, "Held Raffle", "raffle")
+        assert draws_db.claim_draw_for_close(other_id, datetime.utcnow())
+        with pytest.raises(draws_router.HTTPException) as raised:
+            draws_router.close_draw(other_id)
+        assert raised.value.status_code == 409
+
+    def test_released_claim_restores_the_prior_status(self, test_client):
+        pending_id = self._open_draw(test_client, "Pending Raffle", "raffle")
+        get_db().draws.update_one({"_id": ObjectId(pending_id)}, {"$set": {"status": "pending_open"}})
+        claim = draws_db.claim_draw_for_close(pending_id, datetime.utcnow())
+        assert get_db().draws.find_one({"_id": ObjectId(pending_id)})["close_prior_status"] == "pending_open"
+        assert draws_db.release_draw_claim(pending_id, "someone else's claim") is False
+        assert draws_db.release_draw_claim(pending_id, claim)
+        stored = get_db().draws.find_one({"_id": ObjectId(pending_id)})
+        assert stored["status"] == "pending_open"
+        assert not {"close_claim", "close_claimed_at", "close_prior_status"} & stored.keys()
+
+        # A takeover of an expired batch claim keeps the status the batch claimed the draw from
+        open_id = self._open_draw(test_client, "Released Raffle", "raffle")
+        [batch_draw] = draws_db.claim_due_draws(datetime.utcnow(), 10)
+        later = datetime.utcnow() + draws_db.CLOSE_CLAIM_TIMEOUT + timedelta(seconds=1)
+        takeover = draws_db.claim_draw_for_close(open_id, later)
+        assert draws_db.release_draw_claim(open_id, batch_draw.close_claim) is False
+        assert draws_db.release_draw_claim(open_id, takeover)
+        assert draws_db.get_draw_by_id(open_id).status == "open"
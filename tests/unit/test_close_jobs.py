@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta
+
+import asyncio
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+import app as app_module
+
+import draws.router as draws_router
+from database import get_db
+from draws import close_jobs
+from draws import db as draws_db
+
+# test_client and close_draw_and_wait fixtures are from tests/conftest.py
+
+RAFFLE_CATEGORY = {
+    "name": "Close Job Raffle",
+    "draw_interval_type": "daily",
+    "draw_interval_value": 1,
+    "ticket_price": 1.0,
+    "is_active": True,
+    "game_type": "raffle",
+    "game_config": {},
+    "prize_tiers": [
+        {"tier_name": "First", "matches_required": 1, "percentage_of_prize_pool": 50.0},
+        {"tier_name": "Second", "matches_required": 2, "percentage_of_prize_pool": 20.0},
+    ],
+}
+
+class TestCloseJobs:
+
+    @pytest.fixture(autouse=True)
+    def fixed_ledger_hash(self, monkeypatch):
+        monkeypatch.setattr(draws_router, "get_latest_ledger_hash_sync", lambda: "E5" * 32)
+
+    def _open_draw(self, test_client, num_tickets=10):
+        response = test_client.post("/api/lottery_categories/", json=RAFFLE_CATEGORY)
+        assert response.status_code == 201, response.text
+        category_id = response.json()["_id"]
+        response = test_client.post("/api/tickets/buy", json={"wallet_address": "rJobA", "category_id": category_id, "num_tickets": num_tickets})
+        assert response.status_code == 200, response.text
+        return draws_db.get_open_draws_for_category(category_id)[0].id
+
+    def test_job_reports_progress_and_result(self, test_client, close_draw_and_wait):
+        draw_id = self._open_draw(test_client)
+        closed = close_draw_and_wait(draw_id)
+        assert closed["status"] == "completed"
+
+        job = get_db().draw_close_jobs.find_one({"draw_id": draw_id})
+        assert job["status"] == "completed" and job["phase"] == "done"
+        assert job["tickets_scanned"] == 10
+        assert job["winners_found"] == len(closed["winners_by_tier"]) == 2
+        assert job["started_at"] <= job["finished_at"]
+        assert "active_for_draw" not in job
+
+    def test_repeated_close_returns_the_unfinished_job(self, test_client, monkeypatch):
+        submitted = []
+        monkeypatch.setattr(close_jobs, "submit_close_job", lambda *args: submitted.append(args))
+        draw_id = self._open_draw(test_client)
+
+        first = test_client.post(f"/api/draws/close/{draw_id}")
+        second = test_client.post(f"/api/draws/close/{draw_id}")
+        assert first.status_code == second.status_code == 202
+        assert first.json()["_id"] == second.json()["_id"]
+        assert first.json()["status"] == "queued"
+        assert len(submitted) == 1
+
+        # Run the queued job inline, as a pool worker would
+        job_id, job_draw_id, close_fn = submitted[0]
+        close_jobs.run_close_job(job_id, job_draw_id, close_fn)
+        assert test_client.get(f"/api/draws/close_jobs/{job_id}").json()["status"] == "completed"
+
+    def test_failed_close_is_reported_on_the_job(self, test_client):
+        draw_id = self._open_draw(test_client)
+        get_db().lottery_categories.delete_many({})
+
+        job_id = test_client.post(f"/api/draws/close/{draw_id}").json()["_id"]
+        close_jobs.shutdown_close_job_workers() # Waits for the job
+        job = test_client.get(f"/api/draws/close_jobs/{job_id}").json()
+        assert job["status"] == "failed"
+        assert job["error_status_code"] == 500
+        assert "not found during closing" in job["error"]
+        # The draw is free for a new close job
+        assert test_client.post(f"/api/draws/close/{draw_id}").json()["_id"] != job_id
+
+    def test_unknown_draw_and_job(self, test_client):
+        assert test_client.post("/api/draws/close/0123456789abcdef01234567").status_code == 404
+        assert test_client.get("/api/draws/close_jobs/0123456789abcdef01234567").status_code == 404
+
+    def _abandoned_job(self, draw_id):
+        """ A job whose worker claimed the draw and then died, its lease run out. """
+        job, created = draws_db.create_close_job(draw_id, "dead-worker")
+        assert created
+        claim = draws_db.claim_draw_for_close(draw_id, datetime.utcnow())
+        get_db().draw_close_jobs.update_one({"_id": ObjectId(job.id)}, {"$set": {
+            "status": "running", "phase": "selecting_winners", "close_claim": claim,
+            "lease_expires_at": datetime.utcnow() - timedelta(seconds=1),
+        }})
+        return job.id
+
+    def test_dead_workers_job_is_taken_over(self, test_client, close_draw_and_wait):
+        draw_id = self._open_draw(test_client)
+        job, _ = draws_db.create_close_job(draw_id, "live-worker")
+        # While its lease holds, the job blocks a second one and is not taken over
+        assert draws_db.create_close_job(draw_id, close_jobs.WORKER_ID) == (job, False)
+        assert draws_db.take_over_stale_close_jobs(close_jobs.WORKER_ID) == []
+        get_db().draw_close_jobs.delete_many({})
+
+        job_id = self._abandoned_job(draw_id)
+        closed = close_draw_and_wait(draw_id) # The draw stays 'closing' under the dead worker's claim
+        assert closed["status"] == "completed"
+        job = get_db().draw_close_jobs.find_one({"_id": ObjectId(job_id)})
+        assert job["status"] == "completed" and job["attempts"] == 2
+        assert get_db().draw_close_jobs.count_documents({}) == 1
+
+    def test_unfinished_jobs_resume_on_startup(self, test_client):
+        draw_id = self._open_draw(test_client)
+        job_id = self._abandoned_job(draw_id)
+
+        assert close_jobs.resume_close_jobs(draws_router.close_draw) == 1
+        close_jobs.shutdown_close_job_workers() # Waits for the job
+        assert test_client.get(f"/api/draws/close_jobs/{job_id}").json()["status"] == "completed"
+        assert draws_db.get_draw_by_id(draw_id).status == "completed"
+        assert close_jobs.resume_close_jobs() == 0
+
+    def test_running_job_holds_the_draw_and_its_lease(self, test_client, monkeypatch):
+        submitted = []
+        monkeypatch.setattr(close_jobs, "submit_close_job", lambda *args: submitted.append(args))
+        draw_id = self._open_draw(test_client)
+        category_id = draws_db.get_draw_by_id(draw_id).category_id
+        job_id = test_client.post(f"/api/draws/close/{draw_id}").json()["_id"]
+        seen = {}
+
+        def close_fn(draw_id, **kwargs):
+            draw_doc = get_db().draws.find_one({"_id": ObjectId(draw_id)})
+            seen["status"] = draw_doc["status"]
+            # A purchase now goes to a new draw, not the one being closed
+            response = test_client.post("/api/tickets/buy", json={"wallet_address": "rJobB", "category_id": category_id, "num_tickets": 1})
+            assert response.status_code == 200, response.text
+            seen["new_draw"] = response.json()["message"]
+            assert test_client.post(f"/api/draws/close/{draw_id}").json()["_id"] == job_id # Still the same job
+
+            # Backdate the claim and lease so the heartbeat visibly renews them
+            get_db().draws.update_one({"_id": ObjectId(draw_id)}, {"$set": {"close_claimed_at": datetime(2000, 1, 1)}})
+            get_db().draw_close_jobs.update_one({"_id": ObjectId(job_id)}, {"$set": {"lease_expires_at": datetime(2000, 1, 1)}})
+            monkeypatch.setattr(close_jobs, "_close_fn", None)
+            close_jobs.heartbeat()
+            seen["claimed_at"] = get_db().draws.find_one({"_id": ObjectId(draw_id)})["close_claimed_at"]
+            seen["lease"] = get_db().draw_close_jobs.find_one({"_id": ObjectId(job_id)})["lease_expires_at"]
+            return draws_router.close_draw(draw_id, **kwargs)
+
+        close_jobs.run_close_job(job_id, draw_id, close_fn)
+        assert seen["status"] == "closing"
+        assert draw_id not in seen["new_draw"]
+        assert seen["claimed_at"] > datetime(2000, 1, 1) and seen["lease"] > datetime.utcnow()
+        assert get_db().tickets.count_documents({"draw_id": draw_id}) == 10
+        assert draws_db.get_draw_by_id(draw_id).status == "completed"
+        assert "lease_owner" not in test_client.get(f"/api/draws/close_jobs/{job_id}").json()
+
+    def test_draw_index_failure_does_not_skip_other_indexes(self, test_client, monkeypatch):
+        class FailingCollection:
+            def create_index(self, *args, **kwargs):
+                raise OperationFailure("index build failed")
+
+        built = []
+        monkeypatch.setattr(draws_db, "get_draws_collection", lambda: FailingCollection())
+        monkeypatch.setattr(app_module, "ensure_gamification_indexes", lambda: built.append("gamification"))
+        draws_db.ensure_draw_indexes() # Printed, not raised
+        asyncio.run(app_module.ensure_db_indexes())
+        assert built == ["gamification"]
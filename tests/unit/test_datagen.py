@@ -0,0 +1,76 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+
+import database
+from benchmarks import datagen
+
+SMALL_RUN = ["--backend", "mongomock", "--tickets", "3000", "--draws", "10", "--wallets", "500",
+             "--syndicates", "4", "--min-syndicate-members", "100", "--max-syndicate-members", "150",
+             "--workers", "2", "--as-of", "2026-01-15T00:00:00", "--quiet"]
+
+class TestDatagen:
+
+    @pytest.fixture(autouse=True)
+    def reset_database(self):
+        yield
+        database.client = None
+        database.db = None
+
+    def _snapshot(self):
+        tickets = list(database.db.tickets.find({}, {"_id": 1, "wallet_address": 1, "selection_data": 1}).sort("_id", 1))
+        draws = list(database.db.draws.find({}, {"winners_by_tier": 1, "winning_selection": 1}).sort("_id", 1))
+        return tickets, draws
+
+    def test_loads_every_collection(self):
+        result = datagen.main(SMALL_RUN)
+        counts = result["counts"]
+
+        assert counts["tickets"] == 3000
+        assert counts["draws"] == 10
+        assert counts["lottery_categories"] == len(datagen.CATEGORY_SPECS)
+        assert counts["users"] == 500
+        assert counts["syndicates"] == 4
+        assert 400 <= counts["syndicate_memberships"] <= 600
+        assert counts["referral_links"] > 0 and counts["referrer_stats"] > 0
+
+        # Every category has exactly one open draw; completed draws have participants.
+        assert database.db.draws.count_documents({"status": "open"}) == 5
+        for draw in database.db.draws.find({"status": "completed"}):
+            assert draw["participants"] or not database.db.tickets.count_documents({"draw_id": str(draw["_id"])})
+
+        # Syndicate counters were rebuilt from the members arrays.
+        for syndicate in database.db.syndicates.find():
+            active = sum(1 for m in syndicate["members"] if m["status"] == "active")
+            assert syndicate["active_member_count"] == active
+
+        # Referrer counters agree with the links.
+        links = Counter(link["referrer_wallet_address"] for link in database.db.referral_links.find())
+        for stats in database.db.referrer_stats.find():
+            assert stats["total"] == links[stats["_id"]]
+
+    def test_same_seed_same_data(self):
+        datagen.main(SMALL_RUN)
+        first = self._snapshot()
+        datagen.main(SMALL_RUN + ["--workers", "3"])
+        assert self._snapshot() == first
+
+    def test_pick_n_skew_favours_popular_numbers(self):
+        config = {"num_picks": 6, "min_digit": 1, "max_digit": 49, "allow_duplicates": False}
+        log_weights = [math.log(w) for w in datagen.pick_weights(config, skew=1.0)]
+        rng = random.Random(7)
+        counts = Counter()
+        for _ in range(5000):
+            picks = datagen.skewed_picks(rng, config, log_weights)
+            assert len(set(picks)) == 6 and all(1 <= p <= 49 for p in picks)
+            counts.update(picks)
+        birthday = sum(counts[n] for n in range(1, 32)) / 31
+        high = sum(counts[n] for n in range(32, 50)) / 18
+        assert birthday > 1.2 * high
+        assert counts[7] > birthday
+
+    def test_uniform_without_skew(self):
+        config = {"num_picks": 3, "min_digit": 0, "max_digit": 9, "allow_duplicates": True}
+        assert set(datagen.pick_weights(config, skew=0.0)) == {1.0}
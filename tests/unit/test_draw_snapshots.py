@@ -0,0 +1,213 @@
+import os
+
+import pytest
+from bson import ObjectId
+
+import draws.router as draws_router
+from database import get_db
+from draws import db as draws_db
+from draws import snapshots as draw_snapshots
+from lottery_categories.db import get_category_by_id
+from rng.utils import lowest_scoring_tickets, raffle_ticket_score
+from tickets.selections import encode_pick_values
+
+# test_client fixture is from tests/conftest.py
+
+def _ticket_docs(picks_per_ticket):
+    return [
+        {"_id": ObjectId(), "wallet_address": f"rSnap{i % 3}", "ticket_seq": i, "selection_data": {"picks": picks, **encode_pick_values(picks)}}
+        for i, picks in enumerate(picks_per_ticket)
+    ]
+
+class TestDrawSnapshot:
+
+    @pytest.mark.parametrize("picks_per_ticket, kind", [
+        ([[1, 2, 3], [3, 4, 5], [0, 62, 63]], draw_snapshots.PICKS_MASK64),
+        ([[1, 2, 3], [64, 100, 127]], draw_snapshots.PICKS_MASK128),
+        ([[1, 2, 3], [500, -4], [9]], draw_snapshots.PICKS_VALUES),
+    ])
+    def test_round_trip(self, tmp_path, picks_per_ticket, kind):
+        docs = _ticket_docs(picks_per_ticket)
+        path = str(tmp_path / "draw.snap")
+        draw_snapshots.write_snapshot(path, docs, with_picks=True).close()
+
+        with draw_snapshots.DrawSnapshot(path) as snapshot:
+            assert len(snapshot) == len(docs)
+            assert snapshot.picks_kind == kind
+            assert list(snapshot.ticket_seqs) == [doc["ticket_seq"] for doc in docs]
+            for row, doc in enumerate(docs):
+                assert snapshot.ticket(row) == {"ticket_id": str(doc["_id"]), "wallet_address": doc["wallet_address"]}
+                assert snapshot.pick_values(row) == set(picks_per_ticket[row])
+            winning = [3, 5, 63, 127, 500]
+            assert snapshot.match_rows(winning, 1) == [
+                (row, len(set(picks) & set(winning))) for row, picks in enumerate(picks_per_ticket)
+                if set(picks) & set(winning)
+            ]
+
+    def test_checksum_mismatch_is_rejected(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(draw_snapshots, "SNAPSHOT_DIR", str(tmp_path))
+        path = draw_snapshots.snapshot_path("draw1")
+        draw_snapshots.write_snapshot(path, _ticket_docs([[1, 2]]), with_picks=False).close()
+        with pytest.raises(draw_snapshots.SnapshotError):
+            draw_snapshots.open_draw_snapshot("draw1", "0" * 64)
+        with pytest.raises(draw_snapshots.SnapshotError):
+            draw_snapshots.open_draw_snapshot("draw2", "0" * 64)
+
+RAFFLE_CATEGORY = {
+    "name": "Snapshot Raffle",
+    "draw_interval_type": "daily",
+    "draw_interval_value": 1,
+    "ticket_price": 1.0,
+    "is_active": True,
+    "game_type": "raffle",
+    "game_config": {},
+    "prize_tiers": [
+        {"tier_name": "First", "matches_required": 1, "percentage_of_prize_pool": 50.0},
+        {"tier_name": "Second", "matches_required": 2, "percentage_of_prize_pool": 20.0},
+    ],
+}
+
+PICK_N_CATEGORY = {
+    "name": "Snapshot Pick 4",
+    "draw_interval_type": "daily",
+    "draw_interval_value": 1,
+    "ticket_price": 1.0,
+    "is_active": True,
+    "game_type": "pick_n_digits",
+    "game_config": {"num_picks": 4, "min_digit": 0, "max_digit": 9, "allow_duplicates": False},
+    "prize_tiers": [
+        {"tier_name": "Match 4", "matches_required": 4, "percentage_of_prize_pool": 50.0},
+        {"tier_name": "Match 3", "matches_required": 3, "percentage_of_prize_pool": 20.0},
+    ],
+}
+
+class TestCloseWithSnapshot:
+
+    @pytest.fixture(autouse=True)
+    def fixed_ledger_hash(self, monkeypatch):
+        monkeypatch.setattr(draws_router, "get_latest_ledger_hash_sync", lambda: "C3" * 32)
+
+    @pytest.fixture(autouse=True)
+    def closer(self, close_draw_and_wait):
+        self.close_draw_and_wait = close_draw_and_wait
+
+    def _closed_draw(self, test_client, category, tickets_per_wallet):
+        response = test_client.post("/api/lottery_categories/", json=category)
+        assert response.status_code == 201, response.text
+        category_id = response.json()["_id"]
+        for wallet in ("rSnapA", "rSnapB", "rSnapC"):
+            payload = {"wallet_address": wallet, "category_id": category_id, "num_tickets": tickets_per_wallet}
+            if category["game_type"] == "pick_n_digits":
+                payload["quick_pick"] = True
+            response = test_client.post("/api/tickets/buy", json=payload)
+            assert response.status_code == 200, response.text
+        draw_id = draws_db.get_open_draws_for_category(category_id)[0].id
+        return self.close_draw_and_wait(draw_id)
+
+    @pytest.mark.parametrize("category, tickets_per_wallet", [(RAFFLE_CATEGORY, 20), (PICK_N_CATEGORY, 150)])
+    def test_close_records_snapshot_and_verifies(self, test_client, category, tickets_per_wallet):
+        closed = self._closed_draw(test_client, category, tickets_per_wallet)
+        assert closed["ticket_snapshot_count"] == 3 * tickets_per_wallet
+        assert len(closed["ticket_snapshot_sha256"]) == 64
+        assert closed["winners_by_tier"]
+
+        response = test_client.get(f"/api/draws/{closed['_id']}/verify")
+        assert response.status_code == 200, response.text
+        verification = response.json()
+        assert verification["verified"] is True
+        assert verification["mismatched_ticket_ids"] == []
+        assert {(w["tier_name"], w["ticket_id"]) for w in verification["recomputed_winners"]} == {
+            (w["tier_name"], w["ticket_id"]) for w in closed["winners_by_tier"]
+        }
+
+    def test_winners_match_a_close_without_snapshots(self, test_client, monkeypatch):
+        closed = self._closed_draw(test_client, RAFFLE_CATEGORY, 20)
+        tickets = get_db().tickets.find({"draw_id": closed["_id"]}, {"_id": 1, "wallet_address": 1})
+        expected = draws_router._draw_raffle_winners(
+            closed["_id"], closed["selection_seed"], [draws_router.PrizeTierConfig(**t) for t in RAFFLE_CATEGORY["prize_tiers"]],
+            draws_router._TicketDocs(list(tickets))
+        )
+        assert [(w["tier_name"], w["ticket_id"]) for w in closed["winners_by_tier"]] == [
+            (tier.tier_name, ticket["ticket_id"]) for tier, ticket in expected
+        ]
+
+    def test_verify_detects_a_changed_snapshot(self, test_client):
+        closed = self._closed_draw(test_client, RAFFLE_CATEGORY, 5)
+        with open(draw_snapshots.snapshot_path(closed["_id"]), "r+b") as f:
+            f.seek(-1, 2)
+            last = f.read(1)
+            f.seek(-1, 2)
+            f.write(bytes([last[0] ^ 1]))
+        response = test_client.get(f"/api/draws/{closed['_id']}/verify")
+        assert response.status_code == 409
+
+    def test_verify_names_the_host_holding_the_snapshot(self, test_client):
+        closed = self._closed_draw(test_client, RAFFLE_CATEGORY, 5)
+        assert closed["ticket_snapshot_host"] == draw_snapshots.SNAPSHOT_HOST
+        assert closed["ticket_snapshot_path"] == os.path.abspath(draw_snapshots.snapshot_path(closed["_id"]))
+
+        get_db().draws.update_one({"_id": ObjectId(closed["_id"])}, {"$set": {"ticket_snapshot_host": "closer-2", "ticket_snapshot_path": "/elsewhere/x.snap"}})
+        response = test_client.get(f"/api/draws/{closed['_id']}/verify")
+        assert response.status_code == 409
+        assert "/elsewhere/x.snap on host closer-2" in response.json()["detail"]
+
+    def test_verify_detects_changed_winners(self, test_client):
+        closed = self._closed_draw(test_client, RAFFLE_CATEGORY, 5)
+        get_db().draws.update_one({"_id": ObjectId(closed["_id"])}, {"$set": {"winners_by_tier.0.ticket_id": "f" * 24}})
+        verification = test_client.get(f"/api/draws/{closed['_id']}/verify").json()
+        assert verification["verified"] is False
+        assert "f" * 24 in verification["mismatched_ticket_ids"]
+
+    @pytest.mark.parametrize("with_snapshot", [True, False])
+    def test_keyed_rank_raffle_awards_lowest_scores(self, test_client, monkeypatch, with_snapshot):
+        if not with_snapshot:
+            monkeypatch.setattr(draw_snapshots, "SNAPSHOT_DIR", "")
+        category = {**RAFFLE_CATEGORY, "name": "Snapshot Keyed Raffle", "game_config": {"selection_mode": "keyed_rank"}}
+        closed = self._closed_draw(test_client, category, 20)
+        # Purchases reserved sequence numbers, so the draw splits into ticket_seq ranges when ranked
+        assert sorted(t["ticket_seq"] for t in get_db().tickets.find({"draw_id": closed["_id"]})) == list(range(60))
+
+        scores = sorted(
+            (raffle_ticket_score(closed["selection_seed"], str(t["_id"])), str(t["_id"]))
+            for t in get_db().tickets.find({"draw_id": closed["_id"]}, {"_id": 1})
+        )
+        assert [(w["tier_name"], w["ticket_id"], w["selection_score"]) for w in closed["winners_by_tier"]] == [
+            ("First", scores[0][1], scores[0][0].hex()), ("Second", scores[1][1], scores[1][0].hex()),
+        ]
+        if with_snapshot:
+            assert test_client.get(f"/api/draws/{closed['_id']}/verify").json()["verified"] is True
+
+    @pytest.mark.parametrize("with_snapshot", [True, False])
+    def test_keyed_rank_merges_ticket_ranges(self, test_client, monkeypatch, tmp_path, with_snapshot):
+        monkeypatch.setattr(draws_router, "RAFFLE_RANK_SHARDS", 3)
+        merged = []
+        original_merge = draws_router.merge_lowest_scoring
+
+        def recording_merge(shard_results, k):
+            merged.extend(shard_results)
+            return original_merge(merged, k)
+        monkeypatch.setattr(draws_router, "merge_lowest_scoring", recording_merge)
+        response = test_client.post("/api/lottery_categories/", json={**RAFFLE_CATEGORY, "name": "Sharded Keyed Raffle", "game_config": {"selection_mode": "keyed_rank"}})
+        category = get_category_by_id(response.json()["_id"])
+        docs = [{"_id": ObjectId(), "draw_id": "sharded", "wallet_address": f"rShard{i % 4}", "ticket_seq": i} for i in range(10)]
+        docs += [{"_id": ObjectId(), "draw_id": "sharded", "wallet_address": "rNoSeq"} for _ in range(3)] # From before ticket_seq
+        get_db().tickets.insert_many(docs)
+        snapshot = draw_snapshots.write_snapshot(str(tmp_path / "sharded.snap"), docs, with_picks=False) if with_snapshot else None
+
+        try:
+            winners = draws_router._select_raffle_winners("sharded", "S1" * 32, category, snapshot)
+        finally:
+            if snapshot is not None:
+                snapshot.close()
+        expected = lowest_scoring_tickets("S1" * 32, [(str(doc["_id"]), doc["wallet_address"]) for doc in docs], 2)
+        assert [(ticket["ticket_id"], ticket["wallet_address"]) for _, ticket in winners] == [(ticket_id, wallet) for _, ticket_id, wallet in expected]
+        # Three snapshot row ranges, or three ticket_seq ranges plus the tickets without one
+        assert len(merged) == (3 if with_snapshot else 4)
+
+    def test_unknown_selection_mode_is_rejected(self, test_client):
+        category = {**RAFFLE_CATEGORY, "name": "Typo Keyed Raffle", "game_config": {"selection_mode": "keyed-rank"}}
+        assert test_client.post("/api/lottery_categories/", json=category).status_code == 422
+        response = test_client.post("/api/lottery_categories/", json={**category, "game_config": {"selection_mode": "keyed_rank"}})
+        assert response.status_code == 201, response.text
+        update = test_client.put(f"/api/lottery_categories/{response.json()['_id']}", json={"game_config": {"selection_mode": "ranked"}})
+        assert update.status_code == 422
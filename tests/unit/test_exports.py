@@ -0,0 +1,154 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+from datetime import datetime
+
+import pytest
+
+import draws.router as draws_router
+from app import app
+from auth.dependencies import get_current_user_from_token
+from auth.models import TokenData, auth_config
+from database import get_db
+from draws import db as draws_db
+from exports import db as export_db
+from exports.streaming import ExportFormat, chunked, encode_export
+
+# test_client and close_draw_and_wait fixtures are from tests/conftest.py
+
+RAFFLE_CATEGORY = {
+    "name": "Export Raffle",
+    "draw_interval_type": "daily",
+    "draw_interval_value": 1,
+    "ticket_price": 1.0,
+    "is_active": True,
+    "game_type": "raffle",
+    "game_config": {},
+    "prize_tiers": [{"tier_name": "First", "matches_required": 1, "percentage_of_prize_pool": 50.0}],
+}
+
+ROWS = [
+    {"ticket_id": "t1", "timestamp": datetime(2026, 9, 1, 12, 30), "picks": [3, 14, 27], "ticket_seq": 0},
+    {"ticket_id": "t2", "timestamp": datetime(2026, 9, 2), "picks": None, "ticket_seq": None},
+]
+COLUMNS = ("ticket_id", "timestamp", "picks", "ticket_seq")
+
+class TestExportEncoding:
+
+    def test_ndjson(self):
+        body = b"".join(encode_export(ROWS, COLUMNS, ExportFormat.NDJSON))
+        assert [json.loads(line) for line in body.decode().splitlines()] == [
+            {"ticket_id": "t1", "timestamp": "2026-09-01T12:30:00", "picks": [3, 14, 27], "ticket_seq": 0},
+            {"ticket_id": "t2", "timestamp": "2026-09-02T00:00:00", "picks": None, "ticket_seq": None},
+        ]
+
+    def test_csv(self):
+        body = b"".join(encode_export(ROWS, COLUMNS, ExportFormat.CSV)).decode()
+        assert body == "ticket_id,timestamp,picks,ticket_seq\nt1,2026-09-01T12:30:00,3 14 27,0\nt2,2026-09-02T00:00:00,,\n"
+        assert b"".join(encode_export([], COLUMNS, ExportFormat.CSV)) == b"ticket_id,timestamp,picks,ticket_seq\n"
+        assert b"".join(encode_export([], COLUMNS, ExportFormat.NDJSON)) == b""
+
+    def test_gzip_matches_the_plain_body(self):
+        for export_format in ExportFormat:
+            plain = b"".join(encode_export(ROWS * 1000, COLUMNS, export_format))
+            compressed = b"".join(encode_export(ROWS * 1000, COLUMNS, export_format, gzip=True))
+            assert gzip.decompress(compressed) == plain
+            assert len(compressed) < len(plain)
+
+    def test_chunks_are_produced_lazily(self):
+        consumed = []
+        def rows():
+            for i in itertools.count():
+                consumed.append(i)
+                yield {"ticket_id": f"t{i}"}
+        lines = (json.dumps(row) + "\n" for row in rows())
+        first = next(chunked(lines, chunk_bytes=1024))
+        assert 1024 <= len(first) < 1100
+        assert len(consumed) < 100 # An endless export still starts streaming
+
+class TestExportEndpoints:
+
+    @pytest.fixture(autouse=True)
+    def fixed_ledger(self, monkeypatch):
+        monkeypatch.setattr(draws_router, "get_latest_ledger_hash_sync", lambda: "C3" * 32)
+
+    @pytest.fixture(autouse=True)
+    def as_admin(self, monkeypatch):
+        monkeypatch.setattr(auth_config, "ADMIN_WALLET_ADDRESSES", ["rAdmin"])
+        app.dependency_overrides[get_current_user_from_token] = lambda: TokenData(wallet_address="rAdmin")
+        yield
+        app.dependency_overrides.pop(get_current_user_from_token, None)
+
+    def test_admins_only(self, test_client):
+        app.dependency_overrides[get_current_user_from_token] = lambda: TokenData(wallet_address="rUser")
+        for export in ("tickets", "draws", "winners"):
+            assert test_client.get(f"/api/exports/{export}").status_code == 403
+        app.dependency_overrides.pop(get_current_user_from_token)
+        for export in ("tickets", "draws", "winners"):
+            assert test_client.get(f"/api/exports/{export}").status_code in (401, 403)
+
+    def _category_with_tickets(self, test_client, purchases):
+        response = test_client.post("/api/lottery_categories/", json=RAFFLE_CATEGORY)
+        assert response.status_code == 201, response.text
+        category_id = response.json()["_id"]
+        for wallet, num_tickets in purchases:
+            response = test_client.post("/api/tickets/buy", json={"wallet_address": wallet, "category_id": category_id, "num_tickets": num_tickets})
+            assert response.status_code == 200, response.text
+        return category_id, draws_db.get_open_draws_for_category(category_id)[0].id
+
+    def test_ticket_export(self, test_client):
+        _, draw_id = self._category_with_tickets(test_client, [("rExportA", 3), ("rExportB", 2)])
+
+        response = test_client.get("/api/exports/tickets", params={"draw_id": draw_id})
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert response.headers["content-disposition"] == f'attachment; filename="tickets-{draw_id}.ndjson"'
+        tickets = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(t["wallet_address"] for t in tickets) == ["rExportA"] * 3 + ["rExportB"] * 2
+        assert {t["draw_id"] for t in tickets} == {draw_id}
+
+        response = test_client.get("/api/exports/tickets", params={"wallet_address": "rExportB", "format": "csv"})
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 2 and rows[0]["wallet_address"] == "rExportB"
+
+        # Not closed, so neither count is known yet
+        [draw] = [json.loads(line) for line in test_client.get("/api/exports/draws").text.splitlines()]
+        assert (draw["draw_id"], draw["ticket_count"], draw["participant_count"]) == (draw_id, None, None)
+
+        assert test_client.get("/api/exports/tickets", params={"draw_id": "0123456789abcdef01234567"}).status_code == 404
+        assert test_client.get("/api/exports/tickets", params={"format": "xml"}).status_code == 422
+
+    def test_draw_tickets_come_in_ticket_seq_order(self, test_client):
+        # Stored out of order, as sequence numbers are reserved before concurrent purchases insert
+        get_db().tickets.insert_many([
+            {"draw_id": "seqdraw", "wallet_address": f"rSeq{seq}", "ticket_seq": seq, "selection_data": {"picks": [seq]}}
+            for seq in (3, 0, 4, 1, 2)
+        ])
+        assert [row["ticket_seq"] for row in export_db.iter_ticket_rows(draw_id="seqdraw")] == [0, 1, 2, 3, 4]
+        assert [row["ticket_seq"] for row in export_db.iter_ticket_rows(draw_id="seqdraw", wallet_address="rSeq3")] == [3]
+
+    def test_winner_and_draw_exports(self, test_client, close_draw_and_wait):
+        category_id, draw_id = self._category_with_tickets(test_client, [("rExportA", 2), ("rExportB", 2)])
+        closed = close_draw_and_wait(draw_id)
+
+        response = test_client.get("/api/exports/winners", params={"format": "csv", "gzip": True, "start": "2000-01-01T00:00:00"})
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"] == "application/gzip"
+        assert response.headers["content-disposition"] == 'attachment; filename="winners.csv.gz"'
+        winners = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode())))
+        assert [(w["draw_id"], w["tier_name"], w["wallet_address"]) for w in winners] == [
+            (draw_id, w["tier_name"], w["wallet_address"]) for w in closed["winners_by_tier"]
+        ]
+        assert float(winners[0]["prize_amount_calculated"]) == closed["winners_by_tier"][0]["prize_amount_calculated"]
+
+        # Nothing closed before 2000
+        response = test_client.get("/api/exports/winners", params={"end": "2000-01-01T00:00:00"})
+        assert response.status_code == 200 and response.content == b""
+
+        draws = [json.loads(line) for line in test_client.get("/api/exports/draws", params={"category_id": category_id}).text.splitlines()]
+        by_id = {d["draw_id"]: d for d in draws}
+        assert by_id[draw_id]["status"] == "completed"
+        assert (by_id[draw_id]["ticket_count"], by_id[draw_id]["participant_count"]) == (4, 2)
+        assert by_id[draw_id]["winner_count"] == len(closed["winners_by_tier"])
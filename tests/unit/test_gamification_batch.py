@@ -0,0 +1,105 @@
+import pytest
+from mongomock import MongoClient as MockMongoClient
+
+from gamification import db as gamification_db
+from gamification.leaderboard import loyalty_leaderboard
+from gamification.models import AchievementEventType
+from gamification.services import GamificationService
+
+DEFINITIONS = [
+    {"name": "Any Win", "min_amount": None, "tier_name": None, "points_reward": 5},
+    {"name": "Big Win", "min_amount": 100.0, "tier_name": None, "points_reward": 20},
+    {"name": "Jackpot Win", "min_amount": None, "tier_name": "Jackpot", "points_reward": 50},
+]
+
+def _insert_definitions(mock_db):
+    gamification_db.ensure_gamification_indexes()
+    mock_db.achievement_definitions.insert_many([
+        {
+            "name": d["name"],
+            "description": f"{d['name']} achievement.",
+            "criteria": [{
+                "event_type": AchievementEventType.DRAW_WIN.value,
+                "conditions": {"min_amount": d["min_amount"], "tier_name": d["tier_name"]},
+            }],
+            "points_reward": d["points_reward"],
+            "is_active": True,
+        }
+        for d in DEFINITIONS
+    ])
+    # Never earned by a draw win
+    mock_db.achievement_definitions.insert_one({
+        "name": "Buyer", "description": "Buy a ticket.", "points_reward": 1, "is_active": True,
+        "criteria": [{"event_type": AchievementEventType.TICKET_PURCHASE.value, "conditions": {"count": 1}}],
+    })
+
+def _win_events(num_winners):
+    events = []
+    for i in range(num_winners):
+        tier = "Jackpot" if i == 0 else "Match 3"
+        # "amount" is the key min_amount criteria read
+        events.append((f"rWin{i % 40:03d}", AchievementEventType.DRAW_WIN, {"amount": 150.0 if i % 7 == 0 else 2.0, "tier_name": tier, "draw_id": "d1"}))
+    return events
+
+def _grant_earlier(mock_db, wallet, name):
+    definition_id = str(mock_db.achievement_definitions.find_one({"name": name})["_id"])
+    mock_db.user_achievements.insert_one({"user_wallet_address": wallet, "achievement_definition_id": definition_id, "name": name, "description": ""})
+
+def _earned(mock_db):
+    return sorted((a["user_wallet_address"], a["name"]) for a in mock_db.user_achievements.find())
+
+def _points(mock_db):
+    return {l["user_wallet_address"]: l["current_points"] for l in mock_db.user_loyalty.find()}
+
+class TestProcessEventsBatch:
+
+    @pytest.fixture(autouse=True)
+    def mock_db(self, monkeypatch):
+        mock_db = MockMongoClient()["gamification_batch_test"]
+        monkeypatch.setattr(gamification_db, "get_db", lambda: mock_db)
+        loyalty_leaderboard.invalidate()
+        _insert_definitions(mock_db)
+        return mock_db
+
+    def test_grants_match_per_event_processing(self, mock_db, monkeypatch):
+        events = _win_events(200)
+        _grant_earlier(mock_db, "rWin001", "Any Win") # Granted again by neither path
+
+        granted = GamificationService().process_events_batch(events)
+        batch_earned, batch_points = _earned(mock_db), _points(mock_db)
+        assert len(granted) == len(batch_earned) - 1
+        assert len(set(batch_earned)) == len(batch_earned) # Each wallet earns each achievement once
+
+        per_event_db = MockMongoClient()["gamification_per_event_test"]
+        monkeypatch.setattr(gamification_db, "get_db", lambda: per_event_db)
+        _insert_definitions(per_event_db)
+        _grant_earlier(per_event_db, "rWin001", "Any Win")
+        for wallet, event_type, event_data in events:
+            GamificationService().process_event(wallet, event_type, event_data)
+
+        assert batch_earned == _earned(per_event_db)
+        assert batch_points == _points(per_event_db)
+        assert batch_points["rWin000"] == 5 + 20 + 50
+        assert batch_points["rWin001"] == 20 # Big Win only
+
+    def test_round_trips_do_not_grow_with_events(self, mongo_ops):
+        service = GamificationService()
+        with mongo_ops.track():
+            service.process_events_batch(_win_events(400))
+        assert mongo_ops.count("achievement_definitions") == 1
+        assert mongo_ops.count("user_achievements") == 2 # One $in find, one insert_many
+        assert mongo_ops.count("user_loyalty") == 1 # No leaderboard loaded to update
+
+        with mongo_ops.track():
+            assert service.process_events_batch(_win_events(400)) == []
+        assert mongo_ops.count("user_achievements") == 1
+
+    def test_failed_inserts_earn_no_points(self, mock_db, monkeypatch):
+        GamificationService().process_events_batch([("rRace", AchievementEventType.DRAW_WIN, {"amount": 2.0})])
+        assert _points(mock_db) == {"rRace": 5}
+
+        # A concurrent grant landed after the earned-achievements read
+        monkeypatch.setattr(gamification_db, "get_earned_achievement_keys", lambda wallets, definition_ids: set())
+        granted = GamificationService().process_events_batch([("rRace", AchievementEventType.DRAW_WIN, {"amount": 150.0})])
+        assert [a.name for a in granted] == ["Big Win"]
+        assert _points(mock_db) == {"rRace": 5 + 20}
@@ -0,0 +1,38 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+import auth.router as auth_router
+from auth.verification import SignatureVerifier
+from benchmarks import loadgen
+
+class TestLoadGenerator:
+
+    @pytest.fixture(autouse=True)
+    def thread_verifier(self, monkeypatch):
+        verifier = SignatureVerifier("thread", max_workers=2, max_pending=64)
+        monkeypatch.setattr(auth_router, "signature_verifier", verifier)
+        yield
+        verifier.shutdown()
+
+    def test_pick_n_payload_honours_game_config(self):
+        wallet = loadgen.VirtualWallet(random.Random(1))
+        category = {"id": "cat1", "game_type": "pick_n_digits",
+                    "game_config": {"num_picks": 4, "min_digit": 0, "max_digit": 9, "allow_duplicates": False}}
+        args = SimpleNamespace(max_tickets_per_buy=3)
+        payload = loadgen._buy_payload(wallet, category, random.Random(2), args)
+        assert len(set(payload["selection"])) == 4
+        assert all(0 <= d <= 9 for d in payload["selection"])
+        assert 1 <= payload["num_tickets"] <= 3
+
+    def test_in_process_run_reports_every_endpoint(self):
+        report = loadgen.main(["--concurrency", "2", "--duration", "0.5", "--actions-per-session", "4"])
+
+        stage = report["stages"][0]
+        assert stage["concurrency"] == 2
+        for name in loadgen.ENDPOINTS:
+            summary = stage["endpoints"][name]
+            assert summary["requests"] > 0, name
+            assert summary["errors"] == 0, (name, summary["statuses"])
+            assert summary["p50_ms"] <= summary["p99_ms"]
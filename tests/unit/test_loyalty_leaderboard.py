@@ -0,0 +1,125 @@
+import pytest
+from mongomock import MongoClient as MockMongoClient
+
+from app import app
+from auth.dependencies import get_current_user_from_token
+from auth.models import TokenData
+from gamification import db as gamification_db
+from gamification.leaderboard import LoyaltyLeaderboard, loyalty_leaderboard
+from gamification.models import AchievementDefinition, AchievementEventType
+from gamification.services import GamificationService
+
+class TestLoyaltyLeaderboardCache:
+
+    def _loaded(self, size, points_by_wallet):
+        leaderboard = LoyaltyLeaderboard(size=size, max_age_seconds=60)
+        leaderboard.load(points_by_wallet.items())
+        return leaderboard
+
+    def test_page_orders_and_ranks_ties(self):
+        leaderboard = self._loaded(10, {"rA": 5, "rB": 9, "rC": 5, "rD": 1})
+        assert leaderboard.page(0, 10) == [(1, "rB", 9), (2, "rA", 5), (2, "rC", 5), (4, "rD", 1)]
+        assert leaderboard.page(1, 2) == [(2, "rA", 5), (2, "rC", 5)]
+        assert leaderboard.page(10, 5) == []
+
+    def test_full_cache_admits_and_evicts(self):
+        leaderboard = self._loaded(3, {"rA": 10, "rB": 8, "rC": 6})
+        leaderboard.note_points("rD", 5) # Below the cutoff
+        assert [row[1] for row in leaderboard.page(0, 3)] == ["rA", "rB", "rC"]
+        leaderboard.note_points("rE", 7)
+        assert leaderboard.page(0, 3) == [(1, "rA", 10), (2, "rB", 8), (3, "rE", 7)]
+        assert leaderboard.admission_cutoff() == 7
+        leaderboard.note_points("rE", 12) # Cached user moves up
+        assert leaderboard.page(0, 1) == [(1, "rE", 12)]
+
+    def test_drop_to_the_bottom_of_a_full_cache_forces_reload(self):
+        leaderboard = self._loaded(3, {"rA": 10, "rB": 8, "rC": 6})
+        leaderboard.note_points("rA", 9) # Still above the rest
+        assert leaderboard.page(0, 1) == [(1, "rA", 9)]
+        leaderboard.note_points("rA", 2)
+        assert leaderboard.page(0, 3) is None
+
+        short = self._loaded(5, {"rA": 10, "rB": 8})
+        short.note_points("rA", 2) # Holds every user, so the position is known
+        assert short.page(0, 5) == [(1, "rB", 8), (2, "rA", 2)]
+
+    def test_unloaded_or_expired_cache_is_not_served(self):
+        leaderboard = LoyaltyLeaderboard(size=3, max_age_seconds=0)
+        leaderboard.note_points("rA", 1)
+        assert leaderboard.page(0, 3) is None
+        leaderboard.load([("rA", 1)])
+        assert leaderboard.page(0, 3) is None
+
+class TestLoyaltyLeaderboardQueries:
+
+    @pytest.fixture(autouse=True)
+    def mock_db(self, monkeypatch):
+        mock_db = MockMongoClient()["loyalty_leaderboard_test"]
+        monkeypatch.setattr(gamification_db, "get_db", lambda: mock_db)
+        monkeypatch.setattr(loyalty_leaderboard, "size", 5)
+        loyalty_leaderboard.invalidate()
+        gamification_db.ensure_gamification_indexes()
+        for i in range(12):
+            gamification_db.update_user_loyalty_points(f"rUser{i:02d}", 10 * (i + 1))
+        return mock_db
+
+    def test_pages_are_served_from_memory(self, mongo_ops):
+        with mongo_ops.track():
+            first = gamification_db.get_loyalty_leaderboard(0, 5)
+        assert [(e.rank, e.user_wallet_address, e.current_points) for e in first] == [
+            (1, "rUser11", 120), (2, "rUser10", 110), (3, "rUser09", 100), (4, "rUser08", 90), (5, "rUser07", 80),
+        ]
+        assert mongo_ops.count("user_loyalty") == 1
+
+        with mongo_ops.track():
+            assert gamification_db.get_loyalty_leaderboard(2, 2) == first[2:4]
+        assert mongo_ops.count() == 0
+
+    def test_points_changes_update_the_cache(self, mock_db, mongo_ops):
+        gamification_db.get_loyalty_leaderboard(0, 5)
+        gamification_db.update_user_loyalty_points("rUser00", 200)
+        definition = AchievementDefinition(
+            _id="0123456789abcdef01234567", name="Big Points", description="Test.", points_reward=85,
+            criteria=[{"event_type": AchievementEventType.DRAW_WIN.value, "conditions": {}}],
+        )
+        gamification_db.grant_achievements_bulk([("rUser01", definition), ("rUser02", definition)]) # 20+85, 30+85
+
+        with mongo_ops.track():
+            top = gamification_db.get_loyalty_leaderboard(0, 5)
+        assert mongo_ops.count() == 0
+        assert [(e.user_wallet_address, e.current_points) for e in top] == [
+            ("rUser00", 210), ("rUser11", 120), ("rUser02", 115), ("rUser10", 110), ("rUser01", 105),
+        ]
+        # Reloading from the database gives the same board
+        loyalty_leaderboard.invalidate()
+        assert gamification_db.get_loyalty_leaderboard(0, 5) == top
+
+    def test_rank_counts_users_ahead(self, mock_db):
+        gamification_db.update_user_loyalty_points("rTied", 90) # Ties rUser08
+        assert gamification_db.get_user_loyalty_rank("rUser11").rank == 1
+        assert gamification_db.get_user_loyalty_rank("rTied").rank == gamification_db.get_user_loyalty_rank("rUser08").rank == 4
+        assert gamification_db.get_user_loyalty_rank("rUser07").rank == 6
+        nobody = gamification_db.get_user_loyalty_rank("rNobody")
+        assert (nobody.current_points, nobody.rank) == (0, 14)
+
+class TestLeaderboardEndpoints:
+
+    def test_leaderboard_and_my_rank(self, test_client):
+        for wallet, points in (("rLeadA", 30), ("rLeadB", 50), ("rLeadC", 10)):
+            gamification_db.update_user_loyalty_points(wallet, points)
+
+        response = test_client.get("/api/gamification/leaderboard", params={"limit": 2})
+        assert response.status_code == 200, response.text
+        assert response.json() == [
+            {"rank": 1, "user_wallet_address": "rLeadB", "current_points": 50},
+            {"rank": 2, "user_wallet_address": "rLeadA", "current_points": 30},
+        ]
+        assert test_client.get("/api/gamification/leaderboard", params={"limit": 0}).status_code == 422
+
+        assert test_client.get("/api/gamification/leaderboard/my_rank").status_code in (401, 403)
+        app.dependency_overrides[get_current_user_from_token] = lambda: TokenData(wallet_address="rLeadC")
+        try:
+            response = test_client.get("/api/gamification/leaderboard/my_rank")
+        finally:
+            app.dependency_overrides.pop(get_current_user_from_token)
+        assert response.json() == {"user_wallet_address": "rLeadC", "current_points": 10, "rank": 3}
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock import MongoClient as MockMongoClient
+
+import database
+
+class TestRunMigration:
+
+    @pytest.fixture(autouse=True)
+    def mock_db(self, monkeypatch):
+        mock_db = MockMongoClient()["migrations_test"]
+        monkeypatch.setattr(database, "get_db", lambda: mock_db)
+        monkeypatch.setattr(database, "_completed_migrations", set())
+        return mock_db
+
+    def test_runs_once(self, monkeypatch):
+        runs = []
+        assert not database.migration_done("m1")
+        assert database.run_migration("m1", lambda: runs.append(1))
+        monkeypatch.setattr(database, "_completed_migrations", set()) # Another process
+        assert database.run_migration("m1", lambda: runs.append(2))
+        assert runs == [1] and database.migration_done("m1")
+
+    def test_running_elsewhere_is_skipped_until_stale(self, mock_db):
+        mock_db.schema_migrations.insert_one({"_id": "m2", "status": "running", "started_at": datetime.utcnow()})
+        runs = []
+        assert not database.run_migration("m2", lambda: runs.append(1))
+        assert runs == [] and not database.migration_done("m2")
+
+        mock_db.schema_migrations.update_one({"_id": "m2"}, {"$set": {"started_at": datetime.utcnow() - database.MIGRATION_CLAIM_TIMEOUT - timedelta(seconds=1)}})
+        assert database.run_migration("m2", lambda: runs.append(1))
+        assert runs == [1]
+
+    def test_failure_releases_the_claim(self, mock_db):
+        def broken():
+            raise RuntimeError("boom")
+        with pytest.raises(RuntimeError):
+            database.run_migration("m3", broken)
+        assert mock_db.schema_migrations.count_documents({}) == 0
+        assert database.run_migration("m3", lambda: None)
@@ -0,0 +1,86 @@
+import pytest
+from mongomock import MongoClient as MockMongoClient
+
+import draws.router as draws_router
+from database import get_db
+from draws import db as draws_db
+from tickets import db as tickets_db
+from tickets.selections import match_counter
+
+# test_client fixture is from tests/conftest.py
+
+class TestPickPostings:
+
+    @pytest.fixture(autouse=True)
+    def mock_db(self, monkeypatch):
+        mock_db = MockMongoClient()["pick_postings_test"]
+        monkeypatch.setattr(tickets_db, "get_db", lambda: mock_db)
+        return mock_db
+
+    def _index(self, mock_db, tickets):
+        mock_db.tickets.insert_many([{"draw_id": "draw1", "ticket_seq": seq, "selection_data": {"picks": picks}} for seq, picks in tickets])
+        assert tickets_db.index_ticket_picks("draw1", tickets)
+
+    def test_match_counts_across_chunks(self, mock_db):
+        # Seqs past 2^16 land in later chunks
+        self._index(mock_db, [(0, [1, 2, 3]), (5, [3, 4, 5])])
+        self._index(mock_db, [(70_000, [1, 3, 9]), (200_000, [7, 8, 9])])
+        assert tickets_db.get_pick_match_counts("draw1", [1, 3]) == {0: 2, 5: 1, 70_000: 2}
+
+    def test_unindexed_ticket_disables_index(self, mock_db):
+        self._index(mock_db, [(0, [1, 2, 3])])
+        mock_db.tickets.insert_one({"draw_id": "draw1", "selection_data": {"picks": [1, 2, 3]}})
+        assert tickets_db.get_pick_match_counts("draw1", [1]) is None
+
+PICK_N_CATEGORY = {
+    "name": "Postings Pick 4",
+    "draw_interval_type": "daily",
+    "draw_interval_value": 1,
+    "ticket_price": 1.0,
+    "is_active": True,
+    "game_type": "pick_n_digits",
+    "game_config": {"num_picks": 4, "min_digit": 0, "max_digit": 9, "allow_duplicates": False},
+    "prize_tiers": [
+        {"tier_name": "Match 4", "matches_required": 4, "percentage_of_prize_pool": 50.0},
+        {"tier_name": "Match 3", "matches_required": 3, "percentage_of_prize_pool": 20.0},
+    ],
+}
+
+class TestClosePickNWithPostings:
+
+    @pytest.fixture(autouse=True)
+    def fixed_ledger_hash(self, monkeypatch):
+        monkeypatch.setattr(draws_router, "get_latest_ledger_hash_sync", lambda: "B2" * 32)
+
+    @pytest.mark.parametrize("drop_index", [False, True])
+    def test_winners_match_a_full_scan(self, test_client, close_draw_and_wait, monkeypatch, drop_index):
+        index_results = []
+        original = tickets_db.get_pick_match_counts
+        monkeypatch.setattr(tickets_db, "get_pick_match_counts", lambda *args: index_results.append(original(*args)) or index_results[-1])
+        response = test_client.post("/api/lottery_categories/", json=PICK_N_CATEGORY)
+        assert response.status_code == 201, response.text
+        category_id = response.json()["_id"]
+        for wallet in ("rPostA", "rPostB", "rPostC"):
+            response = test_client.post("/api/tickets/buy", json={
+                "wallet_address": wallet, "category_id": category_id, "num_tickets": 150, "quick_pick": True,
+            })
+            assert response.status_code == 200, response.text
+        draw_id = draws_db.get_open_draws_for_category(category_id)[0].id
+        seqs = sorted(t["ticket_seq"] for t in get_db().tickets.find({"draw_id": draw_id}))
+        assert seqs == list(range(450))
+        if drop_index:
+            tickets_db.drop_pick_postings(draw_id) # Close has to fall back to scanning the tickets
+
+        closed = close_draw_and_wait(draw_id)
+
+        count_matches = match_counter(closed["winning_selection"]["picks"])
+        expected = {}
+        for ticket in get_db().tickets.find({"draw_id": draw_id}):
+            matches = count_matches(ticket["selection_data"])
+            if matches >= 3:
+                expected[str(ticket["_id"])] = "Match 4" if matches == 4 else "Match 3"
+        assert expected # 450 quick-picks hit Match 3 with overwhelming probability
+        assert {w["ticket_id"]: w["tier_name"] for w in closed["winners_by_tier"]} == expected
+        assert (index_results[0] is None) == drop_index # The snapshot written at close is not used for matching
+        assert closed["ticket_snapshot_count"] == 450
+        assert get_db().draw_pick_postings.count_documents({"draw_id": draw_id}) == 0
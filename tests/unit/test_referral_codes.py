@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+from mongomock import MongoClient as MockMongoClient
+
+from referrals import db as referrals_db
+
+class TestCreateReferralCode:
+
+    @pytest.fixture(autouse=True)
+    def mock_db(self, monkeypatch):
+        mock_db = MockMongoClient()["referral_codes_test"]
+        monkeypatch.setattr(referrals_db, "get_db", lambda: mock_db)
+        referrals_db.ensure_referral_indexes()
+        return mock_db
+
+    def _codes(self, monkeypatch, codes):
+        sequence = iter(codes)
+        monkeypatch.setattr(referrals_db, "generate_unique_referral_code_str", lambda: next(sequence))
+
+    def test_code_collision_is_retried(self, monkeypatch, mock_db):
+        self._codes(monkeypatch, ["AAAA1111", "AAAA1111", "BBBB2222"])
+        assert referrals_db.create_referral_code("rFirst").code == "AAAA1111"
+        second = referrals_db.create_referral_code("rSecond")
+        assert second.code == "BBBB2222" and second.wallet_address == "rSecond"
+        assert mock_db.referral_codes.count_documents({}) == 2
+
+    def test_existing_wallet_returns_its_code(self, monkeypatch):
+        self._codes(monkeypatch, ["AAAA1111", "CCCC3333"])
+        first = referrals_db.create_referral_code("rWallet")
+        again = referrals_db.create_referral_code("rWallet")
+        assert again.id == first.id and again.code == "AAAA1111"
+
+    def test_gives_up_after_max_attempts(self, monkeypatch):
+        self._codes(monkeypatch, ["AAAA1111"] * (referrals_db.MAX_CODE_ALLOCATION_ATTEMPTS + 1))
+        referrals_db.create_referral_code("rFirst")
+        assert referrals_db.create_referral_code("rSecond") is None
+
+    def test_legacy_duplicates_are_resolved_before_the_unique_indexes(self, monkeypatch):
+        legacy_db = MockMongoClient()["referral_codes_legacy_test"]
+        monkeypatch.setattr(referrals_db, "get_db", lambda: legacy_db)
+        monkeypatch.setattr(referrals_db, "_code_indexes_ready", False)
+        legacy_db.referral_codes.insert_many([
+            {"code": "AAAA1111", "wallet_address": "rDup", "usage_count": 2, "created_at": datetime(2026, 1, 2)},
+            {"code": "BBBB2222", "wallet_address": "rDup", "usage_count": 3, "created_at": datetime(2026, 1, 1)},
+            {"code": "BBBB2222", "wallet_address": "rShared", "usage_count": 1, "created_at": datetime(2026, 1, 3)},
+        ])
+        self._codes(monkeypatch, ["BBBB2222", "CCCC3333"])
+
+        referrals_db.ensure_referral_indexes()
+        assert referrals_db._code_indexes_present()
+        kept = referrals_db.get_referral_code_by_wallet("rDup")
+        assert kept.code == "BBBB2222" and kept.usage_count == 5 # Earliest code, with the extra code's uses
+        assert referrals_db.get_referral_code_by_wallet("rShared").code == "CCCC3333" # Recoded, skipping the taken one
+        assert legacy_db.referral_codes.count_documents({}) == 2
+
+    def test_codes_are_probed_without_the_unique_indexes(self, monkeypatch):
+        unindexed_db = MockMongoClient()["referral_codes_unindexed_test"]
+        monkeypatch.setattr(referrals_db, "get_db", lambda: unindexed_db)
+        monkeypatch.setattr(referrals_db, "_code_indexes_ready", False)
+        self._codes(monkeypatch, ["AAAA1111", "AAAA1111", "BBBB2222"])
+
+        first = referrals_db.create_referral_code("rFirst")
+        assert referrals_db.create_referral_code("rFirst").id == first.id
+        assert referrals_db.create_referral_code("rSecond").code == "BBBB2222"
+        assert unindexed_db.referral_codes.count_documents({}) == 2
@@ -0,0 +1,90 @@
+import pytest
+from mongomock import MongoClient as MockMongoClient
+
+import database
+from referrals import db as referrals_db
+
+class TestReferrerStats:
+
+    @pytest.fixture(autouse=True)
+    def mock_db(self, monkeypatch):
+        mock_db = MockMongoClient()["referral_stats_test"]
+        monkeypatch.setattr(referrals_db, "get_db", lambda: mock_db)
+        monkeypatch.setattr(database, "get_db", lambda: mock_db) # Migration markers
+        monkeypatch.setattr(database, "_completed_migrations", set())
+        referrals_db.ensure_referral_indexes()
+        assert referrals_db.migrate_referrer_stats()
+        return mock_db
+
+    def _refer(self, referrer, count):
+        return [referrals_db.create_referral_link(referrer, f"{referrer}-ref{i}", "CODE1234") for i in range(count)]
+
+    def test_counters_follow_link_lifecycle(self):
+        links = self._refer("rReferrer", 120) # More than the old 50-link page
+        for link in links[:70]:
+            assert referrals_db.update_referral_link_status(link.id, "eligible_for_reward")
+        for link in links[:10]:
+            assert referrals_db.update_referral_link_status(link.id, "reward_credited")
+
+        counts = referrals_db.get_referrer_status_counts("rReferrer")
+        assert counts == {"pending_first_purchase": 50, "eligible_for_reward": 60, "reward_credited": 10}
+        assert counts == referrals_db.count_referral_links_by_status("rReferrer")
+
+    def test_same_status_update_is_not_counted(self):
+        link = self._refer("rReferrer", 1)[0]
+        assert referrals_db.update_referral_link_status(link.id, "eligible_for_reward")
+        assert not referrals_db.update_referral_link_status(link.id, "eligible_for_reward")
+        assert referrals_db.get_referrer_status_counts("rReferrer") == {"eligible_for_reward": 1}
+
+    def test_missing_counters_fall_back_and_rebuild(self, mock_db):
+        self._refer("rLegacy", 3)
+        mock_db.referrer_stats.delete_many({})
+        assert referrals_db.get_referrer_status_counts("rLegacy") == {"pending_first_purchase": 3}
+
+        assert referrals_db.rebuild_referrer_stats() == 1
+        assert mock_db.referrer_stats.find_one({"_id": "rLegacy"})["total"] == 3
+
+    def test_migration_counts_legacy_links(self, mock_db, monkeypatch):
+        monkeypatch.setattr(database, "_completed_migrations", set())
+        mock_db.schema_migrations.delete_many({})
+        # Links written before the counters existed
+        mock_db.referral_links.insert_many([
+            {"referrer_wallet_address": "rOld", "referee_wallet_address": f"rOld-legacy{i}", "reward_status": "pending_first_purchase"}
+            for i in range(4)
+        ])
+        legacy_id = str(mock_db.referral_links.find_one()["_id"])
+        # After deploy, but before the migration: a new link and a legacy status change
+        self._refer("rOld", 1)
+        assert referrals_db.update_referral_link_status(legacy_id, "eligible_for_reward")
+        expected = {"pending_first_purchase": 4, "eligible_for_reward": 1}
+        assert mock_db.referrer_stats.find_one({"_id": "rOld"})["status_counts"]["pending_first_purchase"] == 0 # Partial
+        assert referrals_db.get_referrer_status_counts("rOld") == expected # Not trusted yet
+
+        assert referrals_db.migrate_referrer_stats()
+        assert referrals_db.get_referrer_status_counts("rOld") == expected
+        assert mock_db.referrer_stats.find_one({"_id": "rOld"})["total"] == 5
+        link = referrals_db.create_referral_link("rOld", "rOld-late", "CODE1234")
+        assert referrals_db.update_referral_link_status(link.id, "reward_credited")
+        assert referrals_db.get_referrer_status_counts("rOld") == {**expected, "reward_credited": 1}
+
+    def test_negative_counters_are_rebuilt(self, mock_db):
+        self._refer("rDrift", 2)
+        mock_db.referrer_stats.update_one({"_id": "rDrift"}, {"$set": {"status_counts.eligible_for_reward": -1}})
+        assert referrals_db.get_referrer_status_counts("rDrift") == {"pending_first_purchase": 2}
+        assert mock_db.referrer_stats.find_one({"_id": "rDrift"})["status_counts"] == {"pending_first_purchase": 2}
+
+    def test_seed_retries_when_a_counter_write_races_it(self, mock_db, monkeypatch):
+        self._refer("rBusy", 2)
+        original = referrals_db._count_links_by_status
+        calls = []
+        def count_with_racing_link(referrer_wallet):
+            counts = original(referrer_wallet)
+            if not calls: # A new link is written and counted after the seed counted the links
+                referrals_db.create_referral_link("rBusy", "rBusy-late", "CODE1234")
+            calls.append(counts)
+            return counts
+        monkeypatch.setattr(referrals_db, "_count_links_by_status", count_with_racing_link)
+
+        referrals_db._seed_referrer_stats("rBusy")
+        assert len(calls) == 2
+        assert mock_db.referrer_stats.find_one({"_id": "rBusy"})["status_counts"] == {"pending_first_purchase": 3}
@@ -0,0 +1,103 @@
+import time
+from types import SimpleNamespace
+from typing import List
+
+import fastapi.routing
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, field_validator
+
+from app import app as lottery_app
+from auth.dependencies import get_current_user_from_token
+from auth.models import TokenData, auth_config
+from metrics import instrumentation
+from metrics.instrumentation import MetricsRegistry, MongoCommandTimer, RequestMetricsMiddleware, TimedRoute, track_xrpl_call
+
+class SlowItem(BaseModel):
+    value: int
+
+    @field_validator("value")
+    @classmethod
+    def slow(cls, value):
+        time.sleep(0.002) # Response model validation is part of serialization
+        return value
+
+def _command(timer, name, collection, request_id, micros):
+    started = SimpleNamespace(command_name=name, command={name: collection}, connection_id=("localhost", 27017), request_id=request_id)
+    timer.started(started)
+    timer.succeeded(SimpleNamespace(connection_id=started.connection_id, request_id=request_id, duration_micros=micros))
+
+class TestRequestMetrics:
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        registry = MetricsRegistry()
+        monkeypatch.setattr(instrumentation, "metrics_registry", registry)
+        timer = MongoCommandTimer()
+        app = FastAPI()
+        app.add_middleware(RequestMetricsMiddleware)
+        router = APIRouter(route_class=TimedRoute)
+
+        @router.get("/items/{item_id}")
+        def read_item(item_id: int): # Sync endpoint: runs in Starlette's threadpool
+            for i in range(item_id):
+                _command(timer, "find", "tickets", i, 2000)
+            _command(timer, "insert", "draws", 99, 1000)
+            with track_xrpl_call():
+                pass
+            return {"item_id": item_id}
+
+        @router.get("/slow", response_model=List[SlowItem])
+        async def read_slow():
+            time.sleep(0.05) # Endpoint time, not serialization
+            return [{"value": i} for i in range(5)]
+
+        app.include_router(router)
+        # Commands outside a request are ignored
+        _command(timer, "find", "tickets", 1000, 5000)
+        return TestClient(app), registry
+
+    def test_server_timing_and_aggregates(self, client):
+        test_client, registry = client
+        response = test_client.get("/items/3")
+        assert response.status_code == 200
+        server_timing = response.headers["server-timing"]
+        assert 'mongo;dur=7.00;desc="4 cmds"' in server_timing
+        assert "xrpl;dur=" in server_timing and "serialize;dur=" in server_timing and "app;dur=" in server_timing
+
+        test_client.get("/items/1")
+        route = registry.snapshot()["GET /items/{item_id}"]
+        assert route["requests"] == 2
+        assert route["mongo_by_collection"] == {
+            "draws": {"commands": 2, "total_ms": 2.0},
+            "tickets": {"commands": 4, "total_ms": 8.0},
+        }
+        assert route["mongo_commands_per_request"]["max"] == 4
+        assert sum(route["xrpl_ms"]["buckets"].values()) == 2
+
+    def test_unmatched_route(self, client):
+        test_client, registry = client
+        assert test_client.get("/nope").status_code == 404
+        assert registry.snapshot()["unmatched"]["requests"] == 1
+
+    def test_serialization_is_timed_by_the_route(self, client):
+        test_client, registry = client
+        assert test_client.get("/slow").status_code == 200
+        route = registry.snapshot()["GET /slow"]
+        assert 10 <= route["serialize_ms"]["sum"] < 50 # Five slow validations, but not the endpoint's sleep
+        assert not hasattr(fastapi.routing.serialize_response, "__wrapped__") # FastAPI itself is untouched
+
+class TestMetricsEndpoint:
+
+    def test_admins_only(self, test_client, monkeypatch):
+        assert test_client.get("/api/_metrics").status_code in (401, 403)
+        monkeypatch.setattr(auth_config, "ADMIN_WALLET_ADDRESSES", ["rAdmin"])
+        for wallet, status_code in (("rUser", 403), ("rAdmin", 200)):
+            lottery_app.dependency_overrides[get_current_user_from_token] = lambda wallet=wallet: TokenData(wallet_address=wallet)
+            try:
+                response = test_client.get("/api/_metrics")
+            finally:
+                lottery_app.dependency_overrides.pop(get_current_user_from_token)
+            assert response.status_code == status_code
+        assert "routes" in response.json()
@@ -1,5 +1,5 @@
 import pytest
-from rng.utils import generate_winning_picks, calculate_winner_index
+from rng.utils import generate_winning_picks, calculate_winner_index, raffle_ticket_score, lowest_scoring_tickets, merge_lowest_scoring
 
 class TestRNGUtils:
 
@@ -98,6 +98,21 @@ class TestRNGUtils:
         assert sorted(picks) == [1, 2, 3] # Must be these three numbers in some order
         assert len(set(picks)) == 3
 
+    # Tests for keyed-rank raffle selection
+    def test_lowest_scoring_tickets_matches_a_full_sort(self):
+        seed = "A1" * 32
+        tickets = [(f"{i:024x}", f"wallet_{i % 7}") for i in range(500)]
+        expected = sorted((raffle_ticket_score(seed, ticket_id), ticket_id, wallet) for ticket_id, wallet in tickets)[:5]
+        assert lowest_scoring_tickets(seed, iter(tickets), 5) == expected
+        assert lowest_scoring_tickets(seed, tickets, 0) == []
+        assert len(lowest_scoring_tickets(seed, tickets[:3], 5)) == 3
+
+    def test_merged_shards_equal_a_single_pass(self):
+        seed = "B2" * 32
+        tickets = [(f"{i:024x}", {"wallet": f"w{i}"}) for i in range(300)] # Payloads need not be comparable
+        shards = [lowest_scoring_tickets(seed, tickets[start:start + 70], 4) for start in range(0, 300, 70)]
+        assert merge_lowest_scoring(shards, 4) == lowest_scoring_tickets(seed, tickets, 4)
+
     # Example of a test that might fail if the HMAC generation is not robust enough
     # for very tight non-duplicate constraints, though the current implementation has fallbacks.
     # This test is more about stressing the non-duplicate finding logic.
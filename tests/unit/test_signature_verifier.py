@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+import pytest
+
+from app import app
+from auth import verification as verification_module
+from auth.dependencies import get_current_user_from_token
+from auth.models import TokenData, auth_config
+from auth.verification import SignatureVerifier, VerifierSaturatedError
+
+class TestSignatureVerifier:
+
+    @pytest.fixture(autouse=True)
+    def fake_checks(self, monkeypatch):
+        # Key "good" belongs to every address; signature "sig-ok" is the only valid one.
+        monkeypatch.setattr(verification_module.auth_utils, "check_public_key_matches_address", lambda pk, addr: pk == "good")
+        monkeypatch.setattr(verification_module.auth_utils, "verify_xrpl_signature", lambda public_key_hex, message, signature_hex: signature_hex == "sig-ok")
+
+    def test_verify_runs_both_checks(self):
+        verifier = SignatureVerifier("thread", max_workers=2, max_pending=8)
+        try:
+            assert asyncio.run(verifier.verify("good", "rA", "msg", "sig-ok")) == (True, True)
+            assert asyncio.run(verifier.verify("good", "rA", "msg", "bad")) == (True, False)
+            assert asyncio.run(verifier.verify("other", "rA", "msg", "sig-ok")) == (False, False)
+            assert verifier.metrics()["completed"] == 3
+            assert verifier.metrics()["pending"] == 0
+            assert verifier.metrics()["avg_latency_ms"] > 0
+        finally:
+            verifier.shutdown()
+
+    def test_verify_batch_preserves_order(self):
+        verifier = SignatureVerifier("thread", max_workers=3, max_pending=64)
+        items = [("good", f"r{i}", "msg", "sig-ok" if i % 2 == 0 else "bad") for i in range(10)]
+        try:
+            results = asyncio.run(verifier.verify_batch(items))
+            assert results == [(True, i % 2 == 0) for i in range(10)]
+            assert verifier.metrics()["completed"] == 10
+            assert verifier.metrics()["pending"] == 0
+            assert asyncio.run(verifier.verify_batch([])) == []
+        finally:
+            verifier.shutdown()
+
+    def test_verify_batch_records_per_item_latency(self, monkeypatch):
+        def slow_check(public_key_hex, message, signature_hex):
+            time.sleep(0.02)
+            return True
+        monkeypatch.setattr(verification_module.auth_utils, "verify_xrpl_signature", slow_check)
+        verifier = SignatureVerifier("thread", max_workers=1, max_pending=8)
+        try:
+            started = time.perf_counter()
+            asyncio.run(verifier.verify_batch([("good", f"r{i}", "msg", "sig-ok") for i in range(4)]))
+            batch_ms = (time.perf_counter() - started) * 1000
+            # One worker verifies the items one after another: done after ~20, 40, 60 and 80 ms
+            avg_ms = verifier.metrics()["avg_latency_ms"]
+            assert 40 <= avg_ms < batch_ms
+            assert verifier.metrics()["completed"] == 4
+        finally:
+            verifier.shutdown()
+
+    def test_saturated_queue_rejects(self, monkeypatch):
+        release = threading.Event()
+        def blocking_check(pk, addr):
+            release.wait(5)
+            return True
+        monkeypatch.setattr(verification_module.auth_utils, "check_public_key_matches_address", blocking_check)
+        verifier = SignatureVerifier("thread", max_workers=1, max_pending=1)
+
+        async def scenario():
+            first = asyncio.ensure_future(verifier.verify("good", "rA", "msg", "sig-ok"))
+            await asyncio.sleep(0.05)
+            with pytest.raises(VerifierSaturatedError):
+                await verifier.verify("good", "rB", "msg", "sig-ok")
+            release.set()
+            return await first
+
+        try:
+            assert asyncio.run(scenario()) == (True, True)
+            metrics = verifier.metrics()
+            assert metrics["rejected"] == 1
+            assert metrics["pending_high_water"] == 1
+        finally:
+            verifier.shutdown()
+
+    def test_unknown_executor_kind(self):
+        with pytest.raises(ValueError):
+            SignatureVerifier("gpu", max_workers=1, max_pending=1)
+
+class TestVerificationMetricsEndpoint:
+
+    def test_admins_only(self, test_client, monkeypatch):
+        monkeypatch.setattr(auth_config, "ADMIN_WALLET_ADDRESSES", ["rAdmin"])
+        assert test_client.get("/api/auth/verification/metrics").status_code in (401, 403)
+        try:
+            app.dependency_overrides[get_current_user_from_token] = lambda: TokenData(wallet_address="rUser")
+            assert test_client.get("/api/auth/verification/metrics").status_code == 403
+            app.dependency_overrides[get_current_user_from_token] = lambda: TokenData(wallet_address="rAdmin")
+            response = test_client.get("/api/auth/verification/metrics")
+            assert response.status_code == 200, response.text
+            assert "avg_latency_ms" in response.json()
+        finally:
+            app.dependency_overrides.pop(get_current_user_from_token, None)
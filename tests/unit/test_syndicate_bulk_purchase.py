@@ -0,0 +1,45 @@
+import time
+import pytest
+from mongomock import MongoClient as MockMongoClient
+from pymongo.errors import PyMongoError
+
+from syndicates import db as syndicate_db
+from tickets import db as tickets_db
+from tickets.models import TicketCreate, PickNSelectionData
+from tickets.selections import generate_quick_picks
+
+class TestRecordSyndicateBulkPurchase:
+
+    @pytest.fixture(autouse=True)
+    def mock_db(self, monkeypatch):
+        mock_db = MockMongoClient()["syndicate_bulk_purchase_test"]
+        monkeypatch.setattr(syndicate_db, "get_db", lambda: mock_db)
+        monkeypatch.setattr(tickets_db, "get_db", lambda: mock_db)
+        return mock_db
+
+    def _tickets(self, count):
+        picks = generate_quick_picks({"num_picks": 3, "min_digit": 0, "max_digit": 9}, count)
+        return [TicketCreate(wallet_address="rAdmin", draw_id="draw1", selection_data=PickNSelectionData(picks=p)) for p in picks]
+
+    def test_tickets_and_record_written(self, mock_db):
+        purchase = syndicate_db.record_syndicate_bulk_purchase("synd1", "draw1", "rAdmin", self._tickets(25))
+        assert purchase is not None and purchase.id
+        assert len(purchase.ticket_ids) == 25
+        assert mock_db.tickets.count_documents({"draw_id": "draw1"}) == 25
+        assert mock_db.syndicate_ticket_purchases.count_documents({}) == 1
+
+    def test_failed_record_removes_tickets(self, mock_db, monkeypatch):
+        class FailingPurchases:
+            def insert_one(self, *args, **kwargs):
+                raise PyMongoError("write failed")
+        monkeypatch.setattr(syndicate_db, "get_syndicate_ticket_purchases_collection", lambda: FailingPurchases())
+
+        assert syndicate_db.record_syndicate_bulk_purchase("synd1", "draw1", "rAdmin", self._tickets(10)) is None
+        assert mock_db.tickets.count_documents({}) == 0
+
+    def test_ten_thousand_lines(self, mock_db):
+        started = time.perf_counter()
+        purchase = syndicate_db.record_syndicate_bulk_purchase("synd1", "draw1", "rAdmin", self._tickets(10000))
+        assert len(purchase.ticket_ids) == 10000
+        # Generous bound: mongomock is far slower than a real server for inserts.
+        assert time.perf_counter() - started < 5
@@ -0,0 +1,132 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from mongomock import MongoClient as MockMongoClient
+from pymongo import ReturnDocument
+
+from syndicates import db as syndicate_db
+from syndicates.models import SyndicateMemberStatus
+
+# mongomock implements neither arrayFilters nor pipeline updates, so the member mutations run against a stub
+# syndicates collection that records each find_one_and_update and replays canned results.
+# Membership rows still go to mongomock.
+
+SYNDICATE_ID = "0123456789abcdef01234567"
+
+def _syndicate_doc(*members):
+    return {
+        "_id": ObjectId(SYNDICATE_ID), "name": "Alpha", "creator_wallet_address": "rCreator",
+        "members": [{"wallet_address": wallet, "status": status} for wallet, status in members],
+        "active_member_count": sum(1 for _, status in members if status == "active"),
+    }
+
+class RecordingCollection:
+
+    def __init__(self):
+        self.calls = []
+        self.results = []
+
+    def find_one_and_update(self, filter, update, array_filters=None, return_document=None):
+        self.calls.append({"filter": filter, "update": update, "array_filters": array_filters, "return_document": return_document})
+        return self.results.pop(0) if self.results else None
+
+class TestSyndicateMemberUpdates:
+
+    @pytest.fixture(autouse=True)
+    def collections(self, monkeypatch):
+        self.syndicates = RecordingCollection()
+        self.memberships = MockMongoClient()["syndicate_member_updates_test"].syndicate_memberships
+        monkeypatch.setattr(syndicate_db, "get_syndicates_collection", lambda: self.syndicates)
+        monkeypatch.setattr(syndicate_db, "get_syndicate_memberships_collection", lambda: self.memberships)
+
+    def _membership_status(self, wallet):
+        row = self.memberships.find_one({"syndicate_id": SYNDICATE_ID, "wallet_address": wallet})
+        return row["status"] if row else None
+
+    def test_invite_pushes_a_new_member_once(self):
+        self.syndicates.results = [_syndicate_doc(("rCreator", "active"), ("rNew", "invited"))]
+        syndicate = syndicate_db.invite_syndicate_member(SYNDICATE_ID, "rNew", nickname="new")
+
+        assert [m.wallet_address for m in syndicate.members] == ["rCreator", "rNew"]
+        [call] = self.syndicates.calls
+        assert call["filter"] == {"_id": ObjectId(SYNDICATE_ID), "members.wallet_address": {"$ne": "rNew"}}
+        pushed = call["update"]["$push"]["members"]
+        assert (pushed["wallet_address"], pushed["nickname"], pushed["status"]) == ("rNew", "new", SyndicateMemberStatus.INVITED)
+        assert isinstance(call["update"]["$set"]["updated_at"], datetime)
+        assert call["return_document"] == ReturnDocument.AFTER
+        assert self._membership_status("rNew") == "invited"
+
+    def test_reinvite_flips_a_former_member_back_to_invited(self):
+        # The $ne push finds the wallet already present, then the former-member update applies
+        self.syndicates.results = [None, _syndicate_doc(("rCreator", "active"), ("rBack", "invited"))]
+        assert syndicate_db.invite_syndicate_member(SYNDICATE_ID, "rBack", nickname="back")
+
+        push, flip = self.syndicates.calls
+        assert "$push" in push["update"]
+        assert flip["filter"] == {"_id": ObjectId(SYNDICATE_ID), "members": {"$elemMatch": {"wallet_address": "rBack", "status": {"$in": ["left", "removed"]}}}}
+        assert flip["update"]["$set"]["members.$[m].status"] == "invited"
+        assert flip["update"]["$set"]["members.$[m].nickname"] == "back"
+        assert flip["array_filters"] == [{"m.wallet_address": "rBack"}]
+        assert "$inc" not in flip["update"] # Invited members don't count as active
+        assert self._membership_status("rBack") == "invited"
+
+    def test_invite_of_an_active_or_invited_member_is_rejected(self):
+        assert syndicate_db.invite_syndicate_member(SYNDICATE_ID, "rCreator") is None
+        assert len(self.syndicates.calls) == 2
+        assert self._membership_status("rCreator") is None
+
+    def test_accept_activates_only_a_pending_invite(self):
+        self.syndicates.results = [_syndicate_doc(("rCreator", "active"), ("rNew", "active"))]
+        syndicate = syndicate_db.accept_syndicate_invite(SYNDICATE_ID, "rNew")
+        assert syndicate.active_member_count == 2
+
+        [call] = self.syndicates.calls
+        assert call["filter"] == {"_id": ObjectId(SYNDICATE_ID), "members": {"$elemMatch": {"wallet_address": "rNew", "status": "invited"}}}
+        assert call["update"]["$set"]["members.$[m].status"] == "active"
+        assert isinstance(call["update"]["$set"]["members.$[m].join_date"], datetime)
+        assert "members.$[m].nickname" not in call["update"]["$set"]
+        assert call["update"]["$inc"] == {"active_member_count": 1}
+        assert call["array_filters"] == [{"m.wallet_address": "rNew", "m.status": "invited"}]
+        assert self._membership_status("rNew") == "active"
+
+        # No pending invite: nothing changes
+        assert syndicate_db.accept_syndicate_invite(SYNDICATE_ID, "rStranger") is None
+        assert self._membership_status("rStranger") is None
+
+    def test_remove_is_one_update_that_decrements_only_for_an_active_member(self):
+        self.syndicates.results = [_syndicate_doc(("rCreator", "active"), ("rGone", "removed"))]
+        assert syndicate_db.remove_syndicate_member(SYNDICATE_ID, "rGone")
+
+        [call] = self.syndicates.calls
+        assert call["filter"] == {"_id": ObjectId(SYNDICATE_ID), "members": {"$elemMatch": {"wallet_address": "rGone", "status": {"$in": ["active", "invited"]}}}}
+        assert call["array_filters"] is None # A pipeline update, so the member is picked out by $map
+        [stage] = call["update"]
+        changes = stage["$set"]
+        is_member = {"$eq": ["$$m.wallet_address", "rGone"]}
+        assert changes["members"]["$map"]["in"]["$cond"] == [
+            {"$and": [is_member, {"$in": ["$$m.status", ["active", "invited"]]}]},
+            {"$mergeObjects": ["$$m", {"status": "removed"}]},
+            "$$m",
+        ]
+        # Decremented by the number of matched members that were active: one, or zero for an invite
+        was_active = {"$filter": {"input": "$members", "as": "m", "cond": {"$and": [is_member, {"$eq": ["$$m.status", "active"]}]}}}
+        assert changes["active_member_count"] == {"$subtract": ["$active_member_count", {"$size": was_active}]}
+        assert isinstance(changes["updated_at"], datetime)
+        assert call["return_document"] == ReturnDocument.AFTER
+        assert self._membership_status("rGone") == "removed"
+
+    def test_leave_and_remove_of_an_invite(self):
+        assert syndicate_db.remove_syndicate_member(SYNDICATE_ID, "rLeaver", new_status=SyndicateMemberStatus.LEFT, from_statuses=[SyndicateMemberStatus.ACTIVE]) is None
+        [leave] = self.syndicates.calls
+        assert leave["filter"]["members"] == {"$elemMatch": {"wallet_address": "rLeaver", "status": {"$in": ["active"]}}}
+        assert leave["update"][0]["$set"]["members"]["$map"]["in"]["$cond"][1] == {"$mergeObjects": ["$$m", {"status": "left"}]}
+        assert self._membership_status("rLeaver") is None
+
+        # Only invites can match, so the count is left alone
+        self.syndicates.calls.clear()
+        self.syndicates.results = [_syndicate_doc(("rCreator", "active"), ("rInv", "removed"))]
+        assert syndicate_db.remove_syndicate_member(SYNDICATE_ID, "rInv", from_statuses=[SyndicateMemberStatus.INVITED])
+        [invited] = self.syndicates.calls
+        assert "active_member_count" not in invited["update"][0]["$set"]
+        assert self._membership_status("rInv") == "removed"
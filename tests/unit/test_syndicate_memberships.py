@@ -0,0 +1,85 @@
+import pytest
+from mongomock import MongoClient as MockMongoClient
+
+import database
+from syndicates import db as syndicate_db
+from syndicates.models import SyndicateMemberStatus
+
+class TestSyndicateMemberships:
+
+    @pytest.fixture(autouse=True)
+    def mock_db(self, monkeypatch):
+        mock_db = MockMongoClient()["syndicate_memberships_test"]
+        monkeypatch.setattr(syndicate_db, "get_db", lambda: mock_db)
+        monkeypatch.setattr(database, "get_db", lambda: mock_db) # Migration markers
+        monkeypatch.setattr(database, "_completed_migrations", set())
+        monkeypatch.setattr(syndicate_db, "get_user_by_wallet_address", lambda wallet: None)
+        syndicate_db.ensure_syndicate_indexes()
+        assert syndicate_db.migrate_syndicate_memberships() # Nothing to backfill in an empty database
+        return mock_db
+
+    def _legacy_syndicate(self, mock_db, name, members):
+        # Written before the membership index: no rows, no active_member_count
+        return str(mock_db.syndicates.insert_one({
+            "name": name, "creator_wallet_address": members[0][0],
+            "members": [{"wallet_address": wallet, "status": status} for wallet, status in members],
+        }).inserted_id)
+
+    def test_create_and_invite_are_mirrored(self, mock_db):
+        syndicate = syndicate_db.create_syndicate("Alpha", None, "rCreator", None)
+        assert syndicate.active_member_count == 1
+        syndicate_db.invite_syndicate_member(syndicate.id, "rInvitee", nickname="inv")
+
+        rows = {row["wallet_address"]: row for row in mock_db.syndicate_memberships.find({"syndicate_id": syndicate.id})}
+        assert rows["rCreator"]["status"] == "active" and rows["rCreator"]["role"] == "admin"
+        assert rows["rInvitee"]["status"] == "invited" and rows["rInvitee"]["role"] == "member"
+
+    def test_get_syndicates_for_member_uses_membership_rows(self, mock_db):
+        first = syndicate_db.create_syndicate("Alpha", None, "rCreator", None)
+        second = syndicate_db.create_syndicate("Beta", None, "rOther", None)
+        syndicate_db.invite_syndicate_member(second.id, "rCreator")
+        syndicate_db.create_syndicate("Gamma", None, "rOther", None)
+
+        found = syndicate_db.get_syndicates_for_member("rCreator", include_members=False)
+        assert sorted(s.name for s in found) == ["Alpha", "Beta"]
+        assert all(s.members == [] for s in found)
+        assert {s.id: s.active_member_count for s in found} == {first.id: 1, second.id: 1}
+
+    def test_rebuild_restores_rows_and_counts(self, mock_db):
+        syndicate = syndicate_db.create_syndicate("Alpha", None, "rCreator", None)
+        # Legacy document: members added without membership rows or cached count
+        mock_db.syndicates.update_one({}, {"$push": {"members": {"wallet_address": "rLegacy", "status": SyndicateMemberStatus.ACTIVE.value}}, "$unset": {"active_member_count": ""}})
+        mock_db.syndicate_memberships.delete_many({})
+
+        assert syndicate_db.rebuild_syndicate_memberships() == 1
+        assert syndicate_db.get_syndicate_by_id(syndicate.id).active_member_count == 2
+        assert [s.id for s in syndicate_db.get_syndicates_for_member("rLegacy")] == [syndicate.id]
+
+    def test_legacy_syndicates_are_listed_until_migrated(self, mock_db, monkeypatch):
+        monkeypatch.setattr(database, "_completed_migrations", set())
+        mock_db.schema_migrations.delete_many({})
+        legacy = self._legacy_syndicate(mock_db, "Legacy", [("rOld", "active"), ("rMember", "active"), ("rGone", "left")])
+
+        found = syndicate_db.get_syndicates_for_member("rMember", include_members=False)
+        assert [(s.id, s.active_member_count, s.members) for s in found] == [(legacy, 2, [])]
+        assert syndicate_db.get_syndicates_for_member("rGone") == []
+
+        assert syndicate_db.migrate_syndicate_memberships()
+        assert mock_db.syndicate_memberships.count_documents({"syndicate_id": legacy}) == 3
+        assert syndicate_db.get_syndicate_by_id(legacy).active_member_count == 2
+        assert [s.id for s in syndicate_db.get_syndicates_for_member("rMember", include_members=False)] == [legacy]
+
+    def test_migration_keeps_rows_written_since_deploy(self, mock_db, monkeypatch):
+        monkeypatch.setattr(database, "_completed_migrations", set())
+        mock_db.schema_migrations.delete_many({})
+        legacy = self._legacy_syndicate(mock_db, "Legacy", [("rOld", "active"), ("rMember", "active")])
+        # A mutation after deploy changed the array and wrote its row before the migration ran
+        mock_db.syndicates.update_one({}, {"$set": {"members.1.status": "left"}, "$inc": {"active_member_count": -1}})
+        syndicate_db._upsert_membership(legacy, "rMember", SyndicateMemberStatus.LEFT)
+
+        assert syndicate_db.migrate_syndicate_memberships()
+        assert syndicate_db.get_syndicate_by_id(legacy).active_member_count == 1
+        assert mock_db.syndicate_memberships.find_one({"wallet_address": "rMember"})["status"] == "left"
+        assert [s.id for s in syndicate_db.get_syndicates_for_member("rOld")] == [legacy]
+        assert syndicate_db.get_syndicates_for_member("rMember") == []
+        assert mock_db.schema_migrations.find_one({"_id": syndicate_db.MEMBERSHIPS_MIGRATION})["status"] == "done"
@@ -0,0 +1,160 @@
+import time
+import pytest
+from fastapi import HTTPException
+
+from tickets.selections import validate_pick_n_selection, validate_pick_n_selections, generate_quick_picks, encode_pick_values, match_counter
+from database import get_db
+from tickets.models import MAX_TICKETS_PER_PURCHASE
+
+GAME_CONFIG = {"num_picks": 3, "min_digit": 0, "max_digit": 9, "allow_duplicates": False}
+
+class TestValidatePickNSelections:
+
+    def test_valid_lines(self):
+        result = validate_pick_n_selections([[1, 2, 3], [4, 5, 6]], GAME_CONFIG)
+        assert [s.picks for s in result] == [[1, 2, 3], [4, 5, 6]]
+
+    def test_error_names_the_line(self):
+        with pytest.raises(HTTPException) as exc_info:
+            validate_pick_n_selections([[1, 2, 3], [1, 1, 2]], GAME_CONFIG)
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.detail == "Line 2: Invalid selection: Duplicate picks are not allowed."
+
+class TestPickEncoding:
+
+    @pytest.mark.parametrize("config", [
+        {"num_picks": 4, "min_digit": 0, "max_digit": 9},
+        {"num_picks": 5, "min_digit": 60, "max_digit": 99},
+        {"num_picks": 3, "min_digit": 100, "max_digit": 999},
+        {"num_picks": 6, "min_digit": 0, "max_digit": 2, "allow_duplicates": True},
+    ])
+    def test_matches_agree_with_set_intersection(self, config):
+        winning = generate_quick_picks(config, 1)[0]
+        count_matches = match_counter(winning)
+        for line in generate_quick_picks(config, 200):
+            selection = validate_pick_n_selection(line, config).model_dump()
+            assert count_matches(selection) == len(set(line) & set(winning))
+
+    def test_encoding_form(self):
+        assert encode_pick_values([0, 3, 62]) == {"mask": (1 << 0) | (1 << 3) | (1 << 62)}
+        assert encode_pick_values([63])["packed"] == b"m" + (1 << 63).to_bytes(16, "little")
+        assert encode_pick_values([300, -1]) == {"packed": b"v" + (-1).to_bytes(4, "big", signed=True) + (300).to_bytes(4, "big", signed=True)}
+
+    def test_legacy_tickets_without_encoding(self):
+        assert match_counter([1, 2, 3])({"picks": [3, "2", 9]}) == 2
+
+class TestGenerateQuickPicks:
+
+    def test_unique_picks_in_range(self):
+        picks = generate_quick_picks(GAME_CONFIG, 500)
+        assert len(picks) == 500
+        for line in picks:
+            assert len(line) == 3 and len(set(line)) == 3
+            assert all(0 <= p <= 9 for p in line)
+        # Generated lines pass the same validation as user selections
+        validate_pick_n_selections(picks, GAME_CONFIG)
+
+    def test_duplicates_allowed(self):
+        config = {"num_picks": 6, "min_digit": 1, "max_digit": 2, "allow_duplicates": True}
+        picks = generate_quick_picks(config, 50)
+        assert all(len(line) == 6 and set(line) <= {1, 2} for line in picks)
+
+    def test_large_space_decoded_per_line(self):
+        # 49 choose-in-order 6 is too big for the lookup table
+        config = {"num_picks": 6, "min_digit": 1, "max_digit": 49, "allow_duplicates": False}
+        picks = generate_quick_picks(config, 200)
+        assert len(picks) == 200
+        validate_pick_n_selections(picks, config)
+        assert len({tuple(line) for line in picks}) > 190 # Independent lines, not one line repeated
+
+    def test_ten_thousand_lines(self):
+        started = time.perf_counter()
+        picks = generate_quick_picks({"num_picks": 4, "min_digit": 0, "max_digit": 9}, 10000)
+        assert len(picks) == 10000
+        assert time.perf_counter() - started < 1 # Generous bound; typically a few milliseconds
+
+    def test_impossible_config(self):
+        with pytest.raises(HTTPException):
+            generate_quick_picks({"num_picks": 5, "min_digit": 1, "max_digit": 3}, 1)
+
+# test_client and mongo_ops fixtures are from tests/conftest.py
+
+PICK_N_CATEGORY = {
+    "name": "Quick Pick 4",
+    "draw_interval_type": "daily",
+    "draw_interval_value": 1,
+    "ticket_price": 1.0,
+    "is_active": True,
+    "game_type": "pick_n_digits",
+    "game_config": {"num_picks": 4, "min_digit": 0, "max_digit": 9, "allow_duplicates": False},
+    "prize_tiers": [{"tier_name": "Match 4", "matches_required": 4, "percentage_of_prize_pool": 50.0}],
+}
+
+class TestBuyTicketsQuickPick:
+
+    def _create_category(self, client):
+        response = client.post("/api/lottery_categories/", json=PICK_N_CATEGORY)
+        assert response.status_code == 201, response.text
+        return response.json()["_id"]
+
+    def test_each_ticket_gets_its_own_selection(self, test_client):
+        category_id = self._create_category(test_client)
+        response = test_client.post("/api/tickets/buy", json={
+            "wallet_address": "rQuick", "category_id": category_id, "num_tickets": 300, "quick_pick": True,
+        })
+        assert response.status_code == 200, response.text
+        lines = [t["selection_data"]["picks"] for t in get_db().tickets.find({"wallet_address": "rQuick"})]
+        assert len(lines) == 300
+        validate_pick_n_selections(lines, PICK_N_CATEGORY["game_config"])
+        assert len({tuple(line) for line in lines}) > 1
+        assert all(t["selection_data"]["mask"] for t in get_db().tickets.find({"wallet_address": "rQuick"}))
+
+    @pytest.mark.parametrize("num_tickets", [0, MAX_TICKETS_PER_PURCHASE + 1])
+    def test_ticket_count_is_bounded(self, test_client, num_tickets):
+        category_id = self._create_category(test_client)
+        response = test_client.post("/api/tickets/buy", json={
+            "wallet_address": "rQuick", "category_id": category_id, "num_tickets": num_tickets, "quick_pick": True,
+        })
+        assert response.status_code == 422
+        assert get_db().tickets.count_documents({}) == 0
+
+    def test_selection_and_quick_pick_conflict(self, test_client):
+        category_id = self._create_category(test_client)
+        response = test_client.post("/api/tickets/buy", json={
+            "wallet_address": "rQuick", "category_id": category_id, "num_tickets": 2,
+            "quick_pick": True, "selection": [1, 2, 3, 4],
+        })
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Provide only one of selection, selections or quick_pick."
+        assert get_db().tickets.count_documents({}) == 0
+
+class TestBuyTicketsWithSelections:
+
+    def _create_category(self, client):
+        response = client.post("/api/lottery_categories/", json=PICK_N_CATEGORY)
+        assert response.status_code == 201, response.text
+        return response.json()["_id"]
+
+    def test_one_line_per_ticket_in_one_insert(self, test_client, mongo_ops):
+        category_id = self._create_category(test_client)
+        lines = [[0, 1, 2, 3], [4, 5, 6, 7], [9, 8, 7, 6]]
+        with mongo_ops.track():
+            response = test_client.post("/api/tickets/buy", json={
+                "wallet_address": "rLines", "category_id": category_id, "num_tickets": 3, "selections": lines,
+            })
+        assert response.status_code == 200, response.text
+        assert mongo_ops.count("tickets", {"insert_one", "insert_many"}) == 1
+        stored = {str(t["_id"]): t["selection_data"]["picks"] for t in get_db().tickets.find({"wallet_address": "rLines"})}
+        assert [stored[ticket_id] for ticket_id in response.json()["tickets"]] == lines
+
+    @pytest.mark.parametrize("payload, detail", [
+        ({"num_tickets": 2, "selections": [[0, 1, 2, 3]]}, "Expected 2 selections, got 1."),
+        ({"num_tickets": 2, "selections": [[0, 1, 2, 3], [5, 5, 6, 7]]}, "Line 2: Invalid selection: Duplicate picks are not allowed."),
+        ({"num_tickets": 1, "selections": [[0, 1, 2, 3]], "selection": [0, 1, 2, 3]}, "Provide only one of selection, selections or quick_pick."),
+    ])
+    def test_rejected_without_writing(self, test_client, payload, detail):
+        category_id = self._create_category(test_client)
+        response = test_client.post("/api/tickets/buy", json={"wallet_address": "rLines", "category_id": category_id, **payload})
+        assert response.status_code == 400
+        assert response.json()["detail"] == detail
+        assert get_db().tickets.count_documents({}) == 0
@@ -1,16 +1,49 @@
+import os
+import sys
+from array import array
+from collections import Counter, defaultdict
+from pymongo import UpdateMany, UpdateOne
 from pymongo.collection import Collection
 from pymongo.results import InsertOneResult, UpdateResult, DeleteResult
 from pymongo.errors import PyMongoError
-from bson import ObjectId
+from bson import ObjectId, Binary
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from datetime import datetime, timedelta
 
-from database import get_db
+from database import get_db, run_migration
 from .models import TicketCreate, TicketEntry # Assuming TicketEntry can represent a ticket from DB
 
+# Postings are split roaring-style: a chunk holds the low 16 bits of the seqs sharing seq >> 16.
+POSTINGS_CHUNK_BITS = 16
+SEQ_LOOKUP_BATCH_SIZE = 50_000 # Keeps each $in well under the 16MB command limit
+SEQ_RANGE_DENSITY = 8
+
 def get_tickets_collection() -> Collection:
     """Returns the 'tickets' collection from MongoDB."""
     db = get_db()
     return db.tickets
 
+def get_pick_postings_collection() -> Collection:
+    """
+    Returns the 'draw_pick_postings' collection, the number -> tickets index of Pick-N draws.
+    One document per (draw_id, value, chunk) holds 'blocks': packed little-endian uint16
+    arrays of the low bits of the ticket_seqs whose selection contains value, one block
+    appended per purchase. A (draw_id, value=None, chunk=None) document counts the tickets
+    indexed so far, so close can tell whether the index covers the whole draw.
+    """
+    db = get_db()
+    return db.draw_pick_postings
+
+def ensure_ticket_indexes() -> None:
+    """ Creates the indexes the ticket queries rely on. Safe to call on every startup. """
+    try:
+        get_tickets_collection().create_index([("draw_id", 1), ("ticket_seq", 1)])
+        # Per-wallet ticket scans, e.g. the achievement backfill's wallet-range partitions
+        get_tickets_collection().create_index([("wallet_address", 1), ("draw_id", 1)])
+        get_pick_postings_collection().create_index([("draw_id", 1), ("value", 1), ("chunk", 1)], unique=True)
+    except PyMongoError as e:
+        print(f"Error creating ticket indexes: {e}")
+
 def create_ticket(ticket_data: TicketCreate) -> str | None:
     """
     Creates a new ticket in the database.
@@ -29,6 +62,130 @@ def create_ticket(ticket_data: TicketCreate) -> str | None:
         print(f"Error creating ticket in MongoDB: {e}")
         return None
 
+def create_tickets_bulk(tickets: List[TicketCreate]) -> List[str] | None:
+    """
+    Creates many tickets with a single insert_many.
+    Args:
+        tickets: TicketCreate model instances.
+    Returns:
+        The IDs of the new tickets (in input order) as strings, or None if the insert failed.
+    """
+    if not tickets:
+        return []
+    try:
+        collection = get_tickets_collection()
+        result = collection.insert_many([ticket.model_dump() for ticket in tickets], ordered=True)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+    except PyMongoError as e:
+        print(f"Error bulk creating {len(tickets)} tickets in MongoDB: {e}")
+        return None
+
+def _uint16_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+def _uint16_array(block: bytes) -> array:
+    values = array('H')
+    values.frombytes(block)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def index_ticket_picks(draw_id: str, tickets: List[Tuple[int, List[Any]]]) -> bool:
+    """
+    Adds (ticket_seq, picks) pairs to the draw's postings with one ordered bulk_write:
+    one upsert per (value, chunk) touched, then the indexed-tickets counter. Being ordered,
+    the counter only moves if every posting was written.
+    """
+    if not tickets:
+        return True
+    low_mask = (1 << POSTINGS_CHUNK_BITS) - 1
+    postings: Dict[Tuple[int, int], array] = defaultdict(lambda: array('H'))
+    for seq, picks in tickets:
+        chunk, low = seq >> POSTINGS_CHUNK_BITS, seq & low_mask
+        for value in {int(pick) for pick in picks}:
+            postings[(value, chunk)].append(low)
+    operations = [
+        UpdateOne(
+            {"draw_id": draw_id, "value": value, "chunk": chunk},
+            {"$push": {"blocks": Binary(_uint16_bytes(lows))}},
+            upsert=True
+        )
+        for (value, chunk), lows in postings.items()
+    ]
+    operations.append(UpdateOne(
+        {"draw_id": draw_id, "value": None, "chunk": None},
+        {"$inc": {"indexed_tickets": len(tickets)}},
+        upsert=True
+    ))
+    try:
+        get_pick_postings_collection().bulk_write(operations, ordered=True)
+        return True
+    except PyMongoError as e:
+        print(f"Error indexing {len(tickets)} tickets for draw {draw_id}: {e}")
+        return False
+
+def get_pick_match_counts(draw_id: str, winning_values: Iterable[int]) -> Optional[Counter]:
+    """
+    Merges the postings of the winning values into {ticket_seq: number of winning values on
+    the ticket}, for tickets matching at least one. Tickets matching none are never read.
+    Returns None if the index doesn't cover every ticket of the draw (tickets bought before it
+    existed, or a failed index write), in which case the caller has to scan the tickets.
+    """
+    try:
+        postings = get_pick_postings_collection()
+        counter_doc = postings.find_one({"draw_id": draw_id, "value": None, "chunk": None})
+        indexed = counter_doc.get("indexed_tickets", 0) if counter_doc else 0
+        if indexed != get_tickets_collection().count_documents({"draw_id": draw_id}):
+            return None
+        match_counts: Counter = Counter()
+        for doc in postings.find({"draw_id": draw_id, "value": {"$in": sorted(set(winning_values))}}):
+            base = doc["chunk"] << POSTINGS_CHUNK_BITS
+            for block in doc.get("blocks", []):
+                lows = _uint16_array(bytes(block))
+                match_counts.update(lows if not base else (base + low for low in lows))
+        return match_counts
+    except PyMongoError as e:
+        print(f"Error reading pick postings for draw {draw_id}: {e}")
+        return None
+
+def drop_pick_postings(draw_id: str) -> bool:
+    """ Deletes a draw's postings (and its indexed-tickets counter) once the draw is closed. """
+    try:
+        get_pick_postings_collection().delete_many({"draw_id": draw_id})
+        return True
+    except PyMongoError as e:
+        print(f"Error deleting pick postings for draw {draw_id}: {e}")
+        return False
+
+def get_ticket_docs_by_seqs(draw_id: str, seqs: List[int]) -> List[Dict[str, Any]] | None:
+    """
+    Raw {_id, wallet_address, ticket_seq} documents of the given tickets of a draw, in seq order.
+    Sparse batches are an $in; a batch covering at least 1/SEQ_RANGE_DENSITY of its seq span is
+    read as one index range and filtered here, which beats a huge $in at that density.
+    """
+    docs: List[Dict[str, Any]] = []
+    try:
+        collection = get_tickets_collection()
+        ordered_seqs = sorted(seqs)
+        projection = {"wallet_address": 1, "ticket_seq": 1}
+        for start in range(0, len(ordered_seqs), SEQ_LOOKUP_BATCH_SIZE):
+            batch = ordered_seqs[start:start + SEQ_LOOKUP_BATCH_SIZE]
+            if batch[-1] - batch[0] + 1 <= SEQ_RANGE_DENSITY * len(batch):
+                wanted = set(batch)
+                docs.extend(
+                    doc for doc in collection.find({"draw_id": draw_id, "ticket_seq": {"$gte": batch[0], "$lte": batch[-1]}}, projection)
+                    if doc["ticket_seq"] in wanted
+                )
+            else:
+                docs.extend(collection.find({"draw_id": draw_id, "ticket_seq": {"$in": batch}}, projection))
+        docs.sort(key=lambda doc: doc["ticket_seq"])
+        return docs
+    except PyMongoError as e:
+        print(f"Error retrieving tickets by sequence for draw {draw_id}: {e}")
+        return None
+
 def get_tickets_by_wallet(wallet_address: str) -> list[TicketEntry]:
     """
     Retrieves all tickets for a given wallet address.
@@ -78,6 +235,56 @@ def get_ticket_by_id(ticket_id: str) -> TicketEntry | None:
         print(f"Error converting ticket ID or processing ticket data: {e}")
         return None
 
+# --- Purchase ids ---
+# Tickets bought together share a purchase_id. Tickets written before it existed were stamped
+# one utcnow() each, so migrate_ticket_purchase_ids() (run at startup) groups them into purchases:
+# a wallet's tickets in one draw belong to the same purchase while each follows the previous one
+# within LEGACY_PURCHASE_GAP. Syndicate tickets get the id of their purchase record from
+# syndicates.db.migrate_syndicate_tickets().
+
+PURCHASE_IDS_MIGRATION = "ticket_purchase_ids_v1"
+LEGACY_PURCHASE_GAP = timedelta(seconds=float(os.environ.get('LEGACY_PURCHASE_GAP_SECONDS', '2')))
+PURCHASE_IDS_BATCH_SIZE = 1000
+
+def _backfill_purchase_ids() -> None:
+    collection = get_tickets_collection()
+    legacy = collection.aggregate([
+        {"$match": {"purchase_id": None}},
+        {"$sort": {"wallet_address": 1, "draw_id": 1, "timestamp": 1}},
+        {"$project": {"wallet_address": 1, "draw_id": 1, "timestamp": 1}},
+    ], allowDiskUse=True)
+    updates: List[UpdateMany] = []
+    purchase_key: Optional[Tuple[Any, Any]] = None
+    purchase_ticket_ids: List[ObjectId] = []
+    last_timestamp: Optional[datetime] = None
+
+    def add_purchase() -> None:
+        if purchase_ticket_ids:
+            updates.append(UpdateMany({"_id": {"$in": purchase_ticket_ids}, "purchase_id": None}, {"$set": {"purchase_id": str(ObjectId())}}))
+        if len(updates) >= PURCHASE_IDS_BATCH_SIZE:
+            collection.bulk_write(updates, ordered=False)
+            updates.clear()
+
+    for ticket in legacy:
+        key = (ticket.get("wallet_address"), ticket.get("draw_id"))
+        timestamp = ticket.get("timestamp")
+        same_purchase = (
+            key == purchase_key and timestamp is not None and last_timestamp is not None
+            and timestamp - last_timestamp <= LEGACY_PURCHASE_GAP
+        )
+        if not same_purchase:
+            add_purchase()
+            purchase_key, purchase_ticket_ids = key, []
+        purchase_ticket_ids.append(ticket["_id"])
+        last_timestamp = timestamp
+    add_purchase()
+    if updates:
+        collection.bulk_write(updates, ordered=False)
+
+def migrate_ticket_purchase_ids() -> bool:
+    """ Startup step: groups tickets bought before purchase ids existed, once per database. Returns True once it is done. """
+    return run_migration(PURCHASE_IDS_MIGRATION, _backfill_purchase_ids)
+
 # The global ticket_db list and get_next_ticket_id are no longer needed.
 # ticket_db: List[TicketEntry] = []
 # ticket_counter = 1
@@ -1,17 +1,29 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_serializer
 from typing import List, Optional, Any
 from datetime import datetime
 
 # Model to store user's selection for Pick N type games
 class PickNSelectionData(BaseModel):
     picks: List[Any] # List of numbers or symbols picked by the user. Type can be int, str, etc.
-    # Add any other relevant selection info here if needed in the future.
+    # Canonical encoding of the set of pick values, used for match counting at close (see tickets/selections.py).
+    # Exactly one is set on tickets written since it was introduced; older tickets only have picks.
+    mask: Optional[int] = Field(None, description="Bit v set for each pick value v; used when every value is in 0..62 (fits a BSON int64).")
+    packed: Optional[bytes] = Field(None, description="Otherwise: b'm' + 16-byte little-endian mask (values 0..127), or b'v' + sorted distinct values as 4-byte big-endian ints.")
+
+    @field_serializer('packed', when_used='json')
+    def _packed_as_hex(self, packed: Optional[bytes]) -> Optional[str]:
+        return packed.hex() if packed is not None else None
+
+# Bounds the memory and CPU one purchase can use building and inserting its tickets
+MAX_TICKETS_PER_PURCHASE = 10000
 
 class TicketPurchaseRequest(BaseModel):
     wallet_address: str
-    num_tickets: int
+    num_tickets: int = Field(..., ge=1, le=MAX_TICKETS_PER_PURCHASE)
     category_id: str = Field(..., description="The ID of the lottery category to buy tickets for")
-    selection: Optional[List[Any]] = Field(None, description="User's number/symbol picks for 'Pick N' type games. Required if category is 'Pick N'. Example: For a Pick 3 game, this could be [1, 2, 3]")
+    selection: Optional[List[Any]] = Field(None, description="User's number/symbol picks for 'Pick N' type games. Required if category is 'Pick N' and quick_pick is not set. Example: For a Pick 3 game, this could be [1, 2, 3]")
+    selections: Optional[List[List[Any]]] = Field(None, max_length=MAX_TICKETS_PER_PURCHASE, description="For 'Pick N' games, one selection per ticket (length must equal num_tickets) instead of the same 'selection' on every ticket.")
+    quick_pick: bool = Field(False, description="For 'Pick N' games, generate an independent random selection for each ticket instead of using 'selection'.")
     referral_code: Optional[str] = Field(None, min_length=6, max_length=10, description="Optional referral code to apply.") # Assuming codes are around this length
 
 class TicketPurchaseResponse(BaseModel):
@@ -26,6 +38,9 @@ class TicketEntry(BaseModel):
     draw_id: str # Will store MongoDB _id of the draw as str
     timestamp: datetime
     selection_data: Optional[PickNSelectionData] = Field(None, description="User's picks for 'Pick N' games")
+    ticket_seq: Optional[int] = Field(None, description="Per-draw sequence number (Pick-N tickets); keys the draw's postings index")
+    purchase_id: Optional[str] = Field(None, description="Shared by the tickets bought together in one purchase")
+    syndicate_id: Optional[str] = Field(None, description="Set on tickets bought by a syndicate")
 
     class Config:
         populate_by_name = True
@@ -46,3 +61,6 @@ class TicketCreate(BaseModel):
     draw_id: str # Will store MongoDB _id of the draw as str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     selection_data: Optional[PickNSelectionData] = None
+    ticket_seq: Optional[int] = None
+    purchase_id: Optional[str] = None
+    syndicate_id: Optional[str] = None
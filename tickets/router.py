@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from .models import TicketPurchaseRequest, TicketPurchaseResponse, TicketEntry, TicketCreate, PickNSelectionData
 from . import db as tickets_db
+from .selections import validate_pick_n_selection, validate_pick_n_selections, generate_quick_picks, pick_n_selection_data
 from draws import db as draws_db
 from draws.models import DrawCreate as DrawCreateSchema, DrawUpdate as DrawUpdateSchema, Draw as DrawSchema
 from lottery_categories.db import get_category_by_id as get_category_db_by_id
@@ -11,48 +12,15 @@ from gamification.models import AchievementEventType # Import event types
 from datetime import datetime
 from typing import List, Optional, Any
 from pymongo.errors import PyMongoError
+from bson import ObjectId
+from metrics.instrumentation import TimedRoute
 
-router = APIRouter()
-
-def validate_pick_n_selection(selection: List[Any], game_config: dict) -> PickNSelectionData:
-    """
-    Validates user's selection for a Pick N game against the category's game_config.
-    Returns PickNSelectionData if valid, otherwise raises HTTPException.
-    """
-    num_picks_expected = game_config.get('num_picks')
-    min_val = game_config.get('min_digit') # Assuming digits for now
-    max_val = game_config.get('max_digit') # Assuming digits for now
-    allow_duplicates = game_config.get('allow_duplicates', False)
-
-    if not isinstance(num_picks_expected, int) or \
-       not isinstance(min_val, int) or \
-       not isinstance(max_val, int):
-        raise HTTPException(status_code=500, detail="Invalid game_config for Pick N category.")
-
-    if len(selection) != num_picks_expected:
-        raise HTTPException(status_code=400, detail=f"Invalid selection: Expected {num_picks_expected} picks, got {len(selection)}.")
-
-    if not allow_duplicates and len(set(selection)) != len(selection):
-        raise HTTPException(status_code=400, detail="Invalid selection: Duplicate picks are not allowed.")
-
-    for pick in selection:
-        try:
-            pick_val = int(pick) # Assuming picks are convertible to int for digit games
-        except ValueError:
-            raise HTTPException(status_code=400, detail=f"Invalid selection: Pick '{pick}' is not a valid number.")
-        if not (min_val <= pick_val <= max_val):
-            raise HTTPException(status_code=400, detail=f"Invalid selection: Pick '{pick_val}' is out of range ({min_val}-{max_val}).")
-
-    return PickNSelectionData(picks=selection)
-
+router = APIRouter(route_class=TimedRoute)
 
 @router.post("/buy", response_model=TicketPurchaseResponse)
 def buy_tickets(req: TicketPurchaseRequest):
-    if req.num_tickets < 1:
-        raise HTTPException(status_code=400, detail="Must buy at least one ticket.")
-
     active_draw_id: str
-    ticket_selection_data: Optional[PickNSelectionData] = None
+    ticket_selections: List[Optional[PickNSelectionData]]
 
     try:
         category: Optional[LotteryCategory] = get_category_db_by_id(req.category_id)
@@ -63,12 +31,24 @@ def buy_tickets(req: TicketPurchaseRequest):
 
         # Handle game-specific selection
         if category.game_type == "pick_n_digits": # Or other "pick_n_..." types
-            if req.selection is None:
+            if sum((req.selection is not None, req.selections is not None, req.quick_pick)) > 1:
+                raise HTTPException(status_code=400, detail="Provide only one of selection, selections or quick_pick.")
+            if req.quick_pick:
+                # Generated lines honor game_config by construction, so they skip per-ticket validation.
+                ticket_selections = [pick_n_selection_data(picks) for picks in generate_quick_picks(category.game_config, req.num_tickets)]
+            elif req.selections is not None:
+                if len(req.selections) != req.num_tickets:
+                    raise HTTPException(status_code=400, detail=f"Expected {req.num_tickets} selections, got {len(req.selections)}.")
+                ticket_selections = validate_pick_n_selections(req.selections, category.game_config)
+            elif req.selection is None:
                 raise HTTPException(status_code=400, detail=f"Selection is required for game type '{category.game_type}'.")
-            ticket_selection_data = validate_pick_n_selection(req.selection, category.game_config)
-        elif req.selection is not None:
+            else:
+                ticket_selections = [validate_pick_n_selection(req.selection, category.game_config)] * req.num_tickets
+        elif req.selection is not None or req.selections is not None or req.quick_pick:
             # If selection is provided for a non-pick_n game (e.g., raffle)
             raise HTTPException(status_code=400, detail=f"Selection data is not applicable for game type '{category.game_type}'.")
+        else:
+            ticket_selections = [None] * req.num_tickets
 
         # Find or create an open draw (existing logic from previous step)
         open_draws = draws_db.get_open_draws_for_category(req.category_id)
@@ -154,28 +134,45 @@ def buy_tickets(req: TicketPurchaseRequest):
             print(f"Unexpected error during referral processing for code {req.referral_code}: {e}")
 
 
-    purchased_ticket_ids = []
-    for _ in range(req.num_tickets):
-        ticket_to_create = TicketCreate(
+    # Pick-N tickets get per-draw sequence numbers (one $inc for the whole purchase) so they can
+    # be added to the draw's number -> tickets postings index, which close reads instead of every ticket.
+    # keyed_rank raffle tickets get them too, as close ranks the draw in ticket_seq ranges.
+    first_seq: Optional[int] = None
+    if category.uses_ticket_seqs():
+        first_seq = draws_db.reserve_ticket_seqs(active_draw_id, req.num_tickets)
+        if first_seq is None:
+            raise HTTPException(status_code=500, detail="Failed to allocate ticket numbers for the draw.")
+
+    # All tickets are written in one insert_many, so the round trips don't grow with num_tickets.
+    purchase_time = datetime.utcnow()
+    purchase_id = str(ObjectId())
+    tickets_to_create = [
+        TicketCreate(
             wallet_address=req.wallet_address,
             draw_id=active_draw_id,
-            timestamp=datetime.utcnow(),
-            selection_data=ticket_selection_data
+            timestamp=purchase_time,
+            selection_data=selection,
+            ticket_seq=first_seq + i if first_seq is not None else None,
+            purchase_id=purchase_id
         )
-        try:
-            ticket_id = tickets_db.create_ticket(ticket_to_create)
-            if ticket_id:
-                purchased_ticket_ids.append(ticket_id)
-            else:
-                raise HTTPException(status_code=500, detail="Failed to save one or more tickets to database.")
-        except PyMongoError as e:
-            raise HTTPException(status_code=500, detail=f"Database error while saving a ticket: {str(e)}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Unexpected error while saving a ticket: {str(e)}")
+        for i, selection in enumerate(ticket_selections)
+    ]
+    try:
+        purchased_ticket_ids = tickets_db.create_tickets_bulk(tickets_to_create)
+        if purchased_ticket_ids is None:
+            raise HTTPException(status_code=500, detail="Failed to save one or more tickets to database.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error while saving tickets: {str(e)}")
 
     if not purchased_ticket_ids or len(purchased_ticket_ids) != req.num_tickets:
         raise HTTPException(status_code=500, detail="Could not purchase all requested tickets. Partial transaction may have occurred.")
 
+    if category.game_type == "pick_n_digits":
+        # The tickets are already bought; if indexing fails, close falls back to scanning the draw's tickets.
+        tickets_db.index_ticket_picks(active_draw_id, [(t.ticket_seq, t.selection_data.picks) for t in tickets_to_create])
+
     # --- Gamification Event: Ticket Purchase ---
     try:
         # Assuming category is fetched and available
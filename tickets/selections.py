@@ -0,0 +1,223 @@
+import itertools
+import math
+import os
+import secrets
+from functools import lru_cache
+from typing import List, Any, Dict, Callable, Iterable, Optional
+
+from fastapi import HTTPException
+
+from .models import PickNSelectionData
+
+# Quick-picks must not be predictable, so they come from the OS CSPRNG rather than
+# the seeded generator used for winning picks in rng.utils.
+_quick_pick_rng = secrets.SystemRandom()
+
+
+def _pick_n_config(game_config: dict):
+    """ Returns (num_picks, min_digit, max_digit, allow_duplicates), or raises a 500 if game_config is malformed. """
+    num_picks = game_config.get('num_picks')
+    min_val = game_config.get('min_digit') # Assuming digits for now
+    max_val = game_config.get('max_digit') # Assuming digits for now
+    allow_duplicates = game_config.get('allow_duplicates', False)
+
+    if not isinstance(num_picks, int) or \
+       not isinstance(min_val, int) or \
+       not isinstance(max_val, int):
+        raise HTTPException(status_code=500, detail="Invalid game_config for Pick N category.")
+    return num_picks, min_val, max_val, allow_duplicates
+
+
+# A selection's values are also stored as a canonical set encoding, so matching at close is
+# popcount(ticket_mask & winning_mask) instead of building a Python set per ticket.
+MASK_INT64_VALUES = 63 # Values 0..62: bit 63 would not fit a signed BSON int64
+MASK_128_VALUES = 128
+_PACKED_MASK = b"m"
+_PACKED_VALUES = b"v"
+
+
+def encode_pick_values(values: Iterable[int]) -> Dict[str, Any]:
+    """ Returns {'mask': int} or {'packed': bytes} for a selection's integer values (see PickNSelectionData). """
+    distinct = set(values)
+    if not distinct or min(distinct) >= 0 and max(distinct) < MASK_INT64_VALUES:
+        return {"mask": sum(1 << v for v in distinct)}
+    if min(distinct) >= 0 and max(distinct) < MASK_128_VALUES:
+        return {"packed": _PACKED_MASK + sum(1 << v for v in distinct).to_bytes(16, 'little')}
+    return {"packed": _PACKED_VALUES + b"".join(v.to_bytes(4, 'big', signed=True) for v in sorted(distinct))}
+
+
+def pick_n_selection_data(picks: List[Any], values: Optional[List[int]] = None) -> PickNSelectionData:
+    """ PickNSelectionData for already-valid picks (values: the picks as ints, if the caller has them). """
+    return PickNSelectionData(picks=picks, **encode_pick_values(values if values is not None else map(int, picks)))
+
+
+def decode_pick_values(selection_data: Dict[str, Any]) -> set:
+    """ The set of integer values of a stored selection_data, from whichever encoding it has. """
+    if selection_data.get("mask") is not None:
+        mask = selection_data["mask"]
+        return {v for v in range(mask.bit_length()) if mask >> v & 1}
+    packed = selection_data.get("packed")
+    if packed is not None:
+        packed = bytes(packed)
+        if packed[:1] == _PACKED_MASK:
+            mask = int.from_bytes(packed[1:], 'little')
+            return {v for v in range(mask.bit_length()) if mask >> v & 1}
+        return {int.from_bytes(packed[i:i + 4], 'big', signed=True) for i in range(1, len(packed), 4)}
+    values = set()
+    for pick in selection_data.get("picks") or []:
+        try:
+            values.add(int(pick))
+        except (TypeError, ValueError):
+            continue
+    return values
+
+
+def match_counter(winning_picks: List[Any]) -> Callable[[Optional[Dict[str, Any]]], int]:
+    """
+    Returns a function giving the number of winning values in a stored ticket's selection_data
+    (set semantics, as before). Masked tickets cost one AND and a popcount; tickets without
+    an encoding (written before it existed) fall back to decoding their picks.
+    """
+    winning_values = {int(pick) for pick in winning_picks}
+    winning_mask = sum(1 << v for v in winning_values if 0 <= v < MASK_128_VALUES)
+
+    def count(selection_data: Optional[Dict[str, Any]]) -> int:
+        if not selection_data:
+            return 0
+        mask = selection_data.get("mask")
+        if mask is not None:
+            return (mask & winning_mask).bit_count()
+        packed = selection_data.get("packed")
+        if packed is not None and packed[:1] == _PACKED_MASK:
+            return (int.from_bytes(packed[1:], 'little') & winning_mask).bit_count()
+        return len(decode_pick_values(selection_data) & winning_values)
+
+    return count
+
+
+def validate_pick_n_selection(selection: List[Any], game_config: dict) -> PickNSelectionData:
+    """
+    Validates user's selection for a Pick N game against the category's game_config.
+    Returns PickNSelectionData if valid, otherwise raises HTTPException.
+    """
+    num_picks_expected, min_val, max_val, allow_duplicates = _pick_n_config(game_config)
+
+    if len(selection) != num_picks_expected:
+        raise HTTPException(status_code=400, detail=f"Invalid selection: Expected {num_picks_expected} picks, got {len(selection)}.")
+
+    if not allow_duplicates and len(set(selection)) != len(selection):
+        raise HTTPException(status_code=400, detail="Invalid selection: Duplicate picks are not allowed.")
+
+    values = []
+    for pick in selection:
+        try:
+            pick_val = int(pick) # Assuming picks are convertible to int for digit games
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid selection: Pick '{pick}' is not a valid number.")
+        if not (min_val <= pick_val <= max_val):
+            raise HTTPException(status_code=400, detail=f"Invalid selection: Pick '{pick_val}' is out of range ({min_val}-{max_val}).")
+        values.append(pick_val)
+
+    return pick_n_selection_data(selection, values)
+
+
+def validate_pick_n_selections(selections: List[List[Any]], game_config: dict) -> List[PickNSelectionData]:
+    """
+    Validates a list of selections (one per ticket) with the same rules as validate_pick_n_selection.
+    The config is read once and each line gets a single pass; a line that fails is re-run through
+    validate_pick_n_selection so the error matches. The first invalid line aborts the whole batch;
+    its error detail is prefixed with the line number.
+    """
+    num_picks, min_val, max_val, allow_duplicates = _pick_n_config(game_config)
+    validated: List[PickNSelectionData] = []
+    for line_no, selection in enumerate(selections, start=1):
+        try:
+            values = [int(pick) for pick in selection]
+            valid = (len(values) == num_picks
+                     and (allow_duplicates or len(set(selection)) == num_picks)
+                     and (not values or (min_val <= min(values) and max(values) <= max_val)))
+        except (TypeError, ValueError):
+            valid = False
+        if valid:
+            validated.append(pick_n_selection_data(selection, values))
+            continue
+        try:
+            validated.append(validate_pick_n_selection(selection, game_config))
+        except HTTPException as e:
+            if e.status_code != 400:
+                raise
+            raise HTTPException(status_code=400, detail=f"Line {line_no}: {e.detail}")
+    return validated
+
+
+# Bulk quick-picks draw one uniform index per line into the space of possible lines and decode it.
+# Spaces up to this size are decoded from a cached table of every line (10 choose-in-order 4 is 5,040).
+_QUICK_PICK_TABLE_LIMIT = 1 << 16
+_WORD_BITS = 64
+
+
+@lru_cache(maxsize=32)
+def _quick_pick_table(num_picks: int, min_val: int, max_val: int, allow_duplicates: bool):
+    values = range(min_val, max_val + 1)
+    if allow_duplicates:
+        return tuple(itertools.product(values, repeat=num_picks))
+    return tuple(itertools.permutations(values, num_picks))
+
+
+def _uniform_indexes(space: int, count: int) -> List[int]:
+    """ count independent uniform ints in [0, space) from bulk CSPRNG bytes (rejection sampling, no modulo bias). """
+    limit = (1 << _WORD_BITS) - (1 << _WORD_BITS) % space
+    indexes: List[int] = []
+    while len(indexes) < count:
+        needed = count - len(indexes)
+        words = memoryview(os.urandom(8 * (needed + needed // 16 + 1))).cast('Q')
+        indexes.extend(word % space for word in words if word < limit)
+    del indexes[count:]
+    return indexes
+
+
+def _decode_quick_pick(index: int, num_picks: int, min_val: int, max_val: int, allow_duplicates: bool) -> List[int]:
+    """ Mixed-radix decode of a line index: base n digits with duplicates, a Lehmer code without. """
+    if allow_duplicates:
+        base = max_val - min_val + 1
+        line = []
+        for _ in range(num_picks):
+            index, digit = divmod(index, base)
+            line.append(min_val + digit)
+        return line
+    pool = list(range(min_val, max_val + 1))
+    line = []
+    for _ in range(num_picks):
+        index, position = divmod(index, len(pool))
+        line.append(pool.pop(position))
+    return line
+
+
+def generate_quick_picks(game_config: dict, count: int) -> List[List[int]]:
+    """
+    Generates `count` independent random selections honoring game_config
+    (num_picks, min_digit, max_digit, allow_duplicates).
+    Each line is uniform over all valid ordered lines, like random.sample / choice per pick,
+    but the randomness for the whole batch comes from one urandom read.
+    """
+    num_picks, min_val, max_val, allow_duplicates = _pick_n_config(game_config)
+    if min_val > max_val:
+        raise HTTPException(status_code=500, detail="Invalid game_config for Pick N category.")
+    value_range = range(min_val, max_val + 1)
+    if not allow_duplicates and num_picks > len(value_range):
+        raise HTTPException(status_code=500, detail="Invalid game_config for Pick N category.")
+    if count <= 0:
+        return []
+
+    space = len(value_range) ** num_picks if allow_duplicates else math.perm(len(value_range), num_picks)
+    if space > 1 << (_WORD_BITS - 1):
+        # Too many possible lines to index with one word; fall back to a draw per pick.
+        if allow_duplicates:
+            return [[_quick_pick_rng.choice(value_range) for _ in range(num_picks)] for _ in range(count)]
+        return [_quick_pick_rng.sample(value_range, num_picks) for _ in range(count)]
+
+    indexes = _uniform_indexes(space, count)
+    if space <= _QUICK_PICK_TABLE_LIMIT:
+        table = _quick_pick_table(num_picks, min_val, max_val, allow_duplicates)
+        return [list(table[index]) for index in indexes]
+    return [_decode_quick_pick(index, num_picks, min_val, max_val, allow_duplicates) for index in indexes]
@@ -5,8 +5,9 @@ from . import db as users_db
 from .models import User, UserUpdate
 from auth.dependencies import get_current_user_from_token # Import the real dependency
 from auth.models import TokenData # To type hint the dependency result
+from metrics.instrumentation import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 # Placeholder get_current_user_wallet_address removed.
 
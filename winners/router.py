@@ -6,8 +6,9 @@ from draws.db import get_draw_history # Using existing function, will filter for
 from draws.models import Draw # To access Draw fields
 from lottery_categories.db import get_category_by_id
 from pymongo.errors import PyMongoError
+from metrics.instrumentation import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 def anonymize_wallet(wallet_address: Optional[str]) -> str:
     if not wallet_address:
@@ -36,20 +37,18 @@ def get_recent_winners(
             if len(recent_winners_info) >= limit:
                 break # Reached desired number of winners
 
-            if draw.status == "completed" and draw.winner and draw.actual_close_time:
+            if draw.status == "completed" and draw.winners_by_tier and draw.actual_close_time:
                 category = get_category_by_id(draw.category_id)
                 category_name = category.name if category else "Unknown Category"
-                prize_summary = "Details in Draw" # Placeholder, could be more specific
-                if category and category.prize_info:
-                    # Example: just take the first key as a summary
-                    prize_summary = next(iter(category.prize_info.keys()), "General Prize").replace("_", " ").title()
+                top_winner = draw.winners_by_tier[0]
+                prize_summary = top_winner.tier_name # Prize tiers replaced the category's free-form prize_info
 
 
                 winner_info = RecentWinnerInfo(
                     draw_id=draw.id,
                     category_id=draw.category_id,
                     category_name=category_name,
-                    winning_wallet_address_anonymized=anonymize_wallet(draw.winner),
+                    winning_wallet_address_anonymized=anonymize_wallet(top_winner.wallet_address),
                     prize_info_summary=prize_summary, # Simplified for now
                     closed_time=draw.actual_close_time
                 )